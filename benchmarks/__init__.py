@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/__init__.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Benchmarks for Pacifica Dispatcher Example.
+
+This package defines the benchmarks for Pacifica Dispatcher Example. Each
+benchmark is a module that is run as a script from the root directory of this
+package, e.g., ``python3 -m benchmarks.transform_memory``.
+
+"""
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/batch_ingest.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Ingest benchmark for the batch endpoint of Pacifica Dispatcher Example.
+
+This module starts the CherryPy application in-process against a SQLite
+database and Celery's in-memory broker, and then reports the number of
+CloudEvents notifications per second that are received via one POST request
+per notification to "/receive" and via batches to "/batch".
+
+Usage::
+
+    python3 -m benchmarks.batch_ingest --count 2000 --batch-size 100
+
+"""
+
+import argparse
+import json
+import os
+import socket
+import tempfile
+import time
+
+
+def _free_port() -> int:
+    """Return a free TCP port on the loopback interface.
+
+    """
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Compare the ingest rate of the receive and batch endpoints.')
+    parser.add_argument('--count', metavar='COUNT', dest='count', type=int, default=2000, help='The number of CloudEvents notifications.')
+    parser.add_argument('--batch-size', metavar='BATCH_SIZE', dest='batch_size', type=int, default=100, help='The number of CloudEvents notifications per batch.')
+    parser.add_argument('--json-lines', dest='json_lines', action='store_true', help='Send batches as JSON Lines rather than JSON arrays.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir_name:
+        # The application is configured via environment variables, so they are
+        # set before it is imported.
+        #
+        os.environ['DATABASE_URL'] = 'sqlite:///{0}'.format(os.path.join(tempdir_name, 'db.sqlite3'))
+        os.environ['BROKER_URL'] = 'memory://'
+        os.environ['BACKEND_URL'] = 'cache+memory://'
+
+        # pylint: disable=import-outside-toplevel
+        import cherrypy
+        import requests
+
+        from pacifica.dispatcher_example.__main__ import application
+
+        from .common import create_event_data
+        # pylint: enable=import-outside-toplevel
+
+        port = _free_port()
+
+        cherrypy.config.update({
+            'global': {
+                'environment': 'production',
+                'log.screen': False,
+                'server.socket_host': '127.0.0.1',
+                'server.socket_port': port,
+            },
+        })
+        cherrypy.tree.mount(application)
+
+        # Silence the access and error logs, so that they are not measured.
+        #
+        for log_manager in [cherrypy.log, application.log]:
+            log_manager.access_log.propagate = False
+            log_manager.error_log.propagate = False
+
+        cherrypy.engine.start()
+        cherrypy.engine.wait(cherrypy.engine.states.STARTED)
+
+        try:
+            url = 'http://127.0.0.1:{0}'.format(port)
+            events = [create_event_data(['synthetic.txt'], event_id='E-{0:08d}'.format(index)) for index in range(args.count)]
+
+            with requests.Session() as session:
+                start = time.perf_counter()
+                for event_data in events:
+                    session.post('{0}/receive'.format(url), json=event_data).raise_for_status()
+                elapsed = time.perf_counter() - start
+
+                print('endpoint=receive events={0} elapsed={1:.3f}s events_per_second={2:.1f}'.format(args.count, elapsed, args.count / elapsed))
+
+                start = time.perf_counter()
+                for index in range(0, args.count, args.batch_size):
+                    batch = events[index:(index + args.batch_size)]
+                    if args.json_lines:
+                        response = session.post('{0}/batch'.format(url), data='\n'.join(json.dumps(event_data) for event_data in batch), headers={'Content-Type': 'application/x-ndjson'})
+                    else:
+                        response = session.post('{0}/batch'.format(url), json=batch)
+                    response.raise_for_status()
+                    assert len(response.json()) == len(batch)
+                elapsed = time.perf_counter() - start
+
+                print('endpoint=batch batch_size={0} events={1} elapsed={2:.3f}s events_per_second={3:.1f}'.format(args.batch_size, args.count, elapsed, args.count / elapsed))
+        finally:
+            cherrypy.engine.exit()
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/cart_download.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Throughput benchmark for the __remote__ downloader runners of Pacifica
+Dispatcher Example.
+
+This module downloads the files for synthetic CloudEvents notifications on a
+fixed number of worker threads, as a stand-in for a Celery worker whose pool is
+"threads", from a stand-in for the cart server, whose carts are staged one file
+at a time, i.e., a cart is ready a number of seconds per file after it is
+created, and then reports for each mode:
+
+* ``upstream``: the ``RemoteDownloaderRunner`` class with a Pacifica downloader
+  of its own, i.e., one cart per notification, whose status is checked once per
+  second, and which is downloaded on a new connection.
+* ``pooled``: the ``ShardedRemoteDownloaderRunner`` class with the pooled HTTP
+  session, one cart per notification, whose status is checked once per
+  interval.
+* ``sharded``: the same, but with the files for each notification split into
+  shards, one cart per shard, which are requested in parallel.
+
+The measurements are the number of notifications per second, and the number of
+connections that were accepted by the stand-in for the cart server.
+
+Usage::
+
+    python3 -m benchmarks.cart_download --events 16 --files 16 --concurrency 4 --shard-files 4
+
+"""
+
+import argparse
+import concurrent.futures
+import http.server
+import io
+import json
+import os
+import tarfile
+import tempfile
+import threading
+import time
+import typing
+
+from pacifica.dispatcher.downloader_runners import RemoteDownloaderRunner
+from pacifica.dispatcher.models import File
+from pacifica.downloader import Downloader
+
+from pacifica.dispatcher_example.runners import ShardedRemoteDownloaderRunner, create_session
+
+
+# The names of the modes, in the order that they are run.
+#
+MODE_NAMES = ('upstream', 'pooled', 'sharded', )  # type: typing.Tuple[str, ...]
+
+
+class CartServer(http.server.ThreadingHTTPServer):
+    """A stand-in for the cart server, whose carts are ready a number of
+    seconds per file after they are created, and whose connections are kept
+    alive.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, stage_seconds: float, file_size: int) -> None:
+        """Initialize this server on an ephemeral port."""
+        super(CartServer, self).__init__(('127.0.0.1', 0), CartRequestHandler)
+
+        self.stage_seconds = stage_seconds  # type: float
+        self.file_size = file_size  # type: int
+        self.carts = {}  # type: typing.Dict[str, typing.Tuple[typing.List[str], float]]
+        self.connections = 0  # type: int
+        self.lock = threading.Lock()  # type: threading.Lock
+
+    @property
+    def url(self) -> str:
+        """Return the URL for the cart API."""
+        return 'http://{0}:{1}'.format(*self.server_address[:2])
+
+
+class CartRequestHandler(http.server.BaseHTTPRequestHandler):
+    """The request handler for the stand-in for the cart server.
+
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self) -> None:
+        """Count the accepted connection."""
+        super(CartRequestHandler, self).setup()
+
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args: typing.Any) -> None:
+        """Do not log the requests."""
+
+    def _send(self, status: int, headers: typing.Dict[str, str] = None, body: bytes = b'') -> None:
+        """Send a response whose body has a known length."""
+        self.send_response(status)
+
+        for (key, value) in (headers or {}).items():
+            self.send_header(key, value)
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Create a cart, which is ready after its files are staged."""
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        paths = [file_id['path'] for file_id in body['fileids']]  # type: typing.List[str]
+
+        with self.server.lock:
+            self.server.carts[self.path] = (paths, time.monotonic() + self.server.stage_seconds * len(paths))
+
+        self._send(201)
+
+    def do_HEAD(self) -> None:  # pylint: disable=invalid-name
+        """Return the status of a cart."""
+        with self.server.lock:
+            (_paths, ready) = self.server.carts[self.path]
+
+        self._send(204, {'X-Pacifica-Status': 'ready' if time.monotonic() >= ready else 'staging', 'X-Pacifica-Message': ''})
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Download a cart, as a tar archive of its files."""
+        with self.server.lock:
+            (paths, _ready) = self.server.carts[self.path.split('?', 1)[0]]
+
+        content = io.BytesIO()  # type: io.BytesIO
+
+        with tarfile.open(fileobj=content, mode='w') as cart_tar:
+            for path in paths:
+                tarinfo = tarfile.TarInfo(name=os.path.join('data', path))  # type: tarfile.TarInfo
+                tarinfo.size = self.server.file_size
+                cart_tar.addfile(tarinfo, io.BytesIO(b'x' * self.server.file_size))
+
+        self._send(200, {'Content-Type': 'application/octet-stream'}, content.getvalue())
+
+
+def _create_downloader_runner(mode: str, url: str, args: argparse.Namespace) -> RemoteDownloaderRunner:
+    """Construct the downloader runner for a mode.
+
+    """
+
+    if mode == 'upstream':
+        return RemoteDownloaderRunner(Downloader(cart_api_url=url))
+
+    downloader = Downloader(cart_api_url=url, session=create_session())  # type: pacifica.downloader.Downloader
+
+    return ShardedRemoteDownloaderRunner(downloader, shard_files=args.shard_files if mode == 'sharded' else None, max_concurrency=args.download_concurrency, poll_interval=args.poll_interval)
+
+
+def _run(mode: str, args: argparse.Namespace) -> None:
+    """Download the files for every notification, and then report the
+    measurements.
+
+    """
+
+    server = CartServer(args.stage_seconds, args.file_size)  # type: CartServer
+    thread = threading.Thread(target=server.serve_forever, daemon=True)  # type: threading.Thread
+    thread.start()
+
+    downloader_runner = _create_downloader_runner(mode, server.url, args)  # type: RemoteDownloaderRunner
+
+    files = [File(_id=index, name='file-{0}.txt'.format(index), path='file-{0}.txt'.format(index), hashsum='', hashtype='sha1') for index in range(args.files)]  # type: typing.List[File]
+
+    def handle(_index: int) -> None:
+        """Download the files for a notification."""
+        with tempfile.TemporaryDirectory() as basedir_name:
+            downloader_runner.download(basedir_name, files)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            start = time.perf_counter()  # type: float
+            list(executor.map(handle, range(args.events)))
+            elapsed = time.perf_counter() - start  # type: float
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print('mode={0} events={1} files={2} elapsed={3:.2f}s events_per_second={4:.2f} carts={5} connections={6}'.format(mode, args.events, args.files, elapsed, args.events / elapsed, len(server.carts), server.connections))
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Compare the throughput of the __remote__ downloader runners against a stand-in for the cart server.')
+    parser.add_argument('--events', metavar='EVENTS', dest='events', type=int, default=16, help='The number of notifications.')
+    parser.add_argument('--files', metavar='FILES', dest='files', type=int, default=16, help='The number of files per notification.')
+    parser.add_argument('--file-size', metavar='FILE_SIZE', dest='file_size', type=int, default=4096, help='The size in bytes of each file.')
+    parser.add_argument('--concurrency', metavar='CONCURRENCY', dest='concurrency', type=int, default=4, help='The number of worker threads.')
+    parser.add_argument('--stage-seconds', metavar='STAGE_SECONDS', dest='stage_seconds', type=float, default=0.05, help='The number of seconds to stage each file.')
+    parser.add_argument('--shard-files', metavar='SHARD_FILES', dest='shard_files', type=int, default=4, help='The maximum number of files per cart for the sharded mode.')
+    parser.add_argument('--download-concurrency', metavar='DOWNLOAD_CONCURRENCY', dest='download_concurrency', type=int, default=8, help='The maximum number of carts that are requested at the same time.')
+    parser.add_argument('--poll-interval', metavar='POLL_INTERVAL', dest='poll_interval', type=float, default=0.05, help='The number of seconds between the checks of the status of a cart.')
+    parser.add_argument('--mode', metavar='MODE', dest='modes', action='append', choices=MODE_NAMES, help='The mode, which may be repeated (default: every mode).')
+    args = parser.parse_args()
+
+    for mode in args.modes or MODE_NAMES:
+        _run(mode, args)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/common.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Common functions for the benchmarks for Pacifica Dispatcher Example.
+
+This module defines the functions that generate synthetic CloudEvents
+notifications and file sets for the benchmarks.
+
+Attributes:
+    LIPSUM (str): The text that is repeated to fill synthetic files.
+    create_event_data (typing.Callable[..., typing.Dict[str, typing.Any]]):
+        Construct the JSON-encoded data for a synthetic CloudEvents
+        notification.
+    io_counters (typing.Callable[[], typing.Optional[typing.Dict[str, int]]]):
+        Return the I/O counters of the current process.
+    peak_rss_bytes (typing.Callable[[], int]): Return the peak resident set
+        size of the current process.
+    percentile (typing.Callable[[typing.List[float], float], float]): Return a
+        percentile of a list of values.
+    write_file (typing.Callable[..., int]): Write a synthetic file.
+
+"""
+
+import math
+import resource
+import sys
+import typing
+
+
+# The text that is repeated to fill synthetic files.
+#
+# The text includes multi-byte characters, so that the transforms are
+# exercised across multi-byte UTF-8 boundaries.
+#
+LIPSUM = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. Ærøskøbing straße ĳssel ǆ.\n'  # type: str
+
+
+def create_event_data(file_names: typing.List[str], event_id: str = 'C234-1234-1234', file_size: int = 0) -> typing.Dict[str, typing.Any]:
+    """Construct the JSON-encoded data for a synthetic CloudEvents notification
+    that is matched by the router for Pacifica Dispatcher Example.
+
+    Args:
+        file_names (typing.List[str]): The names of the files.
+        event_id (str): The ID for the CloudEvents notification.
+        file_size (int): The size of each file in bytes.
+
+    Returns:
+        typing.Dict[str, typing.Any]: The JSON-encoded data.
+
+    """
+
+    data = [
+        {'destinationTable': 'Transactions._id', 'value': -1},
+        {'destinationTable': 'Transactions.submitter', 'value': -1},
+        {'destinationTable': 'Transactions.project', 'value': -1},
+        {'destinationTable': 'Transactions.instrument', 'value': -1},
+        {'destinationTable': 'TransactionKeyValue', 'key': 'example-key', 'value': 'example-value'},
+    ]  # type: typing.List[typing.Dict[str, typing.Any]]
+
+    for index, file_name in enumerate(file_names):
+        data.append({
+            '_id': index + 1,
+            'ctime': 'Thu Aug 30 15:19:40 PST 2018',
+            'destinationTable': 'Files',
+            'encoding': 'utf-8',
+            'hashsum': '{0:040x}'.format(index + 1),
+            'hashtype': 'sha1',
+            'mimetype': 'text/plain',
+            'mtime': 'Thu Aug 30 15:19:40 PST 2018',
+            'name': file_name,
+            'size': file_size,
+            'subdir': '',
+        })
+
+    return {
+        'cloudEventsVersion': '0.1',
+        'contentType': 'application/json',
+        'data': data,
+        'eventID': event_id,
+        'eventTime': '2018-08-30T15:20:00Z',
+        'eventType': 'org.pacifica.metadata.ingest',
+        'source': '/pacifica/metadata/ingest',
+    }
+
+
+def io_counters() -> typing.Optional[typing.Dict[str, int]]:
+    """Return the I/O counters of the current process, e.g., "wchar", the
+    number of bytes that were passed to ``write(2)``, and "write_bytes", the
+    number of bytes that were sent to the storage layer.
+
+    Returns:
+        typing.Optional[typing.Dict[str, int]]: The I/O counters, or ``None``
+        if ``/proc/self/io`` is unavailable, e.g., on macOS.
+
+    """
+
+    try:
+        with open('/proc/self/io', mode='r') as file:
+            return {name: int(value) for (name, value) in (line.split(':') for line in file)}
+    except OSError:
+        return None
+
+
+def peak_rss_bytes() -> int:
+    """Return the peak resident set size of the current process.
+
+    Returns:
+        int: The peak resident set size in bytes.
+
+    """
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # type: int
+
+    # The peak resident set size is reported in bytes on macOS and in kibibytes
+    # on Linux.
+    #
+    if sys.platform == 'darwin':
+        return peak_rss
+
+    return peak_rss * 1024
+
+
+def percentile(values: typing.List[float], fraction: float) -> float:
+    """Return a percentile of a list of values, using the nearest-rank method.
+
+    Args:
+        values (typing.List[float]): The values.
+        fraction (float): The percentile as a fraction, e.g., ``0.99``.
+
+    Returns:
+        float: The percentile, or ``NaN`` if there are no values.
+
+    """
+
+    if not values:
+        return math.nan
+
+    ordered = sorted(values)  # type: typing.List[float]
+
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def write_file(path: str, size: int, text: str = LIPSUM) -> int:
+    """Write a synthetic file by repeating the text, one line at a time.
+
+    Args:
+        path (str): The path to the file.
+        size (int): The minimum size of the file in bytes.
+        text (str): The text to repeat.
+
+    Returns:
+        int: The actual size of the file in bytes.
+
+    """
+
+    line = text.encode('utf-8')  # type: bytes
+    block = line * max(1, (1024 * 1024) // len(line))  # type: bytes
+
+    written = 0  # type: int
+
+    with open(path, mode='wb') as file:
+        while written < size:
+            written += file.write(block if (size - written) >= len(block) else line)
+
+    return written
+
+
+# Module exports.
+#
+__all__ = ('LIPSUM', 'create_event_data', 'io_counters', 'peak_rss_bytes', 'percentile', 'write_file', )
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/executor_throughput.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Throughput benchmark for the executors of Pacifica Dispatcher Example.
+
+This module handles a CloudEvents notification for many synthetic files, using
+the __local__ downloader and uploader runners, once for each executor, and then
+reports the throughput of each executor.
+
+Usage::
+
+    python3 -m benchmarks.executor_throughput --count 1000 --size 65536 --max-workers 8
+
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.uploader_runners import LocalUploaderRunner
+
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.executors import EXECUTOR_NAMES
+
+from .common import create_event_data, write_file
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Compare the throughput of the executors of the example event handler.')
+    parser.add_argument('--count', metavar='COUNT', dest='count', type=int, default=1000, help='The number of synthetic files.')
+    parser.add_argument('--size', metavar='SIZE', dest='size', type=int, default=64 * 1024, help='The size of each synthetic file in bytes.')
+    parser.add_argument('--max-workers', metavar='MAX_WORKERS', dest='max_workers', type=int, default=os.cpu_count(), help='The maximum number of workers for the pools.')
+    parser.add_argument('--repeat', metavar='REPEAT', dest='repeat', type=int, default=3, help='The number of times to handle the notification per executor.')
+    parser.add_argument('--executor', metavar='EXECUTOR', dest='executors', action='append', choices=EXECUTOR_NAMES, default=None, help='The executor to benchmark (may be repeated; defaults to all).')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as basedir_name:
+        file_names = ['synthetic-{0:06d}.txt'.format(index) for index in range(args.count)]
+        total_size = sum(write_file(os.path.join(basedir_name, file_name), args.size) for file_name in file_names)
+
+        event = Event(create_event_data(file_names, file_size=args.size))
+
+        for name in (args.executors or EXECUTOR_NAMES):
+            event_handler = ExampleEventHandler(LocalDownloaderRunner(basedir_name), LocalUploaderRunner(), executor=name, max_workers=args.max_workers)
+
+            elapsed = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                event_handler.handle(event)
+                elapsed.append(time.perf_counter() - start)
+
+            best = min(elapsed)
+
+            print('executor={0} max_workers={1} files={2} best={3:.3f}s files_per_second={4:.1f} throughput={5:.1f}MB/s'.format(
+                name, args.max_workers, args.count, best, args.count / best, total_size / best / 1e6))
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
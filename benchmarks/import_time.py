@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/import_time.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Start-up benchmark for Pacifica Dispatcher Example.
+
+This module imports ``pacifica.dispatcher_example.__main__`` in a fresh
+interpreter with ``python -X importtime``, reports the cumulative import time
+of the module and of its most expensive direct imports, and then reports the
+time to first use of each lazily-constructed attribute, i.e., "db",
+"ReceiveTaskModel", "celery_app" and "application", against a temporary SQLite
+database. Each measurement is the median of several fresh interpreters.
+
+Optionally, the benchmark asserts that the import time is below a ceiling.
+
+Usage::
+
+    python3 -m benchmarks.import_time --repeat 5 --top 10 --ceiling 0.1
+
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import typing
+
+
+# The module to import.
+#
+_MODULE_NAME = 'pacifica.dispatcher_example.__main__'  # type: str
+
+# The script that reports the time to first use of each lazily-constructed
+# attribute, one line per attribute.
+#
+_FIRST_USE_SCRIPT = '''
+import time
+start = time.perf_counter()
+import {0} as module
+print('import', time.perf_counter() - start)
+for name in ['db', 'ReceiveTaskModel', 'celery_app', 'application']:
+    start = time.perf_counter()
+    getattr(module, name)
+    print(name, time.perf_counter() - start)
+'''.format(_MODULE_NAME)  # type: str
+
+
+def _import_times(env: typing.Dict[str, str]) -> typing.Dict[str, int]:
+    """Return the cumulative import time in microseconds of the module and of
+    each module that it imports directly, as reported by ``python -X
+    importtime`` in a fresh interpreter.
+
+    """
+
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {0}'.format(_MODULE_NAME)], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    # Each module is reported after the modules that it imports, which are
+    # indented by two more spaces, so the direct imports of the module are the
+    # entries at the first level of indentation since the previous top-level
+    # entry.
+    #
+    children = {}  # type: typing.Dict[str, int]
+
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        (_self_time, cumulative_time, name) = line[len('import time:'):].split('|')
+
+        if not cumulative_time.strip().isdigit():
+            continue
+
+        indent = len(name) - len(name.lstrip()) - 1  # type: int
+
+        if indent == 0:
+            if name.strip() == _MODULE_NAME:
+                children[_MODULE_NAME] = int(cumulative_time)
+
+                return children
+
+            children = {}
+        elif indent == 2:
+            children[name.strip()] = int(cumulative_time)
+
+    return children
+
+
+def _first_use_times(env: typing.Dict[str, str]) -> typing.Dict[str, float]:
+    """Return the time to first use of each lazily-constructed attribute in
+    seconds, in a fresh interpreter.
+
+    """
+
+    process = subprocess.run([sys.executable, '-c', _FIRST_USE_SCRIPT], env=env, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+
+    return {name: float(value) for (name, value) in (line.split() for line in process.stdout.splitlines())}
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    Note:
+        This function exits with a non-zero status if the import time exceeds
+        the ceiling.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Measure the import time and the time to first use of the entrypoint module.')
+    parser.add_argument('--repeat', metavar='REPEAT', dest='repeat', type=int, default=5, help='The number of fresh interpreters per measurement.')
+    parser.add_argument('--top', metavar='TOP', dest='top', type=int, default=10, help='The number of most expensive direct imports to report.')
+    parser.add_argument('--ceiling', metavar='CEILING', dest='ceiling', type=float, default=None, help='The ceiling for the import time in seconds.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir_name:
+        env = dict(os.environ)
+        env['DATABASE_URL'] = 'sqlite:///{0}'.format(os.path.join(tempdir_name, 'db.sqlite3'))
+        env['BROKER_URL'] = 'memory://'
+        env['BACKEND_URL'] = 'cache+memory://'
+
+        runs = [_import_times(env) for _ in range(args.repeat)]  # type: typing.List[typing.Dict[str, int]]
+
+        import_times = {
+            name: statistics.median(run.get(name, 0) for run in runs)
+            for name in runs[0]
+        }  # type: typing.Dict[str, float]
+
+        first_use_runs = [_first_use_times(env) for _ in range(args.repeat)]  # type: typing.List[typing.Dict[str, float]]
+
+    elapsed = import_times[_MODULE_NAME] / 1e6  # type: float
+
+    print('module={0} import={1:.1f}ms'.format(_MODULE_NAME, elapsed * 1e3))
+
+    for name in sorted(import_times, key=import_times.get, reverse=True)[1:(args.top + 1)]:
+        print('  imports={0} import={1:.1f}ms'.format(name, import_times[name] / 1e3))
+
+    for name in first_use_runs[0]:
+        print('first_use={0} elapsed={1:.1f}ms'.format(name, statistics.median(run[name] for run in first_use_runs) * 1e3))
+
+    if (args.ceiling is not None) and (elapsed > args.ceiling):
+        print('FAIL: import time exceeds the ceiling', file=sys.stderr)
+        sys.exit(1)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
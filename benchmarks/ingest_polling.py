@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/ingest_polling.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Worker utilization benchmark for the asynchronous ingest of Pacifica
+Dispatcher Example.
+
+This module runs synthetic CloudEvents notifications through the Celery task
+(eager tasks, SQLite database) on a fixed number of worker threads, as a
+stand-in for a Celery worker whose pool is "threads", against a stand-in for a
+slow ingest server, whose ingest jobs reach a terminal state a number of seconds
+after they are submitted, and then reports for each mode:
+
+* ``blocking``: each upload waits for its ingest job, checking its state once
+  per second, i.e., the default.
+* ``async``: each upload returns after its ingest job is submitted, and a
+  single poller thread sweeps the outstanding ingest jobs once per interval.
+
+The measurements are the time until the worker threads are free again, the
+number of notifications handled per worker-second, i.e., the utilization of the
+worker threads, and the time until every ingest job has been resolved.
+
+Usage::
+
+    python3 -m benchmarks.ingest_polling --count 64 --concurrency 4 --ingest-seconds 2
+
+"""
+
+import argparse
+import concurrent.futures
+import os
+import tempfile
+import threading
+import time
+import typing
+
+from jsonpath2.path import Path
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.receiver import create_peewee_model
+from pacifica.dispatcher.router import Router
+
+from pacifica.dispatcher_example.database import connect
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.ingest import INGESTING_STATUS, IngestJobStore
+from pacifica.dispatcher_example.receivers import create_celery_app
+from pacifica.dispatcher_example.runners import SpoolingRemoteUploaderRunner
+
+from .common import create_event_data, write_file
+
+
+class SlowIngestUploader:
+    """A Pacifica uploader whose ingest jobs reach a terminal state a number of
+    seconds after they are submitted.
+
+    """
+
+    def __init__(self, ingest_seconds: float) -> None:
+        """Initialize this uploader."""
+        self.ingest_seconds = ingest_seconds
+        self.getstate_calls = 0
+        self._submitted = {}  # type: typing.Dict[int, float]
+        self._lock = threading.Lock()  # type: threading.Lock
+
+    def upload(self, read_fd: typing.BinaryIO, content_length: int = None) -> int:  # pylint: disable=unused-argument
+        """Submit a new ingest job."""
+        with self._lock:
+            job_id = len(self._submitted) + 1
+            self._submitted[job_id] = time.monotonic()
+
+        return job_id
+
+    def getstate(self, job_id: int) -> typing.Dict[str, typing.Any]:
+        """Return the state of an ingest job."""
+        with self._lock:
+            self.getstate_calls += 1
+            elapsed = time.monotonic() - self._submitted[job_id]
+
+        if elapsed < self.ingest_seconds:
+            return {'state': 'OK', 'task': 'ingest files', 'task_percent': '{0:.2f}'.format(100.0 * elapsed / self.ingest_seconds)}
+
+        return {'state': 'OK', 'task': 'ingest metadata', 'task_percent': '100.00'}
+
+
+def _run(mode: str, args: argparse.Namespace, basedir_name: str) -> None:
+    """Run the synthetic CloudEvents notifications in a mode, and then report
+    the measurements.
+
+    """
+
+    db = connect('sqlite:///{0}'.format(os.path.join(basedir_name, '{0}.sqlite3'.format(mode))))  # type: peewee.Database
+
+    model = create_peewee_model(db)  # type: type
+    model.create_table(safe=True)
+    db.close()
+
+    store = IngestJobStore(db) if mode == 'async' else None  # type: typing.Optional[IngestJobStore]
+    uploader = SlowIngestUploader(args.ingest_seconds)
+
+    router = Router()  # type: pacifica.dispatcher.router.Router
+    router.add_route(Path.parse_file(os.path.join(os.path.dirname(__file__), '..', 'pacifica', 'dispatcher_example', 'jsonpath2', 'example.txt')), ExampleEventHandler(LocalDownloaderRunner(os.path.join(basedir_name, 'data')), SpoolingRemoteUploaderRunner(uploader), wait_for_ingest=store is None))
+
+    celery_app = create_celery_app(model, router, 'benchmark.app', 'benchmark.tasks.receive', broker='memory://', backend='cache+memory://', ingest_jobs=store)  # type: celery.Celery
+    celery_app.conf.task_always_eager = True
+
+    receive_task = celery_app.tasks['benchmark.tasks.receive']  # type: celery.Task
+
+    # The poller sweeps the outstanding ingest jobs once per interval, until
+    # the worker threads are done and no ingest job is outstanding.
+    #
+    done = threading.Event()  # type: threading.Event
+
+    def poll() -> None:
+        """Sweep the outstanding ingest jobs until they have been resolved."""
+        while not (done.is_set() and (store.outstanding() == 0)):
+            store.poll(uploader.getstate, model)
+            time.sleep(args.poll_interval)
+
+    poller = threading.Thread(target=poll, daemon=True) if store is not None else None  # type: typing.Optional[threading.Thread]
+
+    start = time.perf_counter()  # type: float
+
+    if poller is not None:
+        poller.start()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for future in [executor.submit(receive_task.apply, (create_event_data(['lipsum.txt'], event_id='B-{0:08d}'.format(index), file_size=args.file_size), )) for index in range(args.count)]:
+            future.result()
+
+    workers_elapsed = time.perf_counter() - start  # type: float
+
+    done.set()
+
+    if poller is not None:
+        poller.join()
+
+    ingested_elapsed = time.perf_counter() - start  # type: float
+
+    with db.connection_context():
+        ingesting = model.select().where(model.task_status == INGESTING_STATUS).count()  # type: int
+        succeeded = model.select().where(model.task_status == '200 OK').count()  # type: int
+
+    db.close()
+
+    print('mode={0} count={1} concurrency={2} ingest_seconds={3} workers_elapsed={4:.3f}s events_per_worker_second={5:.2f} ingested_elapsed={6:.3f}s getstate_calls={7} succeeded={8} ingesting={9}'.format(
+        mode, args.count, args.concurrency, args.ingest_seconds, workers_elapsed, args.count / (workers_elapsed * args.concurrency), ingested_elapsed, uploader.getstate_calls, succeeded, ingesting))
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Compare the worker utilization of blocking and asynchronous ingest.')
+    parser.add_argument('--count', metavar='COUNT', dest='count', type=int, default=64, help='The number of CloudEvents notifications.')
+    parser.add_argument('--concurrency', metavar='CONCURRENCY', dest='concurrency', type=int, default=4, help='The number of worker threads.')
+    parser.add_argument('--ingest-seconds', metavar='INGEST_SECONDS', dest='ingest_seconds', type=float, default=2.0, help='The number of seconds that each ingest job takes.')
+    parser.add_argument('--poll-interval', metavar='POLL_INTERVAL', dest='poll_interval', type=float, default=0.5, help='The number of seconds between the sweeps of the poller.')
+    parser.add_argument('--file-size', metavar='FILE_SIZE', dest='file_size', type=int, default=64 * 1024, help='The size of the file for each CloudEvents notification in bytes.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as basedir_name:
+        os.makedirs(os.path.join(basedir_name, 'data'))
+        write_file(os.path.join(basedir_name, 'data', 'lipsum.txt'), args.file_size)
+
+        for mode in ['blocking', 'async']:
+            _run(mode, args, basedir_name)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
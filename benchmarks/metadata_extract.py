@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/metadata_extract.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Benchmark for the metadata extraction of Pacifica Dispatcher Example.
+
+This module generates a synthetic CloudEvents notification with many files,
+and then reports the time for each step from the body of the request to the
+metadata descriptions that are used by the event handler, both upstream and in
+Pacifica Dispatcher Example:
+
+* ``parse``: the ``json`` module versus ``decode_json``, which uses orjson if
+  it is installed.
+* ``route``: ``router.match`` for the upstream router versus the indexed
+  router, whose compiled predicate partitions the payload.
+* ``extract``: the ``from_cloudevents_model`` class methods of the upstream
+  models versus ``extract_metadata``, both after routing, i.e., where the
+  indexed router's partitions are reused.
+* ``files_memory``: the memory that is allocated for the metadata descriptions
+  for the files, i.e., instances of ``File`` versus ``FileRecord``.
+
+Usage::
+
+    python3 -m benchmarks.metadata_extract --files 100000
+
+"""
+
+import argparse
+import json
+import os
+import time
+import tracemalloc
+import typing
+
+from cloudevents.model import Event
+from jsonpath2.path import Path
+
+from pacifica.dispatcher.event_handlers import NoopEventHandler
+from pacifica.dispatcher.models import File, Transaction, TransactionKeyValue
+from pacifica.dispatcher.router import Router
+
+from pacifica.dispatcher_example.metadata import FileRecord, extract_metadata
+from pacifica.dispatcher_example.receivers import decode_json, orjson
+from pacifica.dispatcher_example.routers import IndexedRouter
+
+from .common import create_event_data
+
+
+def _timed(func: typing.Callable[[], typing.Any]) -> typing.Tuple[typing.Any, float]:
+    """Call a function, and then return its return value and the elapsed time.
+
+    """
+
+    start = time.perf_counter()  # type: float
+    value = func()
+
+    return (value, time.perf_counter() - start)
+
+
+def _allocated(func: typing.Callable[[], typing.Any]) -> int:
+    """Call a function, and then return the number of bytes that are allocated
+    for its return value.
+
+    """
+
+    tracemalloc.start()
+
+    try:
+        value = func()  # pylint: disable=unused-variable
+        (current, _peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return current
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Measure the metadata extraction for a notification with many files.')
+    parser.add_argument('--files', metavar='FILES', dest='files', type=int, default=100000, help='The number of files.')
+    args = parser.parse_args()
+
+    body = json.dumps(create_event_data(['synthetic-{0:08d}.txt'.format(index) for index in range(args.files)])).encode('utf-8')  # type: bytes
+
+    print('files={0} body_bytes={1} orjson={2}'.format(args.files, len(body), orjson is not None))
+
+    (event_data, json_elapsed) = _timed(lambda: json.loads(body.decode('utf-8')))
+    (_value, decode_elapsed) = _timed(lambda: decode_json(body))
+
+    print('step=parse upstream={0:.3f}s example={1:.3f}s speedup={2:.1f}x'.format(json_elapsed, decode_elapsed, json_elapsed / decode_elapsed))
+
+    path = Path.parse_file(os.path.join(os.path.dirname(__file__), '..', 'pacifica', 'dispatcher_example', 'jsonpath2', 'example.txt'))  # type: jsonpath2.path.Path
+
+    router = Router()  # type: pacifica.dispatcher.router.Router
+    router.add_route(path, NoopEventHandler())
+
+    indexed_router = IndexedRouter()  # type: pacifica.dispatcher_example.routers.IndexedRouter
+    indexed_router.add_route(path, NoopEventHandler())
+
+    (_value, upstream_route_elapsed) = _timed(lambda: router.match_first_or_raise(event_data))
+    (_value, example_route_elapsed) = _timed(lambda: indexed_router.match_first_or_raise(event_data))
+
+    print('step=route upstream={0:.3f}s example={1:.3f}s speedup={2:.1f}x'.format(upstream_route_elapsed, example_route_elapsed, upstream_route_elapsed / example_route_elapsed))
+
+    event = Event(event_data)  # type: cloudevents.model.Event
+
+    (_value, example_extract_elapsed) = _timed(lambda: extract_metadata(event.data))
+    (_value, upstream_extract_elapsed) = _timed(lambda: (Transaction.from_cloudevents_model(event), TransactionKeyValue.from_cloudevents_model(event), File.from_cloudevents_model(event)))
+
+    print('step=extract upstream={0:.3f}s example={1:.3f}s'.format(upstream_extract_elapsed, example_extract_elapsed))
+
+    upstream_total = upstream_route_elapsed + upstream_extract_elapsed  # type: float
+    example_total = example_route_elapsed + example_extract_elapsed  # type: float
+
+    print('step=route_and_extract upstream={0:.3f}s example={1:.3f}s speedup={2:.1f}x'.format(upstream_total, example_total, upstream_total / example_total))
+
+    entries = [entry for entry in event_data['data'] if entry.get('destinationTable', None) == 'Files']  # type: typing.List[typing.Dict[str, typing.Any]]
+
+    upstream_bytes = _allocated(lambda: [File(**entry) for entry in entries])  # type: int
+    example_bytes = _allocated(lambda: [FileRecord.from_entry(entry) for entry in entries])  # type: int
+
+    print('step=files_memory upstream={0}B example={1}B ratio={2:.2f}'.format(upstream_bytes, example_bytes, example_bytes / upstream_bytes))
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/pipeline_latency.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Latency benchmark for the pipelined mode of Pacifica Dispatcher Example.
+
+This module handles a CloudEvents notification for many synthetic files, using
+__local__ downloader and uploader runners with injected latency, once in phased
+mode and once in pipelined mode, and then reports the wall-clock time of each
+mode alongside the time of each stage.
+
+Usage::
+
+    python3 -m benchmarks.pipeline_latency --count 200 --download-latency 0.01 --upload-latency 0.01
+
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import typing
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.uploader_runners import LocalUploaderRunner
+
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.pipeline import MODE_NAMES, PIPELINED
+
+from .common import create_event_data, write_file
+
+
+class LatencyDownloaderRunner(LocalDownloaderRunner):
+    """A __local__ downloader runner that sleeps for a duration per file, to
+    stand in for the network.
+
+    """
+
+    def __init__(self, basedir_name: str, latency: float) -> None:
+        """Initialize this downloader runner."""
+        super(LatencyDownloaderRunner, self).__init__(basedir_name)
+        self.latency = latency
+        self.elapsed = 0.0
+
+    def download(self, basedir_name, files=None, timeout=180):
+        """Sleep and then download the files."""
+        start = time.perf_counter()
+        time.sleep(self.latency * len(files))
+        file_openers = super(LatencyDownloaderRunner, self).download(basedir_name, files, timeout=timeout)
+        self.elapsed += time.perf_counter() - start
+        return file_openers
+
+
+class LatencyUploaderRunner(LocalUploaderRunner):
+    """A __local__ uploader runner that sleeps for a duration per file, to
+    stand in for the network.
+
+    """
+
+    def __init__(self, latency: float) -> None:
+        """Initialize this uploader runner."""
+        super(LatencyUploaderRunner, self).__init__()
+        self.latency = latency
+        self.elapsed = 0.0
+
+    def upload(self, basedir_name, transaction=None, transaction_key_values=None, timeout=180):
+        """Sleep and then upload the files."""
+        start = time.perf_counter()
+        time.sleep(self.latency * sum(len(file_names) for (_root, _dirs, file_names) in os.walk(basedir_name)))
+        result = super(LatencyUploaderRunner, self).upload(basedir_name, transaction=transaction, transaction_key_values=transaction_key_values, timeout=timeout)
+        self.elapsed += time.perf_counter() - start
+        return result
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Compare the wall-clock time of the phased and pipelined modes of the example event handler.')
+    parser.add_argument('--count', metavar='COUNT', dest='count', type=int, default=200, help='The number of synthetic files.')
+    parser.add_argument('--size', metavar='SIZE', dest='size', type=int, default=512 * 1024, help='The size of each synthetic file in bytes.')
+    parser.add_argument('--download-latency', metavar='SECONDS', dest='download_latency', type=float, default=0.01, help='The injected download latency per file.')
+    parser.add_argument('--upload-latency', metavar='SECONDS', dest='upload_latency', type=float, default=0.01, help='The injected upload latency per file.')
+    parser.add_argument('--download-batch-size', metavar='SIZE', dest='download_batch_size', type=int, default=8, help='The number of files per download in pipelined mode.')
+    parser.add_argument('--upload-batch-size', metavar='SIZE', dest='upload_batch_size', type=int, default=50, help='The number of files per upload in pipelined mode.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as basedir_name:
+        file_names = ['synthetic-{0:06d}.txt'.format(index) for index in range(args.count)]  # type: typing.List[str]
+        for file_name in file_names:
+            write_file(os.path.join(basedir_name, file_name), args.size)
+
+        event = Event(create_event_data(file_names, file_size=args.size))
+
+        for mode in MODE_NAMES:
+            downloader_runner = LatencyDownloaderRunner(basedir_name, args.download_latency)
+            uploader_runner = LatencyUploaderRunner(args.upload_latency)
+
+            kwargs = {
+                'download_batch_size': args.download_batch_size,
+                'upload_batch_size': args.upload_batch_size,
+            } if mode == PIPELINED else {}
+
+            event_handler = ExampleEventHandler(downloader_runner, uploader_runner, mode=mode, **kwargs)
+
+            start = time.perf_counter()
+            event_handler.handle(event)
+            elapsed = time.perf_counter() - start
+
+            print('mode={0} files={1} elapsed={2:.3f}s download={3:.3f}s upload={4:.3f}s'.format(
+                mode, args.count, elapsed, downloader_runner.elapsed, uploader_runner.elapsed))
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
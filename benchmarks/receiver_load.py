@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/receiver_load.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Load benchmark for the engines of Pacifica Dispatcher Example.
+
+This module starts the web server of Pacifica Dispatcher Example in a separate
+process for each engine, i.e., CherryPy and asyncio, against a SQLite database
+and Celery's in-memory broker, and then opens many concurrent keep-alive
+connections to it, each of which sends POST requests to "/receive" one after
+another. The number of requests per second, the p50 and p99 latency, and the
+number of failed requests are reported for each engine.
+
+The Celery tasks are published to the in-memory broker of the web server
+process, and are never consumed, so that only the receiver is measured.
+
+Usage::
+
+    python3 -m benchmarks.receiver_load --engine cherrypy --engine asyncio --connections 200 --count 5000
+
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+from .common import create_event_data, percentile
+
+
+def _free_port() -> int:
+    """Return a free TCP port on the loopback interface.
+
+    """
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 30.0) -> None:
+    """Wait until a TCP port on the loopback interface accepts connections.
+
+    """
+
+    deadline = time.monotonic() + timeout  # type: float
+
+    while True:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1.0):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+
+            time.sleep(0.1)
+
+
+async def _client(port: int, requests: typing.List[bytes], latencies: typing.List[float]) -> int:
+    """Send requests, one after another, on a keep-alive connection, and then
+    return the number of failed requests.
+
+    """
+
+    failures = 0  # type: int
+
+    try:
+        (reader, writer) = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return len(requests)
+
+    try:
+        for index, request in enumerate(requests):
+            start = time.perf_counter()
+
+            try:
+                writer.write(request)
+                await writer.drain()
+
+                head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+                headers = dict((name.lower(), value.strip()) for (name, _sep, value) in (line.partition(':') for line in head[1:] if line))
+
+                await reader.readexactly(int(headers['content-length']))
+            except (OSError, asyncio.IncompleteReadError, KeyError, ValueError):
+                return failures + len(requests) - index
+
+            latencies.append(time.perf_counter() - start)
+
+            if head[0].split(' ')[1] != '200':
+                failures += 1
+    finally:
+        writer.close()
+
+    return failures
+
+
+async def _load(port: int, connections: int, count: int) -> typing.Tuple[typing.List[float], int, float]:
+    """Send requests on concurrent connections, and then return the latency
+    per request, the number of failed requests and the elapsed time.
+
+    """
+
+    requests = []  # type: typing.List[bytes]
+
+    for index in range(count):
+        body = json.dumps(create_event_data(['synthetic.txt'], event_id='E-{0:08d}'.format(index))).encode('utf-8')
+        requests.append('POST /receive HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\nContent-Length: {0}\r\n\r\n'.format(len(body)).encode('latin-1') + body)
+
+    latencies = []  # type: typing.List[float]
+
+    start = time.perf_counter()
+    failures = await asyncio.gather(*[
+        _client(port, requests[index::connections], latencies)
+        for index in range(connections)
+    ])
+    elapsed = time.perf_counter() - start
+
+    return (latencies, sum(failures), elapsed)
+
+
+def run_engine(engine: str, connections: int, count: int, max_workers: int) -> typing.Dict[str, typing.Any]:
+    """Start the web server with an engine, and then measure it.
+
+    Args:
+        engine (str): The name of the engine.
+        connections (int): The number of concurrent connections.
+        count (int): The number of requests.
+        max_workers (int): The maximum number of threads for the asyncio
+            engine.
+
+    Returns:
+        typing.Dict[str, typing.Any]: The measurements.
+
+    """
+
+    with tempfile.TemporaryDirectory() as tempdir_name:
+        port = _free_port()
+
+        env = dict(os.environ, DATABASE_URL='sqlite:///{0}'.format(os.path.join(tempdir_name, 'db.sqlite3')), BROKER_URL='memory://', BACKEND_URL='cache+memory://')
+
+        with subprocess.Popen([sys.executable, '-m', 'pacifica.dispatcher_example', '--engine', engine, '--max-workers', str(max_workers), '--port', str(port)], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) as proc:
+            try:
+                _wait_for_port(port)
+
+                (latencies, failures, elapsed) = asyncio.run(_load(port, connections, count))
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    return {
+        'engine': engine,
+        'connections': connections,
+        'requests': count,
+        'failures': failures,
+        'elapsed': elapsed,
+        'requests_per_second': (count - failures) / elapsed,
+        'p50': percentile(latencies, 0.50),
+        'p99': percentile(latencies, 0.99),
+    }
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Compare the engines of the web server under concurrent connections.')
+    parser.add_argument('--engine', metavar='ENGINE', dest='engines', action='append', choices=('cherrypy', 'asyncio'), default=None, help='The engine to measure (may be repeated; default both).')
+    parser.add_argument('--connections', metavar='CONNECTIONS', dest='connections', type=int, default=200, help='The number of concurrent connections.')
+    parser.add_argument('--count', metavar='COUNT', dest='count', type=int, default=5000, help='The number of requests.')
+    parser.add_argument('--max-workers', metavar='MAX_WORKERS', dest='max_workers', type=int, default=32, help='The maximum number of threads for the asyncio engine.')
+    args = parser.parse_args()
+
+    for engine in (args.engines or ['cherrypy', 'asyncio']):
+        result = run_engine(engine, args.connections, args.count, args.max_workers)
+
+        print('engine={engine} connections={connections} requests={requests} failures={failures} elapsed={elapsed:.3f}s requests_per_second={requests_per_second:.1f} p50={p50:.4f}s p99={p99:.4f}s'.format(**result))
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/router_match.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Micro-benchmark for ``router.match`` of Pacifica Dispatcher Example.
+
+This module registers 1, 50 and 500 routes with the upstream router and with
+the indexed router, where every route has the same shape as the example route
+but a distinct "eventType", and then reports the time per call to ``match``
+for a CloudEvents notification that is matched by exactly one route.
+
+Usage::
+
+    python3 -m benchmarks.router_match --counts 1 50 500 --repeat 200
+
+"""
+
+import argparse
+import os
+import timeit
+
+from jsonpath2.path import Path
+
+from pacifica.dispatcher.event_handlers import NoopEventHandler
+from pacifica.dispatcher.router import Router
+
+from pacifica.dispatcher_example.routers import IndexedRouter
+
+from .common import create_event_data
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Measure the time per call to router.match.')
+    parser.add_argument('--counts', metavar='COUNT', dest='counts', type=int, nargs='+', default=[1, 50, 500], help='The numbers of routes.')
+    parser.add_argument('--repeat', metavar='REPEAT', dest='repeat', type=int, default=200, help='The number of calls per measurement.')
+    args = parser.parse_args()
+
+    with open(os.path.join(os.path.dirname(__file__), '..', 'pacifica', 'dispatcher_example', 'jsonpath2', 'example.txt'), mode='r') as file:
+        template = file.read()
+
+    event_data = create_event_data(['synthetic.txt'])
+
+    for count in args.counts:
+        # The last route is the one that matches the CloudEvents notification.
+        #
+        paths = [
+            Path.parse_str(template.replace('"org.pacifica.metadata.ingest"', '"org.pacifica.metadata.ingest.{0}"'.format(index)))
+            for index in range(count - 1)
+        ] + [Path.parse_str(template)]
+
+        for router_cls in [Router, IndexedRouter]:
+            router = router_cls()
+            for path in paths:
+                router.add_route(path, NoopEventHandler())
+
+            assert len(list(router.match(event_data))) == 1
+
+            elapsed = min(timeit.repeat(lambda: list(router.match(event_data)), number=args.repeat, repeat=3))  # pylint: disable=cell-var-from-loop
+
+            print('router={0} routes={1} per_match={2:.1f}us'.format(router_cls.__name__, count, elapsed / args.repeat * 1e6))
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
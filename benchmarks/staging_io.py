@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/staging_io.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Staging benchmark for Pacifica Dispatcher Example.
+
+This module handles CloudEvents notifications for synthetic files, using a
+__local__ downloader runner and a __remote__ uploader runner whose Pacifica
+uploader reads and then discards each bundle, once with the upstream uploader
+runner, which writes each bundle to a temporary file, and once with the
+spooling uploader runner, optionally with a staging directory, e.g., on a
+tmpfs. It then reports the number of bytes that were written per CloudEvents
+notification, as reported by ``/proc/self/io``.
+
+The synthetic files are ASCII, because the upstream uploader runner reads the
+files in text mode, and so it cannot bundle files that are not ASCII.
+
+The "wchar" counter is the number of bytes that were passed to ``write(2)``,
+including the writes to a tmpfs, and the "write_bytes" counter is the number of
+bytes that were sent to the storage layer. The latter is only accurate once
+the page cache has been written back, so the benchmark calls ``os.sync()``
+before each measurement.
+
+Usage::
+
+    python3 -m benchmarks.staging_io --events 5 --count 20 --size 1048576 --staging-dir /dev/shm/staging
+
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import typing
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.uploader_runners import RemoteUploaderRunner
+
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.runners import DEFAULT_MAX_SPOOL_BYTES, SpoolingRemoteUploaderRunner
+
+from .common import create_event_data, io_counters, write_file
+
+
+# The ASCII text that is repeated to fill synthetic files.
+#
+_ASCII_TEXT = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n'  # type: str
+
+
+class DiscardingUploader:
+    """A Pacifica uploader that reads and then discards each bundle, to stand
+    in for the network.
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize this uploader."""
+        self.uploaded_bytes = 0
+
+    def upload(self, read_fd: typing.BinaryIO, content_length: int = None) -> int:
+        """Read and then discard the bundle."""
+        while True:
+            buf = read_fd.read(1024 * 1024)
+            if not buf:
+                break
+            self.uploaded_bytes += len(buf)
+        return 1
+
+    def getstate(self, _job_id: int) -> typing.Dict[str, typing.Any]:
+        """Return the state of a job that has been ingested."""
+        return {'state': 'OK', 'task': 'ingest metadata', 'task_percent': '100.00'}
+
+
+def _measure(event_handler: ExampleEventHandler, events: typing.List[Event]) -> typing.Tuple[float, typing.Optional[typing.Dict[str, int]], typing.Optional[typing.Dict[str, int]]]:
+    """Handle the CloudEvents notifications, and then return the wall-clock time
+    and the I/O counters before and after.
+
+    """
+
+    os.sync()
+    before = io_counters()  # type: typing.Optional[typing.Dict[str, int]]
+
+    start = time.perf_counter()
+    for event in events:
+        event_handler.handle(event)
+    elapsed = time.perf_counter() - start
+
+    os.sync()
+    after = io_counters()  # type: typing.Optional[typing.Dict[str, int]]
+
+    return (elapsed, before, after)
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Compare the bytes that are written per CloudEvents notification by the upstream and spooling uploader runners.')
+    parser.add_argument('--events', metavar='EVENTS', dest='events', type=int, default=5, help='The number of CloudEvents notifications.')
+    parser.add_argument('--count', metavar='COUNT', dest='count', type=int, default=20, help='The number of synthetic files per CloudEvents notification.')
+    parser.add_argument('--size', metavar='SIZE', dest='size', type=int, default=1024 * 1024, help='The size of each synthetic file in bytes.')
+    parser.add_argument('--staging-dir', metavar='STAGING_DIR', dest='staging_dir', type=str, default=None, help='The staging directory for the spooling uploader runner, e.g., on a tmpfs.')
+    parser.add_argument('--max-spool-bytes', metavar='SIZE', dest='max_spool_bytes', type=int, default=DEFAULT_MAX_SPOOL_BYTES, help='The maximum size in bytes of a bundle that is kept in memory.')
+    args = parser.parse_args()
+
+    if io_counters() is None:
+        print('WARNING: /proc/self/io is unavailable, so the bytes written are not reported')
+
+    with tempfile.TemporaryDirectory() as basedir_name:
+        file_names = ['synthetic-{0:06d}.txt'.format(index) for index in range(args.count)]  # type: typing.List[str]
+        for file_name in file_names:
+            write_file(os.path.join(basedir_name, file_name), args.size, text=_ASCII_TEXT)
+
+        events = [Event(create_event_data(file_names, event_id='C234-1234-{0:04d}'.format(index), file_size=args.size)) for index in range(args.events)]  # type: typing.List[Event]
+
+        configurations = [
+            ('upstream', lambda uploader: RemoteUploaderRunner(uploader), None),
+            ('spooling', lambda uploader: SpoolingRemoteUploaderRunner(uploader, staging_dir=args.staging_dir, max_spool_bytes=args.max_spool_bytes), args.staging_dir),
+        ]  # type: typing.List[typing.Tuple[str, typing.Callable[[DiscardingUploader], RemoteUploaderRunner], typing.Optional[str]]]
+
+        for (name, factory, staging_dir) in configurations:
+            uploader = DiscardingUploader()  # type: DiscardingUploader
+            event_handler = ExampleEventHandler(LocalDownloaderRunner(basedir_name), factory(uploader), staging_dir=staging_dir)  # type: ExampleEventHandler
+
+            (elapsed, before, after) = _measure(event_handler, events)
+
+            line = 'runner={0} staging_dir={1} events={2} elapsed={3:.3f}s uploaded_per_event={4}'.format(name, staging_dir, args.events, elapsed, uploader.uploaded_bytes // args.events)  # type: str
+
+            if (before is not None) and (after is not None):
+                line += ' wchar_per_event={0} write_bytes_per_event={1}'.format(
+                    (after['wchar'] - before['wchar']) // args.events,
+                    (after['write_bytes'] - before['write_bytes']) // args.events)
+
+            print(line)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
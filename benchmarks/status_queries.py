@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/status_queries.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Lookup latency benchmark for the statuses of Pacifica Dispatcher Example.
+
+This module fills a SQLite database with synthetic rows for CloudEvents
+notifications, mostly finished, and then reports the p50 and p99 latency of
+each query, first with the indexes of the Peewee model only, and then after
+the secondary indexes are ensured:
+
+* ``get``: the row for the ID for a Celery task, i.e., "/get/<task_id>".
+* ``duplicates``: the rows for an "eventID" and "source", i.e., deduplication.
+* ``oldest_pending``: the oldest row whose Celery task has not started, i.e.,
+  admission control.
+* ``first_page``: the first page of the rows with a rare status, newest first.
+* ``deep_page``: a page of the rows with a common status, newest first, deep
+  into the listing, which is paged with ``OFFSET`` for the indexes of the
+  Peewee model only, and by the key of the last row with the secondary
+  indexes, i.e., "/statuses".
+
+Finally, the time to apply the retention to the oldest half of the rows is
+reported, in batches.
+
+Usage::
+
+    python3 -m benchmarks.status_queries --rows 1000000 --repeat 50
+
+"""
+
+import argparse
+import datetime
+import os
+import tempfile
+import time
+import typing
+import uuid
+
+import peewee
+
+from pacifica.dispatcher.receiver import create_peewee_model
+
+from pacifica.dispatcher_example.database import connect
+from pacifica.dispatcher_example.statuses import MAX_PAGE_SIZE, apply_retention, ensure_indexes, list_statuses
+
+from .common import percentile
+
+
+# The statuses of the synthetic rows, and the fraction of the rows for each.
+#
+_STATUSES = (
+    ('200 OK', 0.97),
+    ('500 Internal Server Error', 0.02),
+    ('202 Accepted', 0.01),
+)  # type: typing.Tuple[typing.Tuple[str, float], ...]
+
+# The number of rows per ``INSERT`` statement.
+#
+_INSERT_CHUNK_SIZE = 1000  # type: int
+
+
+def _fill(model: type, rows: int) -> typing.List[str]:
+    """Insert the synthetic rows, one second apart, oldest first, and then
+    return the ID for the Celery task of every 1000th row.
+
+    """
+
+    database = model._meta.database  # type: peewee.Database  # pylint: disable=protected-access
+    start = datetime.datetime.now() - datetime.timedelta(seconds=rows)  # type: datetime.datetime
+
+    # The statuses are interleaved evenly, rather than in runs.
+    #
+    thresholds = []  # type: typing.List[typing.Tuple[float, str]]
+    total = 0.0  # type: float
+
+    for (status, fraction) in _STATUSES:
+        total += fraction
+        thresholds.append((total, status))
+
+    def status_for(index: int) -> str:
+        """Return the status of a row."""
+        position = (index * 0.6180339887) % 1.0
+
+        return next(status for (threshold, status) in thresholds if position < threshold)
+
+    sample_task_ids = []  # type: typing.List[str]
+
+    with database.connection_context():
+        for index_chunk in peewee.chunked(range(rows), _INSERT_CHUNK_SIZE):
+            values = []  # type: typing.List[typing.Dict[str, typing.Any]]
+
+            for index in index_chunk:
+                task_id = str(uuid.uuid4())  # type: str
+
+                if index % 1000 == 0:
+                    sample_task_ids.append(task_id)
+
+                values.append({
+                    'uuid': uuid.uuid4(),
+                    'event_type': 'org.pacifica.metadata.ingest',
+                    'source': '/pacifica/metadata/ingest',
+                    'event_id': 'B-{0:08d}'.format(index),
+                    'event_data': '{"data": []}',
+                    'data': '[]',
+                    'task_id': task_id,
+                    'task_application_name': 'benchmark.app',
+                    'task_name': 'benchmark.tasks.receive',
+                    'task_status': status_for(index),
+                    'exc_traceback': '',
+                    'created': start + datetime.timedelta(seconds=index),
+                    'updated': start + datetime.timedelta(seconds=index),
+                })
+
+            with database.atomic():
+                model.insert_many(values).execute()
+
+    return sample_task_ids
+
+
+def _measure(func: typing.Callable[[int], typing.Any], repeat: int) -> typing.Tuple[float, float]:
+    """Call a function a number of times, with the index of each call, and
+    then return the p50 and p99 latency in milliseconds.
+
+    """
+
+    latencies = []  # type: typing.List[float]
+
+    for index in range(repeat):
+        start = time.perf_counter()  # type: float
+        func(index)
+        latencies.append(1000.0 * (time.perf_counter() - start))
+
+    return (percentile(latencies, 0.5), percentile(latencies, 0.99))
+
+
+def _run(mode: str, model: type, sample_task_ids: typing.List[str], args: argparse.Namespace) -> None:
+    """Measure the latency of each query, and then report it.
+
+    """
+
+    database = model._meta.database  # type: peewee.Database  # pylint: disable=protected-access
+
+    def get(index: int) -> None:
+        """Look up the row for the ID for a Celery task."""
+        model.get(model.task_id == sample_task_ids[index % len(sample_task_ids)])
+
+    def duplicates(index: int) -> None:
+        """Look up the rows for an "eventID" and "source"."""
+        list(model.select().where((model.event_id == 'B-{0:08d}'.format(1000 * (index % len(sample_task_ids)))) & (model.source == '/pacifica/metadata/ingest')))
+
+    def oldest_pending(_index: int) -> None:
+        """Look up the oldest row whose Celery task has not started."""
+        model.select(peewee.fn.MIN(model.created)).where(model.task_status == '202 Accepted').scalar()
+
+    def first_page(_index: int) -> None:
+        """List the first page of the rows with a rare status."""
+        if mode == 'indexed':
+            list_statuses(model, status='500 Internal Server Error', limit=args.page_size)
+        else:
+            list(model.select().where(model.task_status == '500 Internal Server Error').order_by(model.created.desc(), model.task_id.desc()).limit(args.page_size))
+
+    # The cursor for the deep page is found by walking the listing once, which
+    # is not measured.
+    #
+    cursor = None  # type: typing.Optional[str]
+
+    if mode == 'indexed':
+        with database.connection_context():
+            for _ in range(args.deep_offset // MAX_PAGE_SIZE):
+                cursor = list_statuses(model, status='200 OK', limit=MAX_PAGE_SIZE, after=cursor)['next']
+
+    def deep_page(_index: int) -> None:
+        """List a page of the rows with a common status, deep into the
+        listing.
+
+        """
+
+        if mode == 'indexed':
+            list_statuses(model, status='200 OK', limit=args.page_size, after=cursor)
+        else:
+            list(model.select().where(model.task_status == '200 OK').order_by(model.created.desc(), model.task_id.desc()).offset(args.deep_offset).limit(args.page_size))
+
+    with database.connection_context():
+        for (name, func) in [('get', get), ('duplicates', duplicates), ('oldest_pending', oldest_pending), ('first_page', first_page), ('deep_page', deep_page)]:
+            (p50, p99) = _measure(func, args.repeat)
+
+            print('mode={0} rows={1} query={2} p50={3:.3f}ms p99={4:.3f}ms'.format(mode, args.rows, name, p50, p99))
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Compare the lookup latency of the statuses with and without the secondary indexes.')
+    parser.add_argument('--rows', metavar='ROWS', dest='rows', type=int, default=1000000, help='The number of rows.')
+    parser.add_argument('--repeat', metavar='REPEAT', dest='repeat', type=int, default=50, help='The number of times that each query is run.')
+    parser.add_argument('--page-size', metavar='PAGE_SIZE', dest='page_size', type=int, default=100, help='The number of rows per page.')
+    parser.add_argument('--deep-offset', metavar='DEEP_OFFSET', dest='deep_offset', type=int, default=100000, help='The number of rows before the deep page.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir_name:
+        db = connect('sqlite:///{0}'.format(os.path.join(tempdir_name, 'db.sqlite3')))  # type: peewee.Database
+
+        model = create_peewee_model(db)  # type: type
+        model.create_table(safe=True)
+
+        start = time.perf_counter()  # type: float
+        sample_task_ids = _fill(model, args.rows)  # type: typing.List[str]
+
+        print('rows={0} fill={1:.1f}s'.format(args.rows, time.perf_counter() - start))
+
+        _run('upstream', model, sample_task_ids, args)
+
+        start = time.perf_counter()
+        ensure_indexes(model)
+
+        print('rows={0} ensure_indexes={1:.1f}s'.format(args.rows, time.perf_counter() - start))
+
+        _run('indexed', model, sample_task_ids, args)
+
+        start = time.perf_counter()
+        count = apply_retention(model, args.rows / 2.0)  # type: int
+
+        print('rows={0} retention={1:.1f}s removed={2} rows_per_second={3:.0f}'.format(args.rows, time.perf_counter() - start, count, count / (time.perf_counter() - start)))
+
+        db.close()
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/suite.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Benchmark suite for Pacifica Dispatcher Example.
+
+This module generates synthetic CloudEvents notifications and file sets of
+configurable count and size, and then runs them through each scenario:
+
+* ``router``: ``router.match`` for the router of Pacifica Dispatcher Example.
+* ``handle``: ``ExampleEventHandler.handle`` with the __local__ downloader and
+  uploader runners.
+* ``end_to_end``: one POST request per notification to "/receive" of the
+  CherryPy application, served in-process, whose Celery task runs eagerly
+  against a SQLite database and hands the notification to the example event
+  handler.
+
+Each scenario runs in a fresh interpreter, so that its peak resident set size is
+its own. The number of notifications per second, the p50 and p99 latency per
+notification, and the peak resident set size of each scenario are written to a
+JSON file, together with the parameters and the environment, so that runs can
+be compared. If a previous JSON file is given, then the ratio of each
+measurement to its previous value is reported.
+
+Usage::
+
+    python3 -m benchmarks.suite --events 200 --files 4 --file-size 65536 --output results.json --compare previous.json
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+from .common import create_event_data, peak_rss_bytes, percentile, write_file
+
+
+# The names of the scenarios, in the order that they are run.
+#
+SCENARIO_NAMES = ('router', 'handle', 'end_to_end', )  # type: typing.Tuple[str, ...]
+
+
+def _free_port() -> int:
+    """Return a free TCP port on the loopback interface.
+
+    """
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _create_router(basedir_name: str) -> 'pacifica.dispatcher_example.routers.IndexedRouter':
+    """Construct the router of Pacifica Dispatcher Example, with the __local__
+    downloader and uploader runners.
+
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from jsonpath2.path import Path
+
+    from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+    from pacifica.dispatcher.uploader_runners import LocalUploaderRunner
+
+    from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+    from pacifica.dispatcher_example.routers import IndexedRouter
+    # pylint: enable=import-outside-toplevel
+
+    router = IndexedRouter()
+    router.add_route(Path.parse_file(os.path.join(os.path.dirname(__file__), '..', 'pacifica', 'dispatcher_example', 'jsonpath2', 'example.txt')), ExampleEventHandler(LocalDownloaderRunner(basedir_name), LocalUploaderRunner()))
+
+    return router
+
+
+def _run_router(basedir_name: str, events: typing.List[typing.Dict[str, typing.Any]]) -> typing.List[float]:
+    """Run the ``router`` scenario, and then return the latency per
+    notification.
+
+    """
+
+    router = _create_router(basedir_name)
+
+    latencies = []  # type: typing.List[float]
+
+    for event_data in events:
+        start = time.perf_counter()
+        routes = list(router.match(event_data))
+        latencies.append(time.perf_counter() - start)
+
+        assert len(routes) == 1
+
+    return latencies
+
+
+def _run_handle(basedir_name: str, events: typing.List[typing.Dict[str, typing.Any]]) -> typing.List[float]:
+    """Run the ``handle`` scenario, and then return the latency per
+    notification.
+
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from cloudevents.model import Event
+    # pylint: enable=import-outside-toplevel
+
+    event_handler = _create_router(basedir_name).match_first_or_raise(events[0]).event_handler
+
+    latencies = []  # type: typing.List[float]
+
+    for event_data in events:
+        event = Event(event_data)
+
+        start = time.perf_counter()
+        event_handler.handle(event)
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+def _run_end_to_end(basedir_name: str, events: typing.List[typing.Dict[str, typing.Any]]) -> typing.List[float]:
+    """Run the ``end_to_end`` scenario, and then return the latency per
+    notification.
+
+    """
+
+    # pylint: disable=import-outside-toplevel
+    import cherrypy
+    import requests
+
+    from pacifica.dispatcher.receiver import create_peewee_model
+
+    from pacifica.dispatcher_example.database import connect, install_cherrypy_hooks
+    from pacifica.dispatcher_example.receivers import create_batch_endpoint, create_celery_app, create_receive_endpoint
+    # pylint: enable=import-outside-toplevel
+
+    db = connect('sqlite:///{0}'.format(os.path.join(basedir_name, 'db.sqlite3')))
+
+    model = create_peewee_model(db)
+    model.create_table(safe=True)
+    db.close()
+
+    celery_app = create_celery_app(model, _create_router(basedir_name), 'benchmarks.app', 'benchmarks.tasks.receive', broker='memory://', backend='cache+memory://')
+    celery_app.conf.task_always_eager = True
+
+    receive_task = celery_app.tasks['benchmarks.tasks.receive']
+
+    application = model.create_cherrypy_app(receive_task)
+    application.root.receive = create_receive_endpoint(model, receive_task)
+    application.root.batch = create_batch_endpoint(model, receive_task)
+    install_cherrypy_hooks(application, db)
+
+    port = _free_port()
+
+    cherrypy.config.update({
+        'global': {
+            'environment': 'production',
+            'log.screen': False,
+            'server.socket_host': '127.0.0.1',
+            'server.socket_port': port,
+        },
+    })
+    cherrypy.tree.mount(application)
+
+    # Silence the access and error logs, so that they are not measured.
+    #
+    for log_manager in [cherrypy.log, application.log]:
+        log_manager.access_log.propagate = False
+        log_manager.error_log.propagate = False
+
+    cherrypy.engine.start()
+    cherrypy.engine.wait(cherrypy.engine.states.STARTED)
+
+    latencies = []  # type: typing.List[float]
+
+    try:
+        url = 'http://127.0.0.1:{0}'.format(port)
+
+        with requests.Session() as session:
+            for event_data in events:
+                start = time.perf_counter()
+                session.post('{0}/receive'.format(url), json=event_data).raise_for_status()
+                latencies.append(time.perf_counter() - start)
+    finally:
+        cherrypy.engine.exit()
+
+    with db.connection_context():
+        assert model.select().where(model.task_status == '200 OK').count() == len(events)
+
+    return latencies
+
+
+# The function that runs each scenario.
+#
+_SCENARIOS = {
+    'router': _run_router,
+    'handle': _run_handle,
+    'end_to_end': _run_end_to_end,
+}  # type: typing.Dict[str, typing.Callable[[str, typing.List[typing.Dict[str, typing.Any]]], typing.List[float]]]
+
+
+def run_scenario(name: str, event_count: int, file_count: int, file_size: int, warmup: int) -> typing.Dict[str, typing.Any]:
+    """Run a scenario in the current process.
+
+    Args:
+        name (str): The name of the scenario.
+        event_count (int): The number of CloudEvents notifications.
+        file_count (int): The number of files per notification.
+        file_size (int): The size of each file in bytes.
+        warmup (int): The number of notifications that are run, but not
+            measured, before the measured notifications.
+
+    Returns:
+        typing.Dict[str, typing.Any]: The measurements.
+
+    """
+
+    with tempfile.TemporaryDirectory() as basedir_name:
+        file_names = ['synthetic-{0:04d}.txt'.format(index) for index in range(file_count)]  # type: typing.List[str]
+
+        size = 0  # type: int
+
+        for file_name in file_names:
+            size = write_file(os.path.join(basedir_name, file_name), file_size)
+
+        events = [
+            create_event_data(file_names, event_id='E-{0:08d}'.format(index), file_size=size)
+            for index in range(warmup + event_count)
+        ]  # type: typing.List[typing.Dict[str, typing.Any]]
+
+        start = time.perf_counter()
+        latencies = _SCENARIOS[name](basedir_name, events)[warmup:]
+        elapsed = time.perf_counter() - start
+
+    # The elapsed time includes the warm-up, so the rate is derived from the
+    # sum of the measured latencies.
+    #
+    measured = sum(latencies)  # type: float
+
+    return {
+        'scenario': name,
+        'events': len(latencies),
+        'elapsed_seconds': elapsed,
+        'events_per_second': (len(latencies) / measured) if measured else None,
+        'latency_seconds': {
+            'p50': percentile(latencies, 0.50),
+            'p99': percentile(latencies, 0.99),
+            'mean': (measured / len(latencies)) if latencies else None,
+            'max': max(latencies) if latencies else None,
+        },
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
+
+
+def _git_commit() -> typing.Optional[str]:
+    """Return the ID of the current git commit, if any.
+
+    """
+
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(results: typing.List[typing.Dict[str, typing.Any]], previous_path: str) -> None:
+    """Print the ratio of each measurement to its previous value.
+
+    """
+
+    with open(previous_path, mode='r') as file:
+        previous = {result['scenario']: result for result in json.load(file)['results']}
+
+    for result in results:
+        if result['scenario'] not in previous:
+            continue
+
+        previous_result = previous[result['scenario']]
+
+        ratios = [
+            ('events_per_second', result['events_per_second'], previous_result['events_per_second']),
+            ('p50', result['latency_seconds']['p50'], previous_result['latency_seconds']['p50']),
+            ('p99', result['latency_seconds']['p99'], previous_result['latency_seconds']['p99']),
+            ('peak_rss', result['peak_rss_bytes'], previous_result['peak_rss_bytes']),
+        ]
+
+        print('compare scenario={0} {1}'.format(result['scenario'], ' '.join(
+            '{0}={1:.2f}x'.format(key, value / previous_value)
+            for (key, value, previous_value) in ratios
+            if value and previous_value
+        )))
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Measure the throughput, latency and peak memory of each scenario.')
+    parser.add_argument('--scenarios', metavar='SCENARIO', dest='scenarios', type=str, nargs='+', choices=SCENARIO_NAMES, default=list(SCENARIO_NAMES), help='The scenarios to run.')
+    parser.add_argument('--events', metavar='EVENTS', dest='events', type=int, default=200, help='The number of CloudEvents notifications per scenario.')
+    parser.add_argument('--files', metavar='FILES', dest='files', type=int, default=4, help='The number of files per notification.')
+    parser.add_argument('--file-size', metavar='FILE_SIZE', dest='file_size', type=int, default=64 * 1024, help='The size of each file in bytes.')
+    parser.add_argument('--warmup', metavar='WARMUP', dest='warmup', type=int, default=5, help='The number of notifications per scenario that are not measured.')
+    parser.add_argument('--output', metavar='OUTPUT', dest='output', type=str, default='benchmark-results.json', help='The JSON file for the results.')
+    parser.add_argument('--compare', metavar='PREVIOUS', dest='compare', type=str, default=None, help='A JSON file of previous results to compare against.')
+    parser.add_argument('--child', metavar='SCENARIO', dest='child', type=str, choices=SCENARIO_NAMES, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        # Run one scenario in this process, and then write its measurements to
+        # standard output for the parent process.
+        #
+        json.dump(run_scenario(args.child, args.events, args.files, args.file_size, args.warmup), sys.stdout)
+
+        return
+
+    results = []  # type: typing.List[typing.Dict[str, typing.Any]]
+
+    for name in args.scenarios:
+        process = subprocess.run([
+            sys.executable, '-m', 'benchmarks.suite', '--child', name,
+            '--events', str(args.events), '--files', str(args.files), '--file-size', str(args.file_size), '--warmup', str(args.warmup),
+        ], cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'), stdout=subprocess.PIPE, universal_newlines=True, check=True)
+
+        result = json.loads(process.stdout)
+        results.append(result)
+
+        print('scenario={0} events={1} events_per_second={2:.1f} p50={3:.3f}ms p99={4:.3f}ms peak_rss={5:.1f}MiB'.format(
+            name, result['events'], result['events_per_second'], result['latency_seconds']['p50'] * 1e3, result['latency_seconds']['p99'] * 1e3, result['peak_rss_bytes'] / 1048576))
+
+    with open(args.output, mode='w') as file:
+        json.dump({
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'parameters': {
+                'events': args.events,
+                'files': args.files,
+                'file_size': args.file_size,
+                'warmup': args.warmup,
+            },
+            'results': results,
+        }, file, indent=2, sort_keys=True)
+
+    if args.compare is not None:
+        _compare(results, args.compare)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
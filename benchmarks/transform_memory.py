@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/transform_memory.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Memory benchmark for the transform of Pacifica Dispatcher Example.
+
+This module handles a CloudEvents notification for a single synthetic file of
+configurable size, using the __local__ downloader and uploader runners, and
+then asserts that the peak resident set size of the process is below a ceiling
+that is independent of the size of the file.
+
+Usage::
+
+    python3 -m benchmarks.transform_memory --size 4294967296 --ceiling 268435456
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.uploader_runners import LocalUploaderRunner
+
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.transforms import DEFAULT_CHUNK_SIZE
+
+from .common import create_event_data, peak_rss_bytes, write_file
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    Note:
+        This function exits with a non-zero status if the peak resident set
+        size exceeds the ceiling.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Measure the peak resident set size of the example event handler.')
+    parser.add_argument('--size', metavar='SIZE', dest='size', type=int, default=2 * 1024 * 1024 * 1024, help='The size of the synthetic file in bytes.')
+    parser.add_argument('--chunk-size', metavar='CHUNK_SIZE', dest='chunk_size', type=int, default=DEFAULT_CHUNK_SIZE, help='The chunk size for the transform in bytes.')
+    parser.add_argument('--ceiling', metavar='CEILING', dest='ceiling', type=int, default=256 * 1024 * 1024, help='The ceiling for the peak resident set size in bytes.')
+    parser.add_argument('--tempdir', metavar='TEMPDIR', dest='tempdir', type=str, default=None, help='The directory for the synthetic file.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.tempdir) as basedir_name:
+        size = write_file(os.path.join(basedir_name, 'synthetic.txt'), args.size)
+
+        event = Event(create_event_data(['synthetic.txt'], file_size=size))
+
+        event_handler = ExampleEventHandler(LocalDownloaderRunner(basedir_name), LocalUploaderRunner(), chunk_size=args.chunk_size)
+
+        start = time.perf_counter()
+        event_handler.handle(event)
+        elapsed = time.perf_counter() - start
+
+    peak_rss = peak_rss_bytes()
+
+    print('size={0} chunk_size={1} elapsed={2:.3f}s throughput={3:.1f}MB/s peak_rss={4:.1f}MiB ceiling={5:.1f}MiB'.format(
+        size, args.chunk_size, elapsed, size / elapsed / 1e6, peak_rss / 1048576, args.ceiling / 1048576))
+
+    if peak_rss > args.ceiling:
+        print('FAIL: peak resident set size exceeds the ceiling', file=sys.stderr)
+        sys.exit(1)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: benchmarks/transform_throughput.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Throughput benchmark for the transforms of Pacifica Dispatcher Example.
+
+This module writes two synthetic files of configurable size, one that is
+entirely ASCII and one that includes multi-byte UTF-8 characters, and then
+reports the throughput in MB/s of each implementation for each file:
+
+* ``upper``: the ``upper`` transform, i.e., the default, which converts each
+  chunk that is entirely ASCII by ``bytes.translate``, and decodes, converts
+  and encodes the other chunks.
+* ``ascii-upper``: the ``ascii-upper`` transform, which converts every chunk by
+  ``bytes.translate``.
+
+The page cache is warmed by a first pass over each file, so that the
+measurements are of the transforms rather than of the storage.
+
+Usage::
+
+    python3 -m benchmarks.transform_throughput --size 268435456 --repeat 3
+
+"""
+
+import argparse
+import functools
+import os
+import tempfile
+import time
+import typing
+
+from pacifica.dispatcher_example.transforms import DEFAULT_CHUNK_SIZE, AsciiUpperTransform, UpperTransform
+
+from .common import write_file
+
+
+# The text that is repeated to fill the synthetic file that is entirely ASCII.
+#
+ASCII_LIPSUM = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n'  # type: str
+
+
+def _best_elapsed(func: typing.Callable[[], typing.Any], repeat: int) -> float:
+    """Call a function a number of times, and then return the least elapsed
+    time.
+
+    """
+
+    elapsed = []  # type: typing.List[float]
+
+    for _ in range(repeat):
+        start = time.perf_counter()  # type: float
+        func()
+        elapsed.append(time.perf_counter() - start)
+
+    return min(elapsed)
+
+
+def main() -> None:
+    """Entrypoint function.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Measure the throughput of each transform.')
+    parser.add_argument('--size', metavar='SIZE', dest='size', type=int, default=256 * 1024 * 1024, help='The approximate size of each synthetic file in bytes.')
+    parser.add_argument('--chunk-size', metavar='CHUNK_SIZE', dest='chunk_size', type=int, default=DEFAULT_CHUNK_SIZE, help='The chunk size for the transforms.')
+    parser.add_argument('--repeat', metavar='REPEAT', dest='repeat', type=int, default=3, help='The number of measurements per transform, of which the best is reported.')
+    parser.add_argument('--tempdir', metavar='TEMPDIR', dest='tempdir', type=str, default=None, help='The directory for the synthetic files.')
+    args = parser.parse_args()
+
+    implementations = [
+        ('upper', functools.partial(UpperTransform().transform_file, encoding='utf-8', chunk_size=args.chunk_size)),
+        ('ascii-upper', functools.partial(AsciiUpperTransform().transform_file, encoding='utf-8', chunk_size=args.chunk_size)),
+    ]  # type: typing.List[typing.Tuple[str, typing.Callable[[str, str], int]]]
+
+    with tempfile.TemporaryDirectory(dir=args.tempdir) as basedir_name:
+        new_path = os.path.join(basedir_name, 'new.txt')  # type: str
+
+        for (content, path, size) in [
+                ('ascii', os.path.join(basedir_name, 'ascii.txt'), write_file(os.path.join(basedir_name, 'ascii.txt'), args.size, text=ASCII_LIPSUM)),
+                ('utf-8', os.path.join(basedir_name, 'utf-8.txt'), write_file(os.path.join(basedir_name, 'utf-8.txt'), args.size)),
+        ]:
+            baseline = None  # type: typing.Optional[float]
+
+            for (name, func) in implementations:
+                func(path, new_path)
+
+                elapsed = _best_elapsed(functools.partial(func, path, new_path), args.repeat)  # type: float
+
+                if baseline is None:
+                    baseline = elapsed
+
+                print('content={0} transform={1} size={2} chunk_size={3} elapsed={4:.3f}s throughput={5:.1f}MB/s speedup={6:.1f}x'.format(
+                    content, name, size, args.chunk_size, elapsed, size / elapsed / 1e6, baseline / elapsed))
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    main()
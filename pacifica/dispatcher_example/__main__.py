@@ -11,8 +11,12 @@
 
 This module provides the entrypoint for Pacifica Dispatcher Example as a script
 that connects to the database via `Peewee`_, starts and/or connects to a task
-queue using `Celery`_, and then starts a `CherryPy`_ server and listens for
-connections.
+queue using `Celery`_, and then starts a `CherryPy`_ server (or, optionally, an
+`asyncio`_ server) and listens for connections.
+
+The database, the Peewee model, the Celery application and the CherryPy
+application are constructed when they are first used, rather than when this
+module is imported.
 
 Attributes:
     ReceiveTaskModel (type): The class for the `Peewee`_ model that encapsulates
@@ -22,6 +26,8 @@ Attributes:
     db (peewee.Database): The `Peewee`_ database.
     main (typing.Callable[[], None]): The entrypoint function.
 
+.. _asyncio:
+   https://docs.python.org/3/library/asyncio.html
 .. _Celery:
    http://www.celeryproject.org/
 .. _CherryPy:
@@ -35,57 +41,450 @@ Attributes:
 
 import argparse
 import os
+import threading
+import typing
 
-import cherrypy
-import playhouse.db_url
 
-from pacifica.dispatcher.receiver import create_peewee_model
+# The modules for the database, the Celery application and the CherryPy
+# application (and the router, which reads the configuration for Pacifica CLI)
+# are imported by the functions that construct them, rather than at the top of
+# this module, so that importing this module is cheap, e.g., for the Celery
+# worker, for test collection, and for each forked web server worker.
+#
+# pylint: disable=import-outside-toplevel
 
-from .router import router
 
+def _create_db() -> 'peewee.Database':
+    """Connect to the database using the URL connection string.
 
-# Connect to the database using the URL connection string.
-#
-# The URL connection string is read from the "DATABASE_URL" environment
-# variable. If the "DATABASE_URL" environment variable is undefined, then the
-# default behavior is to connect to an in-memory SQLite database.
-#
-db = playhouse.db_url.connect(os.getenv('DATABASE_URL', 'sqlite:///:memory:'))  # type: peewee.Database
+    """
 
-# Construct the Peewee model.
-#
-ReceiveTaskModel = create_peewee_model(db)  # type: type
+    from .database import DEFAULT_BUSY_TIMEOUT, connect
 
-# Create the database table for the Peewee model.
-#
-# The "safe" keyword argument ensures that the database table is only created if
-# it does not exist.
-#
-ReceiveTaskModel.create_table(safe=True)
+    # The URL connection string is read from the "DATABASE_URL" environment
+    # variable. If the "DATABASE_URL" environment variable is undefined, then
+    # the default behavior is to connect to an in-memory SQLite database.
+    #
+    # For the pooled URL schemes, e.g., "postgres+pool" and "sqlite+pool", the
+    # maximum number of connections, the number of seconds after which a
+    # connection is recycled, and the number of seconds to wait for a
+    # connection when every connection is in use are read from the
+    # "DATABASE_MAX_CONNECTIONS", "DATABASE_STALE_TIMEOUT" and
+    # "DATABASE_WAIT_TIMEOUT" environment variables. For SQLite, the write-ahead
+    # log is enabled, and the number of milliseconds to wait for a lock is read
+    # from the "DATABASE_BUSY_TIMEOUT" environment variable.
+    #
+    return connect(
+        os.getenv('DATABASE_URL', 'sqlite:///:memory:'),
+        max_connections=int(os.getenv('DATABASE_MAX_CONNECTIONS')) if os.getenv('DATABASE_MAX_CONNECTIONS') else None,
+        stale_timeout=int(os.getenv('DATABASE_STALE_TIMEOUT')) if os.getenv('DATABASE_STALE_TIMEOUT') else None,
+        wait_timeout=int(os.getenv('DATABASE_WAIT_TIMEOUT')) if os.getenv('DATABASE_WAIT_TIMEOUT') else None,
+        busy_timeout=int(os.getenv('DATABASE_BUSY_TIMEOUT', str(DEFAULT_BUSY_TIMEOUT))),
+    )
 
-# Construct the Celery application for the Peewee model.
-#
-# The arguments for the constructor are as follows:
-# 1. The Pacifica Dispatcher router.
-# 2. The name of the Celery application's task queue.
-# 3. The name of the Celery task that is triggered when a CloudEvents
-#    notification is received.
-#
-# The URL connection string for the Celery application's backend is read from
-# the "BACKEND_URL" environment variable.
-#
-# The URL connection string for the Celery application's message broker is read
-# from the "BROKER_URL" environment variable.
-#
-celery_app = ReceiveTaskModel.create_celery_app(router, 'pacifica.dispatcher_example.app', 'pacifica.dispatcher_example.tasks.receive', backend=os.getenv('BACKEND_URL', 'rpc://'), broker=os.getenv('BROKER_URL', 'pyamqp://'))
 
-# Construct the CherryPy application for the Peewee model.
+def _read_dedupe_window() -> typing.Optional[float]:
+    """Read the window in seconds for duplicate CloudEvents notifications.
+
+    The window is read from the "DEDUPE_WINDOW" environment variable. If the
+    "DEDUPE_WINDOW" environment variable is undefined, then the default
+    behavior is to disable deduplication.
+
+    """
+
+    return float(os.getenv('DEDUPE_WINDOW')) if os.getenv('DEDUPE_WINDOW') else None
+
+
+def _create_admission_controller(model: type, receive_task: 'celery.Task') -> 'pacifica.dispatcher_example.admission.AdmissionController':
+    """Construct the admission controller for the endpoints that receive
+    CloudEvents notifications.
+
+    """
+
+    from .admission import DEFAULT_INTERVAL, DEFAULT_RETRY_AFTER, AdmissionController
+    from .router import metrics
+
+    # The maximum number of pending rows, the maximum number of messages in the
+    # queues of the message broker, and the maximum age in seconds of the oldest
+    # row whose Celery task has not started are read from the
+    # "ADMISSION_MAX_PENDING", "ADMISSION_MAX_QUEUE_DEPTH" and
+    # "ADMISSION_MAX_WAIT" environment variables. If all three environment
+    # variables are undefined, then the default behavior is to admit every
+    # CloudEvents notification.
+    #
+    # The minimum number of seconds between the samples of the load and the
+    # minimum number of seconds that a sender is told to wait after a rejected
+    # request are read from the "ADMISSION_INTERVAL" and
+    # "ADMISSION_RETRY_AFTER" environment variables.
+    #
+    return AdmissionController(
+        model,
+        receive_task=receive_task,
+        max_pending=int(os.getenv('ADMISSION_MAX_PENDING')) if os.getenv('ADMISSION_MAX_PENDING') else None,
+        max_queue_depth=int(os.getenv('ADMISSION_MAX_QUEUE_DEPTH')) if os.getenv('ADMISSION_MAX_QUEUE_DEPTH') else None,
+        max_wait=float(os.getenv('ADMISSION_MAX_WAIT')) if os.getenv('ADMISSION_MAX_WAIT') else None,
+        interval=float(os.getenv('ADMISSION_INTERVAL', DEFAULT_INTERVAL)),
+        retry_after=int(os.getenv('ADMISSION_RETRY_AFTER', DEFAULT_RETRY_AFTER)),
+        metrics=metrics,
+    )
+
+
+def _create_task_router() -> typing.Optional['pacifica.dispatcher_example.queues.SizeTaskRouter']:
+    """Construct the task router that sends the Celery task for each CloudEvents
+    notification to the queue for either small or large transactions.
+
+    """
+
+    from .queues import DEFAULT_LARGE_PRIORITY, DEFAULT_LARGE_QUEUE, DEFAULT_SMALL_PRIORITY, DEFAULT_SMALL_QUEUE, SizeTaskRouter
+    from .router import metrics
+
+    # The maximum number of files and the maximum total size in bytes of the
+    # files in a small transaction are read from the "QUEUE_SMALL_MAX_FILES" and
+    # "QUEUE_SMALL_MAX_BYTES" environment variables. If both environment
+    # variables are undefined, then the default behavior is to send every Celery
+    # task to the default queue.
+    #
+    # The names of the queues are read from the "QUEUE_SMALL_NAME" and
+    # "QUEUE_LARGE_NAME" environment variables, and the priorities of the Celery
+    # tasks are read from the "QUEUE_SMALL_PRIORITY" and "QUEUE_LARGE_PRIORITY"
+    # environment variables.
+    #
+    if not (os.getenv('QUEUE_SMALL_MAX_FILES') or os.getenv('QUEUE_SMALL_MAX_BYTES')):
+        return None
+
+    return SizeTaskRouter(
+        'pacifica.dispatcher_example.tasks.receive',
+        max_small_files=int(os.getenv('QUEUE_SMALL_MAX_FILES')) if os.getenv('QUEUE_SMALL_MAX_FILES') else None,
+        max_small_bytes=int(os.getenv('QUEUE_SMALL_MAX_BYTES')) if os.getenv('QUEUE_SMALL_MAX_BYTES') else None,
+        small_queue=os.getenv('QUEUE_SMALL_NAME', DEFAULT_SMALL_QUEUE),
+        large_queue=os.getenv('QUEUE_LARGE_NAME', DEFAULT_LARGE_QUEUE),
+        small_priority=int(os.getenv('QUEUE_SMALL_PRIORITY', DEFAULT_SMALL_PRIORITY)),
+        large_priority=int(os.getenv('QUEUE_LARGE_PRIORITY', DEFAULT_LARGE_PRIORITY)),
+        metrics=metrics,
+    )
+
+
+def _create_receive_task_model() -> type:
+    """Construct the Peewee model, and then create its database table.
+
+    """
+
+    from pacifica.dispatcher.receiver import create_peewee_model
+
+    from .statuses import ensure_indexes
+
+    database = __getattr__('db')  # type: peewee.Database
+
+    model = create_peewee_model(database)  # type: type
+
+    # The "safe" keyword argument ensures that the database table is only
+    # created if it does not exist.
+    #
+    model.create_table(safe=True)
+
+    # Create the secondary indexes for the queries of this package, e.g., for
+    # the listing of the statuses and the retention, including for a database
+    # table that was created by an earlier version.
+    #
+    ensure_indexes(model)
+
+    # Close the connection that was opened to create the database table, so that
+    # it is not inherited by the child processes of the Celery worker.
+    #
+    database.close()
+
+    return model
+
+
+def _create_celery_app() -> 'celery.Celery':
+    """Construct the Celery application for the Peewee model.
+
+    """
+
+    import celery.signals
+
+    from .checkpoints import DEFAULT_MAX_AGE, DEFAULT_PRUNE_INTERVAL, install_checkpoint_pruner
+    from .database import install_celery_hooks
+    from .ingest import install_ingest_poller
+    from .metrics import DEFAULT_INTERVAL, TextfileSink, install_celery_sink
+    from .queues import install_task_router
+    from .receivers import create_celery_app, requeue_duplicates
+    from .router import checkpoints, event_handler, ingest_jobs, metrics, router, uploader_runner
+    from .statuses import DEFAULT_BATCH_SIZE, DEFAULT_RETENTION_INTERVAL, install_retention_task
+
+    # The arguments for the constructor are as follows:
+    # 1. The Peewee model.
+    # 2. The Pacifica Dispatcher router.
+    # 3. The name of the Celery application's task queue.
+    # 4. The name of the Celery task that is triggered when a CloudEvents
+    #    notification is received.
+    #
+    # Unlike the constructor that is provided by the Peewee model, this
+    # constructor creates a Celery task that updates the row for a CloudEvents
+    # notification if it has already been inserted, e.g., by the endpoint for
+    # batches, and that is short-circuited if it was redelivered after it
+    # succeeded or, if deduplication is enabled, if the CloudEvents notification
+    # duplicates an earlier CloudEvents notification. If asynchronous ingest is
+    # enabled, then the Celery task records the ingest jobs that were submitted
+    # by the event handler, rather than waiting for them.
+    #
+    # The URL connection string for the Celery application's backend is read
+    # from the "BACKEND_URL" environment variable.
+    #
+    # The URL connection string for the Celery application's message broker is
+    # read from the "BROKER_URL" environment variable.
+    #
+    dedupe_window = _read_dedupe_window()  # type: typing.Optional[float]
+
+    celery_app = create_celery_app(__getattr__('ReceiveTaskModel'), router, 'pacifica.dispatcher_example.app', 'pacifica.dispatcher_example.tasks.receive', backend=os.getenv('BACKEND_URL', 'rpc://'), broker=os.getenv('BROKER_URL', 'pyamqp://'), dedupe_window=dedupe_window, metrics=metrics, ingest_jobs=ingest_jobs)  # type: celery.Celery
+
+    # Export the metrics from the Celery worker to a file, e.g., for the
+    # textfile collector of the Prometheus node exporter.
+    #
+    # The path to the file is read from the "METRICS_TEXTFILE" environment
+    # variable, where "{pid}" is replaced by the ID of each child process of the
+    # Celery worker. The minimum number of seconds between exports is read from
+    # the "METRICS_INTERVAL" environment variable.
+    #
+    if metrics.enabled and os.getenv('METRICS_TEXTFILE'):
+        install_celery_sink(celery_app, metrics, TextfileSink(os.getenv('METRICS_TEXTFILE')), interval=float(os.getenv('METRICS_INTERVAL', DEFAULT_INTERVAL)))
+
+    # Shut down the pool of threads or processes that transforms the files, if
+    # any, when the Celery worker (or each of its child processes) exits.
+    #
+    def on_worker_shutdown(**_kwargs) -> None:
+        """Shut down the pool of the example event handler."""
+        event_handler.shutdown()
+
+    celery.signals.worker_process_shutdown.connect(on_worker_shutdown, weak=False)
+    celery.signals.worker_shutdown.connect(on_worker_shutdown, weak=False)
+
+    # Send the Celery task for each CloudEvents notification to the queue for
+    # either small or large transactions, if the thresholds are configured, so
+    # that each queue can be consumed by a Celery worker with its own
+    # concurrency, e.g., "celery worker -Q pacifica.dispatcher_example.small".
+    #
+    task_router = _create_task_router()  # type: typing.Optional[pacifica.dispatcher_example.queues.SizeTaskRouter]
+
+    if task_router is not None:
+        install_task_router(celery_app, task_router)
+
+    # Store the per-file checkpoints in the same database as the rows for the
+    # CloudEvents notifications, if checkpointing is enabled.
+    #
+    # Each Celery task is acknowledged after it returns, rather than before it
+    # runs, and is redelivered if the child process of the Celery worker that
+    # runs it is killed, so that its CloudEvents notification is resumed from
+    # its checkpoints by another Celery worker.
+    #
+    # The working directories and the checkpoints of the CloudEvents
+    # notifications that failed are kept, so that they are resumed if they are
+    # handled again, until they were not updated for "CHECKPOINT_MAX_AGE"
+    # seconds, and are then pruned by a periodic Celery task, once per
+    # "CHECKPOINT_PRUNE_INTERVAL" seconds, which is scheduled by Celery beat.
+    #
+    if checkpoints is not None:
+        checkpoints.bind(__getattr__('db'))
+
+        celery_app.conf.task_acks_late = True
+        celery_app.conf.task_reject_on_worker_lost = True
+
+        install_checkpoint_pruner(celery_app, checkpoints, 'pacifica.dispatcher_example.tasks.prune_checkpoints', max_age=float(os.getenv('CHECKPOINT_MAX_AGE', DEFAULT_MAX_AGE)), interval=float(os.getenv('CHECKPOINT_PRUNE_INTERVAL', DEFAULT_PRUNE_INTERVAL)))
+
+    # Store the outstanding ingest jobs in the same database as the rows for the
+    # CloudEvents notifications, if asynchronous ingest is enabled.
+    #
+    # The ingest jobs are polled by a periodic Celery task, once per
+    # "INGEST_POLL_INTERVAL" seconds, which is scheduled by Celery beat, e.g.,
+    # "celery worker -B" or a separate "celery beat" process. Each sweep checks
+    # the state of every outstanding ingest job, and then updates the status of
+    # the row for each CloudEvents notification whose ingest jobs have finished.
+    # If deduplication is enabled, then the Celery task for the earliest
+    # short-circuited duplicate of each CloudEvents notification whose ingest
+    # jobs failed is published again.
+    #
+    if ingest_jobs is not None:
+        ingest_jobs.bind(__getattr__('db'))
+
+        def on_ingest_failed(task_ids: typing.List[str]) -> None:
+            """Publish the Celery tasks for the duplicates again."""
+            requeue_duplicates(__getattr__('ReceiveTaskModel'), celery_app.tasks['pacifica.dispatcher_example.tasks.receive'], task_ids, dedupe_window)
+
+        install_ingest_poller(celery_app, ingest_jobs, __getattr__('ReceiveTaskModel'), lambda job_id: uploader_runner.runner.uploader.getstate(job_id), 'pacifica.dispatcher_example.tasks.poll_ingest', interval=float(os.getenv('INGEST_POLL_INTERVAL')), metrics=metrics, on_failed=on_ingest_failed if dedupe_window is not None else None)
+
+    # Delete the rows for the CloudEvents notifications that finished more than
+    # "RETENTION_SECONDS" seconds ago, if retention is enabled.
+    #
+    # The retention is applied by a periodic Celery task, once per
+    # "RETENTION_INTERVAL" seconds, which is scheduled by Celery beat. The rows
+    # are removed in batches of "RETENTION_BATCH_SIZE" rows, one transaction per
+    # batch. If the "RETENTION_COMPACT" environment variable is "1", "true" or
+    # "yes", then the rows are compacted, i.e., their JSON-encoded data is
+    # cleared, rather than deleted.
+    #
+    if os.getenv('RETENTION_SECONDS'):
+        install_retention_task(
+            celery_app,
+            __getattr__('ReceiveTaskModel'),
+            'pacifica.dispatcher_example.tasks.retention',
+            float(os.getenv('RETENTION_SECONDS')),
+            interval=float(os.getenv('RETENTION_INTERVAL', DEFAULT_RETENTION_INTERVAL)),
+            compact=os.getenv('RETENTION_COMPACT', '').lower() in ('1', 'true', 'yes'),
+            batch_size=int(os.getenv('RETENTION_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+            metrics=metrics,
+        )
+
+    # Open the connection to the database before each Celery task runs, and
+    # close it (or return it to the pool) after the Celery task returns.
+    #
+    install_celery_hooks(celery_app, __getattr__('db'))
+
+    return celery_app
+
+
+def _create_application() -> 'cherrypy.Application':
+    """Construct the CherryPy application for the Peewee model.
+
+    """
+
+    from .admission import create_health_endpoint
+    from .database import install_cherrypy_hooks
+    from .metrics import install_cherrypy_metrics
+    from .receivers import create_batch_endpoint, create_receive_endpoint
+    from .router import metrics
+    from .statuses import create_statuses_endpoint
+
+    model = __getattr__('ReceiveTaskModel')  # type: type
+    receive_task = __getattr__('celery_app').tasks['pacifica.dispatcher_example.tasks.receive']  # type: celery.Task
+
+    # The arguments for the constructor are as follows:
+    # 1. The Celery task that is triggered when a CloudEvents notification is
+    #    received.
+    #
+    application = model.create_cherrypy_app(receive_task)  # type: cherrypy.Application
+
+    dedupe_window = _read_dedupe_window()  # type: typing.Optional[float]
+    admission = _create_admission_controller(model, receive_task)  # type: pacifica.dispatcher_example.admission.AdmissionController
+
+    # Replace the endpoint for CloudEvents notifications at "/receive".
+    #
+    # Unlike the endpoint that is provided by the Peewee model, this endpoint
+    # inserts the row for the CloudEvents notification before it publishes the
+    # Celery task, so that, if deduplication is enabled, a CloudEvents
+    # notification that duplicates an earlier CloudEvents notification is
+    # coalesced with it, i.e., the endpoint responds with the ID for the
+    # earlier Celery task. If admission control is enabled, then a CloudEvents
+    # notification that arrives while the load is over a limit is rejected with
+    # a "Retry-After" header.
+    #
+    application.root.receive = create_receive_endpoint(model, receive_task, dedupe_window=dedupe_window, metrics=metrics, admission=admission)
+
+    # Mount the endpoint for batches of CloudEvents notifications at "/batch".
+    #
+    # The endpoint accepts a JSON array (or a JSON Lines stream, if the media
+    # type is "application/x-ndjson") of CloudEvents notifications, inserts the
+    # rows for the notifications in a single transaction, publishes the Celery
+    # tasks as a single group, and then responds with the IDs for the Celery
+    # tasks. If deduplication is enabled, then duplicate CloudEvents
+    # notifications are coalesced, and batches are rejected, in the same way as
+    # for "/receive".
+    #
+    application.root.batch = create_batch_endpoint(model, receive_task, dedupe_window=dedupe_window, metrics=metrics, admission=admission)
+
+    # Mount the endpoint that reports the current load at "/health".
+    #
+    # The endpoint responds with "503 Service Unavailable" while CloudEvents
+    # notifications are rejected, e.g., so that a load balancer stops sending
+    # requests.
+    #
+    application.root.health = create_health_endpoint(admission)
+
+    # Mount the endpoint that lists the statuses of the CloudEvents
+    # notifications at "/statuses".
+    #
+    # The endpoint responds with a page of the statuses, newest first, which are
+    # optionally filtered by the "status" query parameter, and a cursor for the
+    # next page, which is passed as the "after" query parameter. The endpoint
+    # for the status of one CloudEvents notification that is provided by the
+    # Peewee model, i.e., "/status/<task_id>", is kept.
+    #
+    application.root.statuses = create_statuses_endpoint(model)
+
+    # Open the connection to the database when each CherryPy request starts, and
+    # close it (or return it to the pool) when the CherryPy request ends.
+    #
+    install_cherrypy_hooks(application, __getattr__('db'))
+
+    # Measure the latency of each CherryPy request, and then mount the endpoint
+    # that serves the metrics at "/metrics", if metrics are enabled.
+    #
+    if metrics.enabled:
+        install_cherrypy_metrics(application, metrics)
+
+    return application
+
+
+def _create_asyncio_server(max_workers: int) -> 'pacifica.dispatcher_example.servers.AsyncioServer':
+    """Construct the asyncio server for the Peewee model.
+
+    """
+
+    from .router import metrics
+    from .servers import AsyncioServer
+
+    # The arguments for the constructor are as follows:
+    # 1. The Peewee model.
+    # 2. The Celery task that is triggered when a CloudEvents notification is
+    #    received.
+    #
+    # The asyncio server provides the same endpoints as the CherryPy
+    # application, i.e., "/", "/receive", "/batch", "/get/<task_id>",
+    # "/status/<task_id>", "/health", "/statuses" and, if metrics are enabled,
+    # "/metrics". The calls to the database and the message broker are run in a
+    # pool of at most "max_workers" threads.
+    #
+    model = __getattr__('ReceiveTaskModel')  # type: type
+    receive_task = __getattr__('celery_app').tasks['pacifica.dispatcher_example.tasks.receive']  # type: celery.Task
+
+    return AsyncioServer(model, receive_task, dedupe_window=_read_dedupe_window(), metrics=metrics, max_workers=max_workers, admission=_create_admission_controller(model, receive_task))
+
+
+# pylint: enable=import-outside-toplevel
+
+
+# The function that constructs each lazily-constructed attribute of this module.
 #
-# The arguments for the constructor are as follows:
-# 1. The Celery task that is triggered when a CloudEvents notification is
-#    received.
+_FACTORIES = {
+    'ReceiveTaskModel': _create_receive_task_model,
+    'application': _create_application,
+    'celery_app': _create_celery_app,
+    'db': _create_db,
+}  # type: typing.Dict[str, typing.Callable[[], typing.Any]]
+
+# The lock that ensures that each attribute is constructed at most once. The
+# lock is reentrant, because constructing one attribute may construct another.
 #
-application = ReceiveTaskModel.create_cherrypy_app(celery_app.tasks['pacifica.dispatcher_example.tasks.receive'])
+_LOCK = threading.RLock()  # type: threading.RLock
+
+
+def __getattr__(name: str) -> typing.Any:
+    """Return a lazily-constructed attribute of this module, i.e., "db",
+    "ReceiveTaskModel", "celery_app" or "application", constructing it on first
+    use.
+
+    Once constructed, the attribute is stored in the namespace of this module,
+    so that this function is not called for it again.
+
+    """
+
+    if name not in _FACTORIES:
+        raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
+
+    with _LOCK:
+        if name not in globals():
+            globals()[name] = _FACTORIES[name]()
+
+    return globals()[name]
 
 
 def main() -> None:
@@ -97,17 +496,37 @@ def main() -> None:
 
     """
 
+    # pylint: disable=import-outside-toplevel
+    from .servers import ASYNCIO, CHERRYPY, DEFAULT_MAX_WORKERS, ENGINE_NAMES
+    # pylint: enable=import-outside-toplevel
+
     # Construct the parser for command-line arguments.
     #
-    parser = argparse.ArgumentParser(description='Start the CherryPy application and listen for connections.')
-    parser.add_argument('--config', metavar='CONFIG', dest='config', type=str, default=None, help='The CherryPy configuration file (overrides host and port options).')
+    parser = argparse.ArgumentParser(description='Start the CherryPy (or asyncio) application and listen for connections.')
+    parser.add_argument('--config', metavar='CONFIG', dest='config', type=str, default=None, help='The CherryPy configuration file (overrides host and port options; CherryPy engine only).')
+    parser.add_argument('--engine', metavar='ENGINE', dest='engine', type=str, choices=ENGINE_NAMES, default=CHERRYPY, help='The engine that serves the application, i.e., {0}.'.format(' or '.join(ENGINE_NAMES)))
     parser.add_argument('--host', metavar='HOST', dest='host', type=str, default='127.0.0.1', help='The hostname or IP address on which to listen for connections.')
+    parser.add_argument('--max-workers', metavar='MAX_WORKERS', dest='max_workers', type=int, default=DEFAULT_MAX_WORKERS, help='The maximum number of threads that call the database and the message broker (asyncio engine only).')
     parser.add_argument('--port', metavar='PORT', dest='port', type=int, default=8069, help='The TCP port on which to listen for connections.')
 
     # Parse the command-line arguments.
     #
     args = parser.parse_args()
 
+    if args.engine == ASYNCIO:
+        if args.config is not None:
+            parser.error('argument --config: not allowed with argument --engine {0}'.format(ASYNCIO))
+
+        # Construct the asyncio server (and the database, the Peewee model and
+        # the Celery application), and then listen for connections until
+        # interrupted.
+        #
+        _create_asyncio_server(args.max_workers).run(args.host, args.port)
+
+        return
+
+    import cherrypy  # pylint: disable=import-outside-toplevel
+
     # Configure CherryPy using the command-line arguments.
     #
     cherrypy.config.update({
@@ -122,9 +541,10 @@ def main() -> None:
         #
         cherrypy.config.update(args.config)
 
-    # Mount the CherryPy application.
+    # Mount the CherryPy application, constructing it (and the database, the
+    # Peewee model and the Celery application) if it has not been constructed.
     #
-    cherrypy.tree.mount(application)
+    cherrypy.tree.mount(__getattr__('application'))
 
     # Start the CherryPy application and listen for connections.
     #
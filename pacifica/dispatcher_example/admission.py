@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/admission.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Admission control for Pacifica Dispatcher Example.
+
+This module defines the admission controller that is used by the endpoints
+that receive `CloudEvents`_ notifications to reject new CloudEvents
+notifications while the backlog is over its limits, and the `CherryPy`_
+endpoint that reports the current load.
+
+Without admission control, the endpoints accept every CloudEvents notification,
+so that, when the Celery workers fall behind, the rows for the CloudEvents
+notifications and the queues of the message broker grow without bound. With
+admission control, the load is sampled from live signals, i.e., the number of
+pending rows in the database, the number of messages in the queues of the
+message broker, and the age of the oldest row whose Celery task has not
+started, and each request that arrives while a signal is over its limit is
+rejected with "429 Too Many Requests" (for the backlog) or "503 Service
+Unavailable" (for the age of the oldest row, i.e., if the Celery workers are
+stalled), together with a "Retry-After" header that grows with the overload, so
+that the senders back off.
+
+Attributes:
+    DEFAULT_INTERVAL (float): The default minimum number of seconds between
+        the samples of the load.
+    DEFAULT_RETRY_AFTER (int): The default minimum number of seconds that a
+        sender is told to wait after a rejected request.
+    MAX_RETRY_AFTER (int): The maximum number of seconds that a sender is told
+        to wait after a rejected request.
+    AdmissionController (type): The class for the admission controller.
+    AdmissionRejectedError (type): The class for the error that is raised for
+        a rejected request.
+    LoadSample (type): The class for a sample of the load.
+    create_health_endpoint (typing.Callable[[AdmissionController], typing.Any]):
+        Construct the CherryPy endpoint that reports the current load.
+    to_cherrypy_error (typing.Callable[[AdmissionRejectedError], cherrypy.HTTPError]):
+        Return the CherryPy error for a rejected request.
+
+.. _CherryPy:
+   https://cherrypy.org/
+.. _CloudEvents:
+   https://cloudevents.io/
+
+"""
+
+import collections
+import datetime
+import math
+import threading
+import time
+import typing
+
+import celery
+import cherrypy
+import peewee
+
+from .metrics import NULL_REGISTRY, Registry
+
+
+# The default minimum number of seconds between the samples of the load.
+#
+DEFAULT_INTERVAL = 1.0  # type: float
+
+# The default minimum, and the maximum, number of seconds that a sender is told
+# to wait after a rejected request.
+#
+DEFAULT_RETRY_AFTER = 5  # type: int
+MAX_RETRY_AFTER = 300  # type: int
+
+# The statuses of the row for a CloudEvents notification that is pending, and
+# whose Celery task has not started, which are the same as for the
+# ``pacifica.dispatcher_example.receivers`` module.
+#
+_PENDING_STATUSES = ('202 Accepted', '102 Processing', )  # type: typing.Tuple[str, ...]
+_ACCEPTED_STATUS = '202 Accepted'  # type: str
+
+# A sample of the load, i.e., the number of pending rows, the number of
+# messages in the queues of the message broker (or ``None`` if unknown), and the
+# age in seconds of the oldest row whose Celery task has not started (or
+# ``None`` if there is no such row).
+#
+LoadSample = collections.namedtuple('LoadSample', ('pending', 'queue_depth', 'oldest_pending_seconds', ))
+
+
+class AdmissionRejectedError(Exception):
+    """An error that is raised when a request is rejected by the admission
+    controller.
+
+    Attributes:
+        status (int): The status code of the response, i.e., 429 or 503.
+        reason (str): The signal that is over its limit, i.e., "pending",
+            "queue_depth" or "wait".
+        retry_after (int): The number of seconds that the sender is told to
+            wait.
+
+    """
+
+    def __init__(self, status: int, reason: str, retry_after: int) -> None:
+        """Initialize this error.
+
+        """
+
+        super(AdmissionRejectedError, self).__init__(status, reason, retry_after)
+
+        self.status = status  # type: int
+        self.reason = reason  # type: str
+        self.retry_after = retry_after  # type: int
+
+    def __str__(self) -> str:
+        """Return the message for the response.
+
+        """
+
+        return 'Over the limit for {0}, retry after {1} seconds'.format(self.reason, self.retry_after)
+
+
+class AdmissionController:
+    """An admission controller that rejects new CloudEvents notifications while
+    the load is over its limits.
+
+    The load is sampled at most once per interval, so that the cost of the
+    samples is independent of the rate of requests. Between samples, every
+    CloudEvents notification that is admitted is added to the number of pending
+    rows and to the number of messages, so that a burst of requests cannot
+    overshoot the limits before the next sample.
+
+    Attributes:
+        model (type): The class for the Peewee model.
+        receive_task (typing.Optional[celery.Task]): The Celery task, whose
+            Celery application's queues are measured, or ``None`` to not
+            measure the queues.
+        max_pending (typing.Optional[int]): The maximum number of pending rows,
+            or ``None`` for no limit.
+        max_queue_depth (typing.Optional[int]): The maximum number of messages
+            in the queues, or ``None`` for no limit.
+        max_wait (typing.Optional[float]): The maximum age in seconds of the
+            oldest row whose Celery task has not started, or ``None`` for no
+            limit.
+        interval (float): The minimum number of seconds between samples.
+        retry_after (int): The minimum number of seconds that a sender is told
+            to wait after a rejected request.
+
+    """
+
+    def __init__(self, model: type, receive_task: typing.Optional[celery.Task] = None, max_pending: typing.Optional[int] = None, max_queue_depth: typing.Optional[int] = None, max_wait: typing.Optional[float] = None, interval: float = DEFAULT_INTERVAL, retry_after: int = DEFAULT_RETRY_AFTER, metrics: Registry = NULL_REGISTRY) -> None:
+        """Initialize this admission controller.
+
+        Args:
+            model (type): The class for the Peewee model.
+            receive_task (typing.Optional[celery.Task]): The Celery task.
+            max_pending (typing.Optional[int]): The maximum number of pending
+                rows.
+            max_queue_depth (typing.Optional[int]): The maximum number of
+                messages in the queues.
+            max_wait (typing.Optional[float]): The maximum age in seconds of the
+                oldest row whose Celery task has not started.
+            interval (float): The minimum number of seconds between samples.
+            retry_after (int): The minimum number of seconds that a sender is
+                told to wait.
+            metrics (pacifica.dispatcher_example.metrics.Registry): The
+                registry for the metrics.
+
+        Raises:
+            ValueError: If a limit or the minimum "Retry-After" is not
+                positive, or if the interval is negative.
+
+        """
+
+        super(AdmissionController, self).__init__()
+
+        for (name, value) in [('max_pending', max_pending), ('max_queue_depth', max_queue_depth), ('max_wait', max_wait)]:
+            if (value is not None) and (value <= 0):
+                raise ValueError('{0} must be positive'.format(name))
+
+        if interval < 0:
+            raise ValueError('interval must be non-negative')
+
+        if retry_after <= 0:
+            raise ValueError('retry_after must be positive')
+
+        self.model = model  # type: type
+        self.receive_task = receive_task  # type: typing.Optional[celery.Task]
+        self.max_pending = max_pending  # type: typing.Optional[int]
+        self.max_queue_depth = max_queue_depth  # type: typing.Optional[int]
+        self.max_wait = max_wait  # type: typing.Optional[float]
+        self.interval = interval  # type: float
+        self.retry_after = retry_after  # type: int
+
+        self._lock = threading.Lock()  # type: threading.Lock
+        self._sample = None  # type: typing.Optional[LoadSample]
+        self._sampled = -math.inf  # type: float
+        self._admitted = 0  # type: int
+
+        self._events_rejected_total = metrics.counter('dispatcher_example_events_rejected_total', 'The number of CloudEvents notifications that were rejected by admission control, by the signal that was over its limit.', labelnames=('reason', ))  # type: pacifica.dispatcher_example.metrics.Counter
+
+        if self.enabled:
+            metrics.register_callback('dispatcher_example_admission_pending', 'The number of pending CloudEvents notifications, as of the last sample.', lambda: self._sample.pending if self._sample is not None else 0)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether or not any limit is given.
+
+        """
+
+        return (self.max_pending is not None) or (self.max_queue_depth is not None) or (self.max_wait is not None)
+
+    def _queue_depth(self) -> typing.Optional[int]:
+        """Return the number of messages in the queues of the Celery
+        application, or ``None`` if they cannot be measured.
+
+        """
+
+        if self.receive_task is None:
+            return None
+
+        app = self.receive_task.app  # type: celery.Celery
+
+        queue_names = [queue.name for queue in (app.conf.task_queues or [])] or [app.conf.task_default_queue]  # type: typing.List[str]
+
+        try:
+            with app.connection_or_acquire() as connection:
+                depth = 0  # type: int
+
+                # A channel is opened per queue, because a passive declaration
+                # of a queue that does not exist closes the channel.
+                #
+                for queue_name in queue_names:
+                    with connection.channel() as channel:
+                        try:
+                            depth += channel.queue_declare(queue=queue_name, passive=True).message_count
+                        except connection.channel_errors:
+                            # The queue has not been declared, i.e., it is
+                            # empty.
+                            #
+                            pass
+
+                return depth
+        # pylint: disable=broad-except
+        except Exception:
+            return None
+        # pylint: enable=broad-except
+
+    def _measure(self) -> LoadSample:
+        """Measure the load.
+
+        """
+
+        model = self.model  # type: type
+
+        with model._meta.database.connection_context():  # pylint: disable=protected-access
+            pending = model.select().where(model.task_status.in_(_PENDING_STATUSES)).count()  # type: int
+            oldest = model.select(peewee.fn.MIN(model.created).python_value(model.created.python_value)).where(model.task_status == _ACCEPTED_STATUS).scalar()  # type: typing.Optional[datetime.datetime]
+
+        oldest_pending_seconds = max(0.0, (datetime.datetime.now() - oldest).total_seconds()) if oldest is not None else None  # type: typing.Optional[float]
+
+        return LoadSample(pending, self._queue_depth() if self.max_queue_depth is not None else None, oldest_pending_seconds)
+
+    def sample(self) -> LoadSample:
+        """Return the current load, sampling it if the last sample is older
+        than the interval.
+
+        The CloudEvents notifications that were admitted since the last sample
+        are included.
+
+        Returns:
+            LoadSample: The load.
+
+        """
+
+        with self._lock:
+            now = time.monotonic()  # type: float
+
+            if now - self._sampled >= self.interval:
+                self._sample = self._measure()
+                self._sampled = now
+                self._admitted = 0
+
+            return self._current()
+
+    def _current(self) -> LoadSample:
+        """Return the last sample, including the CloudEvents notifications that
+        were admitted since.
+
+        """
+
+        return self._sample._replace(
+            pending=self._sample.pending + self._admitted,
+            queue_depth=(self._sample.queue_depth + self._admitted) if self._sample.queue_depth is not None else None,
+        )
+
+    def _retry_after(self, value: float, limit: float) -> int:
+        """Return the number of seconds that a sender is told to wait, which is
+        proportional to the overload.
+
+        """
+
+        return int(min(MAX_RETRY_AFTER, max(self.retry_after, math.ceil(self.retry_after * value / limit))))
+
+    def check(self, load: LoadSample) -> typing.Optional[AdmissionRejectedError]:
+        """Return the error for a request that arrives under a load, or ``None``
+        if the request is admitted.
+
+        Args:
+            load (LoadSample): The load.
+
+        Returns:
+            typing.Optional[AdmissionRejectedError]: The error, or ``None``.
+
+        """
+
+        if (self.max_wait is not None) and (load.oldest_pending_seconds is not None) and (load.oldest_pending_seconds >= self.max_wait):
+            return AdmissionRejectedError(503, 'wait', self._retry_after(load.oldest_pending_seconds, self.max_wait))
+
+        if (self.max_pending is not None) and (load.pending >= self.max_pending):
+            return AdmissionRejectedError(429, 'pending', self._retry_after(load.pending, self.max_pending))
+
+        if (self.max_queue_depth is not None) and (load.queue_depth is not None) and (load.queue_depth >= self.max_queue_depth):
+            return AdmissionRejectedError(429, 'queue_depth', self._retry_after(load.queue_depth, self.max_queue_depth))
+
+        return None
+
+    def admit(self, count: int = 1) -> None:
+        """Admit a number of CloudEvents notifications, e.g., a batch, or
+        reject all of them.
+
+        Args:
+            count (int): The number of CloudEvents notifications.
+
+        Raises:
+            AdmissionRejectedError: If the load is over a limit.
+
+        """
+
+        if not self.enabled:
+            return
+
+        self.sample()
+
+        with self._lock:
+            exc = self.check(self._current())  # type: typing.Optional[AdmissionRejectedError]
+
+            if exc is None:
+                self._admitted += count
+
+        if exc is not None:
+            self._events_rejected_total.inc(count, reason=exc.reason)
+
+            raise exc
+
+    def health(self) -> typing.Dict[str, typing.Any]:
+        """Return the JSON-encoded data for the current load and limits.
+
+        Returns:
+            typing.Dict[str, typing.Any]: The JSON-encoded data, where "status"
+            is either "ok" or "overloaded".
+
+        """
+
+        load = self.sample()  # type: LoadSample
+        exc = self.check(load)  # type: typing.Optional[AdmissionRejectedError]
+
+        return {
+            'status': 'ok' if exc is None else 'overloaded',
+            'reason': exc.reason if exc is not None else None,
+            'retryAfter': exc.retry_after if exc is not None else None,
+            'pending': load.pending,
+            'queueDepth': load.queue_depth,
+            'oldestPendingSeconds': load.oldest_pending_seconds,
+            'maxPending': self.max_pending,
+            'maxQueueDepth': self.max_queue_depth,
+            'maxWait': self.max_wait,
+        }
+
+
+class _RetryAfterHTTPError(cherrypy.HTTPError):
+    """An HTTP error whose response includes a "Retry-After" header, which
+    CherryPy otherwise removes from error responses.
+
+    """
+
+    def __init__(self, exc: AdmissionRejectedError) -> None:
+        """Initialize this error.
+
+        """
+
+        super(_RetryAfterHTTPError, self).__init__(exc.status, str(exc))
+
+        self.retry_after = exc.retry_after  # type: int
+
+    def set_response(self) -> None:
+        """Modify the response, and then add the "Retry-After" header.
+
+        """
+
+        super(_RetryAfterHTTPError, self).set_response()
+
+        cherrypy.serving.response.headers['Retry-After'] = str(self.retry_after)
+
+
+def to_cherrypy_error(exc: AdmissionRejectedError) -> cherrypy.HTTPError:
+    """Return the CherryPy error for a rejected request.
+
+    Args:
+        exc (AdmissionRejectedError): The error.
+
+    Returns:
+        cherrypy.HTTPError: The CherryPy error, whose response includes the
+        "Retry-After" header.
+
+    """
+
+    return _RetryAfterHTTPError(exc)
+
+
+def create_health_endpoint(admission: AdmissionController) -> typing.Any:
+    """Construct the CherryPy endpoint that reports the current load.
+
+    The status code is "200 OK" if CloudEvents notifications are admitted, and
+    "503 Service Unavailable", with a "Retry-After" header, otherwise, e.g., so
+    that a load balancer stops sending requests.
+
+    Args:
+        admission (AdmissionController): The admission controller.
+
+    Returns:
+        typing.Any: The CherryPy endpoint, which is mounted as an attribute of
+        the root object of the CherryPy application.
+
+    """
+
+    # pylint: disable=too-few-public-methods
+    class Health:
+        """Health entrypoint for the current load."""
+
+        exposed = True
+
+        # pylint: disable=invalid-name
+        @staticmethod
+        @cherrypy.tools.json_out()
+        def GET() -> typing.Dict[str, typing.Any]:
+            """Report the current load."""
+            health = admission.health()
+
+            if health['status'] != 'ok':
+                cherrypy.response.status = 503
+                cherrypy.response.headers['Retry-After'] = str(health['retryAfter'])
+
+            return health
+        # pylint: enable=invalid-name
+    # pylint: enable=too-few-public-methods
+
+    return Health()
+
+
+# Module exports.
+#
+__all__ = ('DEFAULT_INTERVAL', 'DEFAULT_RETRY_AFTER', 'MAX_RETRY_AFTER', 'AdmissionController', 'AdmissionRejectedError', 'LoadSample', 'create_health_endpoint', 'to_cherrypy_error', )
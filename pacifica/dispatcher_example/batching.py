@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/batching.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Batching for Pacifica Dispatcher Example.
+
+This module defines the batcher that is used by the event handler to
+accumulate the files that were transformed for several CloudEvents
+notifications, which are handled concurrently by the same Celery worker
+process, e.g., by its pool of threads, and then to upload them with fewer calls
+to the uploader runner.
+
+Attributes:
+    DEFAULT_MAX_DELAY (float): The default maximum number of seconds that the
+        first item of a batch waits for more items.
+    DEFAULT_MAX_ITEMS (int): The default maximum number of items per batch.
+    Batcher (type): The class for the batcher.
+
+"""
+
+import concurrent.futures
+import threading
+import time
+import typing
+
+
+# The default maximum number of items per batch.
+#
+DEFAULT_MAX_ITEMS = 32  # type: int
+
+# The default maximum number of seconds that the first item of a batch waits for
+# more items.
+#
+DEFAULT_MAX_DELAY = 0.5  # type: float
+
+
+class Batcher:
+    """A batcher that accumulates the items that are submitted by concurrent
+    callers, and then flushes them together, when either the batch is full or
+    the first item of the batch has waited for the maximum delay.
+
+    Each call to submit an item blocks until its batch has been flushed, and
+    then returns the result for the item, or raises its exception, so that the
+    caller, e.g., a Celery task, still observes the outcome of its own item.
+    The batch is flushed by the caller that submitted its first item, so that no
+    background thread is needed.
+
+    Attributes:
+        flush (typing.Callable[[typing.List[typing.Any]], typing.List[typing.Any]]):
+            The callable that flushes a batch of items, and that returns the
+            result for each item, in the same order, where a result that is an
+            exception is raised for its item.
+        max_items (int): The maximum number of items per batch.
+        max_delay (float): The maximum number of seconds that the first item of
+            a batch waits for more items.
+
+    """
+
+    def __init__(self, flush: typing.Callable[[typing.List[typing.Any]], typing.List[typing.Any]], max_items: int = DEFAULT_MAX_ITEMS, max_delay: float = DEFAULT_MAX_DELAY) -> None:
+        """Initialize this batcher.
+
+        Args:
+            flush (typing.Callable[[typing.List[typing.Any]], typing.List[typing.Any]]):
+                The callable that flushes a batch of items.
+            max_items (int): The maximum number of items per batch.
+            max_delay (float): The maximum number of seconds that the first
+                item of a batch waits for more items.
+
+        Raises:
+            ValueError: If the maximum number of items is not positive, or if
+                the maximum delay is negative.
+
+        """
+
+        super(Batcher, self).__init__()
+
+        if max_items <= 0:
+            raise ValueError('max_items must be positive')
+
+        if max_delay < 0:
+            raise ValueError('max_delay must be non-negative')
+
+        self.flush = flush
+        self.max_items = max_items
+        self.max_delay = max_delay
+
+        self._condition = threading.Condition()  # type: threading.Condition
+        self._batch = []  # type: typing.List[typing.Tuple[typing.Any, concurrent.futures.Future]]
+
+    def submit(self, item: typing.Any) -> typing.Any:
+        """Add an item to the current batch, and then wait for the batch to be
+        flushed.
+
+        Args:
+            item (typing.Any): The item.
+
+        Returns:
+            typing.Any: The result for the item.
+
+        Raises:
+            Exception: If the batch could not be flushed, or if the result for
+                the item is an exception.
+
+        """
+
+        future = concurrent.futures.Future()  # type: concurrent.futures.Future
+
+        with self._condition:
+            batch = self._batch  # type: typing.List[typing.Tuple[typing.Any, concurrent.futures.Future]]
+            batch.append((item, future))
+
+            if len(batch) >= self.max_items:
+                # Seal the batch, so that the next item starts a new batch, and
+                # then wake the caller that submitted its first item.
+                #
+                self._batch = []
+                self._condition.notify_all()
+
+            if len(batch) == 1:
+                # Wait for the batch to be full, or for the maximum delay.
+                #
+                deadline = time.monotonic() + self.max_delay  # type: float
+
+                while self._batch is batch:
+                    remaining = deadline - time.monotonic()  # type: float
+
+                    if remaining <= 0:
+                        self._batch = []
+                        break
+
+                    self._condition.wait(remaining)
+            else:
+                batch = None
+
+        if batch is not None:
+            self._flush(batch)
+
+        return future.result()
+
+    def _flush(self, batch: typing.List[typing.Tuple[typing.Any, concurrent.futures.Future]]) -> None:
+        """Flush a batch, and then resolve the future for each item.
+
+        """
+
+        try:
+            results = self.flush([item for (item, _future) in batch])  # type: typing.List[typing.Any]
+        # pylint: disable=broad-except
+        except BaseException as exc:
+            for (_item, future) in batch:
+                future.set_exception(exc)
+
+            return
+        # pylint: enable=broad-except
+
+        for ((_item, future), result) in zip(batch, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+# Module exports.
+#
+__all__ = ('DEFAULT_MAX_DELAY', 'DEFAULT_MAX_ITEMS', 'Batcher', )
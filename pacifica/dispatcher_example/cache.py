@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/cache.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Result cache for Pacifica Dispatcher Example.
+
+This module defines the content-addressed cache for the files that are written
+by the transform, so that identical input files are not downloaded and
+transformed more than once.
+
+Attributes:
+    DEFAULT_MAX_BYTES (int): The default maximum total size of the cache in
+        bytes.
+    ResultCache (type): The class for the cache.
+
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import typing
+
+from pacifica.dispatcher.models import File
+
+from .transforms import TRANSFORM_VERSION
+
+
+# The default maximum total size of the cache in bytes.
+#
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # type: int
+
+
+class ResultCache:
+    """A content-addressed cache for the files that are written by the
+    transform, with size-bounded least-recently-used eviction.
+
+    Each entry is keyed on the hash of the original file, as described by the
+    "hashtype" and "hashsum" attributes of the metadata description for the
+    Pacifica file, together with its character encoding and the version of the
+    transform. Each entry is stored as a file in the cache directory, whose
+    modification time records when the entry was last used.
+
+    Entries are copied into and out of the cache directory, rather than
+    hard-linked, so that rewriting a restored file, or the file that was
+    stored, never changes the entry.
+
+    Attributes:
+        cache_dir (str): The name of the cache directory.
+        max_bytes (int): The maximum total size of the cache in bytes.
+        version (str): The version of the transform.
+        hits (int): The number of lookups that found an entry.
+        misses (int): The number of lookups that did not find an entry.
+        evictions (int): The number of entries that were evicted.
+
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES, version: str = TRANSFORM_VERSION) -> None:
+        """Initialize this cache.
+
+        Args:
+            cache_dir (str): The name of the cache directory, which is created
+                if it does not exist.
+            max_bytes (int): The maximum total size of the cache in bytes.
+            version (str): The version of the transform.
+
+        Raises:
+            ValueError: If the maximum total size is negative.
+
+        """
+
+        super(ResultCache, self).__init__()
+
+        if max_bytes < 0:
+            raise ValueError('max_bytes must be non-negative')
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.version = version
+
+        self.hits = 0  # type: int
+        self.misses = 0  # type: int
+        self.evictions = 0  # type: int
+
+        self._lock = threading.Lock()  # type: threading.Lock
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # The total size of the cache is tracked incrementally, so that the
+        # cache directory is only walked when entries need to be evicted.
+        #
+        self._size = sum(os.stat(path).st_size for path in self._walk())  # type: int
+
+    def stats(self) -> typing.Dict[str, int]:
+        """Return the counters for this cache.
+
+        Returns:
+            typing.Dict[str, int]: The number of hits, misses and evictions, and
+            the total size of the cache in bytes.
+
+        """
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'bytes': self._size,
+            }
+
+    def key(self, file_inst: File) -> typing.Optional[str]:
+        """Return the key for the entry for a Pacifica file.
+
+        Args:
+            file_inst (pacifica.dispatcher.models.File): The metadata
+                description for the Pacifica file.
+
+        Returns:
+            typing.Optional[str]: The key, or ``None`` if the metadata
+            description does not include a hash.
+
+        """
+
+        if not (file_inst.hashtype and file_inst.hashsum):
+            return None
+
+        return hashlib.sha256('\0'.join([
+            str(file_inst.hashtype),
+            str(file_inst.hashsum),
+            str(file_inst.encoding),
+            self.version,
+        ]).encode('utf-8')).hexdigest()
+
+    def restore(self, file_inst: File, new_path: str) -> bool:
+        """Restore the entry for a Pacifica file to a new path.
+
+        Args:
+            file_inst (pacifica.dispatcher.models.File): The metadata
+                description for the Pacifica file.
+            new_path (str): The new path.
+
+        Returns:
+            bool: ``True`` if the entry was found and restored, or ``False``
+            otherwise.
+
+        """
+
+        key = self.key(file_inst)  # type: typing.Optional[str]
+
+        if key is not None:
+            path = self._path(key)  # type: str
+
+            try:
+                # Mark the entry as the most recently used.
+                #
+                os.utime(path)
+
+                shutil.copyfile(path, new_path)
+            except FileNotFoundError:
+                pass
+            else:
+                with self._lock:
+                    self.hits += 1
+
+                return True
+
+        with self._lock:
+            self.misses += 1
+
+        return False
+
+    def put(self, file_inst: File, path: str) -> bool:
+        """Store a file as the entry for a Pacifica file, and then evict the
+        least recently used entries until the cache is within its maximum total
+        size.
+
+        Args:
+            file_inst (pacifica.dispatcher.models.File): The metadata
+                description for the Pacifica file.
+            path (str): The path to the file that was written by the transform.
+
+        Returns:
+            bool: ``True`` if the file was stored, or ``False`` otherwise.
+
+        """
+
+        key = self.key(file_inst)  # type: typing.Optional[str]
+
+        if key is None:
+            return False
+
+        size = os.stat(path).st_size  # type: int
+
+        if size > self.max_bytes:
+            return False
+
+        new_path = self._path(key)  # type: str
+
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+
+        # Copy the file into the cache directory under a temporary name and
+        # then rename it, so that concurrent readers never see a partial entry.
+        #
+        (file_descriptor, temp_path) = tempfile.mkstemp(dir=os.path.dirname(new_path), prefix='.')
+        os.close(file_descriptor)
+
+        try:
+            shutil.copyfile(path, temp_path)
+        except BaseException:
+            os.unlink(temp_path)
+
+            raise
+
+        # The entry that is replaced, if any, is checked and replaced under the
+        # lock, so that concurrent calls for the same key count its size once.
+        #
+        with self._lock:
+            try:
+                old_size = os.stat(new_path).st_size  # type: int
+            except FileNotFoundError:
+                old_size = 0
+
+            os.replace(temp_path, new_path)
+
+            self._size += size - old_size
+
+            over = self._size > self.max_bytes  # type: bool
+
+        if over:
+            self._evict()
+
+        return True
+
+    def _evict(self) -> None:
+        """Evict the least recently used entries until the cache is within its
+        maximum total size.
+
+        """
+
+        with self._lock:
+            entries = []  # type: typing.List[typing.Tuple[float, int, str]]
+
+            for path in self._walk():
+                try:
+                    path_st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+                entries.append((path_st.st_mtime, path_st.st_size, path))
+
+            self._size = sum(size for (_mtime, size, _path) in entries)
+
+            for (_mtime, size, path) in sorted(entries):
+                if self._size <= self.max_bytes:
+                    break
+
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                else:
+                    self.evictions += 1
+
+                self._size -= size
+
+    def _path(self, key: str) -> str:
+        """Return the path to the entry for a key.
+
+        """
+
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _walk(self) -> typing.Iterator[str]:
+        """Yield the path to every entry in the cache directory.
+
+        """
+
+        for walk_root, _walk_dirs, file_names in os.walk(self.cache_dir):
+            for file_name in file_names:
+                if not file_name.startswith('.'):
+                    yield os.path.join(walk_root, file_name)
+
+
+# Module exports.
+#
+__all__ = ('DEFAULT_MAX_BYTES', 'ResultCache', )
@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/checkpoints.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Checkpoints for Pacifica Dispatcher Example.
+
+This module defines the per-file checkpoints that are used by the event handler
+to resume the handling of a `CloudEvents`_ notification after a failure, e.g.,
+a Celery worker that was killed, rather than starting from scratch.
+
+The checkpoints are stored in a table of the same database as the rows for the
+CloudEvents notifications, via `Peewee`_, and record which files have been
+downloaded, transformed or uploaded, together with their hashes. The files
+themselves are stored in a working directory that is keyed by the "source"
+and "eventID" of the CloudEvents notification, and that is kept until the
+CloudEvents notification has been handled. The working directories and the
+checkpoints of the CloudEvents notifications that failed, and that were not
+handled again, are pruned once they are older than a maximum age, by a
+`Celery`_ task.
+
+Attributes:
+    DEFAULT_MAX_AGE (float): The default number of seconds after which the
+        working directory and the checkpoints for a CloudEvents notification
+        that were not updated are pruned.
+    DEFAULT_PRUNE_INTERVAL (float): The default number of seconds between the
+        runs of the Celery task that prunes the working directories and the
+        checkpoints.
+    DOWNLOADED (str): The stage of a file that has been downloaded.
+    STAGE_NAMES (typing.Tuple[str, ...]): The names of the stages, in order.
+    TRANSFORMED (str): The stage of a file that has been transformed.
+    UPLOADED (str): The stage of a file that has been uploaded.
+    CheckpointStore (type): The class for the store for the checkpoints.
+    EventCheckpoint (type): The class for the checkpoints for a CloudEvents
+        notification.
+    create_checkpoint_model (typing.Callable[[peewee.Database], type]):
+        Construct the Peewee model for the checkpoints.
+    install_checkpoint_pruner (typing.Callable[..., celery.Task]): Register the
+        Celery task that prunes the working directories and the checkpoints,
+        and then schedule it with Celery beat.
+
+.. _Celery:
+   http://www.celeryproject.org/
+.. _CloudEvents:
+   https://cloudevents.io/
+.. _Peewee:
+   http://peewee-orm.com/
+
+"""
+
+import datetime
+import hashlib
+import os
+import shutil
+import tempfile
+import typing
+
+import celery
+import peewee
+from cloudevents.model import Event
+
+from pacifica.dispatcher.models import File
+
+
+# The stages of a file, in order.
+#
+DOWNLOADED = 'downloaded'  # type: str
+TRANSFORMED = 'transformed'  # type: str
+UPLOADED = 'uploaded'  # type: str
+
+STAGE_NAMES = (DOWNLOADED, TRANSFORMED, UPLOADED, )  # type: typing.Tuple[str, ...]
+
+# The default number of seconds after which the working directory and the
+# checkpoints for a CloudEvents notification that were not updated are pruned,
+# which must be longer than the handling of any CloudEvents notification.
+#
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60.0  # type: float
+
+# The default number of seconds between the runs of the Celery task that prunes
+# the working directories and the checkpoints.
+#
+DEFAULT_PRUNE_INTERVAL = 60 * 60.0  # type: float
+
+# The hash function for the files that are written by the transform.
+#
+_HASHTYPE = 'sha1'  # type: str
+
+# The number of bytes that are read from a file per iteration of the hash.
+#
+_HASH_CHUNK_SIZE = 1024 * 1024  # type: int
+
+# The name of the subdirectory of the working directory for the files that
+# will be uploaded.
+#
+_UPLOAD_DIR_NAME = 'upload'  # type: str
+
+
+def _workdir_name(source: typing.Optional[str], event_id: str) -> str:
+    """Return the name of the working directory for a CloudEvents notification,
+    relative to the directory for the working directories, which is the hash of
+    its "source" and "eventID", so that it is a valid file name for any
+    "source" and "eventID".
+
+    """
+
+    return hashlib.sha256('{0}\0{1}'.format(source or '', event_id).encode('utf-8')).hexdigest()
+
+
+def _last_modified(path: str) -> float:
+    """Return the time of the last modification of a directory or of any of
+    its entries, e.g., the directories for each attempt.
+
+    """
+
+    mtimes = [os.stat(path).st_mtime]  # type: typing.List[float]
+
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                mtimes.append(entry.stat(follow_symlinks=False).st_mtime)
+            except FileNotFoundError:
+                pass
+
+    return max(mtimes)
+
+
+def _hash_file(path: str, hashtype: str) -> str:
+    """Return the hash of a file.
+
+    """
+
+    digest = hashlib.new(hashtype)
+
+    with open(path, mode='rb') as file:
+        for chunk in iter(lambda: file.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _matches(path: str, hashtype: typing.Optional[str], hashsum: typing.Optional[str]) -> bool:
+    """Return whether or not a file exists and, if a hash is given, whether or
+    not its hash is the same.
+
+    """
+
+    if not os.path.isfile(path):
+        return False
+
+    if not (hashtype and hashsum):
+        return True
+
+    try:
+        return _hash_file(path, hashtype) == hashsum.lower()
+    except ValueError:
+        # The hash function is not supported.
+        #
+        return True
+
+
+def create_checkpoint_model(database: peewee.Database) -> type:
+    """Construct the Peewee model for the checkpoints.
+
+    Args:
+        database (peewee.Database): The database, which may be a
+            ``peewee.DatabaseProxy``.
+
+    Returns:
+        type: The class for the Peewee model.
+
+    """
+
+    class FileCheckpointModel(peewee.Model):
+        """The checkpoint for a file of a CloudEvents notification.
+
+        Attributes:
+            source (str): The "source" of the CloudEvents notification.
+            event_id (str): The "eventID" of the CloudEvents notification.
+            path (str): The relative path to the file.
+            stage (str): The last stage that the file completed.
+            hashtype (str): The hash function for the hash of the file.
+            hashsum (str): The hash of the file after the stage.
+            location (str): The path to the downloaded file, relative to the
+                working directory.
+            updated (datetime.datetime): When the checkpoint was updated.
+
+        """
+
+        source = peewee.CharField(null=True)
+        event_id = peewee.CharField()
+        path = peewee.CharField()
+        stage = peewee.CharField()
+        hashtype = peewee.CharField(null=True)
+        hashsum = peewee.CharField(null=True)
+        location = peewee.CharField(null=True)
+        updated = peewee.DateTimeField(default=datetime.datetime.now)
+
+        # pylint: disable=too-few-public-methods
+        class Meta:
+            """Meta class connecting the database."""
+
+            database = None
+            table_name = 'file_checkpoint'
+            indexes = (
+                (('event_id', 'source', 'path', ), True),
+            )
+        # pylint: enable=too-few-public-methods
+
+    FileCheckpointModel._meta.set_database(database)  # pylint: disable=protected-access
+
+    return FileCheckpointModel
+
+
+class CheckpointStore:
+    """A store for the checkpoints for the files of each CloudEvents
+    notification, and for their working directories.
+
+    Attributes:
+        checkpoint_dir (str): The name of the directory for the working
+            directories.
+        database (peewee.Database): The database, which is a
+            ``peewee.DatabaseProxy`` until it is bound.
+        model (type): The class for the Peewee model for the checkpoints.
+
+    """
+
+    def __init__(self, checkpoint_dir: str, database: typing.Optional[peewee.Database] = None) -> None:
+        """Initialize this store.
+
+        Args:
+            checkpoint_dir (str): The name of the directory for the working
+                directories, which is created if it does not exist.
+            database (typing.Optional[peewee.Database]): The database, or
+                ``None`` to bind it later, e.g., when it is constructed.
+
+        """
+
+        super(CheckpointStore, self).__init__()
+
+        self.checkpoint_dir = checkpoint_dir  # type: str
+        self.database = database if database is not None else peewee.DatabaseProxy()  # type: peewee.Database
+        self.model = create_checkpoint_model(self.database)  # type: type
+
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+        if database is not None:
+            self.create_table()
+
+    def bind(self, database: peewee.Database) -> None:
+        """Bind this store to a database, and then create its table.
+
+        Args:
+            database (peewee.Database): The database.
+
+        Raises:
+            ValueError: If this store is already bound to a database.
+
+        """
+
+        if not isinstance(self.database, peewee.DatabaseProxy) or (self.database.obj is not None):
+            raise ValueError('checkpoint store is already bound to a database')
+
+        self.database.initialize(database)
+        self.create_table()
+
+    def create_table(self) -> None:
+        """Create the table for the checkpoints, if it does not exist.
+
+        """
+
+        with self.database.connection_context():
+            self.model.create_table(safe=True)
+
+    def open(self, event: Event) -> 'EventCheckpoint':
+        """Return the checkpoints for a CloudEvents notification, creating its
+        working directory if it does not exist.
+
+        Args:
+            event (cloudevents.model.Event): The CloudEvents notification.
+
+        Returns:
+            EventCheckpoint: The checkpoints.
+
+        """
+
+        return EventCheckpoint(self, event.source, str(event.event_id))
+
+    def prune(self, max_age: float = DEFAULT_MAX_AGE) -> int:
+        """Delete the working directories and the checkpoints of the
+        CloudEvents notifications that were not updated within a maximum age,
+        e.g., because their Celery tasks failed and were never run again.
+
+        The checkpoints of a CloudEvents notification are deleted if none of
+        them were updated within the maximum age. A working directory is deleted
+        if it has no such checkpoints, and neither it nor any of its entries
+        were modified within the maximum age, e.g., because its Celery task
+        failed before any file was downloaded.
+
+        Args:
+            max_age (float): The maximum age in seconds.
+
+        Returns:
+            int: The number of working directories that were deleted.
+
+        Raises:
+            ValueError: If the maximum age is not positive.
+
+        """
+
+        if max_age <= 0:
+            raise ValueError('max_age must be positive')
+
+        model = self.model  # type: type
+
+        deadline = datetime.datetime.now() - datetime.timedelta(seconds=max_age)  # type: datetime.datetime
+
+        with self.database.connection_context():
+            keys = list(model.select(model.source, model.event_id, peewee.fn.MAX(model.updated).python_value(model.updated.python_value).alias('last_updated')).group_by(model.source, model.event_id).tuples())  # type: typing.List[typing.Tuple[typing.Optional[str], str, typing.Any]]
+
+            # The checkpoints are deleted one CloudEvents notification at a
+            # time, unless one of them was updated since they were selected.
+            #
+            for (source, event_id, last_updated) in keys:
+                if last_updated < deadline:
+                    model.delete().where((model.event_id == event_id) & (model.source.is_null() if source is None else (model.source == source)) & (model.updated < deadline)).execute()
+
+        active_names = {_workdir_name(source, event_id) for (source, event_id, last_updated) in keys if last_updated >= deadline}  # type: typing.Set[str]
+
+        count = 0  # type: int
+
+        for name in os.listdir(self.checkpoint_dir):
+            path = os.path.join(self.checkpoint_dir, name)  # type: str
+
+            if (name in active_names) or not os.path.isdir(path):
+                continue
+
+            try:
+                if _last_modified(path) >= deadline.timestamp():
+                    continue
+            except FileNotFoundError:
+                continue
+
+            shutil.rmtree(path, ignore_errors=True)
+
+            count += 1
+
+        return count
+
+
+class EventCheckpoint:
+    """The checkpoints for the files of a CloudEvents notification, and its
+    working directory.
+
+    The checkpoints are written as soon as each file completes each stage, so
+    that they survive a failure in the middle of a stage.
+
+    Attributes:
+        store (CheckpointStore): The store.
+        source (typing.Optional[str]): The "source" of the CloudEvents
+            notification.
+        event_id (str): The "eventID" of the CloudEvents notification.
+        workdir (str): The name of the working directory.
+        upload_dir (str): The name of the directory for the files that will be
+            uploaded.
+
+    """
+
+    def __init__(self, store: CheckpointStore, source: typing.Optional[str], event_id: str) -> None:
+        """Initialize these checkpoints, and then load them.
+
+        Args:
+            store (CheckpointStore): The store.
+            source (typing.Optional[str]): The "source" of the CloudEvents
+                notification.
+            event_id (str): The "eventID" of the CloudEvents notification.
+
+        """
+
+        super(EventCheckpoint, self).__init__()
+
+        self.store = store  # type: CheckpointStore
+        self.source = source  # type: typing.Optional[str]
+        self.event_id = event_id  # type: str
+
+        self.workdir = os.path.join(store.checkpoint_dir, _workdir_name(source, event_id))  # type: str
+        self.upload_dir = os.path.join(self.workdir, _UPLOAD_DIR_NAME)  # type: str
+
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+        model = store.model  # type: type
+
+        with store.database.connection_context():
+            self._rows = {inst.path: inst for inst in model.select().where(self._where())}  # type: typing.Dict[str, typing.Any]
+
+    def _where(self) -> peewee.Expression:
+        """Return the expression for the rows for the CloudEvents notification.
+
+        """
+
+        model = self.store.model  # type: type
+
+        return (model.event_id == self.event_id) & (model.source.is_null() if self.source is None else (model.source == self.source))
+
+    def new_download_dir(self) -> str:
+        """Create a new directory for the files that will be downloaded by this
+        attempt, so that a partial download by an earlier attempt is never
+        overwritten or mistaken for a complete one.
+
+        Returns:
+            str: The name of the directory.
+
+        """
+
+        return tempfile.mkdtemp(prefix='download-', dir=self.workdir)
+
+    def stage(self, file_inst: File) -> typing.Optional[str]:
+        """Return the last stage that a file completed, or ``None``.
+
+        """
+
+        inst = self._rows.get(file_inst.path, None)
+
+        return inst.stage if inst is not None else None
+
+    def is_transformed(self, file_inst: File) -> bool:
+        """Return whether or not a file has been transformed, and the file that
+        was written by the transform is intact.
+
+        """
+
+        inst = self._rows.get(file_inst.path, None)
+
+        return (inst is not None) and (inst.stage == TRANSFORMED) and _matches(os.path.join(self.upload_dir, file_inst.path), inst.hashtype, inst.hashsum)
+
+    def downloaded_path(self, file_inst: File) -> typing.Optional[str]:
+        """Return the path to the file that was downloaded by an earlier
+        attempt, if it is intact, or ``None``.
+
+        The downloaded file is intact if its hash is the same as the hash in the
+        metadata description for the Pacifica file.
+
+        """
+
+        inst = self._rows.get(file_inst.path, None)
+
+        if (inst is None) or (inst.location is None) or (inst.stage == UPLOADED):
+            return None
+
+        path = os.path.join(self.workdir, inst.location)  # type: str
+
+        if not _matches(path, file_inst.hashtype, file_inst.hashsum):
+            return None
+
+        return path
+
+    def _save(self, file_inst: File, stage: str, hashtype: typing.Optional[str], hashsum: typing.Optional[str], location: typing.Optional[str]) -> None:
+        """Insert or replace the checkpoint for a file.
+
+        """
+
+        model = self.store.model  # type: type
+
+        with self.store.database.connection_context():
+            with self.store.database.atomic():
+                model.delete().where(self._where() & (model.path == file_inst.path)).execute()
+
+                inst = model.create(source=self.source, event_id=self.event_id, path=file_inst.path, stage=stage, hashtype=hashtype, hashsum=hashsum, location=location)
+
+        self._rows[file_inst.path] = inst
+
+    def mark_downloaded(self, file_inst: File, path: str) -> None:
+        """Record that a file has been downloaded.
+
+        Args:
+            file_inst (pacifica.dispatcher.models.File): The metadata
+                description for the Pacifica file.
+            path (str): The path to the downloaded file, which is in the
+                working directory.
+
+        """
+
+        self._save(file_inst, DOWNLOADED, file_inst.hashtype, file_inst.hashsum, os.path.relpath(os.path.abspath(path), os.path.abspath(self.workdir)))
+
+    def mark_transformed(self, file_inst: File) -> None:
+        """Record that a file has been transformed, together with the hash of
+        the file that was written by the transform.
+
+        Args:
+            file_inst (pacifica.dispatcher.models.File): The metadata
+                description for the Pacifica file.
+
+        """
+
+        inst = self._rows.get(file_inst.path, None)
+
+        self._save(file_inst, TRANSFORMED, _HASHTYPE, _hash_file(os.path.join(self.upload_dir, file_inst.path), _HASHTYPE), inst.location if inst is not None else None)
+
+    def mark_uploaded(self, file_insts: typing.List[File]) -> None:
+        """Record that a batch of files has been uploaded.
+
+        Args:
+            file_insts (typing.List[pacifica.dispatcher.models.File]): The
+                metadata descriptions for the Pacifica files.
+
+        """
+
+        for file_inst in file_insts:
+            self._save(file_inst, UPLOADED, None, None, None)
+
+    def complete(self) -> None:
+        """Delete the checkpoints and the working directory, after the
+        CloudEvents notification has been handled.
+
+        """
+
+        model = self.store.model  # type: type
+
+        with self.store.database.connection_context():
+            model.delete().where(self._where()).execute()
+
+        self._rows.clear()
+
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def install_checkpoint_pruner(celery_app: celery.Celery, store: CheckpointStore, prune_task_name: str, max_age: float = DEFAULT_MAX_AGE, interval: float = DEFAULT_PRUNE_INTERVAL) -> celery.Task:
+    """Register the Celery task that prunes the working directories and the
+    checkpoints, and then schedule it with Celery beat, e.g., "celery worker
+    -B".
+
+    Each scheduled Celery task expires after the interval, so that the Celery
+    tasks that were not started in time do not pile up.
+
+    Args:
+        celery_app (celery.Celery): The Celery application.
+        store (CheckpointStore): The store.
+        prune_task_name (str): The name of the Celery task.
+        max_age (float): The maximum age in seconds.
+        interval (float): The number of seconds between the runs.
+
+    Returns:
+        celery.Task: The Celery task.
+
+    Raises:
+        ValueError: If the maximum age or the interval is not positive.
+
+    """
+
+    if max_age <= 0:
+        raise ValueError('max_age must be positive')
+
+    if interval <= 0:
+        raise ValueError('interval must be positive')
+
+    # The Celery task is not shared with other Celery applications, because it
+    # is bound to the store.
+    #
+    @celery_app.task(ignore_result=True, name=prune_task_name, shared=False)
+    def prune_task() -> int:
+        """Prune the working directories and the checkpoints, and then return
+        the number of working directories that were deleted.
+
+        """
+
+        return store.prune(max_age)
+
+    celery_app.conf.beat_schedule = dict(celery_app.conf.beat_schedule or {}, **{
+        prune_task_name: {
+            'task': prune_task_name,
+            'schedule': interval,
+            'options': {'expires': interval},
+        },
+    })
+
+    return prune_task
+
+
+# Module exports.
+#
+__all__ = ('DEFAULT_MAX_AGE', 'DEFAULT_PRUNE_INTERVAL', 'DOWNLOADED', 'STAGE_NAMES', 'TRANSFORMED', 'UPLOADED', 'CheckpointStore', 'EventCheckpoint', 'create_checkpoint_model', 'install_checkpoint_pruner', )
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/database.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Database for Pacifica Dispatcher Example.
+
+This module defines the functions that connect to the database via `Peewee`_,
+and that open and close the connection for each `CherryPy`_ request and each
+`Celery`_ task.
+
+Attributes:
+    DEFAULT_BUSY_TIMEOUT (int): The default number of milliseconds that SQLite
+        waits for a lock.
+    connect (typing.Callable[..., peewee.Database]): Connect to the database
+        using a URL connection string.
+    install_celery_hooks (typing.Callable[[celery.Celery, peewee.Database], None]):
+        Open and close the connection to the database for each Celery task.
+    install_cherrypy_hooks (typing.Callable[[cherrypy.Application, peewee.Database], None]):
+        Open and close the connection to the database for each CherryPy
+        request.
+    sqlite_pragmas (typing.Callable[[int], typing.List[typing.Tuple[str, typing.Any]]]):
+        Return the pragmas for concurrent access to a SQLite database.
+
+.. _Celery:
+   http://www.celeryproject.org/
+.. _CherryPy:
+   https://cherrypy.org/
+.. _Peewee:
+   http://peewee-orm.com/
+
+"""
+
+import functools
+import threading
+import typing
+import urllib.parse
+
+import celery
+import celery.signals
+import cherrypy
+import peewee
+import playhouse.db_url
+
+
+# The default number of milliseconds that SQLite waits for a lock that is held
+# by another connection before raising "database is locked".
+#
+DEFAULT_BUSY_TIMEOUT = 30000  # type: int
+
+
+def sqlite_pragmas(busy_timeout: int = DEFAULT_BUSY_TIMEOUT) -> typing.List[typing.Tuple[str, typing.Any]]:
+    """Return the pragmas for concurrent access to a SQLite database.
+
+    The write-ahead log lets readers proceed while a writer holds the lock,
+    "synchronous=NORMAL" is durable in WAL mode except against power loss, and
+    the busy timeout makes writers wait for the lock rather than fail.
+
+    Args:
+        busy_timeout (int): The number of milliseconds to wait for a lock.
+
+    Returns:
+        typing.List[typing.Tuple[str, typing.Any]]: The pragmas.
+
+    """
+
+    return [
+        ('journal_mode', 'wal'),
+        ('synchronous', 'normal'),
+        ('busy_timeout', busy_timeout),
+    ]
+
+
+def connect(url: str, max_connections: typing.Optional[int] = None, stale_timeout: typing.Optional[int] = None, wait_timeout: typing.Optional[int] = None, busy_timeout: int = DEFAULT_BUSY_TIMEOUT) -> peewee.Database:
+    """Connect to the database using a URL connection string.
+
+    The pooled URL schemes of ``playhouse.db_url``, e.g., "mysql+pool" and
+    "sqlite+pool", are honored, where the maximum number of connections, the
+    stale timeout and the wait timeout override the parameters in the URL
+    connection string, if specified. For SQLite, the pragmas for concurrent access are applied to
+    every connection.
+
+    Args:
+        url (str): The URL connection string.
+        max_connections (typing.Optional[int]): The maximum number of pooled
+            connections, or ``None`` for the default.
+        stale_timeout (typing.Optional[int]): The number of seconds after which
+            a pooled connection is recycled, or ``None`` for the default.
+        wait_timeout (typing.Optional[int]): The number of seconds to wait for
+            a pooled connection when every connection is in use, where ``0``
+            means forever, or ``None`` for the default, which is not to wait.
+        busy_timeout (int): The number of milliseconds that SQLite waits for a
+            lock.
+
+    Returns:
+        peewee.Database: The database.
+
+    """
+
+    scheme = urllib.parse.urlparse(url).scheme  # type: str
+
+    connect_params = {}  # type: typing.Dict[str, typing.Any]
+
+    if scheme.endswith('+pool'):
+        if max_connections is not None:
+            connect_params['max_connections'] = max_connections
+
+        if stale_timeout is not None:
+            connect_params['stale_timeout'] = stale_timeout
+
+        if wait_timeout is not None:
+            connect_params['timeout'] = wait_timeout
+
+        if scheme.startswith('sqlite'):
+            # A pooled connection is returned to the pool by one thread and
+            # then reused by another.
+            #
+            connect_params['check_same_thread'] = False
+
+    if scheme.startswith('sqlite'):
+        connect_params['pragmas'] = sqlite_pragmas(busy_timeout=busy_timeout)
+
+    return playhouse.db_url.connect(url, **connect_params)
+
+
+# The stack of connection contexts that are entered by the hooks, for each
+# database, in the current thread.
+#
+_local = threading.local()  # type: threading.local
+
+
+def _open(database: peewee.Database) -> None:
+    """Enter a connection context for the database in the current thread.
+
+    While the connection context is entered, the connection is kept open by
+    any nested connection contexts, e.g., those of the Celery task, rather than
+    being opened and closed by each one.
+
+    """
+
+    context = database.connection_context()  # type: peewee.ConnectionContext
+    context.__enter__()
+
+    _local.__dict__.setdefault(id(database), []).append(context)
+
+
+def _close(database: peewee.Database) -> None:
+    """Exit the connection context for the database in the current thread, if
+    any, which closes the connection or returns it to the pool.
+
+    """
+
+    contexts = _local.__dict__.get(id(database), [])  # type: typing.List[peewee.ConnectionContext]
+
+    if not contexts:
+        return
+
+    context = contexts.pop()  # type: peewee.ConnectionContext
+
+    if database._state.ctx:  # pylint: disable=protected-access
+        context.__exit__(None, None, None)
+    elif not database.is_closed():
+        # The connection was closed, and then reopened, by another caller,
+        # e.g., the endpoints of the upstream CherryPy application, which
+        # discards the connection context.
+        #
+        database.close()
+
+
+def install_cherrypy_hooks(application: cherrypy.Application, database: peewee.Database) -> None:
+    """Open and close the connection to the database for each CherryPy request.
+
+    The connection is opened when the request starts, and closed when the
+    request ends, regardless of whether or not the request succeeded.
+
+    Args:
+        application (cherrypy.Application): The CherryPy application.
+        database (peewee.Database): The database.
+
+    """
+
+    application.merge({
+        '/': {
+            'hooks.on_start_resource': functools.partial(_open, database),
+            'hooks.on_end_request': functools.partial(_close, database),
+        },
+    })
+
+
+def install_celery_hooks(celery_app: celery.Celery, database: peewee.Database) -> None:
+    """Open and close the connection to the database for each Celery task.
+
+    The connection is opened before each task of the Celery application runs,
+    and closed after it returns, regardless of whether or not the task
+    succeeded. The connection that is inherited by each child process of the
+    worker is discarded without being closed, because it is shared with the
+    parent process.
+
+    Args:
+        celery_app (celery.Celery): The Celery application.
+        database (peewee.Database): The database.
+
+    """
+
+    def on_task_prerun(sender: celery.Task = None, **_kwargs) -> None:
+        """Open the connection before the task runs."""
+        if (sender is not None) and (sender.app is celery_app):
+            _open(database)
+
+    def on_task_postrun(sender: celery.Task = None, **_kwargs) -> None:
+        """Close the connection after the task returns."""
+        if (sender is not None) and (sender.app is celery_app):
+            _close(database)
+
+    def on_worker_process_init(**_kwargs) -> None:
+        """Discard the connection that is inherited from the parent process."""
+        database._state.reset()  # pylint: disable=protected-access
+        _local.__dict__.pop(id(database), None)
+
+    celery.signals.task_prerun.connect(on_task_prerun, weak=False)
+    celery.signals.task_postrun.connect(on_task_postrun, weak=False)
+    celery.signals.worker_process_init.connect(on_worker_process_init, weak=False)
+
+
+# Module exports.
+#
+__all__ = ('DEFAULT_BUSY_TIMEOUT', 'connect', 'install_celery_hooks', 'install_cherrypy_hooks', 'sqlite_pragmas', )
@@ -16,8 +16,14 @@ Attributes:
 
 """
 
+import concurrent.futures
+import contextlib
+import functools
 import os
 import tempfile
+import threading
+import time
+import typing
 
 from cloudevents.model import Event
 
@@ -26,30 +32,186 @@ from pacifica.dispatcher.event_handlers import EventHandler
 from pacifica.dispatcher.models import File, Transaction, TransactionKeyValue
 from pacifica.dispatcher.uploader_runners import UploaderRunner
 
+from .batching import DEFAULT_MAX_DELAY, Batcher
+from .cache import ResultCache
+from .checkpoints import DOWNLOADED, TRANSFORMED, UPLOADED, CheckpointStore, EventCheckpoint
+from .executors import EXECUTOR_NAMES, PROCESS, SERIAL, create_executor, map_ordered
+from .ingest import record_job_id
+from .metadata import extract_metadata
+from .metrics import NULL_REGISTRY, Registry
+from .pipeline import DEFAULT_DOWNLOAD_BATCH_SIZE, DEFAULT_QUEUE_SIZE, MODE_NAMES, PHASED, PIPELINED, Pipeline, batches
+from .transforms import DEFAULT_CHUNK_SIZE, Transform, UpperTransform
+
 
 class ExampleEventHandler(EventHandler):
     """An example implementation of an event handler that reads each file and
-    then writes a copy of the file with all the cased characters converted to
-    uppercase.
+    then writes a copy of the file that is produced by a transform, by default
+    with all the cased characters converted to uppercase.
 
     Attributes:
         downloader_runner (pacifica.dispatcher.downloader_runners.DownloaderRunner): The downloader runner to use.
         uploader_runner (pacifica.dispatcher.uploader_runners.UploaderRunner): The uploader runner to use.
+        chunk_size (int): The maximum number of bytes to read from each file
+            per iteration.
+        executor (str): The name of the executor that transforms the files for
+            each CloudEvents notification, i.e., "serial", "thread" or
+            "process".
+        max_workers (typing.Optional[int]): The maximum number of workers for
+            the executor, or ``None`` for the default of the executor.
+        mode (str): The name of the mode, i.e., "phased" or "pipelined".
+        download_batch_size (int): The maximum number of files per call to the
+            downloader runner in pipelined mode.
+        upload_batch_size (typing.Optional[int]): The number of files per call
+            to the uploader runner in pipelined mode, or ``None`` to upload
+            every file for a CloudEvents notification at once.
+        queue_size (int): The maximum number of batches in each queue between
+            two stages in pipelined mode.
+        cache (typing.Optional[pacifica.dispatcher_example.cache.ResultCache]):
+            The cache for the files that are written by the transform, or
+            ``None`` to disable caching.
+        metrics (pacifica.dispatcher_example.metrics.Registry): The registry
+            for the metrics, or the null registry to disable metrics.
+        staging_dir (typing.Optional[str]): The name of the directory for the
+            temporary directories for each CloudEvents notification, e.g., on
+            a tmpfs or a fast local disk, or ``None`` for the default temporary
+            directory.
+        checkpoints (typing.Optional[pacifica.dispatcher_example.checkpoints.CheckpointStore]):
+            The store for the per-file checkpoints and the working directory
+            for each CloudEvents notification, or ``None`` to use temporary
+            directories that are discarded if handling fails.
+        transform (pacifica.dispatcher_example.transforms.Transform): The
+            transform that is applied to the content of each file.
+        batch_events (typing.Optional[int]): The maximum number of CloudEvents
+            notifications whose files are uploaded together, or ``None`` to
+            upload the files for each CloudEvents notification on their own.
+        batch_delay (float): The maximum number of seconds that the files for
+            a CloudEvents notification wait for those of other CloudEvents
+            notifications before they are uploaded.
+        wait_for_ingest (bool): Whether or not each upload waits for its ingest
+            job to reach a terminal state. Otherwise, the ID for the ingest job
+            is recorded for the poller, and the upload returns after the ingest
+            job is submitted.
 
     """
 
-    def __init__(self, downloader_runner: DownloaderRunner, uploader_runner: UploaderRunner) -> None:
+    # pylint: disable=too-many-arguments
+    def __init__(self, downloader_runner: DownloaderRunner, uploader_runner: UploaderRunner, chunk_size: int = DEFAULT_CHUNK_SIZE, executor: str = SERIAL, max_workers: typing.Optional[int] = None, mode: str = PHASED, download_batch_size: int = DEFAULT_DOWNLOAD_BATCH_SIZE, upload_batch_size: typing.Optional[int] = None, queue_size: int = DEFAULT_QUEUE_SIZE, cache: typing.Optional[ResultCache] = None, metrics: Registry = NULL_REGISTRY, staging_dir: typing.Optional[str] = None, checkpoints: typing.Optional[CheckpointStore] = None, transform: typing.Optional[Transform] = None, batch_events: typing.Optional[int] = None, batch_delay: float = DEFAULT_MAX_DELAY, wait_for_ingest: bool = True) -> None:
         """Initialize this event handler.
 
         Args:
             downloader_runner (pacifica.dispatcher.downloader_runners.DownloaderRunner): The downloader runner to use.
             uploader_runner (pacifica.dispatcher.uploader_runners.UploaderRunner): The uploader runner to use.
+            chunk_size (int): The maximum number of bytes to read from each
+                file per iteration.
+            executor (str): The name of the executor that transforms the files
+                for each CloudEvents notification.
+            max_workers (typing.Optional[int]): The maximum number of workers
+                for the executor.
+            mode (str): The name of the mode.
+            download_batch_size (int): The maximum number of files per call to
+                the downloader runner in pipelined mode.
+            upload_batch_size (typing.Optional[int]): The number of files per
+                call to the uploader runner in pipelined mode.
+            queue_size (int): The maximum number of batches in each queue
+                between two stages in pipelined mode.
+            cache (typing.Optional[pacifica.dispatcher_example.cache.ResultCache]):
+                The cache for the files that are written by the transform.
+            metrics (pacifica.dispatcher_example.metrics.Registry): The
+                registry for the metrics.
+            staging_dir (typing.Optional[str]): The name of the directory for
+                the temporary directories for each CloudEvents notification.
+            checkpoints (typing.Optional[pacifica.dispatcher_example.checkpoints.CheckpointStore]):
+                The store for the per-file checkpoints.
+            transform (typing.Optional[pacifica.dispatcher_example.transforms.Transform]):
+                The transform, or ``None`` for the ``upper`` transform.
+            batch_events (typing.Optional[int]): The maximum number of
+                CloudEvents notifications whose files are uploaded together.
+            batch_delay (float): The maximum number of seconds that the files
+                for a CloudEvents notification wait for those of other
+                CloudEvents notifications.
+            wait_for_ingest (bool): Whether or not each upload waits for its
+                ingest job to reach a terminal state.
+
+        Raises:
+            ValueError: If the chunk size, batch sizes or queue size are not
+                positive, if the batch delay is negative, or if the name of the
+                executor or mode is unknown.
 
         """
 
         super(ExampleEventHandler, self).__init__()
+
+        if chunk_size <= 0:
+            raise ValueError('chunk_size must be positive')
+
+        if executor not in EXECUTOR_NAMES:
+            raise ValueError('executor must be one of {0}'.format(', '.join(EXECUTOR_NAMES)))
+
+        if mode not in MODE_NAMES:
+            raise ValueError('mode must be one of {0}'.format(', '.join(MODE_NAMES)))
+
+        if download_batch_size <= 0:
+            raise ValueError('download_batch_size must be positive')
+
+        if (upload_batch_size is not None) and (upload_batch_size <= 0):
+            raise ValueError('upload_batch_size must be positive')
+
+        if queue_size <= 0:
+            raise ValueError('queue_size must be positive')
+
+        if (batch_events is not None) and (batch_events <= 0):
+            raise ValueError('batch_events must be positive')
+
+        if batch_delay < 0:
+            raise ValueError('batch_delay must be non-negative')
+
         self.downloader_runner = downloader_runner
         self.uploader_runner = uploader_runner
+        self.chunk_size = chunk_size
+        self.executor = executor
+        self.max_workers = max_workers
+        self.mode = mode
+        self.download_batch_size = download_batch_size
+        self.upload_batch_size = upload_batch_size
+        self.queue_size = queue_size
+        self.cache = cache
+        self.metrics = metrics
+        self.staging_dir = staging_dir
+        self.checkpoints = checkpoints
+        self.transform = transform if transform is not None else UpperTransform()
+        self.batch_events = batch_events
+        self.batch_delay = batch_delay
+        self.wait_for_ingest = wait_for_ingest
+
+        # The batcher for the uploads of concurrent CloudEvents notifications,
+        # if batching is enabled.
+        #
+        self._batcher = Batcher(self._upload_events, max_items=batch_events, max_delay=batch_delay) if batch_events is not None else None  # type: typing.Optional[pacifica.dispatcher_example.batching.Batcher]
+
+        # The pool of threads or processes that transforms the files, which is
+        # constructed on first use, i.e., in the process that handles the
+        # CloudEvents notifications, and is then shared by every CloudEvents
+        # notification, rather than constructed for each.
+        #
+        self._executor = None  # type: typing.Optional[concurrent.futures.Executor]
+        self._executor_lock = threading.Lock()  # type: threading.Lock
+
+        if staging_dir is not None:
+            os.makedirs(staging_dir, exist_ok=True)
+
+        self._events_total = metrics.counter('dispatcher_example_events_total', 'The number of CloudEvents notifications that were handled.')  # type: pacifica.dispatcher_example.metrics.Counter
+        self._event_files = metrics.histogram('dispatcher_example_event_files', 'The number of files per CloudEvents notification.', buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 10000, ))  # type: pacifica.dispatcher_example.metrics.Histogram
+        self._stage_seconds = metrics.histogram('dispatcher_example_stage_seconds', 'The duration of each stage of handling a CloudEvents notification.', labelnames=('stage', ))  # type: pacifica.dispatcher_example.metrics.Histogram
+        self._file_transform_seconds = metrics.histogram('dispatcher_example_file_transform_seconds', 'The duration of the transform of each file.')  # type: pacifica.dispatcher_example.metrics.Histogram
+        self._transform_bytes_total = metrics.counter('dispatcher_example_transform_bytes_total', 'The number of bytes of the files that were transformed, according to their metadata descriptions.')  # type: pacifica.dispatcher_example.metrics.Counter
+        self._transform_read_bytes_total = metrics.counter('dispatcher_example_transform_read_bytes_total', 'The number of bytes that were read by the transform.')  # type: pacifica.dispatcher_example.metrics.Counter
+        self._events_per_upload = metrics.histogram('dispatcher_example_upload_events', 'The number of CloudEvents notifications whose files were uploaded by each call to the uploader runner.', buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, ))  # type: pacifica.dispatcher_example.metrics.Histogram
+        self._checkpoint_files_total = metrics.counter('dispatcher_example_checkpoint_files_total', 'The number of files that were resumed from a checkpoint, by the stage that they had completed.', labelnames=('stage', ))  # type: pacifica.dispatcher_example.metrics.Counter
+
+        if cache is not None:
+            for (key, metric_type) in [('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'), ('bytes', 'gauge')]:
+                metrics.register_callback('dispatcher_example_cache_{0}{1}'.format(key, '_total' if metric_type == 'counter' else ''), 'The number of {0} of the cache.'.format(key), functools.partial(_cache_stat, cache, key), metric_type=metric_type)
+    # pylint: enable=too-many-arguments
 
     def handle(self, event: Event) -> None:
         """Handle a CloudEvents notification.
@@ -62,86 +224,763 @@ class ExampleEventHandler(EventHandler):
 
         # Extract the metadata descriptions for the Pacifica transaction,
         # transaction key-values and files from the payload of the CloudEvents
-        # notification.
+        # notification, in a single pass.
+        #
+        # If the CloudEvents notification was matched by the indexed router,
+        # then the metadata descriptions that it extracted are reused.
+        #
+        metadata = extract_metadata(event.data)  # type: pacifica.dispatcher_example.metadata.EventMetadata
+
+        transaction_inst = metadata.transaction  # type: pacifica.dispatcher.models.Transaction
+        transaction_key_value_insts = metadata.transaction_key_values  # type: typing.List[pacifica.dispatcher.models.TransactionKeyValue]
+        file_insts = list(metadata.files)  # type: typing.List[pacifica.dispatcher.models.File]
+
+        self._events_total.inc()
+        self._event_files.observe(len(file_insts))
+
+        # Load the checkpoints for the CloudEvents notification, if any, so that
+        # the files that were downloaded, transformed or uploaded by an earlier
+        # attempt are not processed again.
         #
-        transaction_inst = Transaction.from_cloudevents_model(event)  # type: pacifica.dispatcher.models.Transaction
-        transaction_key_value_insts = TransactionKeyValue.from_cloudevents_model(event)  # type: typing.List[pacifica.dispatcher.models.TransactionKeyValue]
-        file_insts = File.from_cloudevents_model(event)  # type: typing.List[pacifica.dispatcher.models.File]
+        checkpoint = self.checkpoints.open(event) if self.checkpoints is not None else None  # type: typing.Optional[EventCheckpoint]
 
-        # Create a temporary directory for the files that will be downloaded by
-        # the downloader runner.
+        # Create the directories for the files that will be downloaded by the
+        # downloader runner, and for the files that will be uploaded by the
+        # uploader runner.
         #
-        with tempfile.TemporaryDirectory() as downloader_tempdir_name:
-            # Create a temporary directory for the files that will be uploaded
-            # by the uploader runner.
+        # If checkpointing is enabled, then the directories are in the working
+        # directory for the CloudEvents notification, which is kept if handling
+        # fails. Otherwise, they are temporary directories.
+        #
+        with self._stage_seconds.time(stage='handle'), self._workdirs(checkpoint) as (downloader_tempdir_name, uploader_tempdir_name):
+            # Skip the files that were uploaded by an earlier attempt, and keep
+            # the files that were transformed by an earlier attempt, so that
+            # they are neither downloaded nor transformed.
             #
-            with tempfile.TemporaryDirectory() as uploader_tempdir_name:
+            resumed_file_insts = []  # type: typing.List[File]
+
+            if checkpoint is not None:
+                with self._stage_seconds.time(stage='resume'):
+                    (resumed_file_insts, file_insts) = self._resume_files(checkpoint, file_insts)
+
+            # Restore the files that are in the cache to the temporary
+            # directory, so that they are neither downloaded nor transformed.
+            #
+            with self._stage_seconds.time(stage='restore'):
+                (cached_file_insts, file_insts) = self._restore_files(uploader_tempdir_name, file_insts)
+
+            cached_file_insts = resumed_file_insts + cached_file_insts
+
+            # Construct (or reuse) the executor that transforms the files.
+            #
+            executor = self._get_executor()  # type: concurrent.futures.Executor
+
+            if self.mode == PIPELINED:
+                # Download, transform and upload the files in overlapping
+                # stages.
+                #
+                self._handle_pipelined(executor, downloader_tempdir_name, uploader_tempdir_name, transaction_inst, file_insts, cached_file_insts, checkpoint=checkpoint)
+            else:
                 # Download the files to the temporary directory using the
                 # downloader runner.
                 #
-                # The return value for this function call is a list of callables,
-                # where each callable delegates to the ``open`` built-in
-                # function and returns an IO object.
+                # The return value for this function call is a list of
+                # callables, where each callable delegates to the ``open``
+                # built-in function and returns an IO object.
                 #
-                # The ordering of the return value is the same as that of the
-                # list of metadata descriptions for Pacifica files.
+                # The ordering of the return value is the same as that of
+                # the list of metadata descriptions for Pacifica files.
                 #
-                file_openers = self.downloader_runner.download(downloader_tempdir_name, file_insts)  # type: typing.List[typing.Callable[[], typing.TextIO]]
+                if file_insts:
+                    with self._stage_seconds.time(stage='download'):
+                        file_openers = self._download(downloader_tempdir_name, file_insts, checkpoint=checkpoint)  # type: typing.List[typing.Callable[[], typing.TextIO]]
 
-                # Use the ``zip`` built-in function to associate the metadata
-                # descriptions for Pacifica files with the callables.
-                #
-                for file_inst, file_opener in zip(file_insts, file_openers):
-                    # Open the original file.
+                    # Transform the files using the executor.
                     #
-                    with file_opener() as file:
-                        # Open a new file in write-only mode that is to be
-                        # uploaded by the uploader runner.
-                        #
-                        # In this example, the relative path to the new file is
-                        # the same relative path to the original file.
-                        #
-                        with open(os.path.join(uploader_tempdir_name, file_inst.path), mode='w') as new_file:
-                            # Read the content of the original file and then
-                            # write a copy of the content with all the cased
-                            # characters converted to uppercase.
-                            new_file.write(file.read().upper())
-
-                # Construct the metadata description for the new Pacifica
-                # transaction.
+                    self._transform_files(executor, uploader_tempdir_name, file_insts, file_openers, checkpoint=checkpoint)
+
+                # Upload the files in the temporary directory, together
+                # with those for other CloudEvents notifications, if
+                # batching is enabled.
                 #
-                # In this example, the "submitter", "instrument" and "project"
-                # attributes from the original metadata description are reused.
+                self._upload_event(uploader_tempdir_name, transaction_inst)
+
+        # Delete the checkpoints and the working directory, now that the
+        # CloudEvents notification has been handled.
+        #
+        if checkpoint is not None:
+            with self._stage_seconds.time(stage='cleanup'):
+                checkpoint.complete()
+
+    def shutdown(self) -> None:
+        """Shut down the pool of threads or processes that transforms the
+        files, after the calls that are running return.
+
+        The pool is constructed again if another CloudEvents notification is
+        handled.
+
+        """
+
+        with self._executor_lock:
+            (executor, self._executor) = (self._executor, None)
+
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        """Return the executor that transforms the files for a CloudEvents
+        notification.
+
+        The serial executor is constructed for each CloudEvents notification,
+        because it stops calling functions after the first call fails. The pool
+        of threads or processes is constructed on first use, and is replaced if
+        it is broken, e.g., because a worker process was killed.
+
+        """
+
+        if self.executor == SERIAL:
+            return create_executor(SERIAL)
+
+        with self._executor_lock:
+            if (self._executor is not None) and getattr(self._executor, '_broken', False):
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+            if self._executor is None:
+                self._executor = create_executor(self.executor, max_workers=self.max_workers)
+
+            return self._executor
+
+    # pylint: disable=too-many-arguments
+    def _handle_pipelined(self, executor: concurrent.futures.Executor, downloader_tempdir_name: str, uploader_tempdir_name: str, transaction_inst: Transaction, file_insts: typing.List[File], cached_file_insts: typing.List[File], checkpoint: typing.Optional[EventCheckpoint] = None) -> None:
+        """Download, transform and upload the files in overlapping stages.
+
+        The files are downloaded in batches by one thread and transformed by
+        another thread, where the stages are connected by bounded queues, so
+        that each batch is transformed as soon as it is downloaded. The files
+        that have been transformed are staged for upload in the current thread.
+
+        Args:
+            executor (concurrent.futures.Executor): The executor.
+            downloader_tempdir_name (str): The name of the temporary directory
+                for the files that will be downloaded by the downloader runner.
+            uploader_tempdir_name (str): The name of the temporary directory for
+                the files that will be uploaded by the uploader runner.
+            transaction_inst (pacifica.dispatcher.models.Transaction): The
+                metadata description for the original Pacifica transaction.
+            file_insts (typing.List[pacifica.dispatcher.models.File]): The
+                metadata descriptions for the Pacifica files.
+            cached_file_insts (typing.List[pacifica.dispatcher.models.File]):
+                The metadata descriptions for the Pacifica files that have
+                already been restored from the cache.
+            checkpoint (typing.Optional[pacifica.dispatcher_example.checkpoints.EventCheckpoint]):
+                The checkpoints for the CloudEvents notification, or ``None``.
+
+        """
+
+        def download(file_insts_batch: typing.List[File]) -> typing.Tuple[typing.List[File], typing.List[typing.Callable[[], typing.TextIO]]]:
+            """Download a batch of files.
+
+            """
+
+            with self._stage_seconds.time(stage='download'):
+                return (file_insts_batch, self._download(downloader_tempdir_name, file_insts_batch, checkpoint=checkpoint))
+
+        def transform(item: typing.Tuple[typing.List[File], typing.List[typing.Callable[[], typing.TextIO]]]) -> typing.List[File]:
+            """Transform a batch of files.
+
+            """
+
+            (file_insts_batch, file_openers) = item
+
+            self._transform_files(executor, uploader_tempdir_name, file_insts_batch, file_openers, checkpoint=checkpoint)
+
+            return file_insts_batch
+
+        pipeline = Pipeline(download, transform, queue_size=self.queue_size)  # type: Pipeline
+
+        # The files that have been restored from the cache are already staged.
+        #
+        staged_file_insts = list(cached_file_insts)  # type: typing.List[File]
+
+        for file_insts_batch in pipeline.run(batches(file_insts, self.download_batch_size)):
+            staged_file_insts.extend(file_insts_batch)
+
+            # Upload the staged files in batches, while later files are still
+            # being downloaded and transformed.
+            #
+            while (self.upload_batch_size is not None) and (len(staged_file_insts) >= self.upload_batch_size):
+                self._upload_staged(uploader_tempdir_name, transaction_inst, staged_file_insts[:self.upload_batch_size], checkpoint=checkpoint)
+
+                staged_file_insts = staged_file_insts[self.upload_batch_size:]
+
+        if self.upload_batch_size is None:
+            # Upload every file in the temporary directory at once, together
+            # with those for other CloudEvents notifications, if batching is
+            # enabled.
+            #
+            self._upload_event(uploader_tempdir_name, transaction_inst)
+        elif staged_file_insts:
+            # Upload the remaining staged files.
+            #
+            self._upload_staged(uploader_tempdir_name, transaction_inst, staged_file_insts, checkpoint=checkpoint)
+    # pylint: enable=too-many-arguments
+
+    def _resume_files(self, checkpoint: EventCheckpoint, file_insts: typing.List[File]) -> typing.Tuple[typing.List[File], typing.List[File]]:
+        """Resume the files from the checkpoints of an earlier attempt.
+
+        Args:
+            checkpoint (pacifica.dispatcher_example.checkpoints.EventCheckpoint):
+                The checkpoints for the CloudEvents notification.
+            file_insts (typing.List[pacifica.dispatcher.models.File]): The
+                metadata descriptions for the Pacifica files.
+
+        Returns:
+            typing.Tuple[typing.List[pacifica.dispatcher.models.File], typing.List[pacifica.dispatcher.models.File]]:
+            The metadata descriptions for the Pacifica files that were
+            transformed, and whose transformed files are intact, and for those
+            that still need to be downloaded or transformed, in their original
+            order. The Pacifica files that were uploaded are in neither list.
+
+        """
+
+        transformed_file_insts = []  # type: typing.List[File]
+        remaining_file_insts = []  # type: typing.List[File]
+
+        for file_inst in file_insts:
+            if checkpoint.stage(file_inst) == UPLOADED:
+                self._checkpoint_files_total.inc(stage=UPLOADED)
+            elif checkpoint.is_transformed(file_inst):
+                self._checkpoint_files_total.inc(stage=TRANSFORMED)
+                transformed_file_insts.append(file_inst)
+            else:
+                remaining_file_insts.append(file_inst)
+
+        return (transformed_file_insts, remaining_file_insts)
+
+    def _download(self, downloader_tempdir_name: str, file_insts: typing.List[File], checkpoint: typing.Optional[EventCheckpoint] = None) -> typing.List[typing.Callable[[], typing.TextIO]]:
+        """Download the files using the downloader runner, except for those that
+        were downloaded by an earlier attempt, and whose downloaded files are
+        intact.
+
+        Args:
+            downloader_tempdir_name (str): The name of the temporary directory
+                for the files that will be downloaded by the downloader runner.
+            file_insts (typing.List[pacifica.dispatcher.models.File]): The
+                metadata descriptions for the Pacifica files.
+            checkpoint (typing.Optional[pacifica.dispatcher_example.checkpoints.EventCheckpoint]):
+                The checkpoints for the CloudEvents notification, or ``None``.
+
+        Returns:
+            typing.List[typing.Callable[[], typing.TextIO]]: The callables that
+            open the downloaded files, in the same order as the metadata
+            descriptions.
+
+        """
+
+        if checkpoint is None:
+            return self.downloader_runner.download(downloader_tempdir_name, file_insts)
+
+        file_openers = {}  # type: typing.Dict[str, typing.Callable[[], typing.TextIO]]
+        missed_file_insts = []  # type: typing.List[File]
+
+        for file_inst in file_insts:
+            path = checkpoint.downloaded_path(file_inst)  # type: typing.Optional[str]
+
+            if path is None:
+                missed_file_insts.append(file_inst)
+            else:
+                self._checkpoint_files_total.inc(stage=DOWNLOADED)
+                file_openers[file_inst.path] = functools.partial(open, path, mode='r', encoding=file_inst.encoding)
+
+        if missed_file_insts:
+            for (file_inst, file_opener) in zip(missed_file_insts, self.downloader_runner.download(downloader_tempdir_name, missed_file_insts)):
+                checkpoint.mark_downloaded(file_inst, _to_path(file_opener))
+                file_openers[file_inst.path] = file_opener
+
+        return [file_openers[file_inst.path] for file_inst in file_insts]
+
+    def _restore_files(self, uploader_tempdir_name: str, file_insts: typing.List[File]) -> typing.Tuple[typing.List[File], typing.List[File]]:
+        """Restore the files that are in the cache.
+
+        Args:
+            uploader_tempdir_name (str): The name of the temporary directory for
+                the files that will be uploaded by the uploader runner.
+            file_insts (typing.List[pacifica.dispatcher.models.File]): The
+                metadata descriptions for the Pacifica files.
+
+        Returns:
+            typing.Tuple[typing.List[pacifica.dispatcher.models.File], typing.List[pacifica.dispatcher.models.File]]:
+            The metadata descriptions for the Pacifica files that were restored,
+            and for those that were not, in their original order.
+
+        """
+
+        if self.cache is None:
+            return ([], file_insts)
+
+        cached_file_insts = []  # type: typing.List[File]
+        missed_file_insts = []  # type: typing.List[File]
+
+        for file_inst in file_insts:
+            if file_inst.subdir:
+                os.makedirs(os.path.join(uploader_tempdir_name, file_inst.subdir), exist_ok=True)
+
+            if self.cache.restore(file_inst, os.path.join(uploader_tempdir_name, file_inst.path)):
+                cached_file_insts.append(file_inst)
+            else:
+                missed_file_insts.append(file_inst)
+
+        return (cached_file_insts, missed_file_insts)
+
+    def _upload_staged(self, uploader_tempdir_name: str, transaction_inst: Transaction, file_insts: typing.List[File], checkpoint: typing.Optional[EventCheckpoint] = None) -> typing.Tuple[typing.Any, int, typing.Dict[str, typing.Any]]:
+        """Upload a batch of staged files as a new Pacifica transaction.
+
+        Args:
+            uploader_tempdir_name (str): The name of the temporary directory for
+                the files that will be uploaded by the uploader runner.
+            transaction_inst (pacifica.dispatcher.models.Transaction): The
+                metadata description for the original Pacifica transaction.
+            file_insts (typing.List[pacifica.dispatcher.models.File]): The
+                metadata descriptions for the Pacifica files in the batch.
+            checkpoint (typing.Optional[pacifica.dispatcher_example.checkpoints.EventCheckpoint]):
+                The checkpoints for the CloudEvents notification, in which the
+                files are recorded as uploaded, or ``None``.
+
+        Returns:
+            typing.Tuple[pacifica.uploader.bundler.Bundler, int, typing.Dict[str, typing.Any]]:
+            The uploader's bundle, the job ID for the upload, and the state of
+            the upload.
+
+        """
+
+        # Move the staged files to a temporary directory for the batch, which is
+        # on the same file system, so that no data is copied.
+        #
+        with self._tempdir(dir=uploader_tempdir_name) as batch_tempdir_name:
+            with self._stage_seconds.time(stage='stage'):
+                for file_inst in file_insts:
+                    if file_inst.subdir:
+                        os.makedirs(os.path.join(batch_tempdir_name, file_inst.subdir), exist_ok=True)
+
+                    os.replace(os.path.join(uploader_tempdir_name, file_inst.path), os.path.join(batch_tempdir_name, file_inst.path))
+
+            result = self._upload(batch_tempdir_name, transaction_inst)
+
+        if checkpoint is not None:
+            checkpoint.mark_uploaded(file_insts)
+
+        return self._submitted(result)
+
+    def _upload_event(self, uploader_tempdir_name: str, transaction_inst: Transaction) -> typing.Tuple[typing.Any, int, typing.Dict[str, typing.Any]]:
+        """Upload the files for a CloudEvents notification, either on their own
+        or, if batching is enabled, together with those for other CloudEvents
+        notifications that are handled concurrently.
+
+        Args:
+            uploader_tempdir_name (str): The name of the temporary directory for
+                the files that will be uploaded by the uploader runner.
+            transaction_inst (pacifica.dispatcher.models.Transaction): The
+                metadata description for the original Pacifica transaction.
+
+        Returns:
+            typing.Tuple[pacifica.uploader.bundler.Bundler, int, typing.Dict[str, typing.Any]]:
+            The uploader's bundle, the job ID for the upload, and the state of
+            the upload.
+
+        """
+
+        if self._batcher is None:
+            return self._submitted(self._upload(uploader_tempdir_name, transaction_inst))
+
+        return self._submitted(self._batcher.submit((uploader_tempdir_name, transaction_inst)))
+
+    def _submitted(self, result: typing.Tuple[typing.Any, int, typing.Dict[str, typing.Any]]) -> typing.Tuple[typing.Any, int, typing.Dict[str, typing.Any]]:
+        """Record the ID for the ingest job of an upload for the poller, if
+        uploads do not wait for their ingest jobs, and then return the result of
+        the upload.
+
+        The ID is recorded by the thread that handles the CloudEvents
+        notification, rather than by the thread that uploads a batch, so that
+        it is collected by the Celery task for each CloudEvents notification in
+        the batch.
+
+        """
+
+        if not self.wait_for_ingest:
+            record_job_id(result[1])
+
+        return result
+
+    def _upload_events(self, items: typing.List[typing.Tuple[str, Transaction]]) -> typing.List[typing.Any]:
+        """Upload the files for a batch of CloudEvents notifications with as few
+        calls to the uploader runner as possible.
+
+        The CloudEvents notifications whose new Pacifica transactions would have
+        the same attributes are uploaded together, as one new Pacifica
+        transaction with a "Transactions._id" key-value for each original
+        Pacifica transaction, unless the relative paths to their files collide.
+
+        Args:
+            items (typing.List[typing.Tuple[str, pacifica.dispatcher.models.Transaction]]):
+                The name of the temporary directory for the files, and the
+                metadata description for the original Pacifica transaction, for
+                each CloudEvents notification.
+
+        Returns:
+            typing.List[typing.Any]: The result of the upload, or the exception
+            that it raised, for each CloudEvents notification, in the same
+            order.
+
+        """
+
+        # Assign each CloudEvents notification to the first upload with the
+        # same attributes and no colliding relative paths.
+        #
+        uploads = []  # type: typing.List[typing.Tuple[typing.Tuple[typing.Any, ...], typing.List[int], typing.Set[str]]]
+
+        for (index, (uploader_tempdir_name, transaction_inst)) in enumerate(items):
+            key = (transaction_inst.submitter, transaction_inst.instrument, transaction_inst.project)  # type: typing.Tuple[typing.Any, ...]
+            paths = set(_relpaths(uploader_tempdir_name))  # type: typing.Set[str]
+
+            for (upload_key, indices, upload_paths) in uploads:
+                if (upload_key == key) and upload_paths.isdisjoint(paths):
+                    indices.append(index)
+                    upload_paths.update(paths)
+                    break
+            else:
+                uploads.append((key, [index], paths))
+
+        results = [None] * len(items)  # type: typing.List[typing.Any]
+
+        for (_key, indices, _paths) in uploads:
+            try:
+                # Move the files to a temporary directory for the upload, which
+                # is on the same file system, so that no data is copied.
                 #
-                new_transaction_inst = Transaction(submitter=transaction_inst.submitter, instrument=transaction_inst.instrument, project=transaction_inst.project)  # type: pacifica.dispatcher.models.Transaction
+                with self._tempdir() as batch_tempdir_name:
+                    with self._stage_seconds.time(stage='stage'):
+                        for index in indices:
+                            _move_tree(items[index][0], batch_tempdir_name)
+
+                    result = self._upload(batch_tempdir_name, *[items[index][1] for index in indices])
+            # pylint: disable=broad-except
+            except Exception as exc:
+                result = exc
+            # pylint: enable=broad-except
 
-                # Construct the metadata descriptions for the new Pacifica
-                # key-values.
+            for index in indices:
+                results[index] = result
+
+        return results
+
+    def _upload(self, basedir_name: str, *transaction_insts: Transaction) -> typing.Tuple[typing.Any, int, typing.Dict[str, typing.Any]]:
+        """Upload the files in a directory as a new Pacifica transaction.
+
+        Args:
+            basedir_name (str): The name of the directory.
+            *transaction_insts (pacifica.dispatcher.models.Transaction): The
+                metadata descriptions for the original Pacifica transactions,
+                whose "submitter", "instrument" and "project" attributes are
+                the same.
+
+        Returns:
+            typing.Tuple[pacifica.uploader.bundler.Bundler, int, typing.Dict[str, typing.Any]]:
+            The uploader's bundle, the job ID for the upload, and the state of
+            the upload.
+
+        """
+
+        transaction_inst = transaction_insts[0]  # type: pacifica.dispatcher.models.Transaction
+
+        # Construct the metadata description for the new Pacifica
+        # transaction.
+        #
+        # In this example, the "submitter", "instrument" and "project"
+        # attributes from the original metadata description are reused.
+        #
+        new_transaction_inst = Transaction(submitter=transaction_inst.submitter, instrument=transaction_inst.instrument, project=transaction_inst.project)  # type: pacifica.dispatcher.models.Transaction
+
+        # Construct the metadata descriptions for the new Pacifica
+        # key-values.
+        #
+        new_transaction_key_value_insts = [
+            # In this example, the relationship between the original and new
+            # Pacifica transactions is asserted via the "Transactions._id"
+            # key and its value, the ID for the original Pacifica
+            # transaction.
+            #
+            # This is an example of the assertion of retrospective
+            # provenance information. If the files for several CloudEvents
+            # notifications are uploaded together, then the relationship is
+            # asserted for each original Pacifica transaction.
+            #
+            TransactionKeyValue(key='Transactions._id', value=source_transaction_id)
+            for source_transaction_id in _unique(source_transaction_inst._id for source_transaction_inst in transaction_insts)  # pylint: disable=protected-access
+        ] + [
+            # In this example, a second Pacifica transaction key-value
+            # is asserted via the "example-key" and its value.
+            #
+            TransactionKeyValue(key='example-key', value='example-value'),
+        ]  # type: typing.List[pacifica.dispatcher.models.TransactionKeyValue]
+
+        self._events_per_upload.observe(len(transaction_insts))
+
+        # Upload the files in the temporary directory using the uploader
+        # runner.
+        #
+        # The return value for this function call is a tuple of the
+        # uploader's bundle, the job ID for the upload, and the state of
+        # the upload.
+        #
+        # If uploads do not wait for their ingest jobs, then the timeout is
+        # zero, so that the state of the ingest job is checked once, right
+        # after it is submitted, rather than once per second until it reaches a
+        # terminal state.
+        #
+        with self._stage_seconds.time(stage='upload'):
+            if self.wait_for_ingest:
+                return self.uploader_runner.upload(basedir_name, transaction=new_transaction_inst, transaction_key_values=new_transaction_key_value_insts)
+
+            return self.uploader_runner.upload(basedir_name, transaction=new_transaction_inst, transaction_key_values=new_transaction_key_value_insts, timeout=0)
+
+    def _transform_file(self, uploader_tempdir_name: str, file_inst: File, file_opener: typing.Callable[[], typing.TextIO]) -> int:
+        """Transform a file.
+
+        Args:
+            uploader_tempdir_name (str): The name of the temporary directory for
+                the files that will be uploaded by the uploader runner.
+            file_inst (pacifica.dispatcher.models.File): The metadata
+                description for the Pacifica file.
+            file_opener (typing.Callable[[], typing.TextIO]): The callable that
+                opens the original file.
+
+        Returns:
+            int: The number of bytes that were read from the original file.
+
+        """
+
+        # Open the original file.
+        #
+        # The callable opens the original file in text mode, so the transform
+        # reads its underlying binary file, and the content is never decoded by
+        # the text wrapper.
+        #
+        with file_opener() as file:
+            # Open a new file in write-only binary mode that is to be uploaded
+            # by the uploader runner.
+            #
+            # In this example, the relative path to the new file is the same
+            # relative path to the original file.
+            #
+            with open(os.path.join(uploader_tempdir_name, file_inst.path), mode='wb') as new_file:
+                # Read the content of the original file and then write a copy of
+                # the content that is produced by the transform.
                 #
-                new_transaction_key_value_insts = [
-                    # In this example, the relationship between the original and new
-                    # Pacifica transactions is asserted via the "Transactions._id"
-                    # key and its value, the ID for the original Pacifica
-                    # transaction.
-                    #
-                    # This is an example of the assertion of retrospective
-                    # provenance information.
-                    #
-                    TransactionKeyValue(key='Transactions._id', value=transaction_inst._id),
-                    # In this example, a second Pacifica transaction key-value
-                    # is asserted via the "example-key" and its value.
-                    #
-                    TransactionKeyValue(key='example-key', value='example-value'),
-                ]  # type: typing.List[pacifica.dispatcher.models.TransactionKeyValue]
+                # The content is streamed one chunk at a time, so that the
+                # memory usage is bounded by the chunk size rather than the size
+                # of the file.
+                #
+                return self.transform.transform_stream(file.buffer, new_file, encoding=file_inst.encoding, chunk_size=self.chunk_size)
+
+    def _transform_files(self, executor: concurrent.futures.Executor, uploader_tempdir_name: str, file_insts: typing.List[File], file_openers: typing.List[typing.Callable[[], typing.TextIO]], checkpoint: typing.Optional[EventCheckpoint] = None) -> typing.List[int]:
+        """Transform the files using the executor.
+
+        Args:
+            executor (concurrent.futures.Executor): The executor.
+            uploader_tempdir_name (str): The name of the temporary directory for
+                the files that will be uploaded by the uploader runner.
+            file_insts (typing.List[pacifica.dispatcher.models.File]): The
+                metadata descriptions for the Pacifica files.
+            file_openers (typing.List[typing.Callable[[], typing.TextIO]]): The
+                callables that open the original files, in the same order as
+                the metadata descriptions.
+            checkpoint (typing.Optional[pacifica.dispatcher_example.checkpoints.EventCheckpoint]):
+                The checkpoints for the CloudEvents notification, in which each
+                file is recorded as transformed as soon as its transform
+                succeeds, or ``None``.
+
+        Returns:
+            typing.List[int]: The number of bytes that were read from each
+            original file, in the same order as the metadata descriptions.
+
+        """
 
-                # Upload the files in the temporary directory using the uploader
-                # runner.
+        with self._stage_seconds.time(stage='transform'):
+            if self.executor != PROCESS:
+                # The metadata descriptions for Pacifica files are associated
+                # with the callables in the same way as the ``zip`` built-in
+                # function, and the results are returned in the same order.
                 #
-                # The return value for this function call is a tuple of the
-                # uploader's bundle, the job ID for the upload, and the state of
-                # the upload.
+                transform = functools.partial(self._transform_file, uploader_tempdir_name)  # type: typing.Callable[..., int]
+                args = [file_insts, file_openers]  # type: typing.List[typing.List[typing.Any]]
+            else:
+                # The callables cannot be sent to another process, so resolve
+                # the paths to the original files, which can.
+                #
+                transform = functools.partial(self.transform.transform_file, chunk_size=self.chunk_size)
+                args = [
+                    [_to_path(file_opener) for file_opener in file_openers],
+                    [os.path.join(uploader_tempdir_name, file_inst.path) for file_inst in file_insts],
+                    [file_inst.encoding for file_inst in file_insts],
+                ]
+
+            # Record each file as transformed as soon as its transform succeeds,
+            # so that a failure of a later file does not discard it.
+            #
+            callback = functools.partial(_mark_transformed, checkpoint, file_insts) if checkpoint is not None else None  # type: typing.Optional[typing.Callable[[int, typing.Any], None]]
+
+            if not self.metrics.enabled:
+                counts = map_ordered(executor, transform, *args, callback=callback)  # type: typing.List[int]
+            else:
+                # The duration of the transform of each file is measured by the
+                # worker, which may be in another process, and then observed in
+                # this process.
                 #
-                (_bundle, _job_id, _state) = self.uploader_runner.upload(uploader_tempdir_name, transaction=new_transaction_inst, transaction_key_values=new_transaction_key_value_insts)  # type: typing.Tuple[pacifica.uploader.bundler.Bundler, int, typing.Dict[str, typing.Any]]
+                (counts, elapsed) = _unzip(map_ordered(executor, functools.partial(_timed, transform), *args, callback=callback), 2)
+
+                for seconds in elapsed:
+                    self._file_transform_seconds.observe(seconds)
+
+                self._transform_read_bytes_total.inc(sum(counts))
+                self._transform_bytes_total.inc(sum(file_inst.size for file_inst in file_insts if file_inst.size))
+
+        # Store the new files in the cache.
+        #
+        if self.cache is not None:
+            for file_inst in file_insts:
+                self.cache.put(file_inst, os.path.join(uploader_tempdir_name, file_inst.path))
+
+        return counts
+
+    @contextlib.contextmanager
+    def _workdirs(self, checkpoint: typing.Optional[EventCheckpoint]) -> typing.Iterator[typing.Tuple[str, str]]:
+        """Return the directories for the files that will be downloaded by the
+        downloader runner, and for the files that will be uploaded by the
+        uploader runner.
+
+        Args:
+            checkpoint (typing.Optional[pacifica.dispatcher_example.checkpoints.EventCheckpoint]):
+                The checkpoints for the CloudEvents notification, whose working
+                directory is used, or ``None`` to use temporary directories.
+
+        Returns:
+            typing.ContextManager[typing.Tuple[str, str]]: The context manager
+            for the names of the directories.
+
+        """
+
+        if checkpoint is not None:
+            yield (checkpoint.new_download_dir(), checkpoint.upload_dir)
+        else:
+            with self._tempdir() as downloader_tempdir_name, self._tempdir() as uploader_tempdir_name:
+                yield (downloader_tempdir_name, uploader_tempdir_name)
+
+    @contextlib.contextmanager
+    def _tempdir(self, **kwargs) -> typing.Iterator[str]:
+        """Create a temporary directory, by default in the staging directory,
+        and then observe the duration of its removal as the "cleanup" stage.
+
+        Args:
+            **kwargs: The keyword arguments for the ``tempfile.TemporaryDirectory``
+                class.
+
+        Returns:
+            typing.ContextManager[str]: The context manager for the name of the
+            temporary directory.
+
+        """
+
+        kwargs.setdefault('dir', self.staging_dir)
+
+        tempdir = tempfile.TemporaryDirectory(**kwargs)  # type: tempfile.TemporaryDirectory
+
+        try:
+            yield tempdir.name
+        finally:
+            with self._stage_seconds.time(stage='cleanup'):
+                tempdir.cleanup()
+
+
+def _cache_stat(cache: ResultCache, key: str) -> int:
+    """Return a counter for a cache.
+
+    """
+
+    return cache.stats()[key]
+
+
+def _mark_transformed(checkpoint: EventCheckpoint, file_insts: typing.List[File], index: int, _result: typing.Any) -> None:
+    """Record that a file has been transformed.
+
+    """
+
+    checkpoint.mark_transformed(file_insts[index])
+
+
+def _move_tree(basedir_name: str, new_basedir_name: str) -> None:
+    """Move the files in a directory to the same relative paths in another
+    directory on the same file system.
+
+    """
+
+    for relpath in _relpaths(basedir_name):
+        new_path = os.path.join(new_basedir_name, relpath)  # type: str
+
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        os.replace(os.path.join(basedir_name, relpath), new_path)
+
+
+def _relpaths(basedir_name: str) -> typing.Iterator[str]:
+    """Return the relative path to each file in a directory.
+
+    """
+
+    for (walk_root, _walk_dirs, file_names) in os.walk(basedir_name):
+        for file_name in file_names:
+            yield os.path.relpath(os.path.join(walk_root, file_name), basedir_name)
+
+
+def _unique(values: typing.Iterable[typing.Any]) -> typing.List[typing.Any]:
+    """Return the distinct values, in the order that they first occur.
+
+    """
+
+    return list(dict.fromkeys(values))
+
+
+def _timed(func: typing.Callable[..., typing.Any], *args: typing.Any) -> typing.Tuple[typing.Any, float]:
+    """Call a callable, and then return its return value and the number of
+    seconds that it took.
+
+    """
+
+    start = time.perf_counter()  # type: float
+
+    return (func(*args), time.perf_counter() - start)
+
+
+def _unzip(items: typing.List[typing.Tuple[typing.Any, ...]], count: int) -> typing.Tuple[typing.List[typing.Any], ...]:
+    """Split a list of tuples into a tuple of lists.
+
+    """
+
+    return tuple(list(values) for values in zip(*items)) if items else tuple([] for _ in range(count))
+
+
+def _to_path(file_opener: typing.Callable[[], typing.IO]) -> str:
+    """Return the path to the file that is opened by a callable.
+
+    Args:
+        file_opener (typing.Callable[[], typing.IO]): The callable.
+
+    Returns:
+        str: The path to the file.
+
+    """
+
+    with file_opener() as file:
+        return file.name
 
 
 # Module exports.
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/executors.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Executors for Pacifica Dispatcher Example.
+
+This module defines the executors that are used by the event handler to
+transform the files for a CloudEvents notification in parallel.
+
+Attributes:
+    EXECUTOR_NAMES (typing.Tuple[str, ...]): The names of the executors.
+    PROCESS (str): The name of the executor that uses a pool of processes, for
+        CPU-bound transforms.
+    SERIAL (str): The name of the executor that transforms one file at a time
+        in the current thread.
+    SerialExecutor (type): The class for the executor that calls each function
+        immediately in the current thread.
+    THREAD (str): The name of the executor that uses a pool of threads, for
+        I/O-bound transforms.
+    create_executor (typing.Callable[[str, typing.Optional[int]], concurrent.futures.Executor]):
+        Construct an executor.
+    map_ordered (typing.Callable[..., typing.List[typing.Any]]): Apply a
+        function to every item of one or more iterables using an executor.
+
+"""
+
+import concurrent.futures
+import typing
+
+
+# The names of the executors.
+#
+PROCESS = 'process'  # type: str
+SERIAL = 'serial'  # type: str
+THREAD = 'thread'  # type: str
+
+EXECUTOR_NAMES = (SERIAL, THREAD, PROCESS, )  # type: typing.Tuple[str, ...]
+
+
+class SerialExecutor(concurrent.futures.Executor):
+    """An executor that calls each function immediately in the current thread.
+
+    After the first call to fail, the functions that are submitted are not
+    called and their futures are cancelled.
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize this executor.
+
+        """
+
+        super(SerialExecutor, self).__init__()
+        self._failed = False  # type: bool
+
+    def submit(self, fn, *args, **kwargs) -> concurrent.futures.Future:  # pylint: disable=arguments-differ
+        """Call the function and return a resolved future for its result.
+
+        Args:
+            fn (typing.Callable[..., typing.Any]): The function.
+            *args: The positional arguments for the function.
+            **kwargs: The keyword arguments for the function.
+
+        Returns:
+            concurrent.futures.Future: The resolved future.
+
+        """
+
+        future = concurrent.futures.Future()  # type: concurrent.futures.Future
+
+        if self._failed:
+            future.cancel()
+
+            return future
+
+        try:
+            result = fn(*args, **kwargs)
+        # pylint: disable=broad-except
+        except Exception as exc:
+            self._failed = True
+            future.set_exception(exc)
+        # pylint: enable=broad-except
+        else:
+            future.set_result(result)
+
+        return future
+
+
+def create_executor(name: str = SERIAL, max_workers: typing.Optional[int] = None) -> concurrent.futures.Executor:
+    """Construct an executor.
+
+    Args:
+        name (str): The name of the executor.
+        max_workers (typing.Optional[int]): The maximum number of workers for
+            a pool, or ``None`` for the default of the pool.
+
+    Returns:
+        concurrent.futures.Executor: The executor.
+
+    Raises:
+        ValueError: If the name of the executor is unknown.
+
+    """
+
+    if name == SERIAL:
+        return SerialExecutor()
+
+    if name == THREAD:
+        return concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    if name == PROCESS:
+        return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+
+    raise ValueError('executor must be one of {0}'.format(', '.join(EXECUTOR_NAMES)))
+
+
+def _succeeded(future: concurrent.futures.Future) -> bool:
+    """Return whether or not a future that is done succeeded.
+
+    """
+
+    return (not future.cancelled()) and (future.exception() is None)
+
+
+def map_ordered(executor: concurrent.futures.Executor, fn: typing.Callable[..., typing.Any], *iterables: typing.Iterable[typing.Any], callback: typing.Optional[typing.Callable[[int, typing.Any], None]] = None) -> typing.List[typing.Any]:
+    """Apply a function to every item of one or more iterables using an
+    executor.
+
+    Unlike ``concurrent.futures.Executor.map``, this function stops as soon as
+    any call fails, cancelling the calls that have not started yet, waits for
+    the calls that are still running, and then raises the exception of the
+    first call to fail. No call is running when this function returns or
+    raises, so that the caller can remove the files that the calls write.
+
+    If a callback is given, then it is called in the current thread with the
+    index of the item and the result as soon as each call succeeds, e.g., before
+    the next call for the serial executor, and before this function returns.
+
+    Args:
+        executor (concurrent.futures.Executor): The executor.
+        fn (typing.Callable[..., typing.Any]): The function.
+        *iterables (typing.Iterable[typing.Any]): The iterables of arguments.
+        callback (typing.Optional[typing.Callable[[int, typing.Any], None]]):
+            The callable that is called after each call succeeds, or ``None``.
+
+    Returns:
+        typing.List[typing.Any]: The results, in the same order as the items of
+        the iterables.
+
+    """
+
+    futures = []  # type: typing.List[concurrent.futures.Future]
+    pending = {}  # type: typing.Dict[concurrent.futures.Future, int]
+
+    for (index, args) in enumerate(zip(*iterables)):
+        future = executor.submit(fn, *args)  # type: concurrent.futures.Future
+        futures.append(future)
+
+        if callback is None:
+            continue
+
+        # The serial executor resolves the future before it returns, so that
+        # the callback is called before the next call.
+        #
+        if future.done():
+            if _succeeded(future):
+                callback(index, future.result())
+        else:
+            pending[future] = index
+
+    # Wait for every call to complete, or for the first call to fail, calling
+    # the callback for each call that succeeds.
+    #
+    if pending:
+        for future in concurrent.futures.as_completed(pending.keys()):
+            if not _succeeded(future):
+                break
+
+            callback(pending[future], future.result())
+    else:
+        concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+
+    # Cancel the calls that have not started yet, and then wait for the calls
+    # that are still running, e.g., on a pool that is shared with other
+    # notifications, so that none of them writes to a directory that the caller
+    # removes after this function raises. The calls that were cancelled never
+    # run, and are not waited for, since a future that is cancelled before it
+    # is dequeued is never done for ``concurrent.futures.wait``.
+    #
+    for future in futures:
+        if not future.done():
+            future.cancel()
+
+    concurrent.futures.wait([future for future in futures if not future.cancelled()])
+
+    # Raise the exception of the first call to fail, in the order of the items
+    # of the iterables.
+    #
+    for future in futures:
+        if future.done() and not future.cancelled() and (future.exception() is not None):
+            raise future.exception()
+
+    return [future.result() for future in futures]
+
+
+# Module exports.
+#
+__all__ = ('EXECUTOR_NAMES', 'PROCESS', 'SERIAL', 'THREAD', 'SerialExecutor', 'create_executor', 'map_ordered', )
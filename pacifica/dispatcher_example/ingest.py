@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/ingest.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Ingest jobs for Pacifica Dispatcher Example.
+
+This module defines the store for the Pacifica ingest jobs that were submitted
+by the event handler without waiting for them to be ingested, and the `Celery`_
+task that polls their states and then updates the rows for their `CloudEvents`_
+notifications.
+
+By default, the uploader runner blocks the Celery worker until the ingest job
+for each upload reaches a terminal state, checking its state once per second,
+so that a slow ingest server limits the throughput of every Celery worker. If
+the event handler does not wait, then the IDs for the ingest jobs that are
+submitted while a CloudEvents notification is handled are collected by the
+Celery task, which records them in a table of the same database as the rows for
+the CloudEvents notifications, via `Peewee`_, and then returns with the status
+"102 Ingesting". A single periodic Celery task, scheduled by Celery beat, then
+checks the state of every outstanding ingest job once per sweep, and updates
+the status of each row whose ingest jobs have all reached a terminal state.
+
+Attributes:
+    DEFAULT_POLL_INTERVAL (float): The default number of seconds between the
+        sweeps of the outstanding ingest jobs.
+    DEFAULT_TIMEOUT (float): The default number of seconds after which the
+        ingest jobs for a CloudEvents notification that have not reached a
+        terminal state are abandoned.
+    FAILED_STATUS (str): The status of the row for a CloudEvents notification
+        whose ingest job failed.
+    INGESTED_STATUS (str): The status of the row for a CloudEvents notification
+        whose ingest jobs succeeded.
+    INGESTING_STATUS (str): The status of the row for a CloudEvents
+        notification whose ingest jobs are outstanding.
+    TIMEOUT_STATUS (str): The status of the row for a CloudEvents notification
+        whose ingest jobs were abandoned.
+    IngestJobStore (type): The class for the store for the ingest jobs.
+    collect_job_ids (typing.Callable[[], typing.ContextManager[typing.List[int]]]):
+        Collect the IDs for the ingest jobs that are submitted by the current
+        thread.
+    create_ingest_job_model (typing.Callable[[peewee.Database], type]):
+        Construct the Peewee model for the ingest jobs.
+    install_ingest_poller (typing.Callable[..., celery.Task]): Register the
+        Celery task that polls the outstanding ingest jobs, and then schedule it
+        with Celery beat.
+    record_job_id (typing.Callable[[typing.Optional[int]], None]): Record the
+        ID for an ingest job that was submitted by the current thread.
+    should_sleep (typing.Callable[..., bool]): Return whether or not the state
+        of an ingest job is not terminal.
+
+.. _Celery:
+   http://www.celeryproject.org/
+.. _CloudEvents:
+   https://cloudevents.io/
+.. _Peewee:
+   http://peewee-orm.com/
+
+"""
+
+import collections
+import contextlib
+import datetime
+import json
+import threading
+import typing
+
+import celery
+import peewee
+
+from .metrics import NULL_REGISTRY, Registry
+
+
+# The default number of seconds between the sweeps of the outstanding ingest
+# jobs.
+#
+DEFAULT_POLL_INTERVAL = 5.0  # type: float
+
+# The default number of seconds after which the ingest jobs for a CloudEvents
+# notification that have not reached a terminal state are abandoned.
+#
+DEFAULT_TIMEOUT = 3600.0  # type: float
+
+# The statuses of the row for a CloudEvents notification whose ingest jobs are
+# outstanding, succeeded, failed or were abandoned.
+#
+INGESTING_STATUS = '102 Ingesting'  # type: str
+INGESTED_STATUS = '200 OK'  # type: str
+FAILED_STATUS = '500 Internal Server Error'  # type: str
+TIMEOUT_STATUS = '504 Gateway Timeout'  # type: str
+
+# The maximum number of task IDs per ``UPDATE`` or ``DELETE`` statement, which
+# keeps the number of bound parameters within the limit for SQLite.
+#
+_CHUNK_SIZE = 256  # type: int
+
+# The IDs for the ingest jobs that are being collected for each thread.
+#
+_local = threading.local()  # type: threading.local
+
+
+@contextlib.contextmanager
+def collect_job_ids() -> typing.Iterator[typing.List[int]]:
+    """Collect the IDs for the ingest jobs that are submitted by the current
+    thread, e.g., while a Celery task handles a CloudEvents notification.
+
+    Yields:
+        typing.List[int]: The IDs for the ingest jobs, which are appended by
+        ``record_job_id``.
+
+    """
+
+    previous = getattr(_local, 'job_ids', None)  # type: typing.Optional[typing.List[int]]
+
+    _local.job_ids = job_ids = []  # type: typing.List[int]
+
+    try:
+        yield job_ids
+    finally:
+        _local.job_ids = previous
+
+
+def record_job_id(job_id: typing.Optional[int]) -> None:
+    """Record the ID for an ingest job that was submitted by the current
+    thread, if its IDs are being collected.
+
+    Args:
+        job_id (typing.Optional[int]): The ID for the ingest job, or ``None``,
+            e.g., for the __local__ uploader runner, which is ignored.
+
+    """
+
+    job_ids = getattr(_local, 'job_ids', None)  # type: typing.Optional[typing.List[int]]
+
+    if (job_ids is not None) and (job_id is not None) and (job_id not in job_ids):
+        job_ids.append(job_id)
+
+
+def create_ingest_job_model(database: peewee.Database) -> type:
+    """Construct the Peewee model for the ingest jobs.
+
+    Args:
+        database (peewee.Database): The database, which may be a
+            ``peewee.DatabaseProxy``.
+
+    Returns:
+        type: The class for the Peewee model.
+
+    """
+
+    class IngestJobModel(peewee.Model):
+        """An outstanding ingest job for a CloudEvents notification.
+
+        Attributes:
+            task_id (str): The ID for the Celery task for the CloudEvents
+                notification.
+            job_id (int): The ID for the ingest job.
+            state (str): The last known "state" of the ingest job.
+            task (str): The last known "task" of the ingest job.
+            task_percent (str): The last known "task_percent" of the ingest job.
+            created (datetime.datetime): When the ingest job was submitted.
+            updated (datetime.datetime): When the state was last updated.
+
+        """
+
+        task_id = peewee.CharField()
+        job_id = peewee.IntegerField(index=True)
+        state = peewee.CharField(null=True)
+        task = peewee.CharField(null=True)
+        task_percent = peewee.CharField(null=True)
+        created = peewee.DateTimeField(default=datetime.datetime.now)
+        updated = peewee.DateTimeField(default=datetime.datetime.now)
+
+        # pylint: disable=too-few-public-methods
+        class Meta:
+            """Meta class connecting the database."""
+
+            database = None
+            table_name = 'ingest_job'
+            indexes = (
+                (('task_id', 'job_id', ), True),
+            )
+        # pylint: enable=too-few-public-methods
+
+    IngestJobModel._meta.set_database(database)  # pylint: disable=protected-access
+
+    return IngestJobModel
+
+
+def should_sleep(**kwargs: typing.Any) -> bool:
+    """Return whether or not the state of an ingest job is not terminal, i.e.,
+    whether or not to wait before checking the state again, in the same way as
+    the uploader runners of Pacifica Dispatcher.
+
+    Args:
+        **kwargs: The state of the ingest job, as returned by the ``getstate``
+            method of the Pacifica uploader.
+
+    Returns:
+        bool: ``False`` if the ingest job failed, or if its metadata was
+        ingested, or ``True`` otherwise.
+
+    Raises:
+        ValueError: If the "state", "task" or "task_percent" field is not
+            defined.
+
+    """
+
+    for name in ['state', 'task', 'task_percent']:
+        if name not in kwargs:
+            raise ValueError('field \'{0}\' is not defined'.format(name.replace('\'', '\\\'')))
+
+    if kwargs['state'] == 'FAILED':
+        return False
+
+    return (kwargs['state'] != 'OK') or (kwargs['task'] != 'ingest metadata') or (int(float(kwargs['task_percent'])) != 100)
+
+
+def _job_outcome(state: typing.Optional[typing.Dict[str, typing.Any]]) -> typing.Optional[bool]:
+    """Return whether or not an ingest job succeeded, or ``None`` if it has not
+    reached a terminal state, or its state is unknown.
+
+    """
+
+    if state is None:
+        return None
+
+    try:
+        if should_sleep(**state):
+            return None
+    except ValueError:
+        # The state is malformed, e.g., for an unknown ingest job.
+        #
+        return False
+
+    return state.get('state', None) != 'FAILED'
+
+
+class IngestJobStore:
+    """A store for the outstanding ingest jobs for each CloudEvents
+    notification.
+
+    Attributes:
+        database (peewee.Database): The database, which is a
+            ``peewee.DatabaseProxy`` until it is bound.
+        model (type): The class for the Peewee model for the ingest jobs.
+        timeout (float): The number of seconds after which the ingest jobs for
+            a CloudEvents notification that have not reached a terminal state
+            are abandoned.
+
+    """
+
+    def __init__(self, database: typing.Optional[peewee.Database] = None, timeout: float = DEFAULT_TIMEOUT) -> None:
+        """Initialize this store.
+
+        Args:
+            database (typing.Optional[peewee.Database]): The database, or
+                ``None`` to bind it later, e.g., when it is constructed.
+            timeout (float): The number of seconds after which the ingest jobs
+                for a CloudEvents notification are abandoned.
+
+        Raises:
+            ValueError: If the timeout is not positive.
+
+        """
+
+        super(IngestJobStore, self).__init__()
+
+        if timeout <= 0:
+            raise ValueError('timeout must be positive')
+
+        self.database = database if database is not None else peewee.DatabaseProxy()  # type: peewee.Database
+        self.model = create_ingest_job_model(self.database)  # type: type
+        self.timeout = timeout  # type: float
+
+        if database is not None:
+            self.create_table()
+
+    def bind(self, database: peewee.Database) -> None:
+        """Bind this store to a database, and then create its table.
+
+        Args:
+            database (peewee.Database): The database.
+
+        Raises:
+            ValueError: If this store is already bound to a database.
+
+        """
+
+        if not isinstance(self.database, peewee.DatabaseProxy) or (self.database.obj is not None):
+            raise ValueError('ingest job store is already bound to a database')
+
+        self.database.initialize(database)
+        self.create_table()
+
+    def create_table(self) -> None:
+        """Create the table for the ingest jobs, if it does not exist.
+
+        """
+
+        with self.database.connection_context():
+            self.model.create_table(safe=True)
+
+    def add(self, task_id: str, job_ids: typing.List[int]) -> None:
+        """Record the outstanding ingest jobs for a CloudEvents notification.
+
+        Args:
+            task_id (str): The ID for the Celery task for the CloudEvents
+                notification.
+            job_ids (typing.List[int]): The IDs for the ingest jobs.
+
+        """
+
+        now = datetime.datetime.now()  # type: datetime.datetime
+
+        with self.database.connection_context():
+            self.model.insert_many([
+                {'task_id': str(task_id), 'job_id': job_id, 'created': now, 'updated': now}
+                for job_id in job_ids
+            ]).on_conflict_ignore().execute()
+
+    def outstanding(self) -> int:
+        """Return the number of outstanding ingest jobs.
+
+        """
+
+        with self.database.connection_context():
+            return self.model.select().count()
+
+    def poll(self, getstate: typing.Callable[[int], typing.Dict[str, typing.Any]], task_model: type) -> typing.Dict[str, str]:
+        """Check the state of every outstanding ingest job, and then update the
+        status of the row for each CloudEvents notification whose ingest jobs
+        have all reached a terminal state, or have been abandoned.
+
+        The state of each ingest job is checked once per call, even if the
+        ingest job is shared by several CloudEvents notifications, e.g., because
+        their uploads were batched. An ingest job whose state could not be
+        checked, e.g., because the ingest server is unreachable, is checked
+        again by the next call.
+
+        Args:
+            getstate (typing.Callable[[int], typing.Dict[str, typing.Any]]): The
+                callable that returns the state of an ingest job, e.g., the
+                ``getstate`` method of the Pacifica uploader.
+            task_model (type): The class for the Peewee model for the rows for
+                the CloudEvents notifications.
+
+        Returns:
+            typing.Dict[str, str]: The new status for each Celery task whose row
+            was updated.
+
+        """
+
+        model = self.model  # type: type
+
+        with self.database.connection_context():
+            insts = list(model.select().order_by(model.created, model.id))  # type: typing.List[typing.Any]
+
+        states = {}  # type: typing.Dict[int, typing.Dict[str, typing.Any]]
+
+        for job_id in sorted({inst.job_id for inst in insts}):
+            try:
+                states[job_id] = getstate(job_id)
+            # pylint: disable=broad-except
+            except Exception:
+                continue
+            # pylint: enable=broad-except
+
+        now = datetime.datetime.now()  # type: datetime.datetime
+        deadline = now - datetime.timedelta(seconds=self.timeout)  # type: datetime.datetime
+
+        insts_by_task_id = collections.OrderedDict()  # type: typing.Dict[str, typing.List[typing.Any]]
+
+        for inst in insts:
+            insts_by_task_id.setdefault(inst.task_id, []).append(inst)
+
+        resolved = collections.OrderedDict()  # type: typing.Dict[str, typing.Tuple[str, typing.Optional[str], typing.Optional[str]]]
+        changed = []  # type: typing.List[typing.Any]
+
+        for (task_id, task_insts) in insts_by_task_id.items():
+            outcomes = [_job_outcome(states.get(inst.job_id, None)) for inst in task_insts]  # type: typing.List[typing.Optional[bool]]
+
+            if False in outcomes:
+                state = states[task_insts[outcomes.index(False)].job_id]  # type: typing.Dict[str, typing.Any]
+                resolved[task_id] = (FAILED_STATUS, 'IngestFailedError', json.dumps(state, sort_keys=True))
+            elif None not in outcomes:
+                resolved[task_id] = (INGESTED_STATUS, None, None)
+            elif min(inst.created for inst in task_insts) < deadline:
+                resolved[task_id] = (TIMEOUT_STATUS, 'IngestTimeoutError', 'ingest jobs did not finish within {0} seconds'.format(self.timeout))
+            else:
+                for inst in task_insts:
+                    state = states.get(inst.job_id, None)
+
+                    if (state is not None) and ((inst.state, inst.task, inst.task_percent) != (state.get('state', None), state.get('task', None), state.get('task_percent', None))):
+                        changed.append((inst, state))
+
+        if not (resolved or changed):
+            return {}
+
+        with self.database.connection_context():
+            with self.database.atomic():
+                # Record the progress of the ingest jobs that are still
+                # outstanding, so that it can be queried.
+                #
+                for (inst, state) in changed:
+                    model.update(state=state.get('state', None), task=state.get('task', None), task_percent=state.get('task_percent', None), updated=now).where(model.id == inst.id).execute()
+
+                for (status, exc_type, exc_value) in set(resolved.values()):
+                    task_ids = [task_id for (task_id, outcome) in resolved.items() if outcome == (status, exc_type, exc_value)]  # type: typing.List[str]
+
+                    for task_ids_chunk in peewee.chunked(task_ids, _CHUNK_SIZE):
+                        task_model.update(task_status=status, exc_type=exc_type, exc_value=exc_value, updated=now).where(task_model.task_id.in_(task_ids_chunk)).execute()
+
+                for task_ids_chunk in peewee.chunked(list(resolved), _CHUNK_SIZE):
+                    model.delete().where(model.task_id.in_(task_ids_chunk)).execute()
+
+        return collections.OrderedDict((task_id, status) for (task_id, (status, _exc_type, _exc_value)) in resolved.items())
+
+
+def install_ingest_poller(celery_app: celery.Celery, store: IngestJobStore, task_model: type, getstate: typing.Callable[[int], typing.Dict[str, typing.Any]], poll_task_name: str, interval: float = DEFAULT_POLL_INTERVAL, metrics: Registry = NULL_REGISTRY, on_failed: typing.Optional[typing.Callable[[typing.List[str]], typing.Any]] = None) -> celery.Task:
+    """Register the Celery task that polls the outstanding ingest jobs, and
+    then schedule it with Celery beat, e.g., "celery worker -B".
+
+    Each scheduled Celery task expires after the interval, so that the Celery
+    tasks that were not started in time, e.g., because every Celery worker was
+    busy, do not pile up.
+
+    Args:
+        celery_app (celery.Celery): The Celery application.
+        store (IngestJobStore): The store.
+        task_model (type): The class for the Peewee model for the rows for the
+            CloudEvents notifications.
+        getstate (typing.Callable[[int], typing.Dict[str, typing.Any]]): The
+            callable that returns the state of an ingest job.
+        poll_task_name (str): The name of the Celery task.
+        interval (float): The number of seconds between the sweeps.
+        metrics (pacifica.dispatcher_example.metrics.Registry): The registry
+            for the metrics.
+        on_failed (typing.Optional[typing.Callable[[typing.List[str]], typing.Any]]):
+            The callable that is called after each sweep with the IDs for the
+            Celery tasks whose ingest jobs failed or were abandoned, e.g., to
+            publish the Celery tasks for their duplicates again, or ``None``.
+
+    Returns:
+        celery.Task: The Celery task.
+
+    Raises:
+        ValueError: If the interval is not positive.
+
+    """
+
+    if interval <= 0:
+        raise ValueError('interval must be positive')
+
+    ingest_tasks_total = metrics.counter('dispatcher_example_ingest_tasks_total', 'The number of CloudEvents notifications whose ingest jobs were resolved by the poller, by their final status.', labelnames=('status', ))  # type: pacifica.dispatcher_example.metrics.Counter
+    ingest_jobs_outstanding = metrics.histogram('dispatcher_example_ingest_jobs_outstanding', 'The number of outstanding ingest jobs at the start of each sweep.', buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, ))  # type: pacifica.dispatcher_example.metrics.Histogram
+
+    # The Celery task is not shared with other Celery applications, because it
+    # is bound to the store and the Peewee model.
+    #
+    @celery_app.task(ignore_result=True, name=poll_task_name, shared=False)
+    def poll_task() -> None:
+        """Poll the outstanding ingest jobs.
+
+        """
+
+        if metrics.enabled:
+            ingest_jobs_outstanding.observe(store.outstanding())
+
+        resolved = store.poll(getstate, task_model)  # type: typing.Dict[str, str]
+
+        for status in resolved.values():
+            ingest_tasks_total.inc(status=status.split(' ')[0])
+
+        failed_task_ids = [task_id for (task_id, status) in resolved.items() if status in (FAILED_STATUS, TIMEOUT_STATUS, )]  # type: typing.List[str]
+
+        if (on_failed is not None) and failed_task_ids:
+            on_failed(failed_task_ids)
+
+    celery_app.conf.beat_schedule = dict(celery_app.conf.beat_schedule or {}, **{
+        poll_task_name: {
+            'task': poll_task_name,
+            'schedule': interval,
+            'options': {'expires': interval},
+        },
+    })
+
+    return poll_task
+
+
+# Module exports.
+#
+__all__ = ('DEFAULT_POLL_INTERVAL', 'DEFAULT_TIMEOUT', 'FAILED_STATUS', 'INGESTED_STATUS', 'INGESTING_STATUS', 'TIMEOUT_STATUS', 'IngestJobStore', 'collect_job_ids', 'create_ingest_job_model', 'install_ingest_poller', 'record_job_id', 'should_sleep', )
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/metadata.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Metadata for Pacifica Dispatcher Example.
+
+This module defines the single-pass extractor for the metadata descriptions in
+the payload of a `CloudEvents`_ notification, i.e., the "data" array, which is
+used by both the router and the event handler.
+
+The ``from_cloudevents_model`` class methods of the models that are provided
+by the ``pacifica.dispatcher.models`` module evaluate a `JSONPath`_ against the
+payload for each model (and, for the Pacifica transaction, for each of its
+attributes), each of which walks every entry of the payload. The extractor
+walks the payload once, partitions its entries by "destinationTable", and then
+constructs the same models from the partitions, where each Pacifica file is a
+compact record.
+
+Attributes:
+    FILES_TABLE (str): The "destinationTable" of the entries for Pacifica
+        files.
+    TRANSACTION_KEY_VALUE_TABLE (str): The "destinationTable" of the entries for
+        Pacifica transaction key-values.
+    TRANSACTION_TABLE_PREFIX (str): The prefix of the "destinationTable" of the
+        entries for the attributes of the Pacifica transaction.
+    EventMetadata (type): The class for the metadata descriptions.
+    FileRecord (type): The class for the compact metadata description for a
+        Pacifica file.
+    clear_metadata_cache (typing.Callable[[], None]): Discard the metadata
+        descriptions that are kept for the current thread.
+    extract_metadata (typing.Callable[..., EventMetadata]): Extract the
+        metadata descriptions from the payload of a CloudEvents notification.
+
+.. _CloudEvents:
+   https://cloudevents.io/
+.. _JSONPath:
+   https://goessner.net/articles/JsonPath/
+
+"""
+
+import collections.abc
+import threading
+import typing
+
+from pacifica.dispatcher.exceptions import TransactionDuplicateAttributeError
+from pacifica.dispatcher.models import File, Transaction, TransactionKeyValue
+
+
+# The "destinationTable" of the entries for each model.
+#
+FILES_TABLE = 'Files'  # type: str
+TRANSACTION_KEY_VALUE_TABLE = 'TransactionKeyValue'  # type: str
+TRANSACTION_TABLE_PREFIX = 'Transactions.'  # type: str
+
+# The names of the attributes of a Pacifica file.
+#
+_FILE_ATTR_NAMES = ('_id', 'ctime', 'encoding', 'hashsum', 'hashtype', 'mimetype', 'mtime', 'name', 'size', 'subdir', 'suspense_date', )  # type: typing.Tuple[str, ...]
+
+# The "destinationTable" of the entry for each attribute of the Pacifica
+# transaction.
+#
+_TRANSACTION_TABLES = {
+    '{0}{1}'.format(TRANSACTION_TABLE_PREFIX, name): name
+    for name in ('_id', 'analytical_tool', 'description', 'instrument', 'project', 'submitter', 'suspense_date', )
+}  # type: typing.Dict[str, str]
+
+# The most recently cached metadata descriptions for each thread.
+#
+_local = threading.local()  # type: threading.local
+
+
+class FileRecord(File):
+    """A compact metadata description for a Pacifica file.
+
+    The attributes are stored in slots, rather than in a dictionary for each
+    instance, so that a CloudEvents notification with many Pacifica files uses
+    less memory. Otherwise, a record behaves in the same way as an instance of
+    the ``pacifica.dispatcher.models.File`` class.
+
+    """
+
+    __slots__ = _FILE_ATTR_NAMES
+
+    def __init__(self, **attrs: typing.Any) -> None:  # pylint: disable=super-init-not-called
+        """Initialize this record from keyword arguments.
+
+        The constructor of the ``pacifica.dispatcher.models.File`` class is not
+        called, because it sets the same attributes one by one.
+
+        """
+
+        self._load(attrs)
+
+    @classmethod
+    def from_entry(cls, entry: typing.Mapping[str, typing.Any]) -> 'FileRecord':
+        """Construct a record from the fields of an entry of the payload,
+        without unpacking them into keyword arguments.
+
+        Args:
+            entry (typing.Mapping[str, typing.Any]): The entry.
+
+        Returns:
+            FileRecord: The record.
+
+        """
+
+        record = object.__new__(cls)  # type: FileRecord
+        record._load(entry)  # pylint: disable=protected-access
+
+        return record
+
+    def _load(self, attrs: typing.Mapping[str, typing.Any]) -> None:
+        """Set the attributes of this record.
+
+        """
+
+        get = attrs.get
+
+        self._id = get('_id', None)
+        self.ctime = get('ctime', None)
+        self.encoding = get('encoding', None)
+        self.hashsum = get('hashsum', None)
+        self.hashtype = get('hashtype', None)
+        self.mimetype = get('mimetype', None)
+        self.mtime = get('mtime', None)
+        self.name = get('name', None)
+        self.size = get('size', None)
+        self.subdir = get('subdir', None)
+        self.suspense_date = get('suspense_date', None)
+
+
+class EventMetadata:
+    """The metadata descriptions in the payload of a CloudEvents notification.
+
+    Attributes:
+        tables (typing.Dict[typing.Hashable, typing.List[typing.Dict[str, typing.Any]]]):
+            The entries of the payload, partitioned by "destinationTable", in
+            their original order.
+        transaction_key_values (typing.List[pacifica.dispatcher.models.TransactionKeyValue]):
+            The metadata descriptions for the Pacifica transaction key-values.
+        files (typing.List[FileRecord]): The metadata descriptions for the
+            Pacifica files.
+
+    """
+
+    __slots__ = ('tables', 'transaction_key_values', 'files', '_transaction', '_duplicate_attr_name', )
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, tables: typing.Dict[typing.Hashable, typing.List[typing.Dict[str, typing.Any]]], transaction: Transaction, transaction_key_values: typing.List[TransactionKeyValue], files: typing.List[FileRecord], duplicate_attr_name: typing.Optional[str] = None) -> None:
+        """Initialize these metadata descriptions.
+
+        Args:
+            tables (typing.Dict[typing.Hashable, typing.List[typing.Dict[str, typing.Any]]]):
+                The entries of the payload, partitioned by "destinationTable".
+            transaction (pacifica.dispatcher.models.Transaction): The metadata
+                description for the Pacifica transaction.
+            transaction_key_values (typing.List[pacifica.dispatcher.models.TransactionKeyValue]):
+                The metadata descriptions for the Pacifica transaction
+                key-values.
+            files (typing.List[FileRecord]): The metadata descriptions for the
+                Pacifica files.
+            duplicate_attr_name (typing.Optional[str]): The name of the first
+                attribute of the Pacifica transaction that is given more than
+                once, or ``None``.
+
+        """
+
+        super(EventMetadata, self).__init__()
+
+        self.tables = tables  # type: typing.Dict[typing.Hashable, typing.List[typing.Dict[str, typing.Any]]]
+        self.transaction_key_values = transaction_key_values  # type: typing.List[pacifica.dispatcher.models.TransactionKeyValue]
+        self.files = files  # type: typing.List[FileRecord]
+
+        self._transaction = transaction  # type: pacifica.dispatcher.models.Transaction
+        self._duplicate_attr_name = duplicate_attr_name  # type: typing.Optional[str]
+    # pylint: enable=too-many-arguments
+
+    @property
+    def transaction(self) -> Transaction:
+        """Return the metadata description for the Pacifica transaction.
+
+        The error for an attribute that is given more than once is raised here,
+        rather than when the payload is extracted, so that the router, which
+        does not use the Pacifica transaction, can extract the payload.
+
+        Returns:
+            pacifica.dispatcher.models.Transaction: The metadata description.
+
+        Raises:
+            pacifica.dispatcher.exceptions.TransactionDuplicateAttributeError:
+                If an attribute of the Pacifica transaction is given more than
+                once.
+
+        """
+
+        if self._duplicate_attr_name is not None:
+            raise TransactionDuplicateAttributeError(None, self._duplicate_attr_name)
+
+        return self._transaction
+
+
+def _entries(data: typing.Any) -> typing.Iterable[typing.Any]:
+    """Return the entries of a payload, in the same way as the JSONPath
+    wildcard, i.e., the values of an object or the items of an array.
+
+    """
+
+    if isinstance(data, collections.abc.Mapping):
+        return data.values()
+
+    if isinstance(data, collections.abc.Sequence) and not isinstance(data, str):
+        return data
+
+    return ()
+
+
+def _extract(data: typing.Any) -> EventMetadata:
+    """Extract the metadata descriptions from a payload in a single pass.
+
+    """
+
+    tables = {}  # type: typing.Dict[typing.Hashable, typing.List[typing.Dict[str, typing.Any]]]
+
+    for entry in _entries(data):
+        if not isinstance(entry, collections.abc.Mapping):
+            continue
+
+        try:
+            table = tables.get(entry.get('destinationTable', None), None)
+        except TypeError:
+            # The "destinationTable" is unhashable, so it is not equal to the
+            # "destinationTable" of any model.
+            #
+            continue
+
+        if table is None:
+            tables[entry.get('destinationTable', None)] = [entry]
+        else:
+            table.append(entry)
+
+    transaction_attrs = {}  # type: typing.Dict[str, typing.Any]
+    duplicate_attr_name = None  # type: typing.Optional[str]
+
+    for (table_name, name) in _TRANSACTION_TABLES.items():
+        for entry in tables.get(table_name, ()):
+            if 'value' not in entry:
+                continue
+
+            if (name in transaction_attrs) and (duplicate_attr_name is None):
+                duplicate_attr_name = name
+
+            transaction_attrs[name] = entry['value']
+
+    return EventMetadata(
+        tables,
+        Transaction(**transaction_attrs),
+        [TransactionKeyValue(**entry) for entry in tables.get(TRANSACTION_KEY_VALUE_TABLE, ())],
+        [FileRecord.from_entry(entry) for entry in tables.get(FILES_TABLE, ())],
+        duplicate_attr_name=duplicate_attr_name,
+    )
+
+
+def extract_metadata(data: typing.Any, cache: bool = False) -> EventMetadata:
+    """Extract the metadata descriptions from the payload of a CloudEvents
+    notification.
+
+    The models are the same as those that are constructed by the
+    ``from_cloudevents_model`` class methods of the models that are provided by
+    the ``pacifica.dispatcher.models`` module, except that each Pacifica file is
+    a ``FileRecord``.
+
+    If ``cache`` is ``True``, then the metadata descriptions are kept for the
+    current thread, so that the next call for the same payload, i.e., the same
+    object, e.g., by the event handler after the router has matched the
+    CloudEvents notification, returns them without extracting them again. The
+    cached metadata descriptions are discarded by the next call, or by
+    ``clear_metadata_cache``, e.g., after a CloudEvents notification that was
+    not handled by the event handler, so that they, and the payload, are not
+    kept for longer than the CloudEvents notification.
+
+    Args:
+        data (typing.Any): The payload of the CloudEvents notification, i.e.,
+            its "data".
+        cache (bool): Whether or not to keep the metadata descriptions for the
+            next call.
+
+    Returns:
+        EventMetadata: The metadata descriptions.
+
+    """
+
+    cached = getattr(_local, 'cached', None)  # type: typing.Optional[typing.Tuple[typing.Any, EventMetadata]]
+
+    _local.cached = None
+
+    if (cached is not None) and (cached[0] is data):
+        metadata = cached[1]  # type: EventMetadata
+    else:
+        metadata = _extract(data)
+
+    if cache:
+        _local.cached = (data, metadata)
+
+    return metadata
+
+
+def clear_metadata_cache() -> None:
+    """Discard the metadata descriptions, and the payload, that are kept for
+    the current thread, if any.
+
+    """
+
+    _local.cached = None
+
+
+# Module exports.
+#
+__all__ = ('FILES_TABLE', 'TRANSACTION_KEY_VALUE_TABLE', 'TRANSACTION_TABLE_PREFIX', 'EventMetadata', 'FileRecord', 'clear_metadata_cache', 'extract_metadata', )
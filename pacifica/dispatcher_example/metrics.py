@@ -0,0 +1,729 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/metrics.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Metrics for Pacifica Dispatcher Example.
+
+This module defines the counters and histograms that instrument the handling of
+`CloudEvents`_ notifications, the registry that renders them in the `Prometheus`_
+text exposition format, the `CherryPy`_ endpoint that serves them, and the sink
+that exports them from the `Celery`_ worker.
+
+When metrics are disabled, the null registry is used instead, whose counters and
+histograms do nothing, so that the overhead of the instrumentation is a method
+call per measurement.
+
+Attributes:
+    DEFAULT_BUCKETS (typing.Tuple[float, ...]): The default upper bounds of the
+        buckets for a histogram in seconds.
+    DEFAULT_INTERVAL (float): The default minimum number of seconds between
+        exports by the sink for the Celery worker.
+    NULL_REGISTRY (NullRegistry): The null registry.
+    Counter (type): The class for a counter.
+    Histogram (type): The class for a histogram.
+    NullRegistry (type): The class for the null registry.
+    Registry (type): The class for a registry.
+    TextfileSink (type): The class for the sink that writes the metrics to a
+        file.
+    create_metrics_endpoint (typing.Callable[[Registry], typing.Any]): Construct
+        the CherryPy endpoint that serves the metrics.
+    install_celery_sink (typing.Callable[..., None]): Export the metrics after
+        each Celery task.
+    install_cherrypy_metrics (typing.Callable[[cherrypy.Application, Registry], None]):
+        Measure the latency of each CherryPy request, and then mount the
+        CherryPy endpoint that serves the metrics at "/metrics".
+
+.. _Celery:
+   http://www.celeryproject.org/
+.. _CherryPy:
+   https://cherrypy.org/
+.. _CloudEvents:
+   https://cloudevents.io/
+.. _Prometheus:
+   https://prometheus.io/docs/instrumenting/exposition_formats/
+
+"""
+
+import math
+import os
+import tempfile
+import threading
+import time
+import typing
+
+import celery
+import celery.signals
+import cherrypy
+
+
+# The default upper bounds of the buckets for a histogram in seconds.
+#
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, )  # type: typing.Tuple[float, ...]
+
+# The default minimum number of seconds between exports by the sink for the
+# Celery worker.
+#
+DEFAULT_INTERVAL = 15.0  # type: float
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value in the text exposition format.
+
+    """
+
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+
+    return repr(float(value))
+
+
+def _format_labels(labels: typing.Iterable[typing.Tuple[str, typing.Any]]) -> str:
+    """Format the labels for a sample in the text exposition format.
+
+    """
+
+    pairs = [
+        '{0}="{1}"'.format(name, str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+        for (name, value) in labels
+    ]  # type: typing.List[str]
+
+    return '{{{0}}}'.format(','.join(pairs)) if pairs else ''
+
+
+class _Metric:
+    """The base class for a metric with labels.
+
+    Attributes:
+        name (str): The name of the metric.
+        help (str): The description of the metric.
+        labelnames (typing.Tuple[str, ...]): The names of the labels.
+
+    """
+
+    metric_type = 'untyped'  # type: str
+
+    def __init__(self, name: str, help: str, labelnames: typing.Iterable[str] = ()) -> None:  # pylint: disable=redefined-builtin
+        """Initialize this metric.
+
+        Args:
+            name (str): The name of the metric.
+            help (str): The description of the metric.
+            labelnames (typing.Iterable[str]): The names of the labels.
+
+        """
+
+        super(_Metric, self).__init__()
+
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)  # type: typing.Tuple[str, ...]
+
+        self._lock = threading.Lock()  # type: threading.Lock
+
+    def _key(self, labels: typing.Dict[str, typing.Any]) -> typing.Tuple[str, ...]:
+        """Return the values of the labels, in the order of their names.
+
+        Raises:
+            ValueError: If the names of the labels are not those of this metric.
+
+        """
+
+        if len(labels) != len(self.labelnames):
+            raise ValueError('labels must be {0}'.format(', '.join(self.labelnames) or 'empty'))
+
+        try:
+            return tuple(str(labels[labelname]) for labelname in self.labelnames)
+        except KeyError:
+            raise ValueError('labels must be {0}'.format(', '.join(self.labelnames)))
+
+    def samples(self) -> typing.List[typing.Tuple[str, typing.Tuple[typing.Tuple[str, str], ...], float]]:
+        """Return the samples for this metric, i.e., the name, labels and value
+        of each sample.
+
+        """
+
+        raise NotImplementedError()  # pragma: no cover
+
+
+class Counter(_Metric):
+    """A counter, whose value for each combination of labels only increases.
+
+    """
+
+    metric_type = 'counter'  # type: str
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Initialize this counter.
+
+        """
+
+        super(Counter, self).__init__(*args, **kwargs)
+
+        self._values = {}  # type: typing.Dict[typing.Tuple[str, ...], float]
+
+    def inc(self, amount: float = 1.0, **labels: typing.Any) -> None:
+        """Increment the value of this counter.
+
+        Args:
+            amount (float): The amount to increment by.
+            **labels (typing.Any): The value for each label.
+
+        Raises:
+            ValueError: If the amount is negative, or if the names of the labels
+                are not those of this counter.
+
+        """
+
+        if amount < 0:
+            raise ValueError('amount must be non-negative')
+
+        key = self._key(labels)  # type: typing.Tuple[str, ...]
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: typing.Any) -> float:
+        """Return the value of this counter.
+
+        Args:
+            **labels (typing.Any): The value for each label.
+
+        Returns:
+            float: The value.
+
+        """
+
+        key = self._key(labels)  # type: typing.Tuple[str, ...]
+
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def samples(self) -> typing.List[typing.Tuple[str, typing.Tuple[typing.Tuple[str, str], ...], float]]:
+        """Return the samples for this counter.
+
+        """
+
+        with self._lock:
+            values = sorted(self._values.items())
+
+        return [
+            (self.name, tuple(zip(self.labelnames, key)), value)
+            for (key, value) in values
+        ]
+
+
+class _Timer:
+    """The context manager that observes the number of seconds that its body
+    takes.
+
+    """
+
+    __slots__ = ('_histogram', '_labels', '_start', )
+
+    def __init__(self, histogram: 'Histogram', labels: typing.Dict[str, typing.Any]) -> None:
+        """Initialize this timer.
+
+        """
+
+        self._histogram = histogram
+        self._labels = labels
+        self._start = 0.0  # type: float
+
+    def __enter__(self) -> '_Timer':
+        """Start this timer.
+
+        """
+
+        self._start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *_args) -> None:
+        """Stop this timer, and then observe the elapsed number of seconds.
+
+        """
+
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+
+
+class Histogram(_Metric):
+    """A histogram, which counts the observations for each combination of
+    labels in cumulative buckets.
+
+    Attributes:
+        buckets (typing.Tuple[float, ...]): The upper bounds of the buckets, in
+            ascending order.
+
+    """
+
+    metric_type = 'histogram'  # type: str
+
+    def __init__(self, name: str, help: str, labelnames: typing.Iterable[str] = (), buckets: typing.Iterable[float] = DEFAULT_BUCKETS) -> None:  # pylint: disable=redefined-builtin
+        """Initialize this histogram.
+
+        Args:
+            name (str): The name of the histogram.
+            help (str): The description of the histogram.
+            labelnames (typing.Iterable[str]): The names of the labels.
+            buckets (typing.Iterable[float]): The upper bounds of the buckets.
+
+        Raises:
+            ValueError: If there are no buckets.
+
+        """
+
+        super(Histogram, self).__init__(name, help, labelnames=labelnames)
+
+        self.buckets = tuple(sorted(set(buckets) - {math.inf}))  # type: typing.Tuple[float, ...]
+
+        if not self.buckets:
+            raise ValueError('buckets should contain something')
+
+        # The count for each bucket (and for the implicit "+Inf" bucket), the
+        # sum, and the count of the observations, for each combination of
+        # labels.
+        #
+        self._values = {}  # type: typing.Dict[typing.Tuple[str, ...], typing.List[float]]
+
+    def observe(self, value: float, **labels: typing.Any) -> None:
+        """Observe a value.
+
+        Args:
+            value (float): The value.
+            **labels (typing.Any): The value for each label.
+
+        """
+
+        key = self._key(labels)  # type: typing.Tuple[str, ...]
+
+        with self._lock:
+            values = self._values.get(key)
+
+            if values is None:
+                values = self._values[key] = [0.0] * (len(self.buckets) + 3)
+
+            for (index, bucket) in enumerate(self.buckets):
+                if value <= bucket:
+                    values[index] += 1
+
+                    break
+            else:
+                values[len(self.buckets)] += 1
+
+            values[-2] += value
+            values[-1] += 1
+
+    def time(self, **labels: typing.Any) -> _Timer:
+        """Return the context manager that observes the number of seconds that
+        its body takes.
+
+        Args:
+            **labels (typing.Any): The value for each label.
+
+        Returns:
+            typing.ContextManager: The context manager.
+
+        """
+
+        return _Timer(self, labels)
+
+    def count(self, **labels: typing.Any) -> float:
+        """Return the number of observations.
+
+        Args:
+            **labels (typing.Any): The value for each label.
+
+        Returns:
+            float: The number of observations.
+
+        """
+
+        key = self._key(labels)  # type: typing.Tuple[str, ...]
+
+        with self._lock:
+            return self._values[key][-1] if key in self._values else 0.0
+
+    def samples(self) -> typing.List[typing.Tuple[str, typing.Tuple[typing.Tuple[str, str], ...], float]]:
+        """Return the samples for this histogram.
+
+        """
+
+        with self._lock:
+            values = sorted((key, list(values)) for (key, values) in self._values.items())
+
+        samples = []  # type: typing.List[typing.Tuple[str, typing.Tuple[typing.Tuple[str, str], ...], float]]
+
+        for (key, counts) in values:
+            labels = tuple(zip(self.labelnames, key))  # type: typing.Tuple[typing.Tuple[str, str], ...]
+
+            cumulative_count = 0.0  # type: float
+
+            for (bucket, count) in zip(self.buckets + (math.inf, ), counts):
+                cumulative_count += count
+
+                samples.append(('{0}_bucket'.format(self.name), labels + (('le', _format_value(bucket)), ), cumulative_count))
+
+            samples.append(('{0}_sum'.format(self.name), labels, counts[-2]))
+            samples.append(('{0}_count'.format(self.name), labels, counts[-1]))
+
+        return samples
+
+
+class _Callback(_Metric):
+    """A metric whose value is returned by a callable when it is rendered.
+
+    """
+
+    def __init__(self, name: str, help: str, func: typing.Callable[[], float], metric_type: str = 'gauge') -> None:  # pylint: disable=redefined-builtin
+        """Initialize this metric.
+
+        """
+
+        super(_Callback, self).__init__(name, help)
+
+        self.metric_type = metric_type
+        self._func = func
+
+    def samples(self) -> typing.List[typing.Tuple[str, typing.Tuple[typing.Tuple[str, str], ...], float]]:
+        """Return the sample for this metric.
+
+        """
+
+        return [(self.name, (), float(self._func()))]
+
+
+class Registry:
+    """A registry of metrics, which renders them in the Prometheus text
+    exposition format.
+
+    Each metric is constructed on first use, so that each of the components
+    that use the same name also use the same metric.
+
+    Attributes:
+        enabled (bool): Whether or not the metrics are recorded.
+
+    """
+
+    enabled = True  # type: bool
+
+    def __init__(self) -> None:
+        """Initialize this registry.
+
+        """
+
+        super(Registry, self).__init__()
+
+        self._metrics = {}  # type: typing.Dict[str, _Metric]
+        self._lock = threading.Lock()  # type: threading.Lock
+
+    def _get_or_create(self, cls: type, name: str, *args, **kwargs) -> _Metric:
+        """Return the metric with a name, constructing it on first use.
+
+        Raises:
+            ValueError: If the metric with the name is of a different type.
+
+        """
+
+        with self._lock:
+            metric = self._metrics.get(name)
+
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError('metric {0} is not a {1}'.format(name, cls.metric_type))
+
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: typing.Iterable[str] = ()) -> Counter:  # pylint: disable=redefined-builtin
+        """Return the counter with a name, constructing it on first use.
+
+        Args:
+            name (str): The name of the counter.
+            help (str): The description of the counter.
+            labelnames (typing.Iterable[str]): The names of the labels.
+
+        Returns:
+            Counter: The counter.
+
+        """
+
+        return self._get_or_create(Counter, name, help, labelnames=labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: typing.Iterable[str] = (), buckets: typing.Iterable[float] = DEFAULT_BUCKETS) -> Histogram:  # pylint: disable=redefined-builtin
+        """Return the histogram with a name, constructing it on first use.
+
+        Args:
+            name (str): The name of the histogram.
+            help (str): The description of the histogram.
+            labelnames (typing.Iterable[str]): The names of the labels.
+            buckets (typing.Iterable[float]): The upper bounds of the buckets.
+
+        Returns:
+            Histogram: The histogram.
+
+        """
+
+        return self._get_or_create(Histogram, name, help, labelnames=labelnames, buckets=buckets)
+
+    def register_callback(self, name: str, help: str, func: typing.Callable[[], float], metric_type: str = 'gauge') -> None:  # pylint: disable=redefined-builtin
+        """Register a metric whose value is returned by a callable when it is
+        rendered, replacing any metric with the same name.
+
+        Args:
+            name (str): The name of the metric.
+            help (str): The description of the metric.
+            func (typing.Callable[[], float]): The callable.
+            metric_type (str): The type of the metric, i.e., "counter" or
+                "gauge".
+
+        """
+
+        with self._lock:
+            self._metrics[name] = _Callback(name, help, func, metric_type=metric_type)
+
+    def render(self) -> str:
+        """Render the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics.
+
+        """
+
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics.keys())]
+
+        lines = []  # type: typing.List[str]
+
+        for metric in metrics:
+            lines.append('# HELP {0} {1}'.format(metric.name, metric.help.replace('\\', '\\\\').replace('\n', '\\n')))
+            lines.append('# TYPE {0} {1}'.format(metric.name, metric.metric_type))
+
+            for (name, labels, value) in metric.samples():
+                lines.append('{0}{1} {2}'.format(name, _format_labels(labels), _format_value(value)))
+
+        return ''.join('{0}\n'.format(line) for line in lines)
+
+
+class _NullTimer:
+    """The context manager that does nothing.
+
+    """
+
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullTimer':
+        """Do nothing."""
+        return self
+
+    def __exit__(self, *_args) -> None:
+        """Do nothing."""
+
+
+class _NullMetric:
+    """The counter and histogram that do nothing.
+
+    """
+
+    __slots__ = ()
+
+    def inc(self, amount: float = 1.0, **labels: typing.Any) -> None:
+        """Do nothing."""
+
+    def observe(self, value: float, **labels: typing.Any) -> None:
+        """Do nothing."""
+
+    def time(self, **_labels: typing.Any) -> _NullTimer:
+        """Return the context manager that does nothing."""
+        return _NULL_TIMER
+
+
+_NULL_TIMER = _NullTimer()  # type: _NullTimer
+
+_NULL_METRIC = _NullMetric()  # type: _NullMetric
+
+
+class NullRegistry(Registry):
+    """A registry whose counters and histograms do nothing.
+
+    """
+
+    enabled = False  # type: bool
+
+    def counter(self, *_args, **_kwargs) -> Counter:
+        """Return the counter that does nothing."""
+        return _NULL_METRIC
+
+    def histogram(self, *_args, **_kwargs) -> Histogram:
+        """Return the histogram that does nothing."""
+        return _NULL_METRIC
+
+    def register_callback(self, *_args, **_kwargs) -> None:
+        """Do nothing."""
+
+
+# The null registry.
+#
+NULL_REGISTRY = NullRegistry()  # type: NullRegistry
+
+
+class TextfileSink:
+    """A sink that writes the metrics to a file in the Prometheus text
+    exposition format, e.g., for the textfile collector of the Prometheus node
+    exporter.
+
+    Attributes:
+        path (str): The path to the file, where "{pid}" is replaced by the ID
+            of the current process, so that each child process of the Celery
+            worker writes its own file.
+
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize this sink.
+
+        Args:
+            path (str): The path to the file.
+
+        """
+
+        super(TextfileSink, self).__init__()
+
+        self.path = path
+
+    def __call__(self, text: str) -> None:
+        """Write the metrics to the file.
+
+        The metrics are written to a temporary file that is then renamed, so
+        that readers never see a partial file.
+
+        Args:
+            text (str): The metrics.
+
+        """
+
+        path = self.path.format(pid=os.getpid())  # type: str
+
+        (file_descriptor, temp_path) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.')
+
+        with open(file_descriptor, mode='w') as file:
+            file.write(text)
+
+        os.replace(temp_path, path)
+
+
+def install_celery_sink(celery_app: celery.Celery, registry: Registry, sink: typing.Callable[[str], None], interval: float = DEFAULT_INTERVAL) -> None:
+    """Export the metrics after each Celery task, at most once per interval,
+    and when the Celery worker shuts down.
+
+    Args:
+        celery_app (celery.Celery): The Celery application.
+        registry (Registry): The registry.
+        sink (typing.Callable[[str], None]): The sink, which receives the
+            metrics in the Prometheus text exposition format.
+        interval (float): The minimum number of seconds between exports.
+
+    """
+
+    last_exported = [-math.inf]  # type: typing.List[float]
+
+    def export(force: bool = False) -> None:
+        """Export the metrics, unless they were exported within the interval."""
+        now = time.monotonic()
+
+        if force or (now - last_exported[0] >= interval):
+            last_exported[0] = now
+            sink(registry.render())
+
+    def on_task_postrun(sender: celery.Task = None, **_kwargs) -> None:
+        """Export the metrics after the task returns."""
+        if (sender is not None) and (sender.app is celery_app):
+            export()
+
+    def on_worker_process_shutdown(**_kwargs) -> None:
+        """Export the metrics before the child process exits."""
+        export(force=True)
+
+    celery.signals.task_postrun.connect(on_task_postrun, weak=False)
+    celery.signals.worker_process_shutdown.connect(on_worker_process_shutdown, weak=False)
+
+
+def create_metrics_endpoint(registry: Registry) -> typing.Any:
+    """Construct the CherryPy endpoint that serves the metrics.
+
+    Args:
+        registry (Registry): The registry.
+
+    Returns:
+        typing.Any: The CherryPy endpoint, which is mounted as an attribute of
+        the root object of the CherryPy application.
+
+    """
+
+    # pylint: disable=too-few-public-methods
+    class Metrics:
+        """Metrics entrypoint in the Prometheus text exposition format."""
+
+        exposed = True
+
+        # pylint: disable=invalid-name
+        @staticmethod
+        def GET() -> str:
+            """Render the metrics."""
+            cherrypy.response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+
+            return registry.render()
+        # pylint: enable=invalid-name
+    # pylint: enable=too-few-public-methods
+
+    return Metrics()
+
+
+def install_cherrypy_metrics(application: cherrypy.Application, registry: Registry) -> None:
+    """Measure the latency of each CherryPy request, and then mount the CherryPy
+    endpoint that serves the metrics at "/metrics".
+
+    The latency is labeled by the method, the first segment of the path (e.g.,
+    "/receive" or "/get"), and the status code of the response.
+
+    Args:
+        application (cherrypy.Application): The CherryPy application.
+        registry (Registry): The registry.
+
+    """
+
+    request_seconds = registry.histogram('dispatcher_example_http_request_seconds', 'The latency of each HTTP request.', labelnames=('method', 'path', 'status'))  # type: Histogram
+
+    def on_start_resource() -> None:
+        """Record when the request started."""
+        cherrypy.request.dispatcher_example_start = time.perf_counter()
+
+    def on_end_request() -> None:
+        """Observe the latency of the request."""
+        start = getattr(cherrypy.request, 'dispatcher_example_start', None)  # type: typing.Optional[float]
+
+        if start is not None:
+            request_seconds.observe(
+                time.perf_counter() - start,
+                method=cherrypy.request.method,
+                path='/{0}'.format(cherrypy.request.path_info.strip('/').split('/')[0]),
+                status=str(cherrypy.response.status).split(' ')[0],
+            )
+
+    application.merge({
+        '/': {
+            'hooks.on_start_resource.metrics': on_start_resource,
+            'hooks.on_end_request.metrics': on_end_request,
+        },
+    })
+
+    application.root.metrics = create_metrics_endpoint(registry)
+
+
+# Module exports.
+#
+__all__ = ('DEFAULT_BUCKETS', 'DEFAULT_INTERVAL', 'NULL_REGISTRY', 'Counter', 'Histogram', 'NullRegistry', 'Registry', 'TextfileSink', 'create_metrics_endpoint', 'install_celery_sink', 'install_cherrypy_metrics', )
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/pipeline.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Pipeline for Pacifica Dispatcher Example.
+
+This module defines the pipeline that is used by the event handler to overlap
+the download, transform and upload of the files for a CloudEvents notification.
+
+Attributes:
+    DEFAULT_DOWNLOAD_BATCH_SIZE (int): The default maximum number of files per
+        call to the downloader runner in pipelined mode.
+    DEFAULT_QUEUE_SIZE (int): The default maximum number of items in each queue
+        between two stages.
+    MODE_NAMES (typing.Tuple[str, ...]): The names of the modes of the event
+        handler.
+    PHASED (str): The name of the mode where every file is downloaded, then
+        every file is transformed, and then every file is uploaded.
+    PIPELINED (str): The name of the mode where the download, transform and
+        upload of the files overlap.
+    Pipeline (type): The class for the pipeline.
+    batches (typing.Callable[[typing.List[typing.Any], int], typing.Iterator[typing.List[typing.Any]]]):
+        Split a list into consecutive batches.
+
+"""
+
+import functools
+import queue
+import threading
+import typing
+
+
+# The names of the modes of the event handler.
+#
+PHASED = 'phased'  # type: str
+PIPELINED = 'pipelined'  # type: str
+
+MODE_NAMES = (PHASED, PIPELINED, )  # type: typing.Tuple[str, ...]
+
+# The default maximum number of files per call to the downloader runner in
+# pipelined mode.
+#
+DEFAULT_DOWNLOAD_BATCH_SIZE = 16  # type: int
+
+# The default maximum number of items in each queue between two stages.
+#
+DEFAULT_QUEUE_SIZE = 4  # type: int
+
+# The sentinel that is put into a queue after the last item.
+#
+_DONE = object()  # type: object
+
+# The number of seconds to block on a queue before checking if the pipeline has
+# been stopped.
+#
+_POLL_INTERVAL = 0.1  # type: float
+
+
+def batches(items: typing.List[typing.Any], batch_size: int) -> typing.Iterator[typing.List[typing.Any]]:
+    """Split a list into consecutive batches.
+
+    Args:
+        items (typing.List[typing.Any]): The list.
+        batch_size (int): The maximum number of items per batch.
+
+    Returns:
+        typing.Iterator[typing.List[typing.Any]]: The batches, in order.
+
+    Raises:
+        ValueError: If the batch size is not positive.
+
+    """
+
+    if batch_size <= 0:
+        raise ValueError('batch_size must be positive')
+
+    return (items[index:(index + batch_size)] for index in range(0, len(items), batch_size))
+
+
+class Pipeline:
+    """A pipeline of stages, where each stage runs in its own thread and the
+    stages are connected by bounded queues.
+
+    Each stage is a callable that receives one item and returns one item. The
+    items flow through the stages in order, so that the first stage can process
+    item N + 1 while the second stage is processing item N.
+
+    Attributes:
+        stages (typing.List[typing.Callable[[typing.Any], typing.Any]]): The
+            stages.
+        queue_size (int): The maximum number of items in each queue between two
+            stages.
+
+    """
+
+    def __init__(self, *stages: typing.Callable[[typing.Any], typing.Any], queue_size: int = DEFAULT_QUEUE_SIZE) -> None:
+        """Initialize this pipeline.
+
+        Args:
+            *stages (typing.Callable[[typing.Any], typing.Any]): The stages.
+            queue_size (int): The maximum number of items in each queue between
+                two stages.
+
+        Raises:
+            ValueError: If there are no stages, or if the queue size is not
+                positive.
+
+        """
+
+        super(Pipeline, self).__init__()
+
+        if not stages:
+            raise ValueError('stages should contain something')
+
+        if queue_size <= 0:
+            raise ValueError('queue_size must be positive')
+
+        self.stages = list(stages)  # type: typing.List[typing.Callable[[typing.Any], typing.Any]]
+        self.queue_size = queue_size
+
+    def run(self, items: typing.Iterable[typing.Any]) -> typing.Iterator[typing.Any]:
+        """Run the pipeline.
+
+        The return value is a generator that yields the items that are returned
+        by the last stage, in order. If any stage raises an exception, then
+        every stage is stopped and the exception of the first stage to fail is
+        raised by the generator. If the generator is closed early, then every
+        stage is stopped.
+
+        Args:
+            items (typing.Iterable[typing.Any]): The items for the first stage.
+
+        Returns:
+            typing.Iterator[typing.Any]: The items that are returned by the last
+            stage.
+
+        """
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]  # type: typing.List[queue.Queue]
+        stop = threading.Event()  # type: threading.Event
+        errors = []  # type: typing.List[BaseException]
+
+        def put(out_queue: queue.Queue, item: typing.Any) -> bool:
+            """Put an item into a queue, unless the pipeline is stopped.
+
+            """
+
+            while not stop.is_set():
+                try:
+                    out_queue.put(item, timeout=_POLL_INTERVAL)
+                except queue.Full:
+                    continue
+                return True
+
+            return False
+
+        def get(in_queue: queue.Queue) -> typing.Any:
+            """Get an item from a queue, unless the pipeline is stopped.
+
+            """
+
+            while not stop.is_set():
+                try:
+                    return in_queue.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+
+            return _DONE
+
+        def target(stage: typing.Callable[[typing.Any], typing.Any], in_items: typing.Iterable[typing.Any], out_queue: queue.Queue) -> None:
+            """Run a stage until its items are exhausted or the pipeline is
+            stopped.
+
+            """
+
+            try:
+                for item in in_items:
+                    if stop.is_set() or not put(out_queue, stage(item)):
+                        break
+            # pylint: disable=broad-except
+            except BaseException as exc:
+                errors.append(exc)
+                stop.set()
+            # pylint: enable=broad-except
+            finally:
+                put(out_queue, _DONE)
+
+        threads = []  # type: typing.List[threading.Thread]
+
+        in_items = items  # type: typing.Iterable[typing.Any]
+
+        for stage, out_queue in zip(self.stages, queues):
+            thread = threading.Thread(target=target, args=(stage, in_items, out_queue), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+            in_items = iter(functools.partial(get, out_queue), _DONE)
+
+        try:
+            for item in in_items:
+                yield item
+        finally:
+            # Stop every stage, in case the generator is closed early or a
+            # stage has failed, and then wait for every stage to finish.
+            #
+            stop.set()
+
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+
+
+# Module exports.
+#
+__all__ = ('DEFAULT_DOWNLOAD_BATCH_SIZE', 'DEFAULT_QUEUE_SIZE', 'MODE_NAMES', 'PHASED', 'PIPELINED', 'Pipeline', 'batches', )
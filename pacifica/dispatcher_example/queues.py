@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/queues.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Queues for Pacifica Dispatcher Example.
+
+This module defines the `Celery`_ task router that sends the Celery task for
+each `CloudEvents`_ notification to either the queue for small transactions or
+the queue for large transactions, with a priority, based on the number and the
+total size of the files in the notification.
+
+Without the task router, every Celery task is sent to the same queue, so that
+the Celery task for a transaction with a few small files waits behind the
+Celery tasks for transactions with many large files. With the task router, each
+queue is consumed by its own Celery worker, with its own concurrency, so that
+the latency for small transactions is independent of the load of large
+transactions.
+
+Attributes:
+    DEFAULT_LARGE_PRIORITY (int): The default priority of the Celery tasks for
+        large transactions.
+    DEFAULT_LARGE_QUEUE (str): The default name of the queue for large
+        transactions.
+    DEFAULT_SMALL_PRIORITY (int): The default priority of the Celery tasks for
+        small transactions.
+    DEFAULT_SMALL_QUEUE (str): The default name of the queue for small
+        transactions.
+    MAX_PRIORITY (int): The maximum priority of a Celery task.
+    SizeTaskRouter (type): The class for the task router.
+    install_task_router (typing.Callable[[celery.Celery, SizeTaskRouter], None]):
+        Route the Celery tasks of a Celery application using a task router, and
+        then declare its queues.
+    measure_event (typing.Callable[[typing.Dict[str, typing.Any]], typing.Tuple[int, int]]):
+        Return the number and the total size of the files in a CloudEvents
+        notification.
+
+.. _Celery:
+   http://www.celeryproject.org/
+.. _CloudEvents:
+   https://cloudevents.io/
+
+"""
+
+import typing
+
+import celery
+import kombu
+
+from .metrics import NULL_REGISTRY, Registry
+
+
+# The default names of the queues.
+#
+DEFAULT_SMALL_QUEUE = 'pacifica.dispatcher_example.small'  # type: str
+DEFAULT_LARGE_QUEUE = 'pacifica.dispatcher_example.large'  # type: str
+
+# The maximum priority of a Celery task, which is the "x-max-priority" argument
+# of each queue for RabbitMQ.
+#
+MAX_PRIORITY = 9  # type: int
+
+# The default priorities of the Celery tasks, where a higher priority is
+# delivered first, e.g., if both queues are consumed by the same Celery worker.
+#
+DEFAULT_SMALL_PRIORITY = MAX_PRIORITY  # type: int
+DEFAULT_LARGE_PRIORITY = 0  # type: int
+
+
+def measure_event(event_data: typing.Dict[str, typing.Any]) -> typing.Tuple[int, int]:
+    """Return the number and the total size of the files in a CloudEvents
+    notification, i.e., of the "Files" entries of its data.
+
+    The size of a file whose size is missing or not an integer is zero.
+
+    Args:
+        event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for the
+            CloudEvents notification.
+
+    Returns:
+        typing.Tuple[int, int]: The number of files and the total size of the
+        files in bytes.
+
+    """
+
+    data = event_data.get('data', None)
+
+    if not isinstance(data, list):
+        return (0, 0)
+
+    file_count = 0  # type: int
+    total_size = 0  # type: int
+
+    for entry in data:
+        if isinstance(entry, dict) and (entry.get('destinationTable', None) == 'Files'):
+            file_count += 1
+
+            try:
+                total_size += max(0, int(entry.get('size', 0)))
+            except (TypeError, ValueError):
+                pass
+
+    return (file_count, total_size)
+
+
+class SizeTaskRouter:
+    """A Celery task router that sends the Celery task for each CloudEvents
+    notification to the queue for either small or large transactions.
+
+    A transaction is small if its number of files is at most the maximum number
+    of files, and its total size is at most the maximum size, where a maximum
+    of ``None`` is unlimited.
+
+    The task router is a callable with the signature of a Celery task router,
+    so that it is used by every publisher of the Celery task, i.e., the
+    endpoints for CloudEvents notifications and batches.
+
+    Attributes:
+        task_name (str): The name of the Celery task that is routed.
+        max_small_files (typing.Optional[int]): The maximum number of files in
+            a small transaction.
+        max_small_bytes (typing.Optional[int]): The maximum total size of the
+            files in a small transaction in bytes.
+        small_queue (str): The name of the queue for small transactions.
+        large_queue (str): The name of the queue for large transactions.
+        small_priority (int): The priority of the Celery tasks for small
+            transactions.
+        large_priority (int): The priority of the Celery tasks for large
+            transactions.
+
+    """
+
+    def __init__(self, task_name: str, max_small_files: typing.Optional[int] = None, max_small_bytes: typing.Optional[int] = None, small_queue: str = DEFAULT_SMALL_QUEUE, large_queue: str = DEFAULT_LARGE_QUEUE, small_priority: int = DEFAULT_SMALL_PRIORITY, large_priority: int = DEFAULT_LARGE_PRIORITY, metrics: Registry = NULL_REGISTRY) -> None:
+        """Initialize this task router.
+
+        Args:
+            task_name (str): The name of the Celery task that is routed.
+            max_small_files (typing.Optional[int]): The maximum number of files
+                in a small transaction, or ``None`` for unlimited.
+            max_small_bytes (typing.Optional[int]): The maximum total size of
+                the files in a small transaction in bytes, or ``None`` for
+                unlimited.
+            small_queue (str): The name of the queue for small transactions.
+            large_queue (str): The name of the queue for large transactions.
+            small_priority (int): The priority of the Celery tasks for small
+                transactions.
+            large_priority (int): The priority of the Celery tasks for large
+                transactions.
+            metrics (pacifica.dispatcher_example.metrics.Registry): The
+                registry for the metrics.
+
+        Raises:
+            ValueError: If the queues are the same, or if a priority is out of
+                range.
+
+        """
+
+        super(SizeTaskRouter, self).__init__()
+
+        if small_queue == large_queue:
+            raise ValueError('small_queue and large_queue must be different')
+
+        for priority in (small_priority, large_priority):
+            if not 0 <= priority <= MAX_PRIORITY:
+                raise ValueError('priority must be between 0 and {0}'.format(MAX_PRIORITY))
+
+        self.task_name = task_name  # type: str
+        self.max_small_files = max_small_files  # type: typing.Optional[int]
+        self.max_small_bytes = max_small_bytes  # type: typing.Optional[int]
+        self.small_queue = small_queue  # type: str
+        self.large_queue = large_queue  # type: str
+        self.small_priority = small_priority  # type: int
+        self.large_priority = large_priority  # type: int
+
+        self._events_routed_total = metrics.counter('dispatcher_example_events_routed_total', 'The number of CloudEvents notifications that were routed, by queue.', labelnames=('queue', ))  # type: pacifica.dispatcher_example.metrics.Counter
+
+    def is_small(self, event_data: typing.Dict[str, typing.Any]) -> bool:
+        """Return whether or not a CloudEvents notification is for a small
+        transaction.
+
+        Args:
+            event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for
+                the CloudEvents notification.
+
+        Returns:
+            bool: ``True`` if the transaction is small, and ``False`` otherwise.
+
+        """
+
+        (file_count, total_size) = measure_event(event_data)
+
+        if (self.max_small_files is not None) and (file_count > self.max_small_files):
+            return False
+
+        if (self.max_small_bytes is not None) and (total_size > self.max_small_bytes):
+            return False
+
+        return True
+
+    def route_event(self, event_data: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+        """Return the options for the Celery task for a CloudEvents
+        notification, i.e., its queue and priority.
+
+        Args:
+            event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for
+                the CloudEvents notification.
+
+        Returns:
+            typing.Dict[str, typing.Any]: The options.
+
+        """
+
+        if self.is_small(event_data):
+            (queue, priority) = (self.small_queue, self.small_priority)
+        else:
+            (queue, priority) = (self.large_queue, self.large_priority)
+
+        self._events_routed_total.inc(queue=queue)
+
+        return {'queue': queue, 'priority': priority}
+
+    def __call__(self, name: str, args: typing.Sequence[typing.Any], kwargs: typing.Dict[str, typing.Any], options: typing.Dict[str, typing.Any], task: typing.Optional[celery.Task] = None, **_kw) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """Return the options for a Celery task, or ``None`` if it is not the
+        Celery task that is routed, or if it has no CloudEvents notification.
+
+        Options that are given by the publisher, e.g., an explicit queue,
+        override the options that are returned by this task router.
+
+        """
+
+        if name != self.task_name:
+            return None
+
+        event_data = args[0] if args else (kwargs or {}).get('event_data', None)
+
+        if not isinstance(event_data, dict):
+            return None
+
+        return self.route_event(event_data)
+
+    def queues(self) -> typing.List[kombu.Queue]:
+        """Return the queues for the task router, which support priorities.
+
+        Returns:
+            typing.List[kombu.Queue]: The queues.
+
+        """
+
+        return [
+            kombu.Queue(queue, routing_key=queue, queue_arguments={'x-max-priority': MAX_PRIORITY})
+            for queue in (self.small_queue, self.large_queue)
+        ]
+
+
+def install_task_router(celery_app: celery.Celery, task_router: SizeTaskRouter) -> None:
+    """Route the Celery tasks of a Celery application using a task router, and
+    then declare its queues.
+
+    The default queue is declared as well, so that a Celery worker that is not
+    given a list of queues consumes from every queue. The prefetch multiplier is
+    set to one, so that a Celery worker does not reserve Celery tasks that other
+    Celery workers could start sooner, and so that priorities are respected.
+
+    Args:
+        celery_app (celery.Celery): The Celery application.
+        task_router (SizeTaskRouter): The task router.
+
+    """
+
+    celery_app.conf.task_routes = (task_router, )
+    celery_app.conf.task_queues = [kombu.Queue(celery_app.conf.task_default_queue)] + task_router.queues()
+    celery_app.conf.worker_prefetch_multiplier = 1
+
+
+# Module exports.
+#
+__all__ = ('DEFAULT_LARGE_PRIORITY', 'DEFAULT_LARGE_QUEUE', 'DEFAULT_SMALL_PRIORITY', 'DEFAULT_SMALL_QUEUE', 'MAX_PRIORITY', 'SizeTaskRouter', 'install_task_router', 'measure_event', )
@@ -0,0 +1,842 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/receivers.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Receivers for Pacifica Dispatcher Example.
+
+This module defines the `Celery`_ task and the `CherryPy`_ endpoints that
+receive `CloudEvents`_ notifications, in addition to those that are defined by
+the ``pacifica.dispatcher.receiver`` module.
+
+Duplicate CloudEvents notifications, i.e., notifications with the same
+"source" and "eventID" as an earlier notification that either succeeded or is
+still pending within a window, are coalesced with the earlier notification
+when they are received, and are short-circuited by the Celery task, if a window
+is given. A Celery task that is redelivered after it succeeded is always
+short-circuited. If the earlier notification then fails, then the earliest
+short-circuited duplicate is published again, so that the notification is not
+lost.
+
+If a store for the ingest jobs is given, then the IDs for the ingest jobs that
+are submitted, but not waited for, by the event handler are recorded, and the
+status of the row is "102 Ingesting" until the poller resolves them.
+
+Attributes:
+    DUPLICATE_STATUS (str): The status of the row for a CloudEvents
+        notification whose Celery task was short-circuited.
+    create_batch_endpoint (typing.Callable[..., typing.Any]): Construct the
+        CherryPy endpoint that receives a batch of CloudEvents notifications.
+    create_celery_app (typing.Callable[..., celery.Celery]): Construct the
+        Celery application for a Peewee model.
+    create_receive_endpoint (typing.Callable[..., typing.Any]): Construct the
+        CherryPy endpoint that receives a CloudEvents notification.
+    decode_json (typing.Callable[[bytes], typing.Any]): Parse the body of a
+        request as a JSON document.
+    find_duplicates (typing.Callable[..., typing.Dict[typing.Tuple[typing.Optional[str], str], typing.Any]]):
+        Return the rows for the earlier CloudEvents notifications that
+        duplicate a list of CloudEvents notifications.
+    parse_events (typing.Callable[[bytes, typing.Optional[str]], typing.List[typing.Dict[str, typing.Any]]]):
+        Parse the body of a request as a JSON array or JSON Lines stream of
+        CloudEvents notifications.
+    receive_batch (typing.Callable[..., typing.List[str]]): Insert the rows
+        for a batch of CloudEvents notifications and then publish the Celery
+        tasks.
+    requeue_duplicates (typing.Callable[..., typing.List[str]]): Publish the
+        Celery tasks for the duplicates of the CloudEvents notifications that
+        failed again.
+
+.. _Celery:
+   http://www.celeryproject.org/
+.. _CherryPy:
+   https://cherrypy.org/
+.. _CloudEvents:
+   https://cloudevents.io/
+
+"""
+
+import datetime
+import json
+import sys
+import time
+import traceback
+import typing
+import uuid
+
+import celery
+import cherrypy
+import peewee
+
+from pacifica.dispatcher.router import RouteNotFoundRouterError, Router
+
+from .admission import AdmissionController, AdmissionRejectedError, to_cherrypy_error
+from .ingest import INGESTING_STATUS, IngestJobStore, collect_job_ids
+from .metadata import clear_metadata_cache
+from .metrics import NULL_REGISTRY, Registry
+
+# The fast JSON parser, if it is installed. Otherwise, the ``json`` module is
+# used.
+#
+try:
+    import orjson  # pylint: disable=import-error
+except ImportError:  # pragma: no cover
+    orjson = None  # pylint: disable=invalid-name
+
+
+# The maximum number of rows per ``INSERT`` statement, which keeps the number of
+# bound parameters within the limit for SQLite.
+#
+_INSERT_CHUNK_SIZE = 32  # type: int
+
+# The maximum number of event IDs per ``SELECT`` statement for duplicates, which
+# keeps the number of bound parameters within the limit for SQLite.
+#
+_SELECT_CHUNK_SIZE = 256  # type: int
+
+# The status of the row for a CloudEvents notification whose Celery task
+# succeeded.
+#
+_SUCCEEDED_STATUS = '200 OK'  # type: str
+
+# The status of the row for a CloudEvents notification whose Celery task failed,
+# or could not be published.
+#
+_FAILED_STATUS = '500 Internal Server Error'  # type: str
+
+# The statuses of the row for a CloudEvents notification whose Celery task has
+# not finished.
+#
+_PENDING_STATUSES = ('202 Accepted', '102 Processing', )  # type: typing.Tuple[str, ...]
+
+# The status of the row for a CloudEvents notification whose Celery task was
+# short-circuited, because the CloudEvents notification is a duplicate, or the
+# Celery task was redelivered after it succeeded.
+#
+DUPLICATE_STATUS = '208 Already Reported'  # type: str
+
+
+def _event_key(event_data: typing.Dict[str, typing.Any]) -> typing.Optional[typing.Tuple[typing.Optional[str], str]]:
+    """Return the key that identifies a CloudEvents notification, i.e., its
+    "source" and "eventID", or ``None`` if it has no "eventID".
+
+    """
+
+    event_id = event_data.get('eventID', None)
+
+    if event_id is None:
+        return None
+
+    return (event_data.get('source', None), str(event_id))
+
+
+def _suppressed_reason(inst: typing.Any) -> str:
+    """Return the reason that a CloudEvents notification is suppressed by the
+    row for an earlier CloudEvents notification, i.e., "succeeded" or
+    "pending".
+
+    """
+
+    return 'succeeded' if inst.task_status == _SUCCEEDED_STATUS else 'pending'
+
+
+def _duplicates_query(model: type, window: float) -> peewee.ModelSelect:
+    """Return the query for the rows for the CloudEvents notifications that
+    succeeded or whose ingest jobs are outstanding, or that are pending and were
+    received within the window, in the order that they were received.
+
+    """
+
+    return model.select().where(
+        model.task_status.in_((_SUCCEEDED_STATUS, INGESTING_STATUS, )) |
+        (model.task_status.in_(_PENDING_STATUSES) & (model.created >= datetime.datetime.now() - datetime.timedelta(seconds=window)))
+    ).order_by(model.created, model.task_id)
+
+
+def find_duplicates(model: type, events: typing.List[typing.Dict[str, typing.Any]], window: float) -> typing.Dict[typing.Tuple[typing.Optional[str], str], typing.Any]:
+    """Return the rows for the earlier CloudEvents notifications that
+    duplicate a list of CloudEvents notifications.
+
+    An earlier CloudEvents notification duplicates a CloudEvents notification
+    if it has the same "source" and "eventID", and its Celery task either
+    succeeded, submitted ingest jobs that are outstanding, or has not finished
+    and was received within the window. A
+    pending row that is older than the window is assumed to have been
+    abandoned, e.g., by a worker that crashed.
+
+    Args:
+        model (type): The class for the Peewee model.
+        events (typing.List[typing.Dict[str, typing.Any]]): The JSON-encoded
+            data for each CloudEvents notification.
+        window (float): The window in seconds.
+
+    Returns:
+        typing.Dict[typing.Tuple[typing.Optional[str], str], typing.Any]: The
+        earliest row for each key, i.e., "source" and "eventID", that has a
+        duplicate.
+
+    """
+
+    keys = set(filter(None, map(_event_key, events)))  # type: typing.Set[typing.Tuple[typing.Optional[str], str]]
+
+    duplicates = {}  # type: typing.Dict[typing.Tuple[typing.Optional[str], str], typing.Any]
+
+    for event_ids_chunk in peewee.chunked(sorted({event_id for (_source, event_id) in keys}), _SELECT_CHUNK_SIZE):
+        for inst in _duplicates_query(model, window).where(model.event_id.in_(event_ids_chunk)):
+            key = (inst.source, inst.event_id)
+
+            if (key in keys) and (key not in duplicates):
+                duplicates[key] = inst
+
+    return duplicates
+
+
+def _find_earlier_duplicate(model: type, inst: typing.Any, window: float) -> typing.Optional[typing.Any]:
+    """Return the row for a CloudEvents notification that was received before
+    the CloudEvents notification for a row, and that duplicates it, or
+    ``None``.
+
+    """
+
+    if inst.event_id is None:
+        return None
+
+    return _duplicates_query(model, window).where(
+        _same_event(model, inst) &
+        (model.task_id != inst.task_id) &
+        ((model.created < inst.created) | ((model.created == inst.created) & (model.task_id < inst.task_id)))
+    ).first()
+
+
+def _same_event(model: type, inst: typing.Any) -> peewee.Expression:
+    """Return the expression for the rows for the CloudEvents notifications
+    with the same "source" and "eventID" as the CloudEvents notification for a
+    row.
+
+    """
+
+    return (model.event_id == inst.event_id) & (model.source.is_null() if inst.source is None else (model.source == inst.source))
+
+
+def requeue_duplicates(model: type, receive_task: celery.Task, task_ids: typing.List[str], window: float) -> typing.List[str]:
+    """Publish the Celery tasks for the duplicates of the CloudEvents
+    notifications that failed again.
+
+    The Celery task for a duplicate CloudEvents notification is short-circuited
+    while an earlier CloudEvents notification is pending or its ingest jobs are
+    outstanding, on the assumption that the earlier one succeeds. For each row
+    that has since failed, e.g., with the status "500 Internal Server Error",
+    "422 Unprocessable Entity" or "504 Gateway Timeout", the earliest row with
+    the status "208 Already Reported" for the same "source" and "eventID" is
+    reset to "202 Accepted", and its Celery task is published again, unless
+    another row still stands for the CloudEvents notification. If that Celery
+    task fails too, then the next duplicate is published, and so on.
+
+    If a Celery task cannot be published, then its row is marked as failed, with
+    the exception.
+
+    Args:
+        model (type): The class for the Peewee model.
+        receive_task (celery.Task): The Celery task that is triggered when a
+            CloudEvents notification is received.
+        task_ids (typing.List[str]): The IDs for the Celery tasks whose rows
+            failed.
+        window (float): The window in seconds for duplicate CloudEvents
+            notifications that are pending.
+
+    Returns:
+        typing.List[str]: The IDs for the Celery tasks that were published.
+
+    """
+
+    database = model._meta.database  # type: peewee.Database  # pylint: disable=protected-access
+
+    duplicate_insts = []  # type: typing.List[typing.Any]
+
+    with database.connection_context():
+        insts = []  # type: typing.List[typing.Any]
+
+        for task_ids_chunk in peewee.chunked(sorted(set(map(str, task_ids))), _SELECT_CHUNK_SIZE):
+            insts.extend(model.select().where(model.task_id.in_(task_ids_chunk) & model.event_id.is_null(False) & model.task_status.not_in((_SUCCEEDED_STATUS, DUPLICATE_STATUS, INGESTING_STATUS, ) + _PENDING_STATUSES)))
+
+        for inst in insts:
+            if _duplicates_query(model, window).where(_same_event(model, inst)).exists():
+                continue
+
+            duplicate_inst = model.select().where(_same_event(model, inst) & (model.task_status == DUPLICATE_STATUS)).order_by(model.created, model.task_id).first()
+
+            # The status is only reset if it is unchanged, so that a duplicate
+            # is published once, even if several rows for the same CloudEvents
+            # notification fail at the same time.
+            #
+            if (duplicate_inst is not None) and model.update({
+                    model.task_status: '202 Accepted',
+                    model.updated: datetime.datetime.now(),
+            }).where((model.task_id == duplicate_inst.task_id) & (model.task_status == DUPLICATE_STATUS)).execute():
+                duplicate_insts.append(duplicate_inst)
+
+    requeued = []  # type: typing.List[str]
+
+    for duplicate_inst in duplicate_insts:
+        try:
+            receive_task.apply_async((json.loads(duplicate_inst.event_data), ), task_id=str(duplicate_inst.task_id))
+        # pylint: disable=broad-except
+        except Exception:
+            (exc_type, exc_value, exc_traceback) = sys.exc_info()
+
+            with database.connection_context():
+                model.update({
+                    model.task_status: _FAILED_STATUS,
+                    model.exc_type: exc_type.__name__,
+                    model.exc_value: str(exc_value),
+                    model.exc_traceback: ''.join(traceback.format_tb(exc_traceback)),
+                    model.updated: datetime.datetime.now(),
+                }).where((model.task_id == duplicate_inst.task_id) & (model.task_status == '202 Accepted')).execute()
+        # pylint: enable=broad-except
+        else:
+            requeued.append(str(duplicate_inst.task_id))
+
+    return requeued
+
+
+def _to_row(event_data: typing.Dict[str, typing.Any], task_id: str, task_application_name: str, task_name: str) -> typing.Dict[str, typing.Any]:
+    """Return the initial values of the fields of the row for a CloudEvents
+    notification.
+
+    Args:
+        event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for the
+            CloudEvents notification.
+        task_id (str): The ID for the Celery task.
+        task_application_name (str): The name of the Celery application.
+        task_name (str): The name of the Celery task.
+
+    Returns:
+        typing.Dict[str, typing.Any]: The values of the fields.
+
+    """
+
+    return {
+        'event_type': event_data.get('eventType', None),
+        'event_type_version': event_data.get('eventTypeVersion', None),
+        'source': event_data.get('source', None),
+        'event_id': event_data.get('eventID', None),
+        'event_time': event_data.get('eventTime', None),
+        'schema_url': event_data.get('schemaURL', None),
+        'content_type': event_data.get('contentType', None),
+
+        'event_data': json.dumps(event_data),
+        'data': json.dumps(event_data.get('data', None)),
+
+        'task_id': task_id,
+        'task_application_name': task_application_name,
+        'task_name': task_name,
+        'task_status': '202 Accepted',
+
+        'exc_type': None,
+        'exc_value': None,
+        'exc_traceback': '',
+    }
+
+
+def create_celery_app(model: type, router: Router, name: str, receive_task_name: str, *args, dedupe_window: typing.Optional[float] = None, metrics: Registry = NULL_REGISTRY, ingest_jobs: typing.Optional[IngestJobStore] = None, **kwargs) -> celery.Celery:
+    """Construct the Celery application for a Peewee model.
+
+    The Celery task behaves in the same way as the task that is constructed by
+    the ``create_celery_app`` class method of the Peewee model, except that the
+    row for the CloudEvents notification is updated if it has already been
+    inserted, e.g., by the CherryPy endpoint for batches, rather than always
+    being inserted.
+
+    If the row has already been inserted, then the time between its creation
+    and the start of the Celery task is observed as the queue wait time.
+
+    If the row has already been updated by a Celery task that succeeded, e.g.,
+    because the Celery task was redelivered, or, if a window is given, if the
+    CloudEvents notification duplicates an earlier CloudEvents notification,
+    then the Celery task is short-circuited, i.e., the CloudEvents notification
+    is not routed, and the status of the row is "208 Already Reported". A
+    Celery task that is redelivered after it recorded its ingest jobs is
+    short-circuited in the same way. If the Celery task for a CloudEvents
+    notification fails, then the Celery task for its earliest short-circuited
+    duplicate, if any, is published again by ``requeue_duplicates``. The poller
+    for the ingest jobs must do the same for the rows that it fails.
+
+    If a store is given, and the event handler submits ingest jobs without
+    waiting for them, then their IDs are recorded in the store, and the status
+    of the row is "102 Ingesting", rather than "200 OK", until the poller
+    resolves them. The store must be bound to the same database as the Peewee
+    model, so that both are written in one transaction.
+
+    Args:
+        model (type): The class for the Peewee model.
+        router (pacifica.dispatcher.router.Router): The router.
+        name (str): The name of the Celery application.
+        receive_task_name (str): The name of the Celery task.
+        *args: The positional arguments for the Celery application.
+        dedupe_window (typing.Optional[float]): The window in seconds for
+            duplicate CloudEvents notifications that are pending, or ``None``
+            to disable deduplication.
+        metrics (pacifica.dispatcher_example.metrics.Registry): The registry
+            for the metrics.
+        ingest_jobs (typing.Optional[pacifica.dispatcher_example.ingest.IngestJobStore]):
+            The store for the outstanding ingest jobs, or ``None``.
+        **kwargs: The keyword arguments for the Celery application.
+
+    Returns:
+        celery.Celery: The Celery application.
+
+    """
+
+    database = model._meta.database  # type: peewee.Database  # pylint: disable=protected-access
+
+    celery_app = celery.Celery(name, *args, **kwargs)  # type: celery.Celery
+
+    celery_app.conf.worker_redirect_stdouts = False
+
+    queue_wait_seconds = metrics.histogram('dispatcher_example_queue_wait_seconds', 'The time between the receipt of each CloudEvents notification and the start of its task.')  # type: pacifica.dispatcher_example.metrics.Histogram
+    task_seconds = metrics.histogram('dispatcher_example_task_seconds', 'The duration of each task, by its final status.', labelnames=('status', ))  # type: pacifica.dispatcher_example.metrics.Histogram
+    events_suppressed_total = _events_suppressed_total(metrics)  # type: pacifica.dispatcher_example.metrics.Counter
+
+    # The Celery task is not shared with other Celery applications, because it
+    # is bound to the Peewee model and the router.
+    #
+    # pylint: disable=unused-variable
+    @celery_app.task(bind=True, ignore_result=True, name=receive_task_name, shared=False)
+    def receive_task(self: celery.Task, event_data: typing.Dict[str, typing.Any]) -> None:
+        """Receive and handle a CloudEvents notification.
+
+        Args:
+            event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for
+                the CloudEvents notification.
+
+        """
+
+        start = time.perf_counter()  # type: float
+
+        with database.connection_context():
+            inst = model.get_or_none(model.task_id == self.request.id)
+
+            if inst is None:
+                inst = model(**_to_row(event_data, self.request.id, name, receive_task_name))
+                inst.save(force_insert=True)
+            elif inst.task_status in (_SUCCEEDED_STATUS, DUPLICATE_STATUS, INGESTING_STATUS):
+                events_suppressed_total.inc(stage='task', reason='redelivered')
+                return
+            elif metrics.enabled and isinstance(inst.created, datetime.datetime):
+                queue_wait_seconds.observe(max(0.0, (datetime.datetime.now() - inst.created).total_seconds()))
+
+            duplicate_inst = _find_earlier_duplicate(model, inst, dedupe_window) if dedupe_window is not None else None
+
+        if duplicate_inst is not None:
+            events_suppressed_total.inc(stage='task', reason=_suppressed_reason(duplicate_inst))
+
+            inst.task_status = DUPLICATE_STATUS
+            with database.connection_context():
+                inst.save()
+
+            task_seconds.observe(time.perf_counter() - start, status=inst.task_status.split(' ')[0])
+            return
+
+        try:
+            route = router.match_first_or_raise(event_data)
+        except RouteNotFoundRouterError as exc:
+            inst.task_status = '422 Unprocessable Entity'
+            inst.exc_type = 'RouteNotFoundRouterError'
+            inst.exc_value = str(exc)
+            with database.connection_context():
+                inst.save()
+        else:
+            inst.task_status = '102 Processing'
+            with database.connection_context():
+                inst.save()
+
+            try:
+                with collect_job_ids() as job_ids:
+                    route(event_data)
+            # pylint: disable=broad-except
+            except Exception:
+                (exc_type, exc_value, exc_traceback) = sys.exc_info()
+                inst.exc_type = exc_type.__name__
+                inst.exc_value = str(exc_value)
+                inst.exc_traceback = traceback.format_tb(exc_traceback)
+
+                inst.task_status = _FAILED_STATUS
+                with database.connection_context():
+                    inst.save()
+            # pylint: enable=broad-except
+            else:
+                if (ingest_jobs is not None) and job_ids:
+                    # The status is updated and the ingest jobs are recorded in
+                    # the same transaction, so that a row is never "102
+                    # Ingesting" without its ingest jobs, e.g., if the Celery
+                    # worker dies in between, in which case the redelivered
+                    # Celery task would be short-circuited, and the poller would
+                    # never resolve the row.
+                    #
+                    inst.task_status = INGESTING_STATUS
+                    with database.connection_context():
+                        with database.atomic():
+                            inst.save()
+                            ingest_jobs.add(self.request.id, job_ids)
+                else:
+                    inst.task_status = '200 OK'
+                    with database.connection_context():
+                        inst.save()
+
+        # Discard the metadata descriptions that were extracted by the router,
+        # if any, e.g., for a CloudEvents notification that no route matched,
+        # or whose event handler did not consume them, so that the payload is
+        # not kept alive by the thread until its next Celery task.
+        #
+        clear_metadata_cache()
+
+        task_seconds.observe(time.perf_counter() - start, status=inst.task_status.split(' ')[0])
+
+        if (dedupe_window is not None) and (inst.task_status in (_FAILED_STATUS, '422 Unprocessable Entity', )):
+            requeue_duplicates(model, self, [self.request.id], dedupe_window)
+    # pylint: enable=unused-variable
+
+    return celery_app
+
+
+def decode_json(body: bytes) -> typing.Any:
+    """Parse the body of a request as a JSON document.
+
+    If `orjson`_ is installed, then it is used to parse the body, which is
+    several times faster for large documents, and avoids decoding the body to a
+    string first. If it rejects the body, e.g., because of an integer that does
+    not fit in 64 bits, then the body is parsed again by the ``json`` module,
+    so that the same documents are accepted either way.
+
+    Args:
+        body (bytes): The body of the request, encoded as UTF-8.
+
+    Returns:
+        typing.Any: The JSON document.
+
+    Raises:
+        ValueError: If the body is not a JSON document.
+
+    .. _orjson:
+       https://github.com/ijl/orjson
+
+    """
+
+    if orjson is not None:
+        try:
+            return orjson.loads(body)
+        except ValueError:
+            pass
+
+    return json.loads(body.decode('utf-8'))
+
+
+def _json_processor(entity: 'cherrypy._cpreqbody.Entity') -> None:
+    """Parse the entity of a request as a JSON document, and then store it in
+    ``cherrypy.request.json``, in the same way as the default processor of the
+    "json_in" tool of CherryPy, but using ``decode_json``.
+
+    """
+
+    if not entity.headers.get('Content-Length', ''):
+        raise cherrypy.HTTPError(411)
+
+    body = entity.fp.read()  # type: bytes
+
+    with cherrypy.HTTPError.handle(ValueError, 400, 'Invalid JSON document'):
+        cherrypy.serving.request.json = decode_json(body)
+
+
+def parse_events(body: bytes, content_type: typing.Optional[str] = None) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Parse the body of a request as a JSON array or JSON Lines stream of
+    CloudEvents notifications.
+
+    Args:
+        body (bytes): The body of the request.
+        content_type (typing.Optional[str]): The media type of the body, where
+            "application/x-ndjson" and "application/jsonl" select JSON Lines.
+            Otherwise, the body is parsed as a JSON array.
+
+    Returns:
+        typing.List[typing.Dict[str, typing.Any]]: The JSON-encoded data for
+        each CloudEvents notification.
+
+    Raises:
+        ValueError: If the body is not a JSON array or JSON Lines stream of JSON
+            objects.
+
+    """
+
+    if (content_type or '').split(';')[0].strip() in ('application/x-ndjson', 'application/jsonl', 'application/json-lines'):
+        events = [decode_json(line) for line in body.splitlines() if line.strip()]
+    else:
+        events = decode_json(body)
+
+    if not isinstance(events, list):
+        raise ValueError('body must be a JSON array or JSON Lines stream')
+
+    for event_data in events:
+        if not isinstance(event_data, dict):
+            raise ValueError('each CloudEvents notification must be a JSON object')
+
+    return events
+
+
+def _events_suppressed_total(metrics: Registry) -> 'pacifica.dispatcher_example.metrics.Counter':
+    """Return the counter for the CloudEvents notifications that were
+    suppressed.
+
+    """
+
+    return metrics.counter('dispatcher_example_events_suppressed_total', 'The number of duplicate CloudEvents notifications that were suppressed, by the stage that suppressed them and the reason.', labelnames=('stage', 'reason', ))
+
+
+def receive_batch(model: type, receive_task: celery.Task, events: typing.List[typing.Dict[str, typing.Any]], dedupe_window: typing.Optional[float] = None, metrics: Registry = NULL_REGISTRY) -> typing.List[str]:
+    """Insert the rows for a batch of CloudEvents notifications and then
+    publish the Celery tasks.
+
+    The rows are inserted in a single transaction, and the Celery tasks are
+    published as a single group. If the Celery tasks cannot be published, then
+    the rows are marked as failed, with the exception, before it is raised, so
+    that they are not left pending without a Celery task.
+
+    If a window is given, then each CloudEvents notification that duplicates
+    an earlier CloudEvents notification, either in the database or earlier in
+    the batch, is coalesced with it, i.e., no row is inserted and no Celery task
+    is published for it, and the ID for the Celery task for the earlier
+    CloudEvents notification is returned in its place.
+
+    Args:
+        model (type): The class for the Peewee model.
+        receive_task (celery.Task): The Celery task that is triggered when a
+            CloudEvents notification is received.
+        events (typing.List[typing.Dict[str, typing.Any]]): The JSON-encoded
+            data for each CloudEvents notification.
+        dedupe_window (typing.Optional[float]): The window in seconds for
+            duplicate CloudEvents notifications that are pending, or ``None``
+            to disable deduplication.
+        metrics (pacifica.dispatcher_example.metrics.Registry): The registry
+            for the metrics.
+
+    Returns:
+        typing.List[str]: The ID for the Celery task for each CloudEvents
+        notification, in the same order.
+
+    """
+
+    if not events:
+        return []
+
+    database = model._meta.database  # type: peewee.Database  # pylint: disable=protected-access
+
+    task_ids = []  # type: typing.List[str]
+    new_events = []  # type: typing.List[typing.Tuple[typing.Dict[str, typing.Any], str]]
+
+    if dedupe_window is None:
+        for event_data in events:
+            task_id = str(uuid.uuid4())
+            task_ids.append(task_id)
+            new_events.append((event_data, task_id))
+    else:
+        events_suppressed_total = _events_suppressed_total(metrics)  # type: pacifica.dispatcher_example.metrics.Counter
+
+        with database.connection_context():
+            duplicates = find_duplicates(model, events, dedupe_window)  # type: typing.Dict[typing.Tuple[typing.Optional[str], str], typing.Any]
+
+        # The ID for the Celery task for each key, i.e., "source" and
+        # "eventID", that has been received earlier in the batch.
+        #
+        batch_task_ids = {}  # type: typing.Dict[typing.Tuple[typing.Optional[str], str], str]
+
+        for event_data in events:
+            key = _event_key(event_data)
+
+            if key in duplicates:
+                events_suppressed_total.inc(stage='receive', reason=_suppressed_reason(duplicates[key]))
+                task_ids.append(str(duplicates[key].task_id))
+            elif key in batch_task_ids:
+                events_suppressed_total.inc(stage='receive', reason='pending')
+                task_ids.append(batch_task_ids[key])
+            else:
+                task_id = str(uuid.uuid4())
+
+                if key is not None:
+                    batch_task_ids[key] = task_id
+
+                task_ids.append(task_id)
+                new_events.append((event_data, task_id))
+
+    if not new_events:
+        return task_ids
+
+    rows = [
+        _to_row(event_data, task_id, receive_task.app.main, receive_task.name)
+        for (event_data, task_id) in new_events
+    ]  # type: typing.List[typing.Dict[str, typing.Any]]
+
+    with database.connection_context():
+        with database.atomic():
+            for rows_chunk in peewee.chunked(rows, _INSERT_CHUNK_SIZE):
+                model.insert_many(rows_chunk).execute()
+
+    try:
+        celery.group(
+            receive_task.signature((event_data, ), task_id=task_id)
+            for (event_data, task_id) in new_events
+        ).apply_async()
+    except Exception:
+        # Otherwise, the rows would be counted as pending by the admission
+        # controller, and would suppress the duplicates of their CloudEvents
+        # notifications, i.e., the retries of the batch, until they are older
+        # than the window. The Celery task for a row that was published before
+        # the failure still runs, and overwrites its status.
+        #
+        (exc_type, exc_value, exc_traceback) = sys.exc_info()
+
+        with database.connection_context():
+            with database.atomic():
+                for task_ids_chunk in peewee.chunked([task_id for (_event_data, task_id) in new_events], _SELECT_CHUNK_SIZE):
+                    model.update({
+                        model.task_status: _FAILED_STATUS,
+                        model.exc_type: exc_type.__name__,
+                        model.exc_value: str(exc_value),
+                        model.exc_traceback: ''.join(traceback.format_tb(exc_traceback)),
+                        model.updated: datetime.datetime.now(),
+                    }).where(model.task_id.in_(task_ids_chunk) & (model.task_status == '202 Accepted')).execute()
+
+        raise
+
+    return task_ids
+
+
+def _admit(admission: typing.Optional[AdmissionController], count: int) -> None:
+    """Admit a number of CloudEvents notifications, or raise the CherryPy error
+    for the rejected request.
+
+    """
+
+    if admission is None:
+        return
+
+    try:
+        admission.admit(count)
+    except AdmissionRejectedError as exc:
+        raise to_cherrypy_error(exc)
+
+
+def create_receive_endpoint(model: type, receive_task: celery.Task, dedupe_window: typing.Optional[float] = None, metrics: Registry = NULL_REGISTRY, admission: typing.Optional[AdmissionController] = None) -> typing.Any:
+    """Construct the CherryPy endpoint that receives a CloudEvents
+    notification.
+
+    The endpoint behaves in the same way as the endpoint that is constructed by
+    the ``create_cherrypy_app`` class method of the Peewee model, except that
+    the row for the CloudEvents notification is inserted before the Celery task
+    is published, so that duplicate CloudEvents notifications that are received
+    before the Celery task starts are coalesced with it, if a window is given,
+    and that the CloudEvents notification is rejected while the load is over
+    the limits of the admission controller, if one is given.
+
+    Args:
+        model (type): The class for the Peewee model.
+        receive_task (celery.Task): The Celery task that is triggered when a
+            CloudEvents notification is received.
+        dedupe_window (typing.Optional[float]): The window in seconds for
+            duplicate CloudEvents notifications that are pending, or ``None``
+            to disable deduplication.
+        metrics (pacifica.dispatcher_example.metrics.Registry): The registry
+            for the metrics.
+        admission (typing.Optional[pacifica.dispatcher_example.admission.AdmissionController]):
+            The admission controller, or ``None`` to admit every CloudEvents
+            notification.
+
+    Returns:
+        typing.Any: The CherryPy endpoint, which is mounted as an attribute of
+        the root object of the CherryPy application.
+
+    """
+
+    # pylint: disable=too-few-public-methods
+    class Receive:
+        """Receive entrypoint for new cloud events."""
+
+        exposed = True
+
+        # pylint: disable=invalid-name
+        @staticmethod
+        @cherrypy.tools.json_in(processor=_json_processor)
+        @cherrypy.tools.json_out()
+        def POST() -> str:
+            """Receive a CloudEvents notification."""
+            if not isinstance(cherrypy.request.json, dict):
+                raise cherrypy.HTTPError('400', 'CloudEvents notification must be a JSON object')
+
+            _admit(admission, 1)
+
+            (task_id, ) = receive_batch(model, receive_task, [cherrypy.request.json], dedupe_window=dedupe_window, metrics=metrics)
+
+            return task_id
+        # pylint: enable=invalid-name
+    # pylint: enable=too-few-public-methods
+
+    return Receive()
+
+
+def create_batch_endpoint(model: type, receive_task: celery.Task, dedupe_window: typing.Optional[float] = None, metrics: Registry = NULL_REGISTRY, admission: typing.Optional[AdmissionController] = None) -> typing.Any:
+    """Construct the CherryPy endpoint that receives a batch of CloudEvents
+    notifications.
+
+    The endpoint accepts a POST request whose body is a JSON array or, if the
+    media type is "application/x-ndjson", a JSON Lines stream, and responds
+    with a JSON array of the IDs for the Celery tasks. If an admission controller
+    is given, then the batch is either admitted or rejected as a whole.
+
+    Args:
+        model (type): The class for the Peewee model.
+        receive_task (celery.Task): The Celery task that is triggered when a
+            CloudEvents notification is received.
+        dedupe_window (typing.Optional[float]): The window in seconds for
+            duplicate CloudEvents notifications that are pending, or ``None``
+            to disable deduplication.
+        metrics (pacifica.dispatcher_example.metrics.Registry): The registry
+            for the metrics.
+        admission (typing.Optional[pacifica.dispatcher_example.admission.AdmissionController]):
+            The admission controller, or ``None`` to admit every CloudEvents
+            notification.
+
+    Returns:
+        typing.Any: The CherryPy endpoint, which is mounted as an attribute of
+        the root object of the CherryPy application.
+
+    """
+
+    # pylint: disable=too-few-public-methods
+    class Batch:
+        """Batch entrypoint for new cloud events."""
+
+        exposed = True
+
+        # pylint: disable=invalid-name
+        @staticmethod
+        @cherrypy.tools.json_out()
+        def POST() -> typing.List[str]:
+            """Receive a batch of CloudEvents notifications."""
+            try:
+                events = parse_events(cherrypy.request.body.read(), cherrypy.request.headers.get('Content-Type', None))
+            except ValueError as exc:
+                raise cherrypy.HTTPError('400', str(exc))
+
+            _admit(admission, len(events))
+
+            return receive_batch(model, receive_task, events, dedupe_window=dedupe_window, metrics=metrics)
+        # pylint: enable=invalid-name
+    # pylint: enable=too-few-public-methods
+
+    return Batch()
+
+
+# Module exports.
+#
+__all__ = ('DUPLICATE_STATUS', 'create_batch_endpoint', 'create_celery_app', 'create_receive_endpoint', 'decode_json', 'find_duplicates', 'parse_events', 'receive_batch', 'requeue_duplicates', )
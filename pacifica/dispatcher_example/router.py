@@ -12,59 +12,341 @@
 This module defines the router for Pacifica Dispatcher Example.
 
 Attributes:
+    checkpoints (typing.Optional[pacifica.dispatcher_example.checkpoints.CheckpointStore]):
+        The store for the per-file checkpoints, or ``None``.
+    downloader_runner (pacifica.dispatcher_example.runners.LazyDownloaderRunner):
+        The downloader runner, whose runner is the sharded downloader runner.
+    event_handler (pacifica.dispatcher_example.event_handlers.ExampleEventHandler):
+        The example event handler.
+    ingest_jobs (typing.Optional[pacifica.dispatcher_example.ingest.IngestJobStore]):
+        The store for the outstanding ingest jobs, or ``None``.
+    metrics (pacifica.dispatcher_example.metrics.Registry): The registry for
+        the metrics.
     router (pacifica.dispatcher.router.Router): The router.
+    transform (pacifica.dispatcher_example.transforms.Transform): The transform
+        for the route of the example event handler.
+    uploader_runner (pacifica.dispatcher_example.runners.LazyUploaderRunner):
+        The uploader runner.
 
 """
 
+import functools
 import os
+import typing
 
 from jsonpath2.path import Path
 
-from pacifica.cli.methods import generate_global_config, generate_requests_auth
-from pacifica.dispatcher.downloader_runners import RemoteDownloaderRunner
-from pacifica.dispatcher.router import Router
-from pacifica.dispatcher.uploader_runners import RemoteUploaderRunner
-from pacifica.downloader import Downloader
-from pacifica.uploader import Uploader
-
+from .batching import DEFAULT_MAX_DELAY
+from .cache import DEFAULT_MAX_BYTES, ResultCache
+from .checkpoints import CheckpointStore
 from .event_handlers import ExampleEventHandler
+from .executors import SERIAL
+from .ingest import DEFAULT_TIMEOUT, IngestJobStore
+from .metrics import NULL_REGISTRY, Registry
+from .pipeline import DEFAULT_DOWNLOAD_BATCH_SIZE, DEFAULT_QUEUE_SIZE, PHASED
+from .routers import IndexedRouter
+from .runners import DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_SPOOL_BYTES, DEFAULT_POLL_INTERVAL, DEFAULT_POOL_MAXSIZE, LazyDownloaderRunner, LazyUploaderRunner, ShardedRemoteDownloaderRunner, SpoolingRemoteUploaderRunner, create_session
+from .transforms import DEFAULT_CHUNK_SIZE, UPPER, create_transform
+
+
+@functools.lru_cache(maxsize=None)
+def _read_config() -> typing.Tuple['ConfigParser', typing.Dict[str, typing.Any]]:
+    """Read the configuration for Pacifica CLI, and then extract the
+    authentication credentials for HTTP requests from it.
+
+    Pacifica CLI is imported here, rather than at the top of the module, so that
+    importing this module does not pay for it.
+
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from pacifica.cli.methods import generate_global_config, generate_requests_auth
+    # pylint: enable=import-outside-toplevel
+
+    config = generate_global_config()  # type: ConfigParser
+
+    return (config, generate_requests_auth(config))
+
+
+@functools.lru_cache(maxsize=None)
+def _create_session() -> 'requests.Session':
+    """Construct the pooled HTTP session that is shared by the Pacifica
+    downloader and uploader, so that the connections to the Pacifica servers
+    are reused across the CloudEvents notifications that are handled by the
+    process, i.e., across Celery tasks.
+
+    """
+
+    return create_session(pool_maxsize=pool_maxsize)
+
+
+def _create_downloader_runner() -> ShardedRemoteDownloaderRunner:
+    """Construct the __remote__ downloader runner using a Pacifica downloader
+    that is itself constructed using the configuration for Pacifica CLI, the
+    extracted authentication credentials and the pooled HTTP session.
+
+    The downloader runner splits the files for each CloudEvents notification
+    into shards, and then requests a cart for each shard, in parallel.
+
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from pacifica.downloader import Downloader
+    # pylint: enable=import-outside-toplevel
+
+    (config, auth) = _read_config()
+
+    return ShardedRemoteDownloaderRunner(Downloader(cart_api_url=config.get('endpoints', 'download_url'), auth=auth, session=_create_session()), shard_files=shard_files, max_concurrency=max_concurrency, poll_interval=poll_interval)
+
 
-# Read the configuration for Pacifica CLI.
+def _create_uploader_runner() -> SpoolingRemoteUploaderRunner:
+    """Construct the __remote__ uploader runner using a Pacifica uploader that
+    is itself constructed using the configuration for Pacifica CLI, the
+    extracted authentication credentials and the pooled HTTP session.
+
+    The uploader runner spools each bundle in memory, unless it is larger than
+    the maximum size, in which case it is written to the staging directory.
+
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from pacifica.uploader import Uploader
+    # pylint: enable=import-outside-toplevel
+
+    (config, auth) = _read_config()
+
+    uploader = Uploader(upload_url=config.get('endpoints', 'upload_url'), status_url=config.get('endpoints', 'upload_status_url'), auth=auth)  # type: pacifica.uploader.Uploader
+
+    # The Pacifica uploader does not receive an HTTP session, unlike the
+    # Pacifica downloader, and so its own HTTP session is replaced.
+    #
+    uploader.session = _create_session()
+
+    return SpoolingRemoteUploaderRunner(uploader, staging_dir=staging_dir, max_spool_bytes=max_spool_bytes)
+
+
+def __getattr__(name: str) -> typing.Any:
+    """Return the configuration for Pacifica CLI ("config") or the extracted
+    authentication credentials ("auth"), reading them on first use.
+
+    """
+
+    if name == 'config':
+        return _read_config()[0]
+
+    if name == 'auth':
+        return _read_config()[1]
+
+    raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
+
+
+# Read the name of the staging directory, and the maximum size in bytes of a
+# bundle that is kept in memory by the uploader runner.
 #
-config = generate_global_config()  # type: ConfigParser
+# The name of the staging directory is read from the "STAGING_DIR" environment
+# variable, e.g., a directory on a tmpfs or a fast local disk. The temporary
+# directories for the downloaded and transformed files, and the bundles that are
+# larger than the maximum size, are created in the staging directory. If the
+# "STAGING_DIR" environment variable is undefined, then the default temporary
+# directory is used.
+#
+# The maximum size is read from the "UPLOAD_SPOOL_BYTES" environment variable.
+# If the "UPLOAD_SPOOL_BYTES" environment variable is "0", then every bundle is
+# written to the staging directory.
+#
+staging_dir = os.getenv('STAGING_DIR')  # type: typing.Optional[str]
+max_spool_bytes = int(os.getenv('UPLOAD_SPOOL_BYTES', DEFAULT_MAX_SPOOL_BYTES))  # type: int
 
-# Extract the authentication credentials for HTTP requests from the
-# configuration for Pacifica CLI.
+# Read the maximum number of files per cart, the maximum number of carts that
+# are requested at the same time, and the number of seconds between the checks
+# of the status of a cart, for the downloader runner, and the maximum number of
+# connections per host for the pooled HTTP session.
+#
+# The maximum number of files per cart is read from the "DOWNLOAD_SHARD_FILES"
+# environment variable. If the "DOWNLOAD_SHARD_FILES" environment variable is
+# undefined, then the default behavior is to request one cart for every file
+# that is downloaded at once.
+#
+# The maximum number of carts is read from the "DOWNLOAD_CONCURRENCY"
+# environment variable, and is shared by every CloudEvents notification that is
+# handled by the process, i.e., it limits the number of concurrent requests to
+# the cart server.
+#
+# The interval is read from the "CART_POLL_INTERVAL" environment variable.
 #
-auth = generate_requests_auth(config)  # type: typing.Dict[str, typing.Any]
+# The maximum number of connections per host is read from the
+# "HTTP_POOL_MAXSIZE" environment variable, which should be at least the
+# maximum number of carts.
+#
+shard_files = int(os.getenv('DOWNLOAD_SHARD_FILES')) if os.getenv('DOWNLOAD_SHARD_FILES') else None  # type: typing.Optional[int]
+max_concurrency = int(os.getenv('DOWNLOAD_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))  # type: int
+poll_interval = float(os.getenv('CART_POLL_INTERVAL', DEFAULT_POLL_INTERVAL))  # type: float
+pool_maxsize = int(os.getenv('HTTP_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE))  # type: int
+
+# Construct the downloader and uploader runners.
+#
+# The __remote__ downloader and uploader runners, and the configuration for
+# Pacifica CLI that they are constructed from, are constructed when the runners
+# are first used, i.e., by the Celery worker when it handles the first
+# CloudEvents notification, rather than when this module is imported. The runners
+# and their pooled HTTP session are then reused by every later CloudEvents
+# notification that is handled by the same process.
+#
+downloader_runner = LazyDownloaderRunner(_create_downloader_runner)  # type: pacifica.dispatcher_example.runners.LazyDownloaderRunner
+uploader_runner = LazyUploaderRunner(_create_uploader_runner)  # type: pacifica.dispatcher_example.runners.LazyUploaderRunner
+
+# Construct the transform that the example event handler applies to the content
+# of each file, and read the maximum number of bytes that it reads from each
+# file per iteration.
+#
+# The name of the transform is read from the "TRANSFORM" environment variable,
+# i.e., "upper" (the default) or "ascii-upper".
+#
+# The chunk size is read from the "TRANSFORM_CHUNK_SIZE" environment variable.
+#
+transform = create_transform(os.getenv('TRANSFORM', UPPER))  # type: pacifica.dispatcher_example.transforms.Transform
+chunk_size = int(os.getenv('TRANSFORM_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))  # type: int
+
+# Read the name of the executor that the example event handler uses to
+# transform the files for each CloudEvents notification, and the maximum number
+# of workers for the executor.
+#
+# The name of the executor is read from the "TRANSFORM_EXECUTOR" environment
+# variable, i.e., "serial" (the default), "thread" or "process".
+#
+# The maximum number of workers is read from the "TRANSFORM_MAX_WORKERS"
+# environment variable. If the "TRANSFORM_MAX_WORKERS" environment variable is
+# undefined, then the default of the executor is used.
+#
+executor = os.getenv('TRANSFORM_EXECUTOR', SERIAL)  # type: str
+max_workers = int(os.getenv('TRANSFORM_MAX_WORKERS')) if os.getenv('TRANSFORM_MAX_WORKERS') else None  # type: typing.Optional[int]
 
-# Construct the __remote__ downloader runner using a Pacifica downloader that
-# is itself constructed using the configuration for Pacifica CLI and the
-# extracted authentication credentials.
+# Read the name of the mode of the example event handler, and the batch and
+# queue sizes for the pipelined mode.
+#
+# The name of the mode is read from the "HANDLER_MODE" environment variable,
+# i.e., "phased" (the default) or "pipelined".
+#
+# The maximum number of files per call to the downloader runner is read from the
+# "PIPELINE_DOWNLOAD_BATCH_SIZE" environment variable.
+#
+# The number of files per call to the uploader runner is read from the
+# "PIPELINE_UPLOAD_BATCH_SIZE" environment variable. If the
+# "PIPELINE_UPLOAD_BATCH_SIZE" environment variable is undefined, then every
+# file for a CloudEvents notification is uploaded at once.
 #
-downloader_runner = RemoteDownloaderRunner(Downloader(cart_api_url=config.get('endpoints', 'download_url'), auth=auth))  # type: pacifica.dispatcher.downloader_runners.RemoteDownloaderRunner
+# The maximum number of batches in each queue between two stages is read from
+# the "PIPELINE_QUEUE_SIZE" environment variable.
+#
+mode = os.getenv('HANDLER_MODE', PHASED)  # type: str
+download_batch_size = int(os.getenv('PIPELINE_DOWNLOAD_BATCH_SIZE', DEFAULT_DOWNLOAD_BATCH_SIZE))  # type: int
+upload_batch_size = int(os.getenv('PIPELINE_UPLOAD_BATCH_SIZE')) if os.getenv('PIPELINE_UPLOAD_BATCH_SIZE') else None  # type: typing.Optional[int]
+queue_size = int(os.getenv('PIPELINE_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))  # type: int
 
-# Construct the __remote__ uploader runner using a Pacifica uploader that is
-# itself constructed using the configuration for Pacifica CLI and the extracted
-# authentication credentials.
+# Read the maximum number of CloudEvents notifications whose files are uploaded
+# together by the example event handler, and the maximum number of milliseconds
+# that the files for a CloudEvents notification wait for those of others.
+#
+# The maximum number of CloudEvents notifications is read from the
+# "UPLOAD_BATCH_EVENTS" environment variable. If the "UPLOAD_BATCH_EVENTS"
+# environment variable is undefined, then the default behavior is to upload the
+# files for each CloudEvents notification on their own.
+#
+# The maximum delay is read from the "UPLOAD_BATCH_MS" environment variable.
 #
-uploader_runner = RemoteUploaderRunner(Uploader(upload_url=config.get('endpoints', 'upload_url'), status_url=config.get('endpoints', 'upload_status_url'), auth=auth))  # type: pacifica.dispatcher.uploader_runners.RemoteUploaderRunner
+# Only the CloudEvents notifications that are handled concurrently by the same
+# process are batched, e.g., by a Celery worker whose pool is "threads".
+#
+batch_events = int(os.getenv('UPLOAD_BATCH_EVENTS')) if os.getenv('UPLOAD_BATCH_EVENTS') else None  # type: typing.Optional[int]
+batch_delay = float(os.getenv('UPLOAD_BATCH_MS')) / 1000 if os.getenv('UPLOAD_BATCH_MS') else DEFAULT_MAX_DELAY  # type: float
+
+# Construct the cache for the files that are written by the example event
+# handler.
+#
+# The name of the cache directory is read from the "CACHE_DIR" environment
+# variable. If the "CACHE_DIR" environment variable is undefined, then the
+# default behavior is to disable caching.
+#
+# The maximum total size of the cache in bytes is read from the
+# "CACHE_MAX_BYTES" environment variable.
+#
+# The version of the transform is part of the key for each entry, so that the
+# entries that were written by another transform are never restored.
+#
+cache = ResultCache(os.getenv('CACHE_DIR'), max_bytes=int(os.getenv('CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)), version=transform.version) if os.getenv('CACHE_DIR') else None  # type: typing.Optional[pacifica.dispatcher_example.cache.ResultCache]
+
+# Construct the store for the per-file checkpoints of the example event handler,
+# so that a CloudEvents notification whose handling failed, e.g., because the
+# Celery worker was killed, is resumed rather than started from scratch when
+# its Celery task is redelivered.
+#
+# The name of the directory for the working directories of the CloudEvents
+# notifications is read from the "CHECKPOINT_DIR" environment variable. If the
+# "CHECKPOINT_DIR" environment variable is undefined, then the default behavior
+# is to disable checkpointing.
+#
+# The checkpoints are stored in the same database as the rows for the
+# CloudEvents notifications, which is bound when the Celery application is
+# constructed.
+#
+checkpoints = CheckpointStore(os.getenv('CHECKPOINT_DIR')) if os.getenv('CHECKPOINT_DIR') else None  # type: typing.Optional[pacifica.dispatcher_example.checkpoints.CheckpointStore]
+
+# Construct the store for the ingest jobs that are submitted by the example
+# event handler without waiting for them to be ingested, so that the Celery
+# worker is not blocked while the ingest server ingests each upload.
+#
+# Asynchronous ingest is enabled if the "INGEST_POLL_INTERVAL" environment
+# variable is defined, i.e., the number of seconds between the sweeps of the
+# outstanding ingest jobs by the poller, which is scheduled by Celery beat.
+# Otherwise, the default behavior is for each upload to wait for its ingest job.
+#
+# The number of seconds after which the ingest jobs for a CloudEvents
+# notification are abandoned is read from the "INGEST_TIMEOUT" environment
+# variable.
+#
+# The ingest jobs are stored in the same database as the rows for the
+# CloudEvents notifications, which is bound when the Celery application is
+# constructed.
+#
+ingest_jobs = IngestJobStore(timeout=float(os.getenv('INGEST_TIMEOUT', DEFAULT_TIMEOUT))) if os.getenv('INGEST_POLL_INTERVAL') else None  # type: typing.Optional[pacifica.dispatcher_example.ingest.IngestJobStore]
+
+# Construct the registry for the metrics for the example event handler, the
+# Celery task and the CherryPy application.
+#
+# Metrics are enabled if the "METRICS_ENABLED" environment variable is "1",
+# "true" or "yes". Otherwise, the default behavior is to use the null registry,
+# whose counters and histograms do nothing.
+#
+metrics = Registry() if os.getenv('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes') else NULL_REGISTRY  # type: pacifica.dispatcher_example.metrics.Registry
 
 # Construct an __empty__ router.
 #
-router = Router()  # type: pacifica.dispatcher.router.Router
+# The router indexes the equality tests on top-level fields, e.g., "eventType"
+# and "source", of the JSONPath for each route, so that only the candidate
+# routes for each CloudEvents notification are matched using their full
+# JSONPath.
+#
+router = IndexedRouter()  # type: pacifica.dispatcher_example.routers.IndexedRouter
 
 # Add a new route to the router, so that it is non-empty.
 #
 # The call to add a new route to the router receives the following arguments:
 # 1. The JSONPath, i.e., the instance of the ``jsonpath2.path.Path`` class.
 # 2. The event handler, i.e., the instance of the
-#    ``pacifica.dispatcher.event_handlers.EventHandler`` class.
+#    ``pacifica.dispatcher.event_handlers.EventHandler`` class, which receives
+#    the transform for the route.
 #
 # In this example, the JSONPath for the example event handler is parsed from the
 # content of a text file.
 #
-router.add_route(Path.parse_file(os.path.join(os.path.dirname(__file__), 'jsonpath2', 'example.txt')), ExampleEventHandler(downloader_runner, uploader_runner))
+# The pool of threads or processes that the example event handler uses to
+# transform the files is constructed when the first CloudEvents notification is
+# handled, and is then reused by every CloudEvents notification that is handled
+# by the same process.
+#
+event_handler = ExampleEventHandler(downloader_runner, uploader_runner, chunk_size=chunk_size, executor=executor, max_workers=max_workers, mode=mode, download_batch_size=download_batch_size, upload_batch_size=upload_batch_size, queue_size=queue_size, cache=cache, metrics=metrics, staging_dir=staging_dir, checkpoints=checkpoints, transform=transform, batch_events=batch_events, batch_delay=batch_delay, wait_for_ingest=ingest_jobs is None)  # type: pacifica.dispatcher_example.event_handlers.ExampleEventHandler
+
+router.add_route(Path.parse_file(os.path.join(os.path.dirname(__file__), 'jsonpath2', 'example.txt')), event_handler)
 
 
 # Module exports.
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/routers.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Routers for Pacifica Dispatcher Example.
+
+This module defines a router that narrows the candidate routes for each
+CloudEvents notification using a dictionary lookup, before evaluating the full
+JSONPath for each candidate.
+
+The JSONPath for a route whose conditions are all either equality tests or
+existence tests on top-level fields, or existence tests for an entry of the
+payload with equality tests on its fields, e.g., the example route, is compiled
+into a predicate that is evaluated against the entries of the payload,
+partitioned by "destinationTable", rather than against the whole payload, and
+whose partitions are reused by the event handler.
+
+Attributes:
+    IndexedRouter (type): The class for the router.
+    compile_predicate (typing.Callable[[jsonpath2.path.Path], typing.Optional[typing.Callable[..., bool]]]):
+        Compile a JSONPath into a predicate.
+    extract_discriminators (typing.Callable[[jsonpath2.path.Path], typing.Dict[str, typing.Hashable]]):
+        Extract the equality tests on top-level fields from a JSONPath.
+
+"""
+
+import collections.abc
+import typing
+
+from jsonpath2.expressions.operator import AndVariadicOperatorExpression, EqualBinaryOperatorExpression
+from jsonpath2.expressions.some import SomeExpression
+from jsonpath2.node import Node
+from jsonpath2.nodes.current import CurrentNode
+from jsonpath2.nodes.root import RootNode
+from jsonpath2.nodes.subscript import SubscriptNode
+from jsonpath2.nodes.terminal import TerminalNode
+from jsonpath2.path import Path
+from jsonpath2.subscripts.filter import FilterSubscript
+from jsonpath2.subscripts.objectindex import ObjectIndexSubscript
+from jsonpath2.subscripts.wildcard import WildcardSubscript
+
+from pacifica.dispatcher.router import Route, Router
+
+from .metadata import EventMetadata, extract_metadata
+
+
+# The name of the top-level field for the payload of a CloudEvents notification.
+#
+_DATA_FIELD_NAME = 'data'  # type: str
+
+# The name of the field of each entry of the payload that is used to partition
+# the entries.
+#
+_TABLE_FIELD_NAME = 'destinationTable'  # type: str
+
+
+def _to_subscript(node: typing.Any, subscript_cls: type) -> typing.Optional[typing.Any]:
+    """Return the only subscript of a subscript node, if it is an instance of a
+    class.
+
+    """
+
+    if not (isinstance(node, SubscriptNode) and (len(node.subscripts) == 1) and isinstance(node.subscripts[0], subscript_cls)):
+        return None
+
+    return node.subscripts[0]
+
+
+def _to_field_name(node_or_value: typing.Any, node_cls: type = RootNode) -> typing.Optional[str]:
+    """Return the name of the top-level field that is selected by a node of the
+    form ``$["name"]`` (or, for the current node, ``@["name"]``).
+
+    Args:
+        node_or_value (typing.Any): The node or value.
+        node_cls (type): The class for the first node, i.e., the root node or
+            the current node.
+
+    Returns:
+        typing.Optional[str]: The name of the field, or ``None`` if the node or
+        value is not of the form ``$["name"]``.
+
+    """
+
+    if not isinstance(node_or_value, node_cls):
+        return None
+
+    subscript_node = node_or_value.next_node
+
+    if not (isinstance(subscript_node, SubscriptNode) and isinstance(subscript_node.next_node, TerminalNode)):
+        return None
+
+    if not ((len(subscript_node.subscripts) == 1) and isinstance(subscript_node.subscripts[0], ObjectIndexSubscript)):
+        return None
+
+    index = subscript_node.subscripts[0].index
+
+    if not isinstance(index, str):
+        return None
+
+    return index
+
+
+def extract_discriminators(path: Path) -> typing.Dict[str, typing.Hashable]:
+    """Extract the equality tests on top-level fields from a JSONPath.
+
+    The JSONPath must be of the form ``$[?(expression)]``, where the expression
+    is either an equality test or a conjunction. Each equality test of the form
+    ``$["name"] = value`` (or ``value = $["name"]``), where the value is a
+    hashable literal, is a necessary condition for the JSONPath to match, so a
+    CloudEvents notification whose field has a different value is never
+    matched.
+
+    Args:
+        path (jsonpath2.path.Path): The JSONPath.
+
+    Returns:
+        typing.Dict[str, typing.Hashable]: The value for each field name. The
+        dictionary is empty if there are no discriminators.
+
+    """
+
+    subscript_node = path.root_node.next_node
+
+    if not isinstance(subscript_node, SubscriptNode):
+        return {}
+
+    if not ((len(subscript_node.subscripts) == 1) and isinstance(subscript_node.subscripts[0], FilterSubscript)):
+        return {}
+
+    expression = subscript_node.subscripts[0].expression
+
+    if isinstance(expression, AndVariadicOperatorExpression):
+        expressions = expression.expressions
+    else:
+        expressions = [expression]
+
+    discriminators = {}  # type: typing.Dict[str, typing.Hashable]
+
+    for expression in expressions:
+        if not isinstance(expression, EqualBinaryOperatorExpression):
+            continue
+
+        for (node_or_value, value) in [
+                (expression.left_node_or_value, expression.right_node_or_value),
+                (expression.right_node_or_value, expression.left_node_or_value),
+        ]:
+            field_name = _to_field_name(node_or_value)
+
+            if (field_name is None) or isinstance(value, Node) or not isinstance(value, typing.Hashable):
+                continue
+
+            if (field_name in discriminators) and (discriminators[field_name] != value):
+                # The conjunction of two different equality tests on the same
+                # field is never satisfied, but the full JSONPath is left to
+                # decide.
+                #
+                continue
+
+            discriminators[field_name] = value
+
+    return discriminators
+
+
+def _to_equalities(expression: typing.Any, node_cls: type) -> typing.Optional[typing.List[typing.Tuple[str, typing.Any]]]:
+    """Return the equality tests of the form ``$["name"] = value`` (or, for the
+    current node, ``@["name"] = value``) of an expression that is either an
+    equality test or a conjunction of equality tests, where each value is a
+    literal.
+
+    Returns:
+        typing.Optional[typing.List[typing.Tuple[str, typing.Any]]]: The name of
+        the field and the value for each equality test, or ``None`` if the
+        expression is not of this form.
+
+    """
+
+    if isinstance(expression, AndVariadicOperatorExpression):
+        expressions = expression.expressions
+    else:
+        expressions = [expression]
+
+    equalities = []  # type: typing.List[typing.Tuple[str, typing.Any]]
+
+    for expression in expressions:
+        equality = _to_equality(expression, node_cls)
+
+        if equality is None:
+            return None
+
+        equalities.append(equality)
+
+    return equalities
+
+
+def _to_equality(expression: typing.Any, node_cls: type) -> typing.Optional[typing.Tuple[str, typing.Any]]:
+    """Return the name of the field and the value for an equality test of the
+    form ``$["name"] = value`` (or ``value = $["name"]``), where the value is a
+    literal, or ``None``.
+
+    """
+
+    if not isinstance(expression, EqualBinaryOperatorExpression):
+        return None
+
+    for (node_or_value, value) in [
+            (expression.left_node_or_value, expression.right_node_or_value),
+            (expression.right_node_or_value, expression.left_node_or_value),
+    ]:
+        field_name = _to_field_name(node_or_value, node_cls)
+
+        if (field_name is not None) and not isinstance(value, Node):
+            return (field_name, value)
+
+    return None
+
+
+def _to_entry_filter(expression: typing.Any) -> typing.Optional[typing.Tuple[typing.Hashable, typing.List[typing.Tuple[str, typing.Any]]]]:
+    """Return the "destinationTable" and the equality tests for an existence
+    test for an entry of the payload, i.e., an expression of the form
+    ``$["data"][*][?(@["destinationTable"] = table and @["name"] = value ...)]``,
+    or ``None``.
+
+    """
+
+    if not isinstance(expression, SomeExpression):
+        return None
+
+    node = expression.next_node_or_value
+
+    if not isinstance(node, RootNode):
+        return None
+
+    node = node.next_node
+
+    subscript = _to_subscript(node, ObjectIndexSubscript)
+
+    if (subscript is None) or (subscript.index != _DATA_FIELD_NAME):
+        return None
+
+    node = node.next_node
+
+    if _to_subscript(node, WildcardSubscript) is None:
+        return None
+
+    node = node.next_node
+
+    subscript = _to_subscript(node, FilterSubscript)
+
+    if (subscript is None) or not isinstance(node.next_node, TerminalNode):
+        return None
+
+    equalities = _to_equalities(subscript.expression, CurrentNode)
+
+    if equalities is None:
+        return None
+
+    tables = [value for (field_name, value) in equalities if field_name == _TABLE_FIELD_NAME]
+
+    if (len(tables) != 1) or not isinstance(tables[0], typing.Hashable):
+        return None
+
+    return (tables[0], [(field_name, value) for (field_name, value) in equalities if field_name != _TABLE_FIELD_NAME])
+
+
+def _match_entries(entries: typing.List[typing.Dict[str, typing.Any]], equalities: typing.List[typing.Tuple[str, typing.Any]]) -> bool:
+    """Return whether or not any of the entries satisfies every equality test.
+
+    """
+
+    for entry in entries:
+        for (field_name, value) in equalities:
+            if (field_name not in entry) or not (entry[field_name] == value):
+                break
+        else:
+            return True
+
+    return False
+
+
+def compile_predicate(path: Path) -> typing.Optional[typing.Callable[[typing.Dict[str, typing.Any], typing.Callable[[], EventMetadata]], bool]]:
+    """Compile a JSONPath into a predicate.
+
+    The JSONPath must be of the form ``$[?(expression)]``, where the expression
+    is either a condition or a conjunction of conditions, and each condition is
+    one of the following:
+
+    * An equality test on a top-level field, i.e., ``$["name"] = value``, where
+      the value is a literal.
+    * An existence test for a top-level field, i.e., ``$["name"]``.
+    * An existence test for an entry of the payload with equality tests on its
+      fields, i.e., ``$["data"][*][?(@["destinationTable"] = table and ...)]``,
+      where each value is a literal.
+
+    The predicate is called with the JSON-encoded data for a CloudEvents
+    notification and with a function that returns the metadata descriptions in
+    its payload, which is called at most once, and only if there is an existence
+    test for an entry. The predicate returns the same result as the JSONPath,
+    but an existence test for an entry only examines the entries with the same
+    "destinationTable", and stops at the first entry that satisfies it.
+
+    Args:
+        path (jsonpath2.path.Path): The JSONPath.
+
+    Returns:
+        typing.Optional[typing.Callable[[typing.Dict[str, typing.Any], typing.Callable[[], pacifica.dispatcher_example.metadata.EventMetadata]], bool]]:
+        The predicate, or ``None`` if the JSONPath is not of this form.
+
+    """
+
+    subscript_node = path.root_node.next_node
+
+    subscript = _to_subscript(subscript_node, FilterSubscript)
+
+    if (subscript is None) or not isinstance(subscript_node.next_node, TerminalNode):
+        return None
+
+    if isinstance(subscript.expression, AndVariadicOperatorExpression):
+        expressions = subscript.expression.expressions
+    else:
+        expressions = [subscript.expression]
+
+    equalities = []  # type: typing.List[typing.Tuple[str, typing.Any]]
+    field_names = []  # type: typing.List[str]
+    entry_filters = []  # type: typing.List[typing.Tuple[typing.Hashable, typing.List[typing.Tuple[str, typing.Any]]]]
+
+    for expression in expressions:
+        equality = _to_equality(expression, RootNode)
+
+        if equality is not None:
+            equalities.append(equality)
+            continue
+
+        field_name = _to_field_name(expression.next_node_or_value) if isinstance(expression, SomeExpression) else None
+
+        if field_name is not None:
+            field_names.append(field_name)
+            continue
+
+        entry_filter = _to_entry_filter(expression)
+
+        if entry_filter is not None:
+            entry_filters.append(entry_filter)
+            continue
+
+        return None
+
+    def predicate(event_data: typing.Dict[str, typing.Any], get_metadata: typing.Callable[[], EventMetadata]) -> bool:
+        """Return whether or not the JSONPath matches a CloudEvents
+        notification.
+
+        """
+
+        for (field_name, value) in equalities:
+            if (field_name not in event_data) or not (event_data[field_name] == value):
+                return False
+
+        for field_name in field_names:
+            if field_name not in event_data:
+                return False
+
+        if entry_filters:
+            tables = get_metadata().tables
+
+            for (table, entry_equalities) in entry_filters:
+                if not _match_entries(tables.get(table, []), entry_equalities):
+                    return False
+
+        return True
+
+    return predicate
+
+
+class IndexedRouter(Router):
+    """A router that narrows the candidate routes for each CloudEvents
+    notification using a dictionary lookup.
+
+    When each route is added, the equality tests on top-level fields (e.g.,
+    "eventType" and "source") are extracted from its JSONPath. The routes are
+    grouped by the names of these fields, and each group is indexed by their
+    values. When a CloudEvents notification is matched, the values of its
+    fields are looked up in each index, and only the candidate routes (and the
+    routes without any discriminators) are matched using their full JSONPath,
+    in the order that they were added.
+
+    The candidate routes whose JSONPath was compiled into a predicate are
+    matched using the predicate instead, against the metadata descriptions in
+    the payload, which are extracted at most once per CloudEvents notification
+    and are then cached for the event handler.
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize this router.
+
+        """
+
+        super(IndexedRouter, self).__init__()
+
+        # The index for each group of routes, keyed by the names of the fields,
+        # where each index maps the values of the fields to the positions of
+        # the routes.
+        #
+        self._indexes = {}  # type: typing.Dict[typing.Tuple[str, ...], typing.Dict[typing.Tuple[typing.Hashable, ...], typing.List[int]]]
+
+        # The positions of the routes without any discriminators.
+        #
+        self._unindexed = []  # type: typing.List[int]
+
+        # The predicate for each route, or ``None`` if its JSONPath was not
+        # compiled.
+        #
+        self._predicates = []  # type: typing.List[typing.Optional[typing.Callable[[typing.Dict[str, typing.Any], typing.Callable[[], EventMetadata]], bool]]]
+
+    def add_route(self, *args, **kwargs) -> None:
+        """Append a new route and then index it.
+
+        """
+
+        super(IndexedRouter, self).add_route(*args, **kwargs)
+
+        position = len(self._routes) - 1  # type: int
+
+        self._predicates.append(compile_predicate(self._routes[position].path))
+
+        discriminators = extract_discriminators(self._routes[position].path)  # type: typing.Dict[str, typing.Hashable]
+
+        if not discriminators:
+            self._unindexed.append(position)
+
+            return
+
+        field_names = tuple(sorted(discriminators.keys()))  # type: typing.Tuple[str, ...]
+        values = tuple(discriminators[field_name] for field_name in field_names)  # type: typing.Tuple[typing.Hashable, ...]
+
+        self._indexes.setdefault(field_names, {}).setdefault(values, []).append(position)
+
+    def candidates(self, event_data: typing.Dict[str, typing.Any]) -> typing.List[Route]:
+        """Return the candidate routes for a CloudEvents notification.
+
+        Args:
+            event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for
+                the CloudEvents notification.
+
+        Returns:
+            typing.List[pacifica.dispatcher.router.Route]: The candidate routes,
+            in the order that they were added.
+
+        """
+
+        return [self._routes[position] for position in self._candidate_positions(event_data)]
+
+    def _candidate_positions(self, event_data: typing.Dict[str, typing.Any]) -> typing.List[int]:
+        """Return the positions of the candidate routes for a CloudEvents
+        notification, in the order that they were added.
+
+        """
+
+        positions = list(self._unindexed)  # type: typing.List[int]
+
+        if isinstance(event_data, dict):
+            for (field_names, index) in self._indexes.items():
+                try:
+                    values = tuple(event_data[field_name] for field_name in field_names)  # type: typing.Tuple[typing.Hashable, ...]
+
+                    positions.extend(index.get(values, ()))
+                except (KeyError, TypeError):
+                    # The CloudEvents notification is missing a field, or the
+                    # value of a field is unhashable, so it cannot be equal to
+                    # any of the values in the index.
+                    #
+                    continue
+
+        return sorted(positions)
+
+    def match(self, event_data: typing.Dict[str, typing.Any]) -> typing.Generator[Route, None, None]:
+        """Yield the routes that match a CloudEvents notification.
+
+        Args:
+            event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for
+                the CloudEvents notification.
+
+        Returns:
+            typing.Generator[pacifica.dispatcher.router.Route, None, None]: The
+            routes, in the order that they were added.
+
+        """
+
+        metadata = []  # type: typing.List[EventMetadata]
+
+        def get_metadata() -> EventMetadata:
+            """Return the metadata descriptions in the payload, extracting
+            them on first use, and caching them for the event handler.
+
+            """
+
+            if not metadata:
+                metadata.append(extract_metadata(event_data.get(_DATA_FIELD_NAME, None), cache=True))
+
+            return metadata[0]
+
+        for position in self._candidate_positions(event_data):
+            route = self._routes[position]  # type: pacifica.dispatcher.router.Route
+            predicate = self._predicates[position]
+
+            if (predicate is not None) and isinstance(event_data, collections.abc.Mapping):
+                matched = predicate(event_data, get_metadata)  # type: bool
+            else:
+                matched = route.match(event_data)
+
+            if matched:
+                yield route
+
+
+# Module exports.
+#
+__all__ = ('IndexedRouter', 'compile_predicate', 'extract_discriminators', )
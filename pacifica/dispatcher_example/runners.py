@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/runners.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Runners for Pacifica Dispatcher Example.
+
+This module defines the downloader and uploader runners that defer the
+construction of another runner until it is first used, so that reading the
+configuration for Pacifica CLI and constructing the Pacifica downloader and
+uploader do not happen at import time, the __remote__ downloader runner that
+splits the files for a CloudEvents notification across several carts that are
+requested in parallel, the __remote__ uploader runner that spools each bundle
+in memory rather than writing it to disk, and the pooled HTTP session that is
+shared by the Pacifica downloader and uploader.
+
+Attributes:
+    DEFAULT_MAX_CONCURRENCY (int): The default maximum number of carts that
+        are requested at the same time by the sharded downloader runner.
+    DEFAULT_MAX_SPOOL_BYTES (int): The default maximum size in bytes of a
+        bundle that is kept in memory by the spooling uploader runner.
+    DEFAULT_POLL_INTERVAL (float): The default number of seconds between the
+        checks of the status of a cart.
+    DEFAULT_POOL_MAXSIZE (int): The default maximum number of connections that
+        are kept open per host by the pooled HTTP session.
+    LazyDownloaderRunner (type): The class for the lazy downloader runner.
+    LazyUploaderRunner (type): The class for the lazy uploader runner.
+    ShardedRemoteDownloaderRunner (type): The class for the sharded downloader
+        runner.
+    SpoolingRemoteUploaderRunner (type): The class for the spooling uploader
+        runner.
+    create_session (typing.Callable[..., requests.Session]): Construct the
+        pooled HTTP session.
+
+"""
+
+import concurrent.futures
+import os
+import tarfile
+import tempfile
+import threading
+import time
+import typing
+
+import requests
+import requests.adapters
+
+from pacifica.dispatcher.downloader_runners import DownloaderRunner, RemoteDownloaderRunner
+from pacifica.dispatcher.exceptions import TransactionDuplicateAttributeError
+from pacifica.dispatcher.models import File, Transaction, TransactionKeyValue
+from pacifica.dispatcher.uploader_runners import RemoteUploaderRunner, UploaderRunner
+from pacifica.uploader.bundler import Bundler
+from pacifica.uploader.metadata import MetaData, MetaObj
+
+from .ingest import should_sleep
+
+
+# The default maximum size in bytes of a bundle that is kept in memory by the
+# spooling uploader runner.
+#
+DEFAULT_MAX_SPOOL_BYTES = 64 * 1024 * 1024  # type: int
+
+# The default maximum number of carts that are requested at the same time by the
+# sharded downloader runner, i.e., the number of concurrent requests to the cart
+# server per process.
+#
+DEFAULT_MAX_CONCURRENCY = 4  # type: int
+
+# The default number of seconds between the checks of the status of a cart,
+# which is the same as for the Pacifica downloader.
+#
+DEFAULT_POLL_INTERVAL = 1.0  # type: float
+
+# The default maximum number of connections that are kept open per host by the
+# pooled HTTP session.
+#
+DEFAULT_POOL_MAXSIZE = 16  # type: int
+
+# The number of retries of a request whose connection failed, which is the same
+# as for the HTTP sessions of the Pacifica downloader and uploader.
+#
+_MAX_RETRIES = 5  # type: int
+
+
+def create_session(pool_maxsize: int = DEFAULT_POOL_MAXSIZE) -> requests.Session:
+    """Construct the pooled HTTP session that is shared by the Pacifica
+    downloader and uploader, so that the connections to each host are reused
+    across CloudEvents notifications, rather than opened for each request.
+
+    The HTTP session is not shared across processes, e.g., the child processes
+    of a Celery worker, and so it is constructed by each process on first use.
+
+    Args:
+        pool_maxsize (int): The maximum number of connections that are kept
+            open per host, which should be at least the number of concurrent
+            requests to the host.
+
+    Returns:
+        requests.Session: The HTTP session.
+
+    Raises:
+        ValueError: If the maximum number of connections is not positive.
+
+    """
+
+    if pool_maxsize <= 0:
+        raise ValueError('pool_maxsize must be positive')
+
+    session = requests.Session()  # type: requests.Session
+
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=_MAX_RETRIES)  # type: requests.adapters.HTTPAdapter
+
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+class _Lazy:
+    """A value that is constructed by a factory when it is first used, at most
+    once, even if it is first used by several threads at the same time.
+
+    """
+
+    def __init__(self, factory: typing.Callable[[], typing.Any]) -> None:
+        """Initialize this value.
+
+        Args:
+            factory (typing.Callable[[], typing.Any]): The factory.
+
+        """
+
+        super(_Lazy, self).__init__()
+
+        self._factory = factory
+        self._lock = threading.Lock()  # type: threading.Lock
+        self._value = None  # type: typing.Any
+
+    def get(self) -> typing.Any:
+        """Return the value, constructing it if it has not been constructed.
+
+        """
+
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+
+        return self._value
+
+
+class LazyDownloaderRunner(DownloaderRunner):
+    """A downloader runner that constructs another downloader runner when it
+    is first used, and then delegates to it.
+
+    """
+
+    def __init__(self, factory: typing.Callable[[], DownloaderRunner]) -> None:
+        """Initialize this downloader runner.
+
+        Args:
+            factory (typing.Callable[[], pacifica.dispatcher.downloader_runners.DownloaderRunner]):
+                The factory for the downloader runner to delegate to.
+
+        """
+
+        super(LazyDownloaderRunner, self).__init__()
+
+        self._runner = _Lazy(factory)  # type: _Lazy
+
+    @property
+    def runner(self) -> DownloaderRunner:
+        """The downloader runner to delegate to."""
+        return self._runner.get()
+
+    # pylint: disable=line-too-long
+    def download(self, basedir_name: str, files: typing.List[File] = None, timeout: int = 180) -> typing.List[typing.Callable[[typing.Dict[str, typing.Any]], typing.TextIO]]:
+        """Download the files using the downloader runner to delegate to."""
+        return self.runner.download(basedir_name, files=files, timeout=timeout)
+    # pylint: enable=line-too-long
+
+
+class LazyUploaderRunner(UploaderRunner):
+    """An uploader runner that constructs another uploader runner when it is
+    first used, and then delegates to it.
+
+    """
+
+    def __init__(self, factory: typing.Callable[[], UploaderRunner]) -> None:
+        """Initialize this uploader runner.
+
+        Args:
+            factory (typing.Callable[[], pacifica.dispatcher.uploader_runners.UploaderRunner]):
+                The factory for the uploader runner to delegate to.
+
+        """
+
+        super(LazyUploaderRunner, self).__init__()
+
+        self._runner = _Lazy(factory)  # type: _Lazy
+
+    @property
+    def runner(self) -> UploaderRunner:
+        """The uploader runner to delegate to."""
+        return self._runner.get()
+
+    # pylint: disable=line-too-long
+    def upload(self, basedir_name: str, transaction: Transaction = None, transaction_key_values: typing.List[TransactionKeyValue] = None, timeout: int = 180) -> typing.Tuple[typing.Any, int, typing.Dict[str, typing.Any]]:
+        """Upload the files using the uploader runner to delegate to."""
+        return self.runner.upload(basedir_name, transaction=transaction, transaction_key_values=transaction_key_values, timeout=timeout)
+    # pylint: enable=line-too-long
+
+
+class ShardedRemoteDownloaderRunner(RemoteDownloaderRunner):
+    """A __remote__ downloader runner that splits the files into shards, and
+    then requests a cart for each shard, in parallel.
+
+    Unlike the ``pacifica.dispatcher.downloader_runners.RemoteDownloaderRunner``
+    class, each cart is downloaded via the HTTP session of the cart API of the
+    Pacifica downloader, rather than via a new connection, and the carts of
+    every CloudEvents notification that is handled by the process are requested
+    by a shared pool of threads, whose size limits the number of concurrent
+    requests to the cart server. Otherwise, this downloader runner behaves in
+    the same way.
+
+    Attributes:
+        shard_files (typing.Optional[int]): The maximum number of files per
+            cart, or ``None`` for one cart per call.
+        max_concurrency (int): The maximum number of carts that are requested at
+            the same time.
+        poll_interval (float): The number of seconds between the checks of the
+            status of a cart.
+
+    """
+
+    def __init__(self, downloader: 'pacifica.downloader.Downloader', shard_files: typing.Optional[int] = None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, poll_interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        """Initialize this downloader runner.
+
+        Args:
+            downloader (pacifica.downloader.Downloader): The Pacifica
+                downloader.
+            shard_files (typing.Optional[int]): The maximum number of files per
+                cart.
+            max_concurrency (int): The maximum number of carts that are
+                requested at the same time.
+            poll_interval (float): The number of seconds between the checks of
+                the status of a cart.
+
+        Raises:
+            ValueError: If the maximum number of files per cart or the maximum
+                number of carts is not positive, or if the interval is
+                negative.
+
+        """
+
+        super(ShardedRemoteDownloaderRunner, self).__init__(downloader)
+
+        if (shard_files is not None) and (shard_files <= 0):
+            raise ValueError('shard_files must be positive')
+
+        if max_concurrency <= 0:
+            raise ValueError('max_concurrency must be positive')
+
+        if poll_interval < 0:
+            raise ValueError('poll_interval must be non-negative')
+
+        self.shard_files = shard_files  # type: typing.Optional[int]
+        self.max_concurrency = max_concurrency  # type: int
+        self.poll_interval = poll_interval  # type: float
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='dispatcher-example-cart')  # type: concurrent.futures.ThreadPoolExecutor
+
+    def _wait_for_cart(self, cart_url: str, timeout: int) -> None:
+        """Wait until a cart is ready to download.
+
+        Raises:
+            RuntimeError: If the cart failed, or if it is not ready before the
+                timeout.
+
+        """
+
+        cart_api = self.downloader.cart_api  # type: pacifica.downloader.cartapi.CartAPI
+        deadline = time.monotonic() + timeout  # type: float
+
+        while True:
+            resp = cart_api.session.head(cart_url, **cart_api.auth)  # type: requests.Response
+            status = resp.headers.get('X-Pacifica-Status', None)  # type: typing.Optional[str]
+
+            if (resp.status_code == 204) and (status == 'ready'):
+                return
+
+            if (resp.status_code == 500) or ((resp.status_code == 204) and (status != 'staging')):
+                raise RuntimeError('Cart {0} failed with status {1}: {2}'.format(cart_url, status, resp.headers.get('X-Pacifica-Message', '')))
+
+            if time.monotonic() + self.poll_interval > deadline:
+                raise RuntimeError('Cart {0} is not ready after {1} seconds'.format(cart_url, timeout))
+
+            time.sleep(self.poll_interval)
+
+    def _download_shard(self, basedir_name: str, files: typing.List[File], timeout: int) -> None:
+        """Request a cart for a shard of the files, wait for it, and then
+        extract it.
+
+        """
+
+        cart_api = self.downloader.cart_api  # type: pacifica.downloader.cartapi.CartAPI
+
+        # pylint: disable=protected-access
+        file_ids = [
+            {
+                'id': file._id,
+                'hashsum': file.hashsum,
+                'hashtype': file.hashtype,
+                'path': file.path,
+            }
+            for file in files
+        ]  # type: typing.List[typing.Dict[str, typing.Any]]
+        # pylint: enable=protected-access
+
+        cart_url = cart_api.setup_cart(lambda: iter(file_ids))  # type: str
+
+        self._wait_for_cart(cart_url, timeout)
+
+        # The response is closed after the cart is extracted, so that its
+        # connection is returned to the pool.
+        #
+        with cart_api.session.get(cart_url, params={'filename': 'data'}, stream=True, **cart_api.auth) as resp:
+            resp.raise_for_status()
+
+            with tarfile.open(name=None, mode='r|', fileobj=resp.raw) as cart_tar:
+                cart_tar.extractall(basedir_name)
+
+    # pylint: disable=line-too-long
+    def download(self, basedir_name: str, files: typing.List[File] = None, timeout: int = 180) -> typing.List[typing.Callable[[typing.Dict[str, typing.Any]], typing.TextIO]]:
+        """Download the files, one cart per shard, and then return the openers
+        for the files.
+
+        Every cart is waited for, even if another cart failed, so that no cart
+        is extracted after this method returns.
+
+        """
+
+        if not files:
+            raise ValueError('Files should contain something.')
+
+        shard_files = self.shard_files or len(files)  # type: int
+
+        futures = [
+            self._executor.submit(self._download_shard, basedir_name, files[index:index + shard_files], timeout)
+            for index in range(0, len(files), shard_files)
+        ]  # type: typing.List[concurrent.futures.Future]
+
+        concurrent.futures.wait(futures)
+
+        for future in futures:
+            future.result()
+
+        return [_to_opener(os.path.join(basedir_name, 'data'), file) for file in files]
+    # pylint: enable=line-too-long
+
+
+class SpoolingRemoteUploaderRunner(RemoteUploaderRunner):
+    """A __remote__ uploader runner that spools each bundle in memory, rather
+    than writing it to a temporary file, unless the bundle is larger than a
+    maximum size, in which case it is written to a temporary file in the
+    staging directory.
+
+    Unlike the ``pacifica.dispatcher.uploader_runners.RemoteUploaderRunner``
+    class, the files are read in binary mode, so that the sizes in the headers
+    of the bundle match the content of files that are not ASCII. Otherwise,
+    this uploader runner behaves in the same way.
+
+    Only the bundle is spooled. Each file is still written to the staging
+    directory twice before it is bundled, once when it is downloaded and once
+    when it is transformed, and a bundle that is larger than the maximum size
+    is written a third time, so that the disk traffic for large files is
+    reduced by at most a third.
+
+    Attributes:
+        staging_dir (typing.Optional[str]): The name of the directory for the
+            bundles that are larger than the maximum size, or ``None`` for the
+            default temporary directory.
+        max_spool_bytes (int): The maximum size in bytes of a bundle that is
+            kept in memory, where ``0`` writes every bundle to disk.
+
+    """
+
+    def __init__(self, uploader: 'pacifica.uploader.Uploader', staging_dir: typing.Optional[str] = None, max_spool_bytes: int = DEFAULT_MAX_SPOOL_BYTES) -> None:
+        """Initialize this uploader runner.
+
+        Args:
+            uploader (pacifica.uploader.Uploader): The Pacifica uploader.
+            staging_dir (typing.Optional[str]): The name of the directory for
+                the bundles that are larger than the maximum size.
+            max_spool_bytes (int): The maximum size in bytes of a bundle that is
+                kept in memory.
+
+        Raises:
+            ValueError: If the maximum size is negative.
+
+        """
+
+        super(SpoolingRemoteUploaderRunner, self).__init__(uploader)
+
+        if max_spool_bytes < 0:
+            raise ValueError('max_spool_bytes must be non-negative')
+
+        self.staging_dir = staging_dir
+        self.max_spool_bytes = max_spool_bytes
+
+    # pylint: disable=line-too-long
+    def upload(self, basedir_name: str, transaction: Transaction = None, transaction_key_values: typing.List[TransactionKeyValue] = None, timeout: int = 180) -> typing.Tuple[typing.Any, int, typing.Dict[str, typing.Any]]:
+        """Bundle the files in a directory, and then upload the bundle to
+        Pacifica and wait for it to be ingested.
+
+        """
+
+        bundler = Bundler(_to_meta_data(transaction=transaction, transaction_key_values=transaction_key_values or []), _walk(basedir_name))  # type: pacifica.uploader.bundler.Bundler
+
+        if self.max_spool_bytes:
+            bundler_file = tempfile.SpooledTemporaryFile(max_size=self.max_spool_bytes, dir=self.staging_dir)
+        else:
+            bundler_file = tempfile.TemporaryFile(dir=self.staging_dir)
+
+        with bundler_file:
+            try:
+                bundler.stream(bundler_file)
+            finally:
+                # NOTE Prevent "ResourceWarning: unclosed file" warnings.
+                for file_data in bundler.file_data:
+                    file_descriptor = file_data.get('fileobj', None)
+
+                    if (file_descriptor is not None) and not file_descriptor.closed:
+                        file_descriptor.close()
+
+            content_length = bundler_file.tell()  # type: int
+
+            bundler_file.seek(0)
+
+            job_id = self.uploader.upload(bundler_file, content_length=content_length)
+
+        state = self.uploader.getstate(job_id)
+
+        while timeout and should_sleep(**state):
+            time.sleep(1)
+            timeout -= 1
+            state = self.uploader.getstate(job_id)
+
+        return (bundler, job_id, state)
+    # pylint: enable=line-too-long
+
+
+def _to_opener(basedir_name: str, file: File) -> typing.Callable[..., typing.TextIO]:
+    """Return a function that opens a downloaded file in text mode, in the same
+    way as the __remote__ downloader runner of Pacifica Dispatcher.
+
+    """
+
+    def func(**kwargs: typing.Any) -> typing.TextIO:
+        """Open the file, relative to the directory."""
+        return open(os.path.join(basedir_name, file.path), mode='r', encoding=file.encoding, **kwargs)
+
+    return func
+
+
+def _to_meta_data(transaction: typing.Optional[Transaction], transaction_key_values: typing.List[TransactionKeyValue]) -> MetaData:
+    """Return the metadata for the bundle for a Pacifica transaction and its
+    key-values, in the same way as the __remote__ uploader runner of Pacifica
+    Dispatcher.
+
+    Raises:
+        pacifica.dispatcher.exceptions.TransactionDuplicateAttributeError: If
+            the Pacifica transaction has an ID.
+
+    """
+
+    meta_objs = []  # type: typing.List[MetaObj]
+
+    if transaction is not None:
+        if getattr(transaction, '_id', None) is not None:
+            raise TransactionDuplicateAttributeError(None, '_id')
+
+        for name in ['analytical_tool', 'description', 'instrument', 'project', 'submitter', 'suspense_date']:
+            value = getattr(transaction, name, None)
+
+            if value is not None:
+                meta_objs.append(MetaObj(destinationTable='Transactions.{0}'.format(name), value=value))
+
+    for transaction_key_value in transaction_key_values:
+        meta_objs.append(MetaObj(destinationTable='TransactionKeyValue', key=transaction_key_value.key, value=transaction_key_value.value))
+
+    return MetaData(meta_objs)
+
+
+def _walk(basedir_name: str) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Return the file data for the bundle of the files in a directory, with
+    each file opened in binary mode.
+
+    Args:
+        basedir_name (str): The name of the directory.
+
+    Returns:
+        typing.List[typing.Dict[str, typing.Any]]: The file data.
+
+    """
+
+    file_data = []  # type: typing.List[typing.Dict[str, typing.Any]]
+
+    for (walk_root, _walk_dirs, file_names) in os.walk(basedir_name):
+        for file_name in file_names:
+            path = os.path.join(walk_root, file_name)  # type: str
+            path_st = os.stat(path)  # type: os.stat_result
+
+            file_data.append({
+                'fileobj': open(path, mode='rb'),  # pylint: disable=consider-using-with
+                'name': 'data/{0}'.format(os.path.relpath(path, basedir_name).replace(os.path.sep, '/')),
+                'size': path_st.st_size,
+                'mtime': path_st.st_mtime,
+            })
+
+    return file_data
+
+
+# Module exports.
+#
+__all__ = ('DEFAULT_MAX_CONCURRENCY', 'DEFAULT_MAX_SPOOL_BYTES', 'DEFAULT_POLL_INTERVAL', 'DEFAULT_POOL_MAXSIZE', 'LazyDownloaderRunner', 'LazyUploaderRunner', 'ShardedRemoteDownloaderRunner', 'SpoolingRemoteUploaderRunner', 'create_session', )
@@ -0,0 +1,773 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/servers.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Servers for Pacifica Dispatcher Example.
+
+This module defines the `asyncio`_ server that is an alternative to the
+`CherryPy`_ server for the endpoints that receive `CloudEvents`_ notifications.
+
+The CherryPy server handles each connection in a thread from a fixed pool, so
+that, under bursty ingest, every thread is blocked on a slow client or on the
+database, and new connections queue at the socket. The asyncio server accepts
+and parses every connection in a single event loop, and only hands the calls to
+the database and the message broker to a bounded pool of threads, so that the
+number of concurrent connections is no longer limited by the number of threads.
+
+The asyncio server provides the same endpoints as the CherryPy application,
+i.e., "/", "/receive", "/batch", "/get/<task_id>", "/status/<task_id>",
+"/health", "/statuses" and, if metrics are enabled, "/metrics", with the same
+request and response bodies.
+
+Attributes:
+    ASYNCIO (str): The name of the asyncio engine.
+    CHERRYPY (str): The name of the CherryPy engine.
+    DEFAULT_BACKLOG (int): The default maximum number of connections that are
+        queued at the socket of the asyncio server.
+    DEFAULT_KEEPALIVE_TIMEOUT (float): The default number of seconds that an
+        idle connection is kept open by the asyncio server.
+    DEFAULT_MAX_BODY_BYTES (int): The default maximum size of the body of a
+        request to the asyncio server in bytes.
+    DEFAULT_MAX_WORKERS (int): The default maximum number of threads that call
+        the database and the message broker for the asyncio server.
+    ENGINE_NAMES (typing.Tuple[str, ...]): The names of the engines.
+    AsyncioServer (type): The class for the asyncio server.
+
+.. _asyncio:
+   https://docs.python.org/3/library/asyncio.html
+.. _CherryPy:
+   https://cherrypy.org/
+.. _CloudEvents:
+   https://cloudevents.io/
+
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import http
+import json
+import logging
+import re
+import time
+import typing
+import urllib.parse
+import uuid
+
+import celery
+import peewee
+
+from .admission import AdmissionController, AdmissionRejectedError
+from .metrics import NULL_REGISTRY, Registry
+from .receivers import decode_json, parse_events, receive_batch
+from .statuses import DEFAULT_PAGE_SIZE, list_statuses
+
+
+# The names of the engines that serve the endpoints.
+#
+CHERRYPY = 'cherrypy'  # type: str
+ASYNCIO = 'asyncio'  # type: str
+
+ENGINE_NAMES = (CHERRYPY, ASYNCIO, )  # type: typing.Tuple[str, ...]
+
+# The default maximum number of connections that are queued at the socket, i.e.,
+# that have not been accepted by the event loop yet.
+#
+DEFAULT_BACKLOG = 1024  # type: int
+
+# The default number of seconds that an idle connection is kept open, i.e.,
+# between two requests, or before the first request.
+#
+DEFAULT_KEEPALIVE_TIMEOUT = 60.0  # type: float
+
+# The default maximum size of the body of a request in bytes.
+#
+DEFAULT_MAX_BODY_BYTES = 64 * 1024 * 1024  # type: int
+
+# The default maximum number of threads that call the database and the message
+# broker.
+#
+DEFAULT_MAX_WORKERS = 32  # type: int
+
+# The maximum size of the request line and headers of a request in bytes.
+#
+_MAX_HEAD_BYTES = 64 * 1024  # type: int
+
+# The patterns for the value of the "Content-Length" header, and for the line
+# that starts each chunk of a chunked body, i.e., its size and any extensions.
+# The number of digits is bounded, so that the values are always converted to
+# integers.
+#
+_CONTENT_LENGTH_PATTERN = re.compile(r'[0-9]{1,18}')  # type: typing.Pattern[str]
+_CHUNK_SIZE_PATTERN = re.compile(rb'([0-9A-Fa-f]{1,15})(?:;[^\r\n]*)?')  # type: typing.Pattern[bytes]
+
+# The names of the headers that frame the body of a request, which must not be
+# repeated.
+#
+_FRAMING_HEADER_NAMES = ('content-length', 'transfer-encoding', )  # type: typing.Tuple[str, ...]
+
+# The media types of the body of a request to "/receive", which are the same as
+# those that are accepted by the "json_in" tool of CherryPy.
+#
+_JSON_CONTENT_TYPES = ('application/json', 'text/javascript', )  # type: typing.Tuple[str, ...]
+
+_JSON_CONTENT_TYPE = 'application/json'  # type: str
+
+_TEXT_CONTENT_TYPE = 'text/plain; charset=utf-8'  # type: str
+
+_METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'  # type: str
+
+_LOGGER = logging.getLogger(__name__)  # type: logging.Logger
+
+# A request, where the names of the headers are lower case, and where the query
+# parameters are decoded, keeping the last value of each.
+#
+_Request = collections.namedtuple('_Request', ('method', 'path', 'version', 'headers', 'body', 'query', ))
+
+# A response, where the body is encoded.
+#
+_Response = collections.namedtuple('_Response', ('status', 'content_type', 'body', 'headers', ))
+
+
+class _HTTPError(Exception):
+    """An error that is sent to the client as the response to a request.
+
+    Attributes:
+        status (int): The status code.
+        message (str): The message.
+        headers (typing.Dict[str, str]): The additional headers.
+
+    """
+
+    def __init__(self, status: int, message: typing.Optional[str] = None, headers: typing.Optional[typing.Dict[str, str]] = None) -> None:
+        """Initialize this error.
+
+        """
+
+        super(_HTTPError, self).__init__(status, message)
+
+        self.status = status  # type: int
+        self.message = message if message is not None else http.HTTPStatus(status).phrase  # type: str
+        self.headers = dict(headers or {})  # type: typing.Dict[str, str]
+
+
+def _error_response(exc: _HTTPError) -> _Response:
+    """Return the response for an error.
+
+    """
+
+    return _Response(exc.status, _TEXT_CONTENT_TYPE, exc.message.encode('utf-8'), exc.headers)
+
+
+def _json_response(value: typing.Any) -> _Response:
+    """Return the response for a JSON-encoded value.
+
+    """
+
+    return _Response(200, _JSON_CONTENT_TYPE, json.dumps(value).encode('utf-8'), {})
+
+
+def _media_type(headers: typing.Dict[str, str]) -> str:
+    """Return the media type of the body of a request, without its parameters.
+
+    """
+
+    return headers.get('content-type', '').split(';')[0].strip().lower()
+
+
+def _keep_alive(request: _Request) -> bool:
+    """Return whether or not the connection is kept open after the response to
+    a request, i.e., by default for HTTP/1.1, and if requested for HTTP/1.0.
+
+    """
+
+    connection = request.headers.get('connection', '').lower()  # type: str
+
+    if request.version == 'HTTP/1.0':
+        return connection == 'keep-alive'
+
+    return connection != 'close'
+
+
+def _to_status(inst: typing.Any) -> typing.Dict[str, typing.Any]:
+    """Return the JSON-encoded data for the row for a CloudEvents notification,
+    which is the same as the response of "/get/<task_id>" of the CherryPy
+    application.
+
+    """
+
+    return {
+        'eventType': inst.event_type,
+        'eventTypeVersion': inst.event_type_version,
+        'source': inst.source,
+        'eventID': inst.event_id,
+        'eventTime': inst.event_time,
+        'schemaURL': inst.schema_url,
+        'contentType': inst.content_type,
+        'eventData': inst.event_data,
+        'data': inst.data,
+        'taskID': str(inst.task_id),
+        'taskStatus': inst.task_status,
+        'taskApplicationName': inst.task_application_name,
+        'taskName': inst.task_name,
+        'exceptionType': inst.exc_type,
+        'exceptionValue': inst.exc_value,
+        'exceptionTraceback': inst.exc_traceback,
+        'created': str(inst.created) if inst.created is not None else None,
+        'updated': str(inst.updated) if inst.updated is not None else None,
+        'deleted': str(inst.deleted) if inst.deleted is not None else None,
+    }
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: typing.Dict[str, str], max_body_bytes: int) -> bytes:
+    """Read the body of a request, which is either delimited by its length or
+    chunked.
+
+    The length and the size of each chunk must be plain decimal and hexadecimal
+    digits, respectively, and a request must not have both a length and a
+    transfer encoding, so that this server never frames a request differently
+    from a proxy in front of it, i.e., request smuggling.
+
+    Raises:
+        _HTTPError: If the body is malformed or too large.
+
+    """
+
+    if 'transfer-encoding' in headers:
+        if 'content-length' in headers:
+            raise _HTTPError(400, 'Both Content-Length and Transfer-Encoding')
+
+        if headers['transfer-encoding'].lower() != 'chunked':
+            raise _HTTPError(501, 'Unsupported transfer encoding')
+
+        chunks = []  # type: typing.List[bytes]
+        size = 0  # type: int
+
+        while True:
+            chunk_size_match = _CHUNK_SIZE_PATTERN.fullmatch((await reader.readuntil(b'\r\n'))[:-2])
+
+            if chunk_size_match is None:
+                raise _HTTPError(400, 'Malformed chunk size')
+
+            chunk_size = int(chunk_size_match.group(1), 16)  # type: int
+
+            if chunk_size == 0:
+                # Discard the trailers.
+                #
+                while (await reader.readuntil(b'\r\n')) != b'\r\n':
+                    pass
+
+                return b''.join(chunks)
+
+            size += chunk_size
+
+            if size > max_body_bytes:
+                raise _HTTPError(413)
+
+            chunks.append(await reader.readexactly(chunk_size))
+
+            if (await reader.readexactly(2)) != b'\r\n':
+                raise _HTTPError(400, 'Malformed chunk')
+
+    if _CONTENT_LENGTH_PATTERN.fullmatch(headers.get('content-length', '0')) is None:
+        raise _HTTPError(400, 'Malformed Content-Length')
+
+    content_length = int(headers.get('content-length', '0'))  # type: int
+
+    if content_length > max_body_bytes:
+        raise _HTTPError(413)
+
+    return await reader.readexactly(content_length)
+
+
+async def _read_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_body_bytes: int, timeout: float) -> typing.Optional[_Request]:
+    """Read a request, or return ``None`` if the client closed the connection
+    before it sent the request.
+
+    The timeout applies to the head of the request, i.e., to an idle
+    connection, rather than to its body, which may take longer to upload.
+
+    Raises:
+        _HTTPError: If the request is malformed or too large.
+        asyncio.TimeoutError: If the head of the request was not read within the
+            timeout.
+
+    """
+
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)  # type: bytes
+    except asyncio.IncompleteReadError as exc:
+        if not exc.partial.strip():
+            return None
+
+        raise
+    except asyncio.LimitOverrunError:
+        raise _HTTPError(431)
+
+    try:
+        lines = head.decode('latin-1').split('\r\n')  # type: typing.List[str]
+        (method, target, version) = lines[0].split(' ')
+    except ValueError:
+        raise _HTTPError(400, 'Malformed request line')
+
+    if version not in ('HTTP/1.0', 'HTTP/1.1'):
+        raise _HTTPError(505)
+
+    headers = {}  # type: typing.Dict[str, str]
+
+    for line in lines[1:]:
+        if not line:
+            continue
+
+        (name, sep, value) = line.partition(':')
+
+        # Reject the obsolete line folding and whitespace before the colon, as
+        # well as a repeated header that frames the body.
+        #
+        if not (sep and name) or (name != name.strip()):
+            raise _HTTPError(400, 'Malformed header')
+
+        name = name.lower()
+
+        if (name in headers) and (name in _FRAMING_HEADER_NAMES):
+            raise _HTTPError(400, 'Repeated {0} header'.format(name))
+
+        headers[name] = value.strip()
+
+    # Tell the client to send the body, e.g., for curl, which waits for the
+    # interim response before it sends a large body.
+    #
+    if headers.get('expect', '').lower() == '100-continue':
+        writer.write('{0} 100 Continue\r\n\r\n'.format(version).encode('latin-1'))
+        await writer.drain()
+
+    body = await _read_body(reader, headers, max_body_bytes)  # type: bytes
+
+    (path, _sep, query) = target.partition('?')
+
+    return _Request(method, path, version, headers, body, dict(urllib.parse.parse_qsl(query)))
+
+
+class AsyncioServer:
+    """An asyncio server for the endpoints that receive CloudEvents
+    notifications.
+
+    Each request is parsed in the event loop, and then the calls to the
+    database and the message broker for the request are run in a bounded pool
+    of threads, so that the event loop is never blocked by them.
+
+    Attributes:
+        model (type): The class for the Peewee model.
+        receive_task (celery.Task): The Celery task that is triggered when a
+            CloudEvents notification is received.
+        dedupe_window (typing.Optional[float]): The window in seconds for
+            duplicate CloudEvents notifications that are pending, or ``None``
+            to disable deduplication.
+        metrics (pacifica.dispatcher_example.metrics.Registry): The registry
+            for the metrics.
+        max_body_bytes (int): The maximum size of the body of a request in
+            bytes.
+        keepalive_timeout (float): The number of seconds that an idle
+            connection is kept open.
+        admission (pacifica.dispatcher_example.admission.AdmissionController):
+            The admission controller.
+
+    """
+
+    def __init__(self, model: type, receive_task: celery.Task, dedupe_window: typing.Optional[float] = None, metrics: Registry = NULL_REGISTRY, max_workers: int = DEFAULT_MAX_WORKERS, max_body_bytes: int = DEFAULT_MAX_BODY_BYTES, keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT, admission: typing.Optional[AdmissionController] = None) -> None:
+        """Initialize this server.
+
+        Args:
+            model (type): The class for the Peewee model.
+            receive_task (celery.Task): The Celery task that is triggered when a
+                CloudEvents notification is received.
+            dedupe_window (typing.Optional[float]): The window in seconds for
+                duplicate CloudEvents notifications that are pending, or
+                ``None`` to disable deduplication.
+            metrics (pacifica.dispatcher_example.metrics.Registry): The
+                registry for the metrics.
+            max_workers (int): The maximum number of threads that call the
+                database and the message broker.
+            max_body_bytes (int): The maximum size of the body of a request in
+                bytes.
+            keepalive_timeout (float): The number of seconds that an idle
+                connection is kept open.
+            admission (typing.Optional[pacifica.dispatcher_example.admission.AdmissionController]):
+                The admission controller, or ``None`` to admit every
+                CloudEvents notification.
+
+        Raises:
+            ValueError: If the maximum number of threads is not positive.
+
+        """
+
+        super(AsyncioServer, self).__init__()
+
+        if max_workers <= 0:
+            raise ValueError('max_workers must be positive')
+
+        self.model = model  # type: type
+        self.receive_task = receive_task  # type: celery.Task
+        self.dedupe_window = dedupe_window  # type: typing.Optional[float]
+        self.metrics = metrics  # type: pacifica.dispatcher_example.metrics.Registry
+        self.max_body_bytes = max_body_bytes  # type: int
+        self.keepalive_timeout = keepalive_timeout  # type: float
+        self.admission = admission if admission is not None else AdmissionController(model)  # type: AdmissionController
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dispatcher-example-receiver')  # type: concurrent.futures.ThreadPoolExecutor
+        self._connections = 0  # type: int
+
+        self._request_seconds = metrics.histogram('dispatcher_example_http_request_seconds', 'The latency of each HTTP request.', labelnames=('method', 'path', 'status'))  # type: pacifica.dispatcher_example.metrics.Histogram
+
+        metrics.register_callback('dispatcher_example_http_connections', 'The number of open HTTP connections.', lambda: self._connections)
+
+    async def _run_in_executor(self, func: typing.Callable[..., typing.Any], *args, **kwargs) -> typing.Any:
+        """Call a function in the pool of threads, and then return its result.
+
+        """
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def _receive(self, events: typing.List[typing.Dict[str, typing.Any]]) -> typing.List[str]:
+        """Admit a list of CloudEvents notifications, and then insert their rows
+        and publish the Celery tasks.
+
+        The admission controller is called in the pool of threads, rather than
+        in the event loop, because it may sample the load.
+
+        """
+
+        try:
+            self.admission.admit(len(events))
+        except AdmissionRejectedError as exc:
+            raise _HTTPError(exc.status, str(exc), headers={'Retry-After': str(exc.retry_after)})
+
+        return receive_batch(self.model, self.receive_task, events, dedupe_window=self.dedupe_window, metrics=self.metrics)
+
+    def _receive_body(self, body: bytes, content_type: typing.Optional[str]) -> typing.List[str]:
+        """Parse the body of a request to "/batch", and then insert the rows for
+        the CloudEvents notifications and publish the Celery tasks.
+
+        The body is parsed in the pool of threads, rather than in the event
+        loop, because a batch may be large.
+
+        """
+
+        try:
+            events = parse_events(body, content_type)
+        except ValueError as exc:
+            raise _HTTPError(400, str(exc))
+
+        return self._receive(events)
+
+    def _find(self, task_id: str) -> typing.Any:
+        """Return the row for a CloudEvents notification.
+
+        Raises:
+            _HTTPError: If the ID for the Celery task is invalid, or if the row
+                is not found.
+
+        """
+
+        try:
+            task_uuid = uuid.UUID(task_id)
+        except ValueError:
+            raise _HTTPError(422)
+
+        with self.model._meta.database.connection_context():  # pylint: disable=protected-access
+            try:
+                return self.model.get(self.model.task_id == task_uuid)
+            except peewee.DoesNotExist:
+                raise _HTTPError(404)
+
+    def _get(self, task_id: str) -> typing.Dict[str, typing.Any]:
+        """Return the JSON-encoded data for the row for a CloudEvents
+        notification.
+
+        """
+
+        return _to_status(self._find(task_id))
+
+    def _status(self, task_id: str) -> str:
+        """Return the status of the row for a CloudEvents notification, which
+        is the same as the response of "/status/<task_id>" of the CherryPy
+        application.
+
+        """
+
+        return self._find(task_id).task_status
+
+    def _index(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        """Return the JSON-encoded data for every row, newest first, which is
+        the same as the response of "/" of the CherryPy application.
+
+        """
+
+        with self.model._meta.database.connection_context():  # pylint: disable=protected-access
+            return [
+                {
+                    'taskID': str(inst.task_id),
+                    'created': str(inst.created) if inst.created is not None else None,
+                    'updated': str(inst.updated) if inst.updated is not None else None,
+                    'deleted': str(inst.deleted) if inst.deleted is not None else None,
+                }
+                for inst in self.model.select(self.model.task_id, self.model.created, self.model.updated, self.model.deleted).order_by(self.model.created.desc())
+            ]
+
+    def _list(self, query: typing.Dict[str, str]) -> typing.Dict[str, typing.Any]:
+        """Return the JSON-encoded data for a page of the statuses.
+
+        """
+
+        try:
+            return list_statuses(self.model, status=query.get('status', None), limit=int(query.get('limit', DEFAULT_PAGE_SIZE)), after=query.get('after', None))
+        except ValueError as exc:
+            raise _HTTPError(400, str(exc))
+
+    def _health(self) -> _Response:
+        """Return the response to a request to "/health".
+
+        """
+
+        health = self.admission.health()  # type: typing.Dict[str, typing.Any]
+
+        if health['status'] != 'ok':
+            return _Response(503, _JSON_CONTENT_TYPE, json.dumps(health).encode('utf-8'), {'Retry-After': str(health['retryAfter'])})
+
+        return _json_response(health)
+
+    async def _handle_request(self, request: _Request) -> _Response:
+        """Return the response to a request.
+
+        Raises:
+            _HTTPError: If the request is not found, not allowed or invalid.
+
+        """
+
+        segments = request.path.strip('/').split('/')  # type: typing.List[str]
+
+        if segments == ['']:
+            if request.method not in ('GET', 'HEAD'):
+                raise _HTTPError(405, headers={'Allow': 'GET, HEAD'})
+
+            return _json_response(await self._run_in_executor(self._index))
+
+        if segments == ['receive']:
+            if request.method != 'POST':
+                raise _HTTPError(405, headers={'Allow': 'POST'})
+
+            if _media_type(request.headers) not in _JSON_CONTENT_TYPES:
+                raise _HTTPError(415, 'Expected an entity of content type {0}'.format(', '.join(_JSON_CONTENT_TYPES)))
+
+            try:
+                event_data = decode_json(request.body)
+            except ValueError:
+                raise _HTTPError(400, 'Invalid JSON document')
+
+            if not isinstance(event_data, dict):
+                raise _HTTPError(400, 'CloudEvents notification must be a JSON object')
+
+            (task_id, ) = await self._run_in_executor(self._receive, [event_data])
+
+            return _json_response(task_id)
+
+        if segments == ['batch']:
+            if request.method != 'POST':
+                raise _HTTPError(405, headers={'Allow': 'POST'})
+
+            return _json_response(await self._run_in_executor(self._receive_body, request.body, request.headers.get('content-type', None)))
+
+        if (len(segments) == 2) and (segments[0] == 'get'):
+            if request.method not in ('GET', 'HEAD'):
+                raise _HTTPError(405, headers={'Allow': 'GET, HEAD'})
+
+            return _json_response(await self._run_in_executor(self._get, segments[1]))
+
+        if (len(segments) == 2) and (segments[0] == 'status'):
+            if request.method not in ('GET', 'HEAD'):
+                raise _HTTPError(405, headers={'Allow': 'GET, HEAD'})
+
+            return _json_response(await self._run_in_executor(self._status, segments[1]))
+
+        if segments == ['statuses']:
+            if request.method not in ('GET', 'HEAD'):
+                raise _HTTPError(405, headers={'Allow': 'GET, HEAD'})
+
+            return _json_response(await self._run_in_executor(self._list, request.query))
+
+        if segments == ['health']:
+            if request.method not in ('GET', 'HEAD'):
+                raise _HTTPError(405, headers={'Allow': 'GET, HEAD'})
+
+            return await self._run_in_executor(self._health)
+
+        if (segments == ['metrics']) and self.metrics.enabled:
+            if request.method not in ('GET', 'HEAD'):
+                raise _HTTPError(405, headers={'Allow': 'GET, HEAD'})
+
+            return _Response(200, _METRICS_CONTENT_TYPE, self.metrics.render().encode('utf-8'), {})
+
+        raise _HTTPError(404)
+
+    async def _respond(self, request: _Request) -> _Response:
+        """Return the response to a request, including for errors.
+
+        """
+
+        try:
+            return await self._handle_request(request)
+        except _HTTPError as exc:
+            return _error_response(exc)
+        # pylint: disable=broad-except
+        except Exception:
+            _LOGGER.exception('Unhandled exception for %s %s', request.method, request.path)
+
+            return _error_response(_HTTPError(500))
+        # pylint: enable=broad-except
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, response: _Response, keep_alive: bool, head_only: bool = False) -> None:
+        """Write a response.
+
+        """
+
+        lines = [
+            'HTTP/1.1 {0} {1}'.format(response.status, http.HTTPStatus(response.status).phrase),
+            'Content-Type: {0}'.format(response.content_type),
+            'Content-Length: {0}'.format(len(response.body)),
+            'Connection: {0}'.format('keep-alive' if keep_alive else 'close'),
+        ]  # type: typing.List[str]
+
+        lines.extend('{0}: {1}'.format(name, value) for (name, value) in response.headers.items())
+
+        writer.write(''.join('{0}\r\n'.format(line) for line in lines).encode('latin-1') + b'\r\n')
+
+        if not head_only:
+            writer.write(response.body)
+
+        await writer.drain()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Handle the requests on a connection until either the client closes
+        it, it is idle for longer than the timeout, or a request asks for it
+        to be closed.
+
+        Args:
+            reader (asyncio.StreamReader): The reader for the connection.
+            writer (asyncio.StreamWriter): The writer for the connection.
+
+        """
+
+        self._connections += 1
+
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader, writer, self.max_body_bytes, self.keepalive_timeout)  # type: typing.Optional[_Request]
+                except _HTTPError as exc:
+                    await self._write_response(writer, _error_response(exc), False)
+                    break
+
+                if request is None:
+                    break
+
+                start = time.perf_counter()  # type: float
+
+                response = await self._respond(request)  # type: _Response
+                keep_alive = _keep_alive(request)  # type: bool
+
+                await self._write_response(writer, response, keep_alive, head_only=(request.method == 'HEAD'))
+
+                self._request_seconds.observe(
+                    time.perf_counter() - start,
+                    method=request.method,
+                    path='/{0}'.format(request.path.strip('/').split('/')[0]),
+                    status=str(response.status),
+                )
+
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            self._connections -= 1
+
+            writer.close()
+
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def start(self, host: str, port: int, backlog: int = DEFAULT_BACKLOG) -> asyncio.AbstractServer:
+        """Start listening for connections.
+
+        Args:
+            host (str): The hostname or IP address on which to listen for
+                connections.
+            port (int): The TCP port on which to listen for connections.
+            backlog (int): The maximum number of connections that are queued at
+                the socket.
+
+        Returns:
+            asyncio.AbstractServer: The server, which is serving.
+
+        """
+
+        return await asyncio.start_server(self.handle_connection, host, port, limit=_MAX_HEAD_BYTES, backlog=backlog)
+
+    async def serve_forever(self, host: str, port: int, backlog: int = DEFAULT_BACKLOG) -> None:
+        """Listen for connections until cancelled.
+
+        Args:
+            host (str): The hostname or IP address on which to listen for
+                connections.
+            port (int): The TCP port on which to listen for connections.
+            backlog (int): The maximum number of connections that are queued at
+                the socket.
+
+        """
+
+        server = await self.start(host, port, backlog=backlog)  # type: asyncio.AbstractServer
+
+        async with server:
+            await server.serve_forever()
+
+    def run(self, host: str, port: int, backlog: int = DEFAULT_BACKLOG) -> None:
+        """Listen for connections until interrupted, and then shut down the
+        pool of threads.
+
+        Args:
+            host (str): The hostname or IP address on which to listen for
+                connections.
+            port (int): The TCP port on which to listen for connections.
+            backlog (int): The maximum number of connections that are queued at
+                the socket.
+
+        """
+
+        try:
+            asyncio.run(self.serve_forever(host, port, backlog=backlog))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        """Shut down the pool of threads, after the calls that are running
+        return.
+
+        """
+
+        self._executor.shutdown(wait=True)
+
+
+# Module exports.
+#
+__all__ = ('ASYNCIO', 'CHERRYPY', 'DEFAULT_BACKLOG', 'DEFAULT_KEEPALIVE_TIMEOUT', 'DEFAULT_MAX_BODY_BYTES', 'DEFAULT_MAX_WORKERS', 'ENGINE_NAMES', 'AsyncioServer', )
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/statuses.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Statuses for Pacifica Dispatcher Example.
+
+This module defines the secondary indexes, the retention and the paginated
+listing for the rows for the `CloudEvents`_ notifications, i.e., for the table
+of the Peewee model that is provided by the ``pacifica.dispatcher.receiver``
+module.
+
+The Peewee model indexes each column on its own, and nothing ever removes its
+rows, so that, as the table grows, the queries that filter on one column and
+order by another, e.g., the rows with a given status, newest first, sort every
+matching row, and the queries that page with ``OFFSET`` scan every skipped
+row. The composite indexes that are ensured by this module match the queries
+of this package, the rows for the CloudEvents notifications that have finished
+are deleted (or compacted) by a periodic `Celery`_ task, in batches, once they
+are older than the retention period, and the `CherryPy`_ endpoint that lists
+the statuses pages by the key of the last row (keyset pagination), so that the
+cost of each page is independent of its position.
+
+Attributes:
+    ACTIVE_STATUSES (typing.Tuple[str, ...]): The statuses of the rows for the
+        CloudEvents notifications that have not finished, which are never
+        removed.
+    DEFAULT_BATCH_SIZE (int): The default number of rows that are removed per
+        transaction.
+    DEFAULT_PAGE_SIZE (int): The default number of rows per page.
+    DEFAULT_RETENTION_INTERVAL (float): The default number of seconds between
+        the runs of the retention.
+    MAX_PAGE_SIZE (int): The maximum number of rows per page.
+    apply_retention (typing.Callable[..., int]): Delete or compact the rows for
+        the CloudEvents notifications that finished before the retention period.
+    create_statuses_endpoint (typing.Callable[[type], typing.Any]): Construct
+        the CherryPy endpoint that lists the statuses.
+    ensure_indexes (typing.Callable[[type], None]): Create the secondary
+        indexes for the Peewee model, if they do not exist.
+    install_retention_task (typing.Callable[..., celery.Task]): Register the
+        Celery task that applies the retention, and then schedule it with Celery
+        beat.
+    list_statuses (typing.Callable[..., typing.Dict[str, typing.Any]]): Return
+        a page of the statuses.
+
+.. _Celery:
+   http://www.celeryproject.org/
+.. _CherryPy:
+   https://cherrypy.org/
+.. _CloudEvents:
+   https://cloudevents.io/
+
+"""
+
+import base64
+import datetime
+import typing
+import uuid
+
+import celery
+import cherrypy
+import peewee
+
+from .ingest import INGESTING_STATUS
+from .metrics import NULL_REGISTRY, Registry
+
+
+# The statuses of the rows for the CloudEvents notifications that have not
+# finished, i.e., whose Celery tasks have not started or are running, or whose
+# ingest jobs are outstanding.
+#
+ACTIVE_STATUSES = ('202 Accepted', '102 Processing', INGESTING_STATUS, )  # type: typing.Tuple[str, ...]
+
+# The default number of rows that are removed per transaction, which keeps each
+# transaction short, so that the Celery workers and the endpoints are not
+# blocked by the retention.
+#
+DEFAULT_BATCH_SIZE = 1000  # type: int
+
+# The default number of seconds between the runs of the retention.
+#
+DEFAULT_RETENTION_INTERVAL = 3600.0  # type: float
+
+# The default and the maximum number of rows per page.
+#
+DEFAULT_PAGE_SIZE = 100  # type: int
+MAX_PAGE_SIZE = 1000  # type: int
+
+# The maximum number of rows per ``DELETE`` or ``UPDATE`` statement, which keeps
+# the number of bound parameters within the limit for SQLite.
+#
+_CHUNK_SIZE = 256  # type: int
+
+# The separator of the fields of a cursor.
+#
+_CURSOR_SEPARATOR = '|'  # type: str
+
+
+def ensure_indexes(model: type) -> None:
+    """Create the secondary indexes for the Peewee model, if they do not exist.
+
+    The indexes are as follows:
+    1. "eventID" and "source", for the duplicates of CloudEvents notifications.
+    2. The status, the time of creation and the ID for the Celery task, for the
+       listing of the statuses with a given status, for the retention, and for
+       the oldest pending row, e.g., for the admission controller.
+    3. The time of creation and the ID for the Celery task, for the listing of
+       every status.
+
+    Args:
+        model (type): The class for the Peewee model.
+
+    """
+
+    existing = {index._name for index in model._meta.indexes if isinstance(index, peewee.ModelIndex)}  # type: typing.Set[str]  # pylint: disable=protected-access
+
+    for fields in [
+            (model.event_id, model.source, ),
+            (model.task_status, model.created, model.task_id, ),
+            (model.created, model.task_id, ),
+    ]:
+        name = '_'.join([model._meta.table_name] + [field.column_name for field in fields])  # type: str  # pylint: disable=protected-access
+
+        if name not in existing:
+            model.add_index(peewee.ModelIndex(model, fields, name=name))
+
+    # The "safe" keyword argument ensures that each index is only created if it
+    # does not exist, i.e., the indexes of an existing table are added.
+    #
+    with model._meta.database.connection_context():  # pylint: disable=protected-access
+        model._schema.create_indexes(safe=True)  # pylint: disable=protected-access
+
+
+def apply_retention(model: type, retention: float, compact: bool = False, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Delete or compact the rows for the CloudEvents notifications that
+    finished, and that were received before the retention period.
+
+    A compacted row keeps its status, so that it can still be looked up and
+    still suppresses its duplicates, but its JSON-encoded data and its
+    traceback are cleared, and the time that it was compacted is set.
+
+    The rows are removed oldest first, in batches, one transaction per batch.
+
+    Args:
+        model (type): The class for the Peewee model.
+        retention (float): The retention period in seconds.
+        compact (bool): Whether to compact, rather than delete, the rows.
+        batch_size (int): The number of rows per transaction.
+
+    Returns:
+        int: The number of rows that were deleted or compacted.
+
+    Raises:
+        ValueError: If the retention period or the number of rows per
+            transaction is not positive.
+
+    """
+
+    if retention <= 0:
+        raise ValueError('retention must be positive')
+
+    if batch_size <= 0:
+        raise ValueError('batch_size must be positive')
+
+    database = model._meta.database  # type: peewee.Database  # pylint: disable=protected-access
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=retention)  # type: datetime.datetime
+
+    query = model.select(model.uuid).where((model.created < cutoff) & model.task_status.not_in(ACTIVE_STATUSES))  # type: peewee.ModelSelect
+
+    if compact:
+        query = query.where(model.deleted.is_null())
+
+    count = 0  # type: int
+
+    with database.connection_context():
+        while True:
+            with database.atomic():
+                uuids = [inst.uuid for inst in query.order_by(model.created).limit(batch_size)]  # type: typing.List[uuid.UUID]
+
+                for uuids_chunk in peewee.chunked(uuids, _CHUNK_SIZE):
+                    if compact:
+                        model.update(event_data='', data='', exc_traceback='', deleted=datetime.datetime.now()).where(model.uuid.in_(uuids_chunk)).execute()
+                    else:
+                        model.delete().where(model.uuid.in_(uuids_chunk)).execute()
+
+            count += len(uuids)
+
+            if len(uuids) < batch_size:
+                return count
+
+
+def install_retention_task(celery_app: celery.Celery, model: type, retention_task_name: str, retention: float, interval: float = DEFAULT_RETENTION_INTERVAL, compact: bool = False, batch_size: int = DEFAULT_BATCH_SIZE, metrics: Registry = NULL_REGISTRY) -> celery.Task:
+    """Register the Celery task that applies the retention, and then schedule
+    it with Celery beat, e.g., "celery worker -B".
+
+    Each scheduled Celery task expires after the interval, so that the Celery
+    tasks that were not started in time do not pile up.
+
+    Args:
+        celery_app (celery.Celery): The Celery application.
+        model (type): The class for the Peewee model.
+        retention_task_name (str): The name of the Celery task.
+        retention (float): The retention period in seconds.
+        interval (float): The number of seconds between the runs.
+        compact (bool): Whether to compact, rather than delete, the rows.
+        batch_size (int): The number of rows per transaction.
+        metrics (pacifica.dispatcher_example.metrics.Registry): The registry
+            for the metrics.
+
+    Returns:
+        celery.Task: The Celery task.
+
+    Raises:
+        ValueError: If the retention period, the interval or the number of rows
+            per transaction is not positive.
+
+    """
+
+    if retention <= 0:
+        raise ValueError('retention must be positive')
+
+    if interval <= 0:
+        raise ValueError('interval must be positive')
+
+    if batch_size <= 0:
+        raise ValueError('batch_size must be positive')
+
+    retention_rows_total = metrics.counter('dispatcher_example_retention_rows_total', 'The number of rows for CloudEvents notifications that were removed by the retention, by action.', labelnames=('action', ))  # type: pacifica.dispatcher_example.metrics.Counter
+
+    # The Celery task is not shared with other Celery applications, because it
+    # is bound to the Peewee model.
+    #
+    @celery_app.task(ignore_result=True, name=retention_task_name, shared=False)
+    def retention_task() -> int:
+        """Apply the retention, and then return the number of rows that were
+        removed.
+
+        """
+
+        count = apply_retention(model, retention, compact=compact, batch_size=batch_size)  # type: int
+
+        retention_rows_total.inc(count, action='compact' if compact else 'delete')
+
+        return count
+
+    celery_app.conf.beat_schedule = dict(celery_app.conf.beat_schedule or {}, **{
+        retention_task_name: {
+            'task': retention_task_name,
+            'schedule': interval,
+            'options': {'expires': interval},
+        },
+    })
+
+    return retention_task
+
+
+def _encode_cursor(inst: typing.Any) -> str:
+    """Return the cursor for the page after a row.
+
+    """
+
+    return base64.urlsafe_b64encode(_CURSOR_SEPARATOR.join([inst.created.isoformat(), str(inst.task_id)]).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> typing.Tuple[datetime.datetime, uuid.UUID]:
+    """Return the time of creation and the ID for the Celery task of the row
+    for a cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+
+    """
+
+    try:
+        (created, task_id) = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split(_CURSOR_SEPARATOR)
+
+        return (datetime.datetime.fromisoformat(created), uuid.UUID(task_id))
+    except (TypeError, UnicodeError, ValueError):
+        raise ValueError('Malformed cursor')
+
+
+def list_statuses(model: type, status: typing.Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, after: typing.Optional[str] = None) -> typing.Dict[str, typing.Any]:
+    """Return a page of the statuses of the rows for the CloudEvents
+    notifications, newest first.
+
+    Only the columns for the statuses are selected, rather than the JSON-encoded
+    data, and each page starts after the key of the last row of the previous
+    page, i.e., its time of creation and the ID for its Celery task, so that
+    each page is read from the secondary indexes.
+
+    Args:
+        model (type): The class for the Peewee model.
+        status (typing.Optional[str]): The status of the rows, or ``None`` for
+            every row.
+        limit (int): The maximum number of rows.
+        after (typing.Optional[str]): The cursor for the page, i.e., the
+            "next" cursor of the previous page, or ``None`` for the first page.
+
+    Returns:
+        typing.Dict[str, typing.Any]: The JSON-encoded data for the page, where
+        "statuses" is the list of the statuses, and "next" is the cursor for the
+        next page, or ``None`` for the last page.
+
+    Raises:
+        ValueError: If the maximum number of rows is out of range, or if the
+            cursor is malformed.
+
+    """
+
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError('limit must be between 1 and {0}'.format(MAX_PAGE_SIZE))
+
+    query = model.select(model.task_id, model.task_status, model.source, model.event_id, model.event_type, model.created, model.updated)  # type: peewee.ModelSelect
+
+    if status is not None:
+        query = query.where(model.task_status == status)
+
+    if after is not None:
+        (created, task_id) = _decode_cursor(after)
+
+        # The row value comparison is a range of the secondary index, rather
+        # than a filter of every row before the cursor.
+        #
+        query = query.where(peewee.Tuple(model.created, model.task_id) < peewee.Tuple(model.created.to_value(created), model.task_id.to_value(task_id)))
+
+    # One more row than the limit is selected, so that the last page has no
+    # cursor.
+    #
+    with model._meta.database.connection_context():  # pylint: disable=protected-access
+        insts = list(query.order_by(model.created.desc(), model.task_id.desc()).limit(limit + 1))  # type: typing.List[typing.Any]
+
+    return {
+        'statuses': [
+            {
+                'taskID': str(inst.task_id),
+                'taskStatus': inst.task_status,
+                'source': inst.source,
+                'eventID': inst.event_id,
+                'eventType': inst.event_type,
+                'created': str(inst.created) if inst.created is not None else None,
+                'updated': str(inst.updated) if inst.updated is not None else None,
+            }
+            for inst in insts[:limit]
+        ],
+        'next': _encode_cursor(insts[limit - 1]) if len(insts) > limit else None,
+    }
+
+
+def create_statuses_endpoint(model: type) -> typing.Any:
+    """Construct the CherryPy endpoint that lists the statuses of the rows for
+    the CloudEvents notifications, newest first.
+
+    The query parameters are "status", "limit" and "after", which are the same
+    as the keyword arguments of ``list_statuses``. The endpoint is mounted
+    alongside the upstream "/status/<task_id>" endpoint, which it does not
+    replace.
+
+    Args:
+        model (type): The class for the Peewee model.
+
+    Returns:
+        typing.Any: The CherryPy endpoint, which is mounted as an attribute of
+        the root object of the CherryPy application.
+
+    """
+
+    # pylint: disable=too-few-public-methods
+    class Statuses:
+        """Statuses entrypoint for the listing of the statuses."""
+
+        exposed = True
+
+        # pylint: disable=invalid-name
+        @staticmethod
+        @cherrypy.tools.json_out()
+        def GET(status: typing.Optional[str] = None, limit: typing.Optional[str] = None, after: typing.Optional[str] = None) -> typing.Dict[str, typing.Any]:
+            """List the statuses."""
+            try:
+                return list_statuses(model, status=status, limit=int(limit) if limit is not None else DEFAULT_PAGE_SIZE, after=after)
+            except ValueError as exc:
+                raise cherrypy.HTTPError('400', str(exc))
+        # pylint: enable=invalid-name
+    # pylint: enable=too-few-public-methods
+
+    return Statuses()
+
+
+# Module exports.
+#
+__all__ = ('ACTIVE_STATUSES', 'DEFAULT_BATCH_SIZE', 'DEFAULT_PAGE_SIZE', 'DEFAULT_RETENTION_INTERVAL', 'MAX_PAGE_SIZE', 'apply_retention', 'create_statuses_endpoint', 'ensure_indexes', 'install_retention_task', 'list_statuses', )
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: pacifica/dispatcher_example/transforms.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Transforms for Pacifica Dispatcher Example.
+
+This module defines the streaming transforms that are applied by the event
+handler to the content of each downloaded file.
+
+Each transform is an instance of a subclass of the ``Transform`` class, whose
+interface is bytes-in and bytes-out, so that the event handler never decodes or
+encodes the content itself. The built-in transforms are:
+
+* ``upper``: convert all the cased characters to uppercase, in the same way as
+  ``str.upper``, and then write the content as UTF-8. Every chunk that is
+  entirely ASCII, which is the common case for the text files that are
+  ingested by Pacifica, is converted by ``bytes.translate``, without decoding
+  or encoding it. The other chunks are decoded, converted and encoded.
+* ``ascii-upper``: convert only the ASCII letters to uppercase, and copy every
+  other byte unchanged, i.e., by ``bytes.translate`` alone.
+
+Attributes:
+    ASCII_UPPER (str): The name of the transform that converts only the ASCII
+        letters to uppercase.
+    DEFAULT_CHUNK_SIZE (int): The default number of bytes that are read from
+        the original file per iteration.
+    TRANSFORM_NAMES (typing.Tuple[str, ...]): The names of the transforms.
+    TRANSFORM_VERSION (str): The version of the default transform, which must
+        be changed whenever the output of the transform changes.
+    UPPER (str): The name of the transform that converts all the cased
+        characters to uppercase.
+    AsciiUpperTransform (type): The class for the ``ascii-upper`` transform.
+    Transform (type): The abstract base class for the transforms.
+    UpperTransform (type): The class for the ``upper`` transform.
+    create_transform (typing.Callable[[str], Transform]): Construct a
+        transform.
+
+"""
+
+import abc
+import codecs
+import string
+import typing
+
+
+# The names of the transforms.
+#
+ASCII_UPPER = 'ascii-upper'  # type: str
+UPPER = 'upper'  # type: str
+
+TRANSFORM_NAMES = (UPPER, ASCII_UPPER, )  # type: typing.Tuple[str, ...]
+
+# The default number of bytes that are read from the original file per
+# iteration.
+#
+# The peak memory usage of the transform is proportional to the chunk size and
+# is independent of the size of the original file.
+#
+DEFAULT_CHUNK_SIZE = 1024 * 1024  # type: int
+
+# The version of the default transform, i.e., ``upper``.
+#
+# The version is part of the key for the results that are cached, so it must be
+# changed whenever the output of the transform changes.
+#
+TRANSFORM_VERSION = 'upper-2'  # type: str
+
+# The translation table that converts the ASCII letters to uppercase, and maps
+# every other byte to itself.
+#
+_ASCII_UPPER_TABLE = bytes.maketrans(string.ascii_lowercase.encode('ascii'), string.ascii_uppercase.encode('ascii'))  # type: bytes
+
+# The names of the codecs for the character encodings in which every byte that
+# is less than 0x80 is the ASCII character with the same code, and is never part
+# of a multi-byte character, so that the ASCII letters are converted without
+# decoding the content.
+#
+# The character encoding of a Pacifica file that is ``None`` is UTF-8.
+#
+_ASCII_COMPATIBLE_CODEC_NAMES = frozenset([
+    'ascii',
+    'cp1252',
+    'iso8859-1',
+    'iso8859-15',
+    'utf-8',
+])  # type: typing.FrozenSet[str]
+
+
+def _lookup_codec(encoding: typing.Optional[str]) -> codecs.CodecInfo:
+    """Return the codec for a character encoding, where ``None`` is UTF-8.
+
+    """
+
+    return codecs.lookup(encoding or 'utf-8')
+
+
+class Transform(abc.ABC):
+    """The abstract base class for the transforms that are applied by the event
+    handler to the content of each downloaded file.
+
+    The interface is bytes-in and bytes-out: the original file and the new file
+    are binary files, and the character encoding of the original file, if any,
+    is given by the metadata description for the Pacifica file. Instances are
+    stateless, so that they can be shared by threads and sent to other
+    processes.
+
+    Attributes:
+        name (str): The name of the transform.
+        version (str): The version of the transform, which is part of the key
+            for the results that are cached.
+
+    """
+
+    name = None  # type: str
+    version = None  # type: str
+
+    @abc.abstractmethod
+    def transform_stream(self, file: typing.BinaryIO, new_file: typing.BinaryIO, encoding: typing.Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """Copy the content of a file, applying this transform, one chunk at a
+        time.
+
+        Args:
+            file (typing.BinaryIO): The original file.
+            new_file (typing.BinaryIO): The new file.
+            encoding (typing.Optional[str]): The character encoding of the
+                original file, or ``None`` for UTF-8.
+            chunk_size (int): The maximum number of bytes to read per
+                iteration.
+
+        Returns:
+            int: The number of bytes that were read from the original file.
+
+        Raises:
+            ValueError: If the chunk size is not positive, or if the character
+                encoding is not supported by this transform.
+
+        """
+
+        raise NotImplementedError()  # pragma: no cover
+
+    def transform_file(self, path: str, new_path: str, encoding: typing.Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """Copy the content of a file at a path to a new path, applying this
+        transform, one chunk at a time.
+
+        This method receives paths rather than IO objects, so that it can be
+        submitted to a pool of processes.
+
+        Args:
+            path (str): The path to the original file.
+            new_path (str): The path to the new file.
+            encoding (typing.Optional[str]): The character encoding of the
+                original file, or ``None`` for UTF-8.
+            chunk_size (int): The maximum number of bytes to read per
+                iteration.
+
+        Returns:
+            int: The number of bytes that were read from the original file.
+
+        """
+
+        with open(path, mode='rb') as file:
+            with open(new_path, mode='wb') as new_file:
+                return self.transform_stream(file, new_file, encoding=encoding, chunk_size=chunk_size)
+
+
+class UpperTransform(Transform):
+    """The transform that converts all the cased characters to uppercase, in
+    the same way as ``str.upper``, and then writes the content as UTF-8.
+
+    If the character encoding of the original file is ASCII-compatible, then
+    each chunk that is entirely ASCII, and that does not continue a multi-byte
+    character from the previous chunk, is converted by ``bytes.translate``.
+    Otherwise, the chunk is decoded by an incremental decoder, converted and
+    encoded. Either way, the line endings are copied unchanged.
+
+    """
+
+    name = UPPER  # type: str
+    version = TRANSFORM_VERSION  # type: str
+
+    def transform_stream(self, file: typing.BinaryIO, new_file: typing.BinaryIO, encoding: typing.Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """Copy the content of a file, converting all the cased characters to
+        uppercase, one chunk at a time.
+
+        Args:
+            file (typing.BinaryIO): The original file.
+            new_file (typing.BinaryIO): The new file.
+            encoding (typing.Optional[str]): The character encoding of the
+                original file, or ``None`` for UTF-8.
+            chunk_size (int): The maximum number of bytes to read per
+                iteration.
+
+        Returns:
+            int: The number of bytes that were read from the original file.
+
+        Raises:
+            ValueError: If the chunk size is not positive.
+            UnicodeDecodeError: If the content of the original file is invalid
+                in its character encoding.
+
+        """
+
+        if chunk_size <= 0:
+            raise ValueError('chunk_size must be positive')
+
+        codec = _lookup_codec(encoding)  # type: codecs.CodecInfo
+        decoder = codec.incrementaldecoder()  # type: codecs.IncrementalDecoder
+
+        ascii_compatible = codec.name in _ASCII_COMPATIBLE_CODEC_NAMES  # type: bool
+        pending = False  # type: bool
+        count = 0  # type: int
+
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            count += len(chunk)
+
+            if ascii_compatible and not pending and chunk.isascii():
+                # The uppercase of an ASCII character is an ASCII character, so
+                # the chunk is converted byte by byte, and its encoding in UTF-8
+                # is itself.
+                #
+                new_file.write(chunk.translate(_ASCII_UPPER_TABLE))
+            else:
+                new_file.write(decoder.decode(chunk).upper().encode('utf-8'))
+
+                # The decoder buffers the bytes of a multi-byte character that
+                # is split across two chunks, so the next chunk must also be
+                # decoded.
+                #
+                pending = bool(decoder.getstate()[0])
+
+        new_file.write(decoder.decode(b'', final=True).upper().encode('utf-8'))
+
+        return count
+
+
+class AsciiUpperTransform(Transform):
+    """The transform that converts only the ASCII letters to uppercase, and
+    copies every other byte unchanged, so that the new file has the same
+    character encoding as the original file.
+
+    This transform never decodes the content, so it is the fastest, but the
+    cased characters that are not ASCII, e.g., "ø", are not converted. Only the
+    ASCII-compatible character encodings are supported.
+
+    """
+
+    name = ASCII_UPPER  # type: str
+    version = 'ascii-upper-1'  # type: str
+
+    def transform_stream(self, file: typing.BinaryIO, new_file: typing.BinaryIO, encoding: typing.Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """Copy the content of a file, converting the ASCII letters to
+        uppercase, one chunk at a time.
+
+        Args:
+            file (typing.BinaryIO): The original file.
+            new_file (typing.BinaryIO): The new file.
+            encoding (typing.Optional[str]): The character encoding of the
+                original file, or ``None`` for UTF-8.
+            chunk_size (int): The maximum number of bytes to read per
+                iteration.
+
+        Returns:
+            int: The number of bytes that were read from the original file.
+
+        Raises:
+            ValueError: If the chunk size is not positive, or if the character
+                encoding is not ASCII-compatible.
+
+        """
+
+        if chunk_size <= 0:
+            raise ValueError('chunk_size must be positive')
+
+        if _lookup_codec(encoding).name not in _ASCII_COMPATIBLE_CODEC_NAMES:
+            raise ValueError('encoding must be ASCII-compatible, not {0!r}'.format(encoding))
+
+        count = 0  # type: int
+
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            new_file.write(chunk.translate(_ASCII_UPPER_TABLE))
+            count += len(chunk)
+
+        return count
+
+
+def create_transform(name: str = UPPER) -> Transform:
+    """Construct a transform.
+
+    Args:
+        name (str): The name of the transform.
+
+    Returns:
+        Transform: The transform.
+
+    Raises:
+        ValueError: If the name of the transform is unknown.
+
+    """
+
+    if name == UPPER:
+        return UpperTransform()
+
+    if name == ASCII_UPPER:
+        return AsciiUpperTransform()
+
+    raise ValueError('transform must be one of {0}'.format(', '.join(TRANSFORM_NAMES)))
+
+
+# Module exports.
+#
+__all__ = ('ASCII_UPPER', 'DEFAULT_CHUNK_SIZE', 'TRANSFORM_NAMES', 'TRANSFORM_VERSION', 'UPPER', 'AsciiUpperTransform', 'Transform', 'UpperTransform', 'create_transform', )
@@ -29,7 +29,7 @@ setup(
     long_description_content_type='text/markdown',
     author='Mark Borkum',
     author_email='mark.borkum@pnnl.gov',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     namespace_packages=['pacifica'],
     include_package_data=True,
     package_data={'': ['*.txt']},
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/admission_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the admission control for Pacifica Dispatcher Example.
+
+This module defines the test cases for the admission control for Pacifica
+Dispatcher Example.
+
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import typing
+import unittest
+
+import cherrypy
+import playhouse.db_url
+from jsonpath2.path import Path
+
+from pacifica.dispatcher.event_handlers import NoopEventHandler
+from pacifica.dispatcher.receiver import create_peewee_model
+from pacifica.dispatcher.router import Router
+
+from pacifica.dispatcher_example.admission import MAX_RETRY_AFTER, AdmissionController, AdmissionRejectedError, LoadSample, to_cherrypy_error
+from pacifica.dispatcher_example.metrics import Registry
+from pacifica.dispatcher_example.receivers import create_celery_app
+from pacifica.dispatcher_example.servers import AsyncioServer
+
+from servers_test import _request
+
+
+class AdmissionTestCase(unittest.TestCase):
+    """Test cases for the admission control for Pacifica Dispatcher Example.
+
+    Attributes:
+        event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for the
+            CloudEvents notification.
+        tempdir (tempfile.TemporaryDirectory): The temporary directory for the
+            SQLite database.
+        model (type): The class for the Peewee model.
+        metrics (pacifica.dispatcher_example.metrics.Registry): The registry
+            for the metrics.
+        receive_task (celery.Task): The Celery task, which is not run, i.e., as
+            if the Celery workers were stalled, so that its messages accumulate
+            in the queue of the message broker.
+
+    """
+
+    def setUp(self) -> None:
+        """Initialize the environment for the test cases.
+
+        """
+
+        with open(os.path.join('test_files', 'C234-1234-1234', 'event.json'), mode='r') as event_file:
+            self.event_data = json.load(event_file)  # type: typing.Dict[str, typing.Any]
+
+        self.tempdir = tempfile.TemporaryDirectory()  # type: tempfile.TemporaryDirectory
+
+        db = playhouse.db_url.connect('sqlite:///{0}'.format(os.path.join(self.tempdir.name, 'db.sqlite3')))  # type: peewee.Database
+
+        self.model = create_peewee_model(db)  # type: type
+        self.model.create_table(safe=True)
+        db.close()
+
+        router = Router()  # type: pacifica.dispatcher.router.Router
+        router.add_route(Path.parse_file(os.path.join(os.path.dirname(__file__), '..', 'pacifica', 'dispatcher_example', 'jsonpath2', 'example.txt')), NoopEventHandler())
+
+        self.metrics = Registry()  # type: pacifica.dispatcher_example.metrics.Registry
+
+        celery_app = create_celery_app(self.model, router, 'test.admission.app', 'test.admission.tasks.receive', broker='memory://', backend='cache+memory://', metrics=self.metrics)  # type: celery.Celery
+        celery_app.conf.task_default_queue = 'test.admission'
+
+        # The queues of the in-memory message broker are shared by every Celery
+        # application in the process.
+        #
+        with celery_app.connection_for_write() as connection:
+            connection.default_channel.queue_purge('test.admission')
+
+        self.receive_task = celery_app.tasks['test.admission.tasks.receive']  # type: celery.Task
+
+    def tearDown(self) -> None:
+        """Clean up the environment for the test cases.
+
+        """
+
+        self.tempdir.cleanup()
+
+    def test_flood(self) -> None:
+        """Test that a flood of concurrent CloudEvents notifications is admitted
+        up to the limits, so that the growth of the pending rows and of the
+        queue of the message broker is bounded, and that the remainder are
+        rejected with a "Retry-After" header.
+
+        """
+
+        admission = AdmissionController(self.model, receive_task=self.receive_task, max_pending=8, max_queue_depth=8, interval=60.0, metrics=self.metrics)
+        server = AsyncioServer(self.model, self.receive_task, metrics=self.metrics, max_workers=8, admission=admission)
+
+        statuses = []  # type: typing.List[int]
+
+        async def client(address: typing.Tuple[str, int], count: int) -> None:
+            """Send a number of CloudEvents notifications on one connection."""
+            (reader, writer) = await asyncio.open_connection(*address)
+
+            try:
+                for _ in range(count):
+                    (status, headers, _body) = await _request(reader, writer, 'POST', '/receive', json.dumps(self.event_data).encode('utf-8'), {'Content-Type': 'application/json'})
+                    statuses.append(status)
+
+                    if status == 429:
+                        self.assertLessEqual(int(headers['retry-after']), MAX_RETRY_AFTER)
+            finally:
+                writer.close()
+
+        async def run() -> typing.Dict[str, typing.Any]:
+            """Flood the asyncio server, and then return the current load."""
+            started = await server.start('127.0.0.1', 0)
+
+            async with started:
+                address = started.sockets[0].getsockname()[:2]
+
+                await asyncio.gather(*[client(address, 4) for _ in range(16)])
+
+                (reader, writer) = await asyncio.open_connection(*address)
+
+                try:
+                    (status, headers, body) = await _request(reader, writer, 'GET', '/health')
+                finally:
+                    writer.close()
+
+                self.assertEqual(503, status)
+                self.assertIn('retry-after', headers)
+
+                return json.loads(body.decode('utf-8'))
+
+        try:
+            health = asyncio.run(run())
+        finally:
+            server.shutdown()
+
+        self.assertEqual(8, statuses.count(200))
+        self.assertEqual(56, statuses.count(429))
+
+        with self.model._meta.database.connection_context():
+            self.assertEqual(8, self.model.select().count())
+
+        # The queue of the message broker has grown by the number of admitted
+        # CloudEvents notifications only.
+        #
+        admission.interval = 0.0
+
+        self.assertEqual(LoadSample(8, 8, health['oldestPendingSeconds']), admission.sample()._replace(oldest_pending_seconds=health['oldestPendingSeconds']))
+        self.assertEqual('overloaded', health['status'])
+        self.assertEqual('pending', health['reason'])
+        self.assertIn('dispatcher_example_events_rejected_total{reason="pending"} 56', self.metrics.render())
+
+    def test_wait(self) -> None:
+        """Test that CloudEvents notifications are rejected with "503 Service
+        Unavailable" while the oldest pending row is older than the limit,
+        i.e., while the Celery workers are stalled.
+
+        """
+
+        admission = AdmissionController(self.model, max_wait=60.0, interval=0.0, retry_after=1)
+
+        admission.admit()
+        self.assertEqual('ok', admission.health()['status'])
+
+        with self.model._meta.database.connection_context():
+            self.model.create(event_data='{}', data='{}', task_id='00000000-0000-0000-0000-000000000000', task_application_name='test.app', task_name='test.tasks.receive', task_status='202 Accepted', exc_traceback='', created=datetime.datetime.now() - datetime.timedelta(seconds=90))
+
+        with self.assertRaises(AdmissionRejectedError) as context:
+            admission.admit()
+
+        self.assertEqual((503, 'wait', 2), (context.exception.status, context.exception.reason, context.exception.retry_after))
+
+        # The "Retry-After" header survives CherryPy's cleaning of the headers of
+        # error responses.
+        #
+        cherrypy.serving.response.headers.clear()
+        to_cherrypy_error(context.exception).set_response()
+
+        self.assertEqual(503, cherrypy.serving.response.status)
+        self.assertEqual('2', cherrypy.serving.response.headers['Retry-After'])
+
+    def test_disabled(self) -> None:
+        """Test that every CloudEvents notification is admitted if no limit is
+        given, and that invalid limits are rejected.
+
+        """
+
+        admission = AdmissionController(self.model)
+
+        self.assertFalse(admission.enabled)
+
+        for _ in range(3):
+            admission.admit(1000)
+
+        with self.assertRaises(ValueError):
+            AdmissionController(self.model, max_pending=0)
+
+        with self.assertRaises(ValueError):
+            AdmissionController(self.model, interval=-1.0)
+
+        with self.assertRaises(ValueError):
+            AdmissionController(self.model, retry_after=0)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
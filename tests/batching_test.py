@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/batching_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the batching for Pacifica Dispatcher Example.
+
+This module defines the test cases for the batching for Pacifica Dispatcher
+Example.
+
+"""
+
+import concurrent.futures
+import json
+import os
+import tempfile
+import threading
+import typing
+import unittest
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.uploader_runners import LocalUploaderRunner
+
+from pacifica.dispatcher_example.batching import Batcher
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+
+
+class RecordingUploaderRunner(LocalUploaderRunner):
+    """A __local__ uploader runner that records the relative paths to the files
+    and the key-values for each call.
+
+    Attributes:
+        uploads (typing.List[typing.Tuple[typing.List[str], typing.List[typing.Tuple[str, typing.Any]]]]):
+            The relative paths to the files that were uploaded and the
+            key-values, for each call.
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize this uploader runner.
+
+        """
+
+        super(RecordingUploaderRunner, self).__init__()
+        self.uploads = []  # type: typing.List[typing.Tuple[typing.List[str], typing.List[typing.Tuple[str, typing.Any]]]]
+        self._lock = threading.Lock()  # type: threading.Lock
+
+    def upload(self, basedir_name: str, transaction=None, transaction_key_values=None, timeout: int = 180):
+        """Record the files and the key-values and then upload the files.
+
+        """
+
+        paths = sorted(
+            os.path.relpath(os.path.join(walk_root, file_name), basedir_name)
+            for (walk_root, _walk_dirs, file_names) in os.walk(basedir_name)
+            for file_name in file_names
+        )  # type: typing.List[str]
+
+        with self._lock:
+            self.uploads.append((paths, [(inst.key, inst.value) for inst in transaction_key_values]))
+
+        return super(RecordingUploaderRunner, self).upload(basedir_name, transaction=transaction, transaction_key_values=transaction_key_values, timeout=timeout)
+
+
+class BatchingTestCase(unittest.TestCase):
+    """Test cases for the batching for Pacifica Dispatcher Example.
+
+    """
+
+    def test_batcher(self) -> None:
+        """Test that concurrent items are flushed together when the batch is
+        full, and that each caller receives its own result or exception.
+
+        """
+
+        flushed = []  # type: typing.List[typing.List[int]]
+
+        def flush(items: typing.List[int]) -> typing.List[typing.Any]:
+            """Record a batch, and then return the square of each item, or an
+            exception for a negative item.
+
+            """
+
+            flushed.append(sorted(items))
+
+            return [ValueError(item) if item < 0 else item * item for item in items]
+
+        batcher = Batcher(flush, max_items=4, max_delay=60.0)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(batcher.submit, item) for item in [1, 2, -3, 4]]  # type: typing.List[concurrent.futures.Future]
+
+            self.assertEqual([1, 4], [futures[0].result(), futures[1].result()])
+            self.assertIsInstance(futures[2].exception(), ValueError)
+            self.assertEqual(16, futures[3].result())
+
+        self.assertEqual([[-3, 1, 2, 4]], flushed)
+
+        # A single item is flushed on its own after the maximum delay.
+        #
+        batcher.max_delay = 0.01
+
+        self.assertEqual(25, batcher.submit(5))
+        self.assertEqual([5], flushed[-1])
+
+        with self.assertRaises(ValueError):
+            Batcher(flush, max_items=0)
+
+    def test_handle_batched(self) -> None:
+        """Test that the files for concurrent CloudEvents notifications are
+        uploaded together, with a "Transactions._id" key-value for each original
+        Pacifica transaction, and that colliding paths are uploaded separately.
+
+        """
+
+        with tempfile.TemporaryDirectory() as basedir_name:
+            events = []  # type: typing.List[cloudevents.model.Event]
+
+            for (index, file_name) in enumerate(['a.txt', 'b.txt', 'c.txt', 'a.txt']):
+                os.makedirs(os.path.join(basedir_name, str(index)))
+
+                with open(os.path.join(basedir_name, str(index), file_name), mode='w', encoding='utf-8') as file:
+                    file.write('lorem ipsum {0}\n'.format(index))
+
+                events.append(Event({
+                    'cloudEventsVersion': '0.1',
+                    'contentType': 'application/json',
+                    'data': [
+                        {'destinationTable': 'Transactions._id', 'value': index + 1},
+                        {'destinationTable': 'Transactions.submitter', 'value': -1},
+                        {'destinationTable': 'Transactions.project', 'value': -1},
+                        {'destinationTable': 'Transactions.instrument', 'value': -1},
+                        {'destinationTable': 'Files', 'encoding': 'utf-8', 'name': file_name, 'subdir': ''},
+                    ],
+                    'eventID': 'C234-1234-{0:04d}'.format(index),
+                    'eventType': 'org.pacifica.metadata.ingest',
+                    'source': '/pacifica/metadata/ingest',
+                }))
+
+            uploader_runner = RecordingUploaderRunner()
+
+            handlers = [
+                ExampleEventHandler(LocalDownloaderRunner(os.path.join(basedir_name, str(index))), uploader_runner, batch_events=4, batch_delay=60.0)
+                for index in range(len(events))
+            ]  # type: typing.List[ExampleEventHandler]
+
+            # The event handlers share the batcher of the first event handler,
+            # as if they were a single event handler with one downloader runner
+            # per CloudEvents notification.
+            #
+            for handler in handlers[1:]:
+                handler._batcher = handlers[0]._batcher  # pylint: disable=protected-access
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(events)) as executor:
+                for future in [executor.submit(handler.handle, event) for (handler, event) in zip(handlers, events)]:
+                    future.result()
+
+        # The two CloudEvents notifications for "a.txt" collide, so one of them
+        # is uploaded on its own.
+        #
+        self.assertEqual([1, 3], sorted(len(paths) for (paths, _key_values) in uploader_runner.uploads))
+
+        transaction_ids = []  # type: typing.List[int]
+
+        for (paths, key_values) in uploader_runner.uploads:
+            transaction_ids.extend(value for (key, value) in key_values if key == 'Transactions._id')
+
+            self.assertEqual(len(paths), len([key for (key, _value) in key_values if key == 'Transactions._id']))
+            self.assertEqual([('example-key', 'example-value')], [(key, value) for (key, value) in key_values if key == 'example-key'])
+
+        self.assertEqual([1, 2, 3, 4], sorted(transaction_ids))
+
+    def test_handle_unbatched(self) -> None:
+        """Test that the files for a CloudEvents notification are uploaded on
+        their own if batching is disabled.
+
+        """
+
+        with open(os.path.join('test_files', 'C234-1234-1234', 'event.json'), mode='r') as event_file:
+            event = Event(json.load(event_file))  # type: cloudevents.model.Event
+
+        uploader_runner = RecordingUploaderRunner()
+
+        ExampleEventHandler(LocalDownloaderRunner(os.path.abspath(os.path.join('test_files', 'C234-1234-1234', 'data'))), uploader_runner).handle(event)
+
+        self.assertEqual([(['lipsum.txt'], [('Transactions._id', -1), ('example-key', 'example-value')])], uploader_runner.uploads)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/cache_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the result cache for Pacifica Dispatcher Example.
+
+This module defines the test cases for the result cache for Pacifica Dispatcher
+Example.
+
+"""
+
+import os
+import tempfile
+import threading
+import time
+import typing
+import unittest
+import unittest.mock
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.models import File
+from pacifica.dispatcher.uploader_runners import LocalUploaderRunner
+
+from pacifica.dispatcher_example.cache import ResultCache
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.pipeline import MODE_NAMES
+
+
+class CountingDownloaderRunner(LocalDownloaderRunner):
+    """A __local__ downloader runner that records the files for each call.
+
+    Attributes:
+        downloads (typing.List[typing.List[str]]): The names of the files that
+            were downloaded for each call.
+
+    """
+
+    def __init__(self, basedir_name: str) -> None:
+        """Initialize this downloader runner.
+
+        """
+
+        super(CountingDownloaderRunner, self).__init__(basedir_name)
+        self.downloads = []  # type: typing.List[typing.List[str]]
+
+    def download(self, basedir_name: str, files=None, timeout: int = 180):
+        """Record the files and then download the files.
+
+        """
+
+        self.downloads.append([file.name for file in files])
+
+        return super(CountingDownloaderRunner, self).download(basedir_name, files, timeout=timeout)
+
+
+class CacheTestCase(unittest.TestCase):
+    """Test cases for the result cache for Pacifica Dispatcher Example.
+
+    """
+
+    def test_restore_and_put(self) -> None:
+        """Test that entries are keyed on the hash and the version.
+
+        """
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            cache = ResultCache(os.path.join(tempdir_name, 'cache'), max_bytes=1024)
+
+            path = os.path.join(tempdir_name, 'output.txt')
+            with open(path, mode='w') as file:
+                file.write('LOREM IPSUM\n')
+
+            file_inst = File(name='output.txt', hashtype='sha1', hashsum='0123')
+
+            self.assertFalse(cache.restore(file_inst, os.path.join(tempdir_name, 'restored.txt')))
+            self.assertTrue(cache.put(file_inst, path))
+            self.assertTrue(cache.restore(file_inst, os.path.join(tempdir_name, 'restored.txt')))
+
+            with open(os.path.join(tempdir_name, 'restored.txt'), mode='r') as file:
+                self.assertEqual('LOREM IPSUM\n', file.read())
+
+            # Files without a hash are never cached.
+            #
+            self.assertFalse(cache.put(File(name='output.txt'), path))
+
+            # Entries for another version of the transform are not shared.
+            #
+            self.assertFalse(ResultCache(cache.cache_dir, version='2').restore(file_inst, os.path.join(tempdir_name, 'other.txt')))
+
+            self.assertEqual({'hits': 1, 'misses': 1, 'evictions': 0, 'bytes': 12}, cache.stats())
+
+    def test_put_concurrent(self) -> None:
+        """Test that concurrent calls for the same key count the size of the
+        entry once.
+
+        """
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            cache = ResultCache(os.path.join(tempdir_name, 'cache'), max_bytes=1024)
+
+            path = os.path.join(tempdir_name, 'output.txt')
+            with open(path, mode='w') as file:
+                file.write('LOREM IPSUM\n')
+
+            file_inst = File(name='output.txt', hashtype='sha1', hashsum='0123')
+
+            def put() -> None:
+                """Store the file as the entry a number of times."""
+                for _ in range(50):
+                    cache.put(file_inst, path)
+
+            replace = os.replace
+
+            def slow_replace(*args: typing.Any) -> None:
+                """Replace a file after a delay, which widens any race."""
+                time.sleep(0.001)
+                replace(*args)
+
+            threads = [threading.Thread(target=put) for _ in range(8)]  # type: typing.List[threading.Thread]
+
+            with unittest.mock.patch('os.replace', side_effect=slow_replace):
+                for thread in threads:
+                    thread.start()
+
+                for thread in threads:
+                    thread.join()
+
+            self.assertEqual(12, cache.stats()['bytes'])
+            self.assertEqual(0, cache.stats()['evictions'])
+
+    def test_rewrite(self) -> None:
+        """Test that rewriting a restored file, or the file that was stored,
+        does not change the entry.
+
+        """
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            cache = ResultCache(os.path.join(tempdir_name, 'cache'), max_bytes=1024)
+
+            path = os.path.join(tempdir_name, 'output.txt')
+            with open(path, mode='w') as file:
+                file.write('LOREM IPSUM\n')
+
+            file_inst = File(name='output.txt', hashtype='sha1', hashsum='0123')
+
+            self.assertTrue(cache.put(file_inst, path))
+
+            with open(path, mode='w') as file:
+                file.write('DOLOR SIT AMET\n')
+
+            self.assertTrue(cache.restore(file_inst, os.path.join(tempdir_name, 'restored.txt')))
+
+            with open(os.path.join(tempdir_name, 'restored.txt'), mode='w') as file:
+                file.write('CONSECTETUR\n')
+
+            self.assertTrue(cache.restore(file_inst, os.path.join(tempdir_name, 'restored-2.txt')))
+
+            with open(os.path.join(tempdir_name, 'restored-2.txt'), mode='r') as file:
+                self.assertEqual('LOREM IPSUM\n', file.read())
+
+    def test_evict(self) -> None:
+        """Test that the least recently used entries are evicted.
+
+        """
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            cache = ResultCache(os.path.join(tempdir_name, 'cache'), max_bytes=250)
+
+            paths = [os.path.join(tempdir_name, 'output-{0}.txt'.format(index)) for index in range(3)]
+            for path in paths:
+                with open(path, mode='w') as file:
+                    file.write('X' * 100)
+
+            file_insts = [File(name='output.txt', hashtype='sha1', hashsum=str(index)) for index in range(3)]
+
+            for (file_inst, path) in zip(file_insts[:2], paths[:2]):
+                cache.put(file_inst, path)
+                time.sleep(0.01)
+
+            # Use the first entry, so that the second entry is the least
+            # recently used.
+            #
+            self.assertTrue(cache.restore(file_insts[0], os.path.join(tempdir_name, 'restored.txt')))
+            time.sleep(0.01)
+
+            cache.put(file_insts[2], paths[2])
+
+            self.assertEqual(1, cache.evictions)
+            self.assertEqual(200, cache.stats()['bytes'])
+            self.assertFalse(cache.restore(file_insts[1], os.path.join(tempdir_name, 'missing.txt')))
+            self.assertTrue(cache.restore(file_insts[2], os.path.join(tempdir_name, 'restored-2.txt')))
+
+    def test_example_event_handler(self) -> None:
+        """Test that cache hits skip the download and transform for every mode.
+
+        """
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            basedir_name = os.path.join(tempdir_name, 'data')
+            os.makedirs(basedir_name)
+
+            for file_name in ['a.txt', 'b.txt']:
+                with open(os.path.join(basedir_name, file_name), mode='w') as file:
+                    file.write('lorem ipsum\n')
+
+            def create_event(file_names: typing.List[str]) -> Event:
+                return Event({
+                    'cloudEventsVersion': '0.1',
+                    'contentType': 'application/json',
+                    'data': [
+                        {'destinationTable': 'Transactions._id', 'value': -1},
+                    ] + [
+                        {'destinationTable': 'Files', 'hashtype': 'sha1', 'hashsum': file_name, 'name': file_name, 'subdir': ''}
+                        for file_name in file_names
+                    ],
+                    'eventID': 'C234-1234-1234',
+                    'eventType': 'org.pacifica.metadata.ingest',
+                    'source': '/pacifica/metadata/ingest',
+                })
+
+            for mode in MODE_NAMES:
+                cache = ResultCache(os.path.join(tempdir_name, 'cache-{0}'.format(mode)))
+                downloader_runner = CountingDownloaderRunner(basedir_name)
+                event_handler = ExampleEventHandler(downloader_runner, LocalUploaderRunner(), mode=mode, cache=cache)
+
+                event_handler.handle(create_event(['a.txt']))
+                event_handler.handle(create_event(['a.txt', 'b.txt']))
+                event_handler.handle(create_event(['a.txt', 'b.txt']))
+
+                self.assertEqual([['a.txt'], ['b.txt']], downloader_runner.downloads)
+                self.assertEqual({'hits': 3, 'misses': 2, 'evictions': 0, 'bytes': 24}, cache.stats())
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
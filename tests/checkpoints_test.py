@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/checkpoints_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the checkpoints for Pacifica Dispatcher Example.
+
+This module defines the test cases for the checkpoints for Pacifica Dispatcher
+Example.
+
+"""
+
+import datetime
+import hashlib
+import os
+import time
+import tempfile
+import typing
+import unittest
+
+import playhouse.db_url
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.models import File
+
+from pacifica.dispatcher_example.checkpoints import DOWNLOADED, TRANSFORMED, UPLOADED, CheckpointStore
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.metrics import Registry
+from pacifica.dispatcher_example.pipeline import PIPELINED
+
+from pipeline_test import CountingUploaderRunner
+
+
+class CountingDownloaderRunner(LocalDownloaderRunner):
+    """A __local__ downloader runner that records the files for each call.
+
+    Attributes:
+        downloads (typing.List[typing.List[str]]): The relative paths to the
+            files that were downloaded, for each call.
+
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Initialize this downloader runner.
+
+        """
+
+        super(CountingDownloaderRunner, self).__init__(*args, **kwargs)
+        self.downloads = []  # type: typing.List[typing.List[str]]
+
+    def download(self, basedir_name: str, files: typing.List['File'] = None):
+        """Record the files and then download them.
+
+        """
+
+        self.downloads.append([file_inst.path for file_inst in (files or [])])
+
+        return super(CountingDownloaderRunner, self).download(basedir_name, files)
+
+
+class FailingEventHandler(ExampleEventHandler):
+    """An event handler that fails after it has transformed a number of files,
+    as if its Celery worker was killed.
+
+    Attributes:
+        fail_after (typing.Optional[int]): The number of files that are
+            transformed before the failure, or ``None`` to never fail.
+        transformed (typing.List[str]): The relative paths to the files that
+            were transformed.
+
+    """
+
+    def __init__(self, *args, fail_after: typing.Optional[int] = None, **kwargs) -> None:
+        """Initialize this event handler.
+
+        """
+
+        super(FailingEventHandler, self).__init__(*args, **kwargs)
+        self.fail_after = fail_after  # type: typing.Optional[int]
+        self.transformed = []  # type: typing.List[str]
+
+    def _transform_file(self, uploader_tempdir_name: str, file_inst: 'File', file_opener: typing.Callable[[], typing.TextIO]) -> int:
+        """Transform a file, unless the number of files has been reached.
+
+        """
+
+        if (self.fail_after is not None) and (len(self.transformed) >= self.fail_after):
+            raise RuntimeError('worker was killed')
+
+        self.transformed.append(file_inst.path)
+
+        return super(FailingEventHandler, self)._transform_file(uploader_tempdir_name, file_inst, file_opener)
+
+
+class CheckpointsTestCase(unittest.TestCase):
+    """Test cases for the checkpoints for Pacifica Dispatcher Example.
+
+    Attributes:
+        tempdir (tempfile.TemporaryDirectory): The temporary directory for the
+            files, the SQLite database and the working directories.
+        basedir_name (str): The name of the directory for the original files.
+        file_names (typing.List[str]): The names of the original files.
+        event (cloudevents.model.Event): The CloudEvents notification.
+
+    """
+
+    def setUp(self) -> None:
+        """Initialize the environment for the test cases.
+
+        """
+
+        self.tempdir = tempfile.TemporaryDirectory()  # type: tempfile.TemporaryDirectory
+
+        self.basedir_name = os.path.join(self.tempdir.name, 'files')  # type: str
+        os.makedirs(self.basedir_name)
+
+        self.file_names = ['file-{0:03d}.txt'.format(index) for index in range(10)]  # type: typing.List[str]
+
+        data = [{'destinationTable': 'Transactions._id', 'value': -1}]  # type: typing.List[typing.Dict[str, typing.Any]]
+
+        for file_name in self.file_names:
+            content = '{0}: lorem ipsum\n'.format(file_name).encode('utf-8')  # type: bytes
+
+            with open(os.path.join(self.basedir_name, file_name), mode='wb') as file:
+                file.write(content)
+
+            data.append({'destinationTable': 'Files', 'encoding': 'utf-8', 'name': file_name, 'subdir': '', 'hashtype': 'sha1', 'hashsum': hashlib.sha1(content).hexdigest()})
+
+        self.event = Event({
+            'cloudEventsVersion': '0.1',
+            'contentType': 'application/json',
+            'data': data,
+            'eventID': 'C234-1234-1234',
+            'eventType': 'org.pacifica.metadata.ingest',
+            'source': '/pacifica/metadata/ingest',
+        })  # type: cloudevents.model.Event
+
+    def tearDown(self) -> None:
+        """Clean up the environment for the test cases.
+
+        """
+
+        self.tempdir.cleanup()
+
+    def _create_store(self) -> CheckpointStore:
+        """Return a new store, as if the Celery worker was restarted.
+
+        """
+
+        db = playhouse.db_url.connect('sqlite:///{0}'.format(os.path.join(self.tempdir.name, 'db.sqlite3')))  # type: peewee.Database
+
+        return CheckpointStore(os.path.join(self.tempdir.name, 'checkpoints'), database=db)
+
+    def _expected_contents(self) -> typing.Dict[str, str]:
+        """Return the content of each transformed file.
+
+        """
+
+        return {file_name: '{0}: LOREM IPSUM\n'.format(file_name.upper()) for file_name in self.file_names}
+
+    def _assert_completed(self, store: CheckpointStore) -> None:
+        """Assert that the checkpoints and the working directory were deleted.
+
+        """
+
+        with store.database.connection_context():
+            self.assertEqual(0, store.model.select().count())
+
+        self.assertEqual([], os.listdir(store.checkpoint_dir))
+
+    def test_resume_phased(self) -> None:
+        """Test that, after a failure partway through the transform, only the
+        remaining files are transformed, and that no file is downloaded again.
+
+        """
+
+        downloader_runner = CountingDownloaderRunner(self.basedir_name)
+        uploader_runner = CountingUploaderRunner()
+
+        handler = FailingEventHandler(downloader_runner, uploader_runner, checkpoints=self._create_store(), fail_after=4)
+
+        with self.assertRaisesRegex(RuntimeError, 'worker was killed'):
+            handler.handle(self.event)
+
+        self.assertEqual(self.file_names[:4], handler.transformed)
+        self.assertEqual([self.file_names], downloader_runner.downloads)
+        self.assertEqual([], uploader_runner.uploads)
+
+        # Handle the CloudEvents notification again, as if the Celery task was
+        # redelivered to another Celery worker.
+        #
+        store = self._create_store()
+        metrics = Registry()  # type: pacifica.dispatcher_example.metrics.Registry
+
+        handler = FailingEventHandler(downloader_runner, uploader_runner, checkpoints=store, metrics=metrics)
+        handler.handle(self.event)
+
+        self.assertEqual(self.file_names[4:], handler.transformed)
+        self.assertEqual([self.file_names], downloader_runner.downloads)
+        self.assertEqual([self._expected_contents()], uploader_runner.uploads)
+
+        checkpoint_files_total = metrics.counter('dispatcher_example_checkpoint_files_total', '', labelnames=('stage', ))  # type: pacifica.dispatcher_example.metrics.Counter
+
+        self.assertEqual(4, checkpoint_files_total.value(stage=TRANSFORMED))
+        self.assertEqual(6, checkpoint_files_total.value(stage=DOWNLOADED))
+
+        self._assert_completed(store)
+
+    def test_resume_pipelined(self) -> None:
+        """Test that, after a failure partway through the pipeline, the files
+        that were uploaded are not uploaded again, and that the files that were
+        not downloaded are downloaded.
+
+        """
+
+        downloader_runner = CountingDownloaderRunner(self.basedir_name)
+        uploader_runner = CountingUploaderRunner()
+
+        handler = FailingEventHandler(downloader_runner, uploader_runner, mode=PIPELINED, download_batch_size=3, upload_batch_size=3, queue_size=1, checkpoints=self._create_store(), fail_after=7)
+
+        with self.assertRaisesRegex(RuntimeError, 'worker was killed'):
+            handler.handle(self.event)
+
+        uploaded = set()  # type: typing.Set[str]
+        for upload in uploader_runner.uploads:
+            uploaded.update(upload)
+
+        self.assertTrue(uploaded)
+        self.assertLessEqual(len(uploaded), 6)
+
+        # Handle the CloudEvents notification again.
+        #
+        store = self._create_store()
+        metrics = Registry()  # type: pacifica.dispatcher_example.metrics.Registry
+
+        uploads_count = len(uploader_runner.uploads)  # type: int
+        downloads_count = len(downloader_runner.downloads)  # type: int
+
+        handler = FailingEventHandler(downloader_runner, uploader_runner, mode=PIPELINED, download_batch_size=3, upload_batch_size=3, queue_size=1, checkpoints=store, metrics=metrics)
+        handler.handle(self.event)
+
+        self.assertEqual(self.file_names[7:], handler.transformed)
+
+        contents = {}  # type: typing.Dict[str, str]
+        for upload in uploader_runner.uploads[uploads_count:]:
+            self.assertFalse(uploaded.intersection(upload))
+            contents.update(upload)
+
+        for upload in uploader_runner.uploads[:uploads_count]:
+            contents.update(upload)
+
+        self.assertEqual(self._expected_contents(), contents)
+
+        redownloaded = [path for download in downloader_runner.downloads[downloads_count:] for path in download]  # type: typing.List[str]
+        self.assertEqual(sorted(set(self.file_names) - set(path for download in downloader_runner.downloads[:downloads_count] for path in download)), sorted(redownloaded))
+
+        checkpoint_files_total = metrics.counter('dispatcher_example_checkpoint_files_total', '', labelnames=('stage', ))  # type: pacifica.dispatcher_example.metrics.Counter
+        self.assertEqual(len(uploaded), checkpoint_files_total.value(stage=UPLOADED))
+
+        self._assert_completed(store)
+
+    def test_open(self) -> None:
+        """Test that a store is bound at most once, and that the checkpoints for
+        a CloudEvents notification are in its own working directory.
+
+        """
+
+        store = CheckpointStore(os.path.join(self.tempdir.name, 'checkpoints'))
+
+        store.bind(playhouse.db_url.connect('sqlite:///{0}'.format(os.path.join(self.tempdir.name, 'db.sqlite3'))))
+
+        with self.assertRaises(ValueError):
+            store.bind(playhouse.db_url.connect('sqlite:///:memory:'))
+
+        checkpoint = store.open(self.event)  # type: pacifica.dispatcher_example.checkpoints.EventCheckpoint
+
+        self.assertEqual([os.path.basename(checkpoint.workdir)], os.listdir(store.checkpoint_dir))
+        self.assertTrue(os.path.isdir(checkpoint.upload_dir))
+
+    def test_prune(self) -> None:
+        """Test that only the working directories and the checkpoints that were
+        not updated within the maximum age are pruned.
+
+        """
+
+        store = self._create_store()  # type: pacifica.dispatcher_example.checkpoints.CheckpointStore
+
+        (failed, active, orphan) = [
+            store.open(Event(dict(self.event.to_dict(), eventID=event_id)))
+            for event_id in ['failed', 'active', 'orphan']
+        ]  # type: typing.List[pacifica.dispatcher_example.checkpoints.EventCheckpoint]
+
+        for checkpoint in [failed, active]:
+            path = os.path.join(checkpoint.new_download_dir(), 'file.txt')  # type: str
+
+            with open(path, mode='w') as file:
+                file.write('lorem ipsum\n')
+
+            checkpoint.mark_downloaded(File(name='file.txt', path='file.txt'), path)
+
+        # The working directories of the failed and orphaned CloudEvents
+        # notifications, and the checkpoints of the failed one, are old.
+        #
+        old = time.time() - 120.0  # type: float
+
+        for checkpoint in [failed, orphan]:
+            for name in os.listdir(checkpoint.workdir):
+                os.utime(os.path.join(checkpoint.workdir, name), (old, old))
+
+            os.utime(checkpoint.workdir, (old, old))
+
+        with store.database.connection_context():
+            store.model.update(updated=datetime.datetime.now() - datetime.timedelta(seconds=120)).where(store.model.event_id == 'failed').execute()
+
+        # The working directory of the active CloudEvents notification is old,
+        # but its checkpoints are not.
+        #
+        os.utime(active.workdir, (old, old))
+
+        self.assertEqual(2, store.prune(60.0))
+        self.assertEqual([os.path.basename(active.workdir)], os.listdir(store.checkpoint_dir))
+
+        with store.database.connection_context():
+            self.assertEqual(['active'], [inst.event_id for inst in store.model.select()])
+
+        with self.assertRaises(ValueError):
+            store.prune(0.0)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
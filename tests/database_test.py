@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/database_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the database for Pacifica Dispatcher Example.
+
+This module defines the test cases for the database for Pacifica Dispatcher
+Example.
+
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+import uuid
+
+import celery
+
+from pacifica.dispatcher.receiver import create_peewee_model
+
+from pacifica.dispatcher_example.database import connect, install_celery_hooks, install_cherrypy_hooks
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Test cases for the database for Pacifica Dispatcher Example.
+
+    Attributes:
+        tempdir (tempfile.TemporaryDirectory): The temporary directory for the
+            SQLite database.
+        url (str): The URL connection string for the SQLite database.
+
+    """
+
+    def setUp(self) -> None:
+        """Initialize the environment for the test cases.
+
+        """
+
+        self.tempdir = tempfile.TemporaryDirectory()  # type: tempfile.TemporaryDirectory
+
+        self.url = 'sqlite+pool:///{0}'.format(os.path.join(self.tempdir.name, 'db.sqlite3'))  # type: str
+
+    def tearDown(self) -> None:
+        """Clean up the environment for the test cases.
+
+        """
+
+        self.tempdir.cleanup()
+
+    def test_connect(self) -> None:
+        """Test that the pool parameters and the SQLite pragmas are applied.
+
+        """
+
+        db = connect(self.url, max_connections=3, stale_timeout=60, busy_timeout=1234)  # type: peewee.Database
+
+        self.assertEqual(3, db._max_connections)  # pylint: disable=protected-access
+        self.assertEqual(60, db._stale_timeout)  # pylint: disable=protected-access
+
+        with db.connection_context():
+            self.assertEqual('wal', db.execute_sql('PRAGMA journal_mode').fetchone()[0])
+            self.assertEqual(1234, db.execute_sql('PRAGMA busy_timeout').fetchone()[0])
+
+        db.close_all()
+
+        db = connect(self.url.replace('sqlite+pool', 'sqlite'), max_connections=3)
+
+        self.assertFalse(hasattr(db, '_max_connections'))
+
+    def test_concurrent_writes(self) -> None:
+        """Test that concurrent writers do not fail with "database is locked".
+
+        """
+
+        db = connect(self.url, max_connections=8, wait_timeout=0)  # type: peewee.Database
+
+        model = create_peewee_model(db)  # type: type
+        model.create_table(safe=True)
+        db.close()
+
+        errors = []  # type: typing.List[BaseException]
+
+        def target() -> None:
+            """Insert and then update the rows for the Celery tasks."""
+            try:
+                for _ in range(25):
+                    with db.connection_context():
+                        inst = model(event_data='{}', data='null', task_id=uuid.uuid4(), task_application_name='test.app', task_name='test.tasks.receive', task_status='202 Accepted', exc_traceback='')
+                        inst.save(force_insert=True)
+
+                    for task_status in ['102 Processing', '200 OK']:
+                        inst.task_status = task_status
+                        with db.connection_context():
+                            inst.save()
+            # pylint: disable=broad-except
+            except BaseException as exc:
+                errors.append(exc)
+            # pylint: enable=broad-except
+
+        threads = [threading.Thread(target=target) for _ in range(16)]  # type: typing.List[threading.Thread]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+
+        with db.connection_context():
+            self.assertEqual(16 * 25, model.select().where(model.task_status == '200 OK').count())
+
+        db.close_all()
+
+    def test_install_celery_hooks(self) -> None:
+        """Test that the connection is open while each Celery task runs.
+
+        """
+
+        db = connect(self.url)  # type: peewee.Database
+
+        celery_app = celery.Celery('test.app', broker='memory://', backend='cache+memory://')  # type: celery.Celery
+        celery_app.conf.task_always_eager = True
+
+        @celery_app.task(name='test.tasks.is_closed', shared=False)
+        def is_closed_task() -> bool:
+            """Return whether or not the connection is closed."""
+            with db.connection_context():
+                pass
+
+            return db.is_closed()
+
+        install_celery_hooks(celery_app, db)
+
+        self.assertFalse(is_closed_task.delay().get())
+        self.assertTrue(db.is_closed())
+
+    def test_install_cherrypy_hooks(self) -> None:
+        """Test that the hooks are attached to the CherryPy application.
+
+        """
+
+        db = connect(self.url)  # type: peewee.Database
+
+        model = create_peewee_model(db)  # type: type
+
+        application = model.create_cherrypy_app(None)  # type: cherrypy.Application
+
+        install_cherrypy_hooks(application, db)
+
+        application.config['/']['hooks.on_start_resource']()
+        self.assertFalse(db.is_closed())
+
+        application.config['/']['hooks.on_end_request']()
+        self.assertTrue(db.is_closed())
+
+        # The upstream endpoints close and then reopen the connection.
+        #
+        application.config['/']['hooks.on_start_resource']()
+        db.close()
+        db.connect()
+        application.config['/']['hooks.on_end_request']()
+        self.assertTrue(db.is_closed())
+
+
+if __name__ == '__main__':
+    unittest.main()
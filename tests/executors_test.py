@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/executors_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the executors for Pacifica Dispatcher Example.
+
+This module defines the test cases for the executors for Pacifica Dispatcher
+Example.
+
+"""
+
+import concurrent.futures
+import os
+import tempfile
+import time
+import typing
+import unittest
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.uploader_runners import LocalUploaderRunner
+
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.executors import EXECUTOR_NAMES, SERIAL, create_executor, map_ordered
+
+
+def _sleep_and_return(value: int) -> int:
+    """Sleep for a duration that is inversely proportional to a value and then
+    return the value, so that calls complete out of order.
+
+    """
+
+    time.sleep(0.01 * (5 - value))
+
+    return value
+
+
+def _fail_on_two(value: int) -> int:
+    """Raise an exception if a value is two.
+
+    """
+
+    if value == 2:
+        raise RuntimeError('value is two')
+
+    return value
+
+
+def _fail_or_write(path: str) -> None:
+    """Raise an exception if a path is empty, or sleep and then write a file at
+    the path otherwise.
+
+    """
+
+    if not path:
+        raise RuntimeError('path is empty')
+
+    time.sleep(0.1)
+
+    with open(path, mode='w') as file:
+        file.write(path)
+
+
+class ReadingUploaderRunner(LocalUploaderRunner):
+    """A __local__ uploader runner that reads the content of the files that are
+    uploaded.
+
+    Attributes:
+        contents (typing.Dict[str, str]): The content of each file that was
+            uploaded, keyed by relative path.
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize this uploader runner.
+
+        """
+
+        super(ReadingUploaderRunner, self).__init__()
+        self.contents = {}  # type: typing.Dict[str, str]
+
+    def upload(self, basedir_name: str, *args, **kwargs):
+        """Read the content of the files and then upload the files.
+
+        """
+
+        for file_name in os.listdir(basedir_name):
+            with open(os.path.join(basedir_name, file_name), mode='r', encoding='utf-8') as file:
+                self.contents[file_name] = file.read()
+
+        return super(ReadingUploaderRunner, self).upload(basedir_name, *args, **kwargs)
+
+
+class ExecutorsTestCase(unittest.TestCase):
+    """Test cases for the executors for Pacifica Dispatcher Example.
+
+    """
+
+    def test_map_ordered(self) -> None:
+        """Test that the results are in the same order as the arguments for
+        every executor.
+
+        """
+
+        for name in EXECUTOR_NAMES:
+            with create_executor(name, max_workers=4) as executor:
+                self.assertEqual([1, 2, 3, 4], map_ordered(executor, _sleep_and_return, [1, 2, 3, 4]))
+
+    def test_map_ordered_failure(self) -> None:
+        """Test that the exception of the first call to fail is raised for
+        every executor.
+
+        """
+
+        for name in EXECUTOR_NAMES:
+            with create_executor(name, max_workers=4) as executor:
+                with self.assertRaisesRegex(RuntimeError, 'value is two'):
+                    map_ordered(executor, _fail_on_two, [1, 2, 3, 4])
+
+    def test_map_ordered_failure_waits(self) -> None:
+        """Test that no call is running after the exception is raised for every
+        executor.
+
+        """
+
+        for name in EXECUTOR_NAMES:
+            with tempfile.TemporaryDirectory() as tempdir_name:
+                paths = [''] + [os.path.join(tempdir_name, '{0}.txt'.format(index)) for index in range(4)]  # type: typing.List[str]
+
+                with create_executor(name, max_workers=2) as executor:
+                    with self.assertRaisesRegex(RuntimeError, 'path is empty'):
+                        map_ordered(executor, _fail_or_write, paths)
+
+                    names = sorted(os.listdir(tempdir_name))  # type: typing.List[str]
+
+                    time.sleep(0.3)
+
+                    self.assertEqual(names, sorted(os.listdir(tempdir_name)))
+
+    def test_create_executor_unknown(self) -> None:
+        """Test that unknown executors are rejected.
+
+        """
+
+        with self.assertRaises(ValueError):
+            create_executor('unknown')
+
+    def test_example_event_handler(self) -> None:
+        """Test that the event handler transforms many files for every executor.
+
+        """
+
+        file_names = ['file-{0:03d}.txt'.format(index) for index in range(32)]  # type: typing.List[str]
+
+        with tempfile.TemporaryDirectory() as basedir_name:
+            for file_name in file_names:
+                with open(os.path.join(basedir_name, file_name), mode='w', encoding='utf-8') as file:
+                    file.write('{0}: straße\n'.format(file_name) * 64)
+
+            event = Event({
+                'cloudEventsVersion': '0.1',
+                'contentType': 'application/json',
+                'data': [
+                    {'destinationTable': 'Transactions._id', 'value': -1},
+                ] + [
+                    {'destinationTable': 'Files', 'encoding': 'utf-8', 'name': file_name, 'subdir': ''}
+                    for file_name in file_names
+                ],
+                'eventID': 'C234-1234-1234',
+                'eventType': 'org.pacifica.metadata.ingest',
+                'source': '/pacifica/metadata/ingest',
+            })  # type: cloudevents.model.Event
+
+            for name in EXECUTOR_NAMES:
+                uploader_runner = ReadingUploaderRunner()
+
+                event_handler = ExampleEventHandler(LocalDownloaderRunner(basedir_name), uploader_runner, executor=name, max_workers=4)  # type: ExampleEventHandler
+
+                try:
+                    event_handler.handle(event)
+
+                    self.assertEqual(sorted(file_names), sorted(uploader_runner.contents.keys()))
+
+                    for file_name in file_names:
+                        self.assertEqual('{0}: STRASSE\n'.format(file_name.upper()) * 64, uploader_runner.contents[file_name])
+
+                    # The pool of threads or processes is reused by the next
+                    # CloudEvents notification, rather than constructed again.
+                    #
+                    executor = event_handler._executor  # type: typing.Optional[concurrent.futures.Executor]
+
+                    event_handler.handle(event)
+
+                    self.assertIs(executor, event_handler._executor)
+                    self.assertEqual(name == SERIAL, executor is None)
+                finally:
+                    event_handler.shutdown()
+
+                self.assertIsNone(event_handler._executor)
+
+    def test_example_event_handler_unknown(self) -> None:
+        """Test that the event handler rejects unknown executors.
+
+        """
+
+        with self.assertRaises(ValueError):
+            ExampleEventHandler(LocalDownloaderRunner('.'), LocalUploaderRunner(), executor='unknown')
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/ingest_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the ingest jobs for Pacifica Dispatcher Example.
+
+This module defines the test cases for the ingest jobs for Pacifica Dispatcher
+Example.
+
+"""
+
+import datetime
+import json
+import os
+import tempfile
+import threading
+import typing
+import unittest
+import unittest.mock
+
+import playhouse.db_url
+from jsonpath2.path import Path
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.receiver import create_peewee_model
+from pacifica.dispatcher.router import Router
+
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.ingest import FAILED_STATUS, INGESTED_STATUS, INGESTING_STATUS, TIMEOUT_STATUS, IngestJobStore, collect_job_ids, install_ingest_poller, record_job_id, should_sleep
+from pacifica.dispatcher_example.metrics import Registry
+from pacifica.dispatcher_example.receivers import DUPLICATE_STATUS, create_celery_app, requeue_duplicates
+from pacifica.dispatcher_example.runners import SpoolingRemoteUploaderRunner
+
+
+class SlowIngestUploader:
+    """A Pacifica uploader whose ingest jobs reach a terminal state after a
+    number of checks of their state, as a stand-in for a slow ingest server.
+
+    Attributes:
+        checks (int): The number of checks of the state of each ingest job
+            before it reaches a terminal state.
+        failed_job_ids (typing.Set[int]): The IDs for the ingest jobs that fail.
+        getstate_calls (typing.Dict[int, int]): The number of checks of the
+            state of each ingest job.
+
+    """
+
+    def __init__(self, checks: int = 2) -> None:
+        """Initialize this uploader."""
+        self.checks = checks
+        self.failed_job_ids = set()  # type: typing.Set[int]
+        self.getstate_calls = {}  # type: typing.Dict[int, int]
+        self._lock = threading.Lock()  # type: threading.Lock
+
+    def upload(self, read_fd: typing.BinaryIO, content_length: int = None) -> int:  # pylint: disable=unused-argument
+        """Submit a new ingest job."""
+        with self._lock:
+            job_id = len(self.getstate_calls) + 1
+            self.getstate_calls[job_id] = 0
+
+        return job_id
+
+    def getstate(self, job_id: int) -> typing.Dict[str, typing.Any]:
+        """Return the state of an ingest job."""
+        with self._lock:
+            self.getstate_calls[job_id] += 1
+            calls = self.getstate_calls[job_id]
+
+        if calls <= self.checks:
+            return {'state': 'OK', 'task': 'ingest files', 'task_percent': '{0:.2f}'.format(100.0 * calls / (self.checks + 1))}
+
+        if job_id in self.failed_job_ids:
+            return {'state': 'FAILED', 'task': 'ingest metadata', 'task_percent': '0.00'}
+
+        return {'state': 'OK', 'task': 'ingest metadata', 'task_percent': '100.00'}
+
+
+class IngestTestCase(unittest.TestCase):
+    """Test cases for the ingest jobs for Pacifica Dispatcher Example.
+
+    Attributes:
+        tempdir (tempfile.TemporaryDirectory): The temporary directory for the
+            SQLite database.
+        db (peewee.Database): The database.
+        model (type): The class for the Peewee model.
+        store (pacifica.dispatcher_example.ingest.IngestJobStore): The store.
+
+    """
+
+    def setUp(self) -> None:
+        """Initialize the environment for the test cases.
+
+        """
+
+        self.tempdir = tempfile.TemporaryDirectory()  # type: tempfile.TemporaryDirectory
+
+        self.db = playhouse.db_url.connect('sqlite:///{0}'.format(os.path.join(self.tempdir.name, 'db.sqlite3')))  # type: peewee.Database
+
+        self.model = create_peewee_model(self.db)  # type: type
+        self.model.create_table(safe=True)
+        self.db.close()
+
+        self.store = IngestJobStore()  # type: pacifica.dispatcher_example.ingest.IngestJobStore
+        self.store.bind(self.db)
+
+    def tearDown(self) -> None:
+        """Clean up the environment for the test cases.
+
+        """
+
+        self.db.close()
+        self.tempdir.cleanup()
+
+    def _create_rows(self, count: int) -> typing.List[str]:
+        """Insert the rows for a number of CloudEvents notifications whose
+        ingest jobs are outstanding, and then return the IDs for their Celery
+        tasks.
+
+        """
+
+        task_ids = ['00000000-0000-0000-0000-{0:012d}'.format(index) for index in range(count)]  # type: typing.List[str]
+
+        with self.db.connection_context():
+            for task_id in task_ids:
+                self.model.create(event_data='{}', data='{}', task_id=task_id, task_application_name='test.app', task_name='test.tasks.receive', task_status=INGESTING_STATUS, exc_traceback='')
+
+        return task_ids
+
+    def _statuses(self) -> typing.Dict[str, str]:
+        """Return the status of the row for each CloudEvents notification.
+
+        """
+
+        with self.db.connection_context():
+            return {str(inst.task_id): inst.task_status for inst in self.model.select()}
+
+    def test_should_sleep(self) -> None:
+        """Test that only the failed and ingested states are terminal.
+
+        """
+
+        self.assertFalse(should_sleep(state='FAILED', task='upload', task_percent='0'))
+        self.assertFalse(should_sleep(state='OK', task='ingest metadata', task_percent='100.0'))
+        self.assertTrue(should_sleep(state='OK', task='ingest metadata', task_percent='99.5'))
+        self.assertTrue(should_sleep(state='OK', task='ingest files', task_percent='100'))
+        self.assertTrue(should_sleep(state='UNKNOWN', task='ingest metadata', task_percent='100'))
+
+        with self.assertRaises(ValueError):
+            should_sleep(state='OK', task='ingest metadata')
+
+    def test_collect_job_ids(self) -> None:
+        """Test that the IDs for the ingest jobs are only collected within the
+        context, once each, and not for the __local__ uploader runner.
+
+        """
+
+        record_job_id(1)
+
+        with collect_job_ids() as job_ids:
+            for job_id in [2, None, 3, 2]:
+                record_job_id(job_id)
+
+            with collect_job_ids() as nested_job_ids:
+                record_job_id(4)
+
+            record_job_id(5)
+
+        record_job_id(6)
+
+        self.assertEqual([2, 3, 5], job_ids)
+        self.assertEqual([4], nested_job_ids)
+
+    def test_poll(self) -> None:
+        """Test that each outstanding ingest job is checked once per sweep, and
+        that the status of each row is updated when its ingest jobs have all
+        reached a terminal state.
+
+        """
+
+        uploader = SlowIngestUploader(checks=2)
+        task_ids = self._create_rows(3)  # type: typing.List[str]
+        job_ids = [uploader.upload(None) for _ in range(3)]  # type: typing.List[int]
+        uploader.failed_job_ids.add(job_ids[2])
+
+        # The first two CloudEvents notifications share an ingest job, e.g.,
+        # because their uploads were batched, and the second has another one.
+        #
+        self.store.add(task_ids[0], [job_ids[0]])
+        self.store.add(task_ids[1], [job_ids[0], job_ids[1]])
+        self.store.add(task_ids[2], [job_ids[2]])
+        self.store.add(task_ids[2], [job_ids[2]])
+
+        self.assertEqual(4, self.store.outstanding())
+
+        for _ in range(2):
+            self.assertEqual({}, self.store.poll(uploader.getstate, self.model))
+
+        with self.db.connection_context():
+            self.assertEqual({'ingest files'}, {inst.task for inst in self.store.model.select()})
+
+        self.assertEqual({task_id: INGESTING_STATUS for task_id in task_ids}, self._statuses())
+        self.assertEqual({task_ids[0]: INGESTED_STATUS, task_ids[1]: INGESTED_STATUS, task_ids[2]: FAILED_STATUS}, self.store.poll(uploader.getstate, self.model))
+        self.assertEqual({job_id: 3 for job_id in job_ids}, uploader.getstate_calls)
+        self.assertEqual({task_ids[0]: INGESTED_STATUS, task_ids[1]: INGESTED_STATUS, task_ids[2]: FAILED_STATUS}, self._statuses())
+        self.assertEqual(0, self.store.outstanding())
+
+        with self.db.connection_context():
+            inst = self.model.get(self.model.task_id == task_ids[2])
+
+        self.assertEqual('IngestFailedError', inst.exc_type)
+        self.assertEqual('FAILED', json.loads(inst.exc_value)['state'])
+
+    def test_poll_timeout(self) -> None:
+        """Test that the ingest jobs whose state cannot be checked are checked
+        again by the next sweep, until they are abandoned.
+
+        """
+
+        (task_id, ) = self._create_rows(1)
+
+        def getstate(_job_id: int) -> typing.Dict[str, typing.Any]:
+            """Fail to check the state of an ingest job."""
+            raise ConnectionError('ingest server is unreachable')
+
+        self.store.add(task_id, [1])
+
+        self.assertEqual({}, self.store.poll(getstate, self.model))
+        self.assertEqual(1, self.store.outstanding())
+
+        with self.db.connection_context():
+            self.store.model.update(created=datetime.datetime.now() - datetime.timedelta(seconds=2 * self.store.timeout)).execute()
+
+        self.assertEqual({task_id: TIMEOUT_STATUS}, self.store.poll(getstate, self.model))
+        self.assertEqual({task_id: TIMEOUT_STATUS}, self._statuses())
+
+        with self.assertRaises(ValueError):
+            self.store.bind(self.db)
+
+        with self.assertRaises(ValueError):
+            IngestJobStore(timeout=0)
+
+    def test_receive_task(self) -> None:
+        """Test that the Celery task returns after the ingest job is submitted,
+        rather than waiting for it, and that the poller updates its row.
+
+        """
+
+        with open(os.path.join('test_files', 'C234-1234-1234', 'event.json'), mode='r') as event_file:
+            event_data = json.load(event_file)  # type: typing.Dict[str, typing.Any]
+
+        uploader = SlowIngestUploader(checks=2)
+
+        router = Router()  # type: pacifica.dispatcher.router.Router
+        router.add_route(Path.parse_file(os.path.join(os.path.dirname(__file__), '..', 'pacifica', 'dispatcher_example', 'jsonpath2', 'example.txt')), ExampleEventHandler(LocalDownloaderRunner(os.path.abspath(os.path.join('test_files', 'C234-1234-1234', 'data'))), SpoolingRemoteUploaderRunner(uploader), wait_for_ingest=False))
+
+        metrics = Registry()  # type: pacifica.dispatcher_example.metrics.Registry
+
+        celery_app = create_celery_app(self.model, router, 'test.app', 'test.tasks.receive', broker='memory://', backend='cache+memory://', metrics=metrics, ingest_jobs=self.store)  # type: celery.Celery
+        celery_app.conf.task_always_eager = True
+
+        poll_task = install_ingest_poller(celery_app, self.store, self.model, uploader.getstate, 'test.tasks.poll_ingest', interval=1.0, metrics=metrics)  # type: celery.Task
+
+        self.assertEqual('test.tasks.poll_ingest', celery_app.conf.beat_schedule['test.tasks.poll_ingest']['task'])
+
+        task_id = celery_app.tasks['test.tasks.receive'].delay(event_data).id  # type: str
+
+        # The state of the ingest job was checked once, when it was submitted.
+        #
+        self.assertEqual({1: 1}, uploader.getstate_calls)
+        self.assertEqual({task_id: INGESTING_STATUS}, self._statuses())
+
+        # A redelivered Celery task does not submit the ingest job again.
+        #
+        celery_app.tasks['test.tasks.receive'].apply((event_data, ), task_id=task_id)
+
+        self.assertEqual({1: 1}, uploader.getstate_calls)
+
+        for _ in range(2):
+            poll_task.delay()
+
+        self.assertEqual({task_id: INGESTED_STATUS}, self._statuses())
+        self.assertIn('dispatcher_example_ingest_tasks_total{status="200"} 1', metrics.render())
+
+        # If the ingest jobs cannot be recorded, e.g., because the Celery worker
+        # dies, then the status is not "102 Ingesting" either, so that the
+        # redelivered Celery task handles the CloudEvents notification again.
+        #
+        with unittest.mock.patch.object(self.store.model, 'insert_many', side_effect=RuntimeError('worker died')):
+            task_id = celery_app.tasks['test.tasks.receive'].delay(event_data).id
+
+        self.assertEqual('102 Processing', self._statuses()[task_id])
+        self.assertEqual(0, self.store.outstanding())
+
+        celery_app.tasks['test.tasks.receive'].apply((event_data, ), task_id=task_id)
+
+        self.assertEqual(INGESTING_STATUS, self._statuses()[task_id])
+        self.assertEqual(1, self.store.outstanding())
+
+    def test_poll_requeue(self) -> None:
+        """Test that the short-circuited duplicate of a CloudEvents notification
+        whose ingest job failed is handled again.
+
+        """
+
+        with open(os.path.join('test_files', 'C234-1234-1234', 'event.json'), mode='r') as event_file:
+            event_data = json.load(event_file)  # type: typing.Dict[str, typing.Any]
+
+        uploader = SlowIngestUploader(checks=1)
+        uploader.failed_job_ids.add(1)
+
+        router = Router()  # type: pacifica.dispatcher.router.Router
+        router.add_route(Path.parse_file(os.path.join(os.path.dirname(__file__), '..', 'pacifica', 'dispatcher_example', 'jsonpath2', 'example.txt')), ExampleEventHandler(LocalDownloaderRunner(os.path.abspath(os.path.join('test_files', 'C234-1234-1234', 'data'))), SpoolingRemoteUploaderRunner(uploader), wait_for_ingest=False))
+
+        celery_app = create_celery_app(self.model, router, 'test.app', 'test.tasks.receive', broker='memory://', backend='cache+memory://', dedupe_window=60.0, ingest_jobs=self.store)  # type: celery.Celery
+        celery_app.conf.task_always_eager = True
+
+        receive_task = celery_app.tasks['test.tasks.receive']  # type: celery.Task
+
+        poll_task = install_ingest_poller(celery_app, self.store, self.model, uploader.getstate, 'test.tasks.poll_ingest', interval=1.0, on_failed=lambda task_ids: requeue_duplicates(self.model, receive_task, task_ids, 60.0))  # type: celery.Task
+
+        task_id = receive_task.delay(event_data).id  # type: str
+        duplicate_task_id = receive_task.delay(event_data).id  # type: str
+
+        self.assertEqual({task_id: INGESTING_STATUS, duplicate_task_id: DUPLICATE_STATUS}, self._statuses())
+
+        poll_task.delay()
+
+        self.assertEqual({task_id: FAILED_STATUS, duplicate_task_id: INGESTING_STATUS}, self._statuses())
+
+        poll_task.delay()
+
+        self.assertEqual({task_id: FAILED_STATUS, duplicate_task_id: INGESTED_STATUS}, self._statuses())
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/metadata_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the metadata for Pacifica Dispatcher Example.
+
+This module defines the test cases for the metadata for Pacifica Dispatcher
+Example.
+
+"""
+
+import json
+import os
+import pickle
+import typing
+import unittest
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.exceptions import TransactionDuplicateAttributeError
+from pacifica.dispatcher.models import File, Transaction, TransactionKeyValue
+
+from pacifica.dispatcher_example.metadata import FileRecord, extract_metadata
+
+
+def _attrs(inst: object) -> typing.Dict[str, typing.Any]:
+    """Return the attributes of a model.
+
+    """
+
+    return {name: getattr(inst, name, None) for name in ('_id', 'analytical_tool', 'ctime', 'description', 'encoding', 'hashsum', 'hashtype', 'instrument', 'key', 'mimetype', 'mtime', 'name', 'project', 'size', 'subdir', 'submitter', 'suspense_date', 'value')}
+
+
+class MetadataTestCase(unittest.TestCase):
+    """Test cases for the metadata for Pacifica Dispatcher Example.
+
+    Attributes:
+        event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for the
+            CloudEvents notification.
+
+    """
+
+    def setUp(self) -> None:
+        """Initialize the environment for the test cases.
+
+        """
+
+        with open(os.path.join('test_files', 'C234-1234-1234', 'event.json'), mode='r') as event_file:
+            self.event_data = json.load(event_file)  # type: typing.Dict[str, typing.Any]
+
+    def test_extract_metadata(self) -> None:
+        """Test that the same models are extracted as by the upstream models.
+
+        """
+
+        data = self.event_data['data'] + [
+            'junk',
+            {'destinationTable': ['unhashable']},
+            {'destinationTable': 'Transactions.description'},
+            {'destinationTable': 'Transactions.unknown', 'value': 'ignored'},
+            {'destinationTable': 'TransactionKeyValue', 'key': 'other-key', 'value': 'other-value'},
+            {'destinationTable': 'Files', 'name': 'other.txt', 'subdir': 'a', 'unknown': 'ignored'},
+        ]  # type: typing.List[typing.Any]
+
+        for event_data in [dict(self.event_data, data=data), dict(self.event_data, data=dict(enumerate(data))), dict(self.event_data, data=None)]:
+            event = Event(event_data)  # type: cloudevents.model.Event
+            metadata = extract_metadata(event.data)  # type: pacifica.dispatcher_example.metadata.EventMetadata
+
+            self.assertEqual(_attrs(Transaction.from_cloudevents_model(event)), _attrs(metadata.transaction))
+            self.assertEqual([_attrs(inst) for inst in TransactionKeyValue.from_cloudevents_model(event)], [_attrs(inst) for inst in metadata.transaction_key_values])
+            self.assertEqual([_attrs(inst) for inst in File.from_cloudevents_model(event)], [_attrs(inst) for inst in metadata.files])
+
+        self.assertEqual(['lipsum.txt', os.path.join('a', 'other.txt')], [inst.path for inst in extract_metadata(data).files])
+        self.assertEqual(2, len(extract_metadata(data).tables['Files']))
+
+    def test_duplicate_attribute(self) -> None:
+        """Test that an attribute of the Pacifica transaction that is given more
+        than once is an error when the Pacifica transaction is used.
+
+        """
+
+        metadata = extract_metadata(self.event_data['data'] + [{'destinationTable': 'Transactions.submitter', 'value': 10}])  # type: pacifica.dispatcher_example.metadata.EventMetadata
+
+        self.assertEqual(1, len(metadata.files))
+
+        with self.assertRaises(TransactionDuplicateAttributeError):
+            metadata.transaction  # pylint: disable=pointless-statement
+
+    def test_file_record(self) -> None:
+        """Test that a record behaves in the same way as a Pacifica file, and
+        that it has no dictionary of attributes.
+
+        """
+
+        record = FileRecord(name='a.txt', subdir='b', size=1)  # type: pacifica.dispatcher_example.metadata.FileRecord
+
+        self.assertIsInstance(record, File)
+        self.assertEqual(os.path.join('b', 'a.txt'), record.path)
+        self.assertIsNone(record.hashsum)
+        self.assertEqual({}, getattr(record, '__dict__', {}))
+
+        record = pickle.loads(pickle.dumps(record))
+
+        self.assertEqual((os.path.join('b', 'a.txt'), 1), (record.path, record.size))
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/metrics_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the metrics for Pacifica Dispatcher Example.
+
+This module defines the test cases for the metrics for Pacifica Dispatcher
+Example.
+
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.uploader_runners import LocalUploaderRunner
+
+from pacifica.dispatcher_example.cache import ResultCache
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.executors import EXECUTOR_NAMES
+from pacifica.dispatcher_example.metrics import NULL_REGISTRY, Registry, TextfileSink, create_metrics_endpoint
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Test cases for the metrics for Pacifica Dispatcher Example.
+
+    """
+
+    def test_render(self) -> None:
+        """Test that the metrics are rendered in the text exposition format.
+
+        """
+
+        registry = Registry()  # type: pacifica.dispatcher_example.metrics.Registry
+
+        counter = registry.counter('example_total', 'An example counter.', labelnames=('status', ))
+        counter.inc(status='200')
+        counter.inc(2, status='a "quoted"\nvalue')
+
+        histogram = registry.histogram('example_seconds', 'An example histogram.', buckets=(0.1, 1.0))
+        for value in [0.05, 0.5, 5.0]:
+            histogram.observe(value)
+
+        registry.register_callback('example_bytes', 'An example gauge.', lambda: 42)
+
+        self.assertIs(counter, registry.counter('example_total', 'An example counter.', labelnames=('status', )))
+
+        with self.assertRaises(ValueError):
+            registry.histogram('example_total', 'An example counter.')
+
+        with self.assertRaises(ValueError):
+            counter.inc(method='GET')
+
+        self.assertEqual('\n'.join([
+            '# HELP example_bytes An example gauge.',
+            '# TYPE example_bytes gauge',
+            'example_bytes 42.0',
+            '# HELP example_seconds An example histogram.',
+            '# TYPE example_seconds histogram',
+            'example_seconds_bucket{le="0.1"} 1.0',
+            'example_seconds_bucket{le="1.0"} 2.0',
+            'example_seconds_bucket{le="+Inf"} 3.0',
+            'example_seconds_sum 5.55',
+            'example_seconds_count 3.0',
+            '# HELP example_total An example counter.',
+            '# TYPE example_total counter',
+            'example_total{status="200"} 1.0',
+            'example_total{status="a \\"quoted\\"\\nvalue"} 2.0',
+            '',
+        ]), registry.render())
+
+    def test_null_registry(self) -> None:
+        """Test that the null registry records nothing.
+
+        """
+
+        NULL_REGISTRY.counter('example_total', 'An example counter.').inc()
+
+        with NULL_REGISTRY.histogram('example_seconds', 'An example histogram.').time(stage='example'):
+            pass
+
+        self.assertEqual('', NULL_REGISTRY.render())
+
+    def test_textfile_sink_and_endpoint(self) -> None:
+        """Test that the sink and the endpoint export the rendered metrics.
+
+        """
+
+        registry = Registry()  # type: pacifica.dispatcher_example.metrics.Registry
+        registry.counter('example_total', 'An example counter.').inc()
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            TextfileSink(os.path.join(tempdir_name, 'metrics-{pid}.prom'))(registry.render())
+
+            with open(os.path.join(tempdir_name, 'metrics-{0}.prom'.format(os.getpid())), mode='r') as file:
+                self.assertEqual(registry.render(), file.read())
+
+            self.assertEqual(1, len(os.listdir(tempdir_name)))
+
+        self.assertEqual(registry.render(), create_metrics_endpoint(registry).GET())
+
+    def test_example_event_handler(self) -> None:
+        """Test that each stage of the example event handler is measured.
+
+        """
+
+        with open(os.path.join('test_files', 'C234-1234-1234', 'event.json'), mode='r') as event_file:
+            event = Event(json.load(event_file))
+
+        for executor in EXECUTOR_NAMES:
+            registry = Registry()  # type: pacifica.dispatcher_example.metrics.Registry
+
+            with tempfile.TemporaryDirectory() as tempdir_name:
+                event_handler = ExampleEventHandler(LocalDownloaderRunner(os.path.abspath(os.path.join('test_files', 'C234-1234-1234', 'data'))), LocalUploaderRunner(), executor=executor, cache=ResultCache(tempdir_name), metrics=registry)
+
+                event_handler.handle(event)
+
+            stage_seconds = registry.histogram('dispatcher_example_stage_seconds', '', labelnames=('stage', ))
+
+            for stage in ['handle', 'restore', 'download', 'transform', 'upload']:
+                self.assertEqual(1, stage_seconds.count(stage=stage))
+
+            self.assertEqual(2, stage_seconds.count(stage='cleanup'))
+            self.assertEqual(1, registry.counter('dispatcher_example_events_total', '').value())
+            self.assertEqual(1, registry.histogram('dispatcher_example_file_transform_seconds', '').count())
+            self.assertEqual(614, registry.counter('dispatcher_example_transform_bytes_total', '').value())
+            self.assertLess(0, registry.counter('dispatcher_example_transform_read_bytes_total', '').value())
+            self.assertIn('dispatcher_example_cache_misses_total 1.0', registry.render())
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
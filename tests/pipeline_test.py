@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/pipeline_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the pipeline for Pacifica Dispatcher Example.
+
+This module defines the test cases for the pipeline for Pacifica Dispatcher
+Example.
+
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.uploader_runners import LocalUploaderRunner
+
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.pipeline import PIPELINED, Pipeline, batches
+
+
+class CountingUploaderRunner(LocalUploaderRunner):
+    """A __local__ uploader runner that records the content of the files for
+    each call.
+
+    Attributes:
+        uploads (typing.List[typing.Dict[str, str]]): The content of each file
+            that was uploaded, keyed by relative path, for each call.
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize this uploader runner.
+
+        """
+
+        super(CountingUploaderRunner, self).__init__()
+        self.uploads = []  # type: typing.List[typing.Dict[str, str]]
+
+    def upload(self, basedir_name: str, *args, **kwargs):
+        """Record the content of the files and then upload the files.
+
+        """
+
+        contents = {}  # type: typing.Dict[str, str]
+
+        for file_name in os.listdir(basedir_name):
+            with open(os.path.join(basedir_name, file_name), mode='r', encoding='utf-8') as file:
+                contents[file_name] = file.read()
+
+        self.uploads.append(contents)
+
+        return super(CountingUploaderRunner, self).upload(basedir_name, *args, **kwargs)
+
+
+class PipelineTestCase(unittest.TestCase):
+    """Test cases for the pipeline for Pacifica Dispatcher Example.
+
+    """
+
+    def test_batches(self) -> None:
+        """Test that a list is split into consecutive batches.
+
+        """
+
+        self.assertEqual([[1, 2], [3, 4], [5]], list(batches([1, 2, 3, 4, 5], 2)))
+
+        with self.assertRaises(ValueError):
+            list(batches([1], 0))
+
+    def test_pipeline(self) -> None:
+        """Test that the items flow through the stages in order, and that each
+        stage runs in its own thread.
+
+        """
+
+        thread_names = set()  # type: typing.Set[str]
+
+        def record(value: int) -> int:
+            thread_names.add(threading.current_thread().name)
+            return value
+
+        pipeline = Pipeline(record, lambda value: record(value) * 2, queue_size=1)
+
+        self.assertEqual([value * 2 for value in range(100)], list(pipeline.run(range(100))))
+        self.assertEqual(2, len(thread_names))
+
+    def test_pipeline_failure(self) -> None:
+        """Test that the exception of the stage that fails is raised.
+
+        """
+
+        def fail_on_three(value: int) -> int:
+            if value == 3:
+                raise RuntimeError('value is three')
+            return value
+
+        pipeline = Pipeline(lambda value: value, fail_on_three, queue_size=1)
+
+        with self.assertRaisesRegex(RuntimeError, 'value is three'):
+            list(pipeline.run(range(100)))
+
+    def test_pipeline_close(self) -> None:
+        """Test that the stages are stopped if the generator is closed early.
+
+        """
+
+        generator = Pipeline(lambda value: value, queue_size=1).run(range(1000000))
+
+        self.assertEqual(0, next(generator))
+
+        generator.close()
+
+    def test_example_event_handler(self) -> None:
+        """Test that the event handler transforms and uploads every file in
+        pipelined mode, with and without upload batches.
+
+        """
+
+        file_names = ['file-{0:03d}.txt'.format(index) for index in range(10)]  # type: typing.List[str]
+
+        with tempfile.TemporaryDirectory() as basedir_name:
+            for file_name in file_names:
+                with open(os.path.join(basedir_name, file_name), mode='w', encoding='utf-8') as file:
+                    file.write('{0}: lorem ipsum\n'.format(file_name))
+
+            event = Event({
+                'cloudEventsVersion': '0.1',
+                'contentType': 'application/json',
+                'data': [
+                    {'destinationTable': 'Transactions._id', 'value': -1},
+                ] + [
+                    {'destinationTable': 'Files', 'encoding': 'utf-8', 'name': file_name, 'subdir': ''}
+                    for file_name in file_names
+                ],
+                'eventID': 'C234-1234-1234',
+                'eventType': 'org.pacifica.metadata.ingest',
+                'source': '/pacifica/metadata/ingest',
+            })  # type: cloudevents.model.Event
+
+            for (upload_batch_size, upload_count) in [(None, 1), (4, 3), (5, 2)]:
+                uploader_runner = CountingUploaderRunner()
+
+                ExampleEventHandler(LocalDownloaderRunner(basedir_name), uploader_runner, mode=PIPELINED, download_batch_size=3, upload_batch_size=upload_batch_size, queue_size=1).handle(event)
+
+                self.assertEqual(upload_count, len(uploader_runner.uploads))
+
+                contents = {}  # type: typing.Dict[str, str]
+                for upload in uploader_runner.uploads:
+                    contents.update(upload)
+
+                self.assertEqual({file_name: '{0}: LOREM IPSUM\n'.format(file_name.upper()) for file_name in file_names}, contents)
+
+    def test_example_event_handler_invalid(self) -> None:
+        """Test that the event handler rejects unknown modes and non-positive
+        batch and queue sizes.
+
+        """
+
+        for kwargs in [{'mode': 'unknown'}, {'download_batch_size': 0}, {'upload_batch_size': 0}, {'queue_size': 0}]:
+            with self.assertRaises(ValueError):
+                ExampleEventHandler(LocalDownloaderRunner('.'), LocalUploaderRunner(), **kwargs)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/queues_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the queues for Pacifica Dispatcher Example.
+
+This module defines the test cases for the queues for Pacifica Dispatcher
+Example.
+
+"""
+
+import math
+import random
+import typing
+import unittest
+
+import celery
+
+from pacifica.dispatcher_example.metrics import Registry
+from pacifica.dispatcher_example.queues import DEFAULT_LARGE_QUEUE, DEFAULT_SMALL_QUEUE, MAX_PRIORITY, SizeTaskRouter, install_task_router, measure_event
+
+
+def _create_event_data(file_count: int, file_size: int) -> typing.Dict[str, typing.Any]:
+    """Return the JSON-encoded data for a CloudEvents notification with a number
+    of files of a size.
+
+    """
+
+    data = [{'destinationTable': 'Transactions._id', 'value': -1}]  # type: typing.List[typing.Dict[str, typing.Any]]
+    data.extend({'destinationTable': 'Files', 'name': 'file-{0}.txt'.format(index), 'size': file_size} for index in range(file_count))
+
+    return {'eventID': 'E', 'eventType': 'org.pacifica.metadata.ingest', 'source': '/pacifica/metadata/ingest', 'data': data}
+
+
+def _simulate(jobs: typing.List[typing.Tuple[float, float, str, bool]], workers: typing.Dict[str, int]) -> typing.List[float]:
+    """Simulate first-in first-out queues, each consumed by its own workers,
+    and then return the latency, i.e., the time between arrival and completion,
+    of each small job.
+
+    Args:
+        jobs (typing.List[typing.Tuple[float, float, str, bool]]): The arrival
+            time, service time, queue and whether or not it is small for each
+            job, in order of arrival.
+        workers (typing.Dict[str, int]): The number of workers for each queue.
+
+    Returns:
+        typing.List[float]: The latency of each small job.
+
+    """
+
+    free_at = {queue: [0.0] * count for (queue, count) in workers.items()}  # type: typing.Dict[str, typing.List[float]]
+
+    latencies = []  # type: typing.List[float]
+
+    for (arrival, service, queue, small) in jobs:
+        # The job starts when it has arrived and the earliest worker is free.
+        #
+        index = min(range(len(free_at[queue])), key=free_at[queue].__getitem__)
+        free_at[queue][index] = max(arrival, free_at[queue][index]) + service
+
+        if small:
+            latencies.append(free_at[queue][index] - arrival)
+
+    return latencies
+
+
+def _p99(values: typing.List[float]) -> float:
+    """Return the 99th percentile of a list of values.
+
+    """
+
+    return sorted(values)[max(0, math.ceil(0.99 * len(values)) - 1)]
+
+
+class QueuesTestCase(unittest.TestCase):
+    """Test cases for the queues for Pacifica Dispatcher Example.
+
+    """
+
+    def test_measure_event(self) -> None:
+        """Test that the number and total size of the files are measured.
+
+        """
+
+        self.assertEqual((3, 30), measure_event(_create_event_data(3, 10)))
+        self.assertEqual((0, 0), measure_event({'data': None}))
+        self.assertEqual((2, 5), measure_event({'data': [{'destinationTable': 'Files', 'size': 5}, {'destinationTable': 'Files', 'size': 'unknown'}, 'junk']}))
+
+    def test_route(self) -> None:
+        """Test that Celery tasks are routed by the thresholds, that other
+        Celery tasks are not routed, and that the queues are declared.
+
+        """
+
+        metrics = Registry()  # type: pacifica.dispatcher_example.metrics.Registry
+        task_router = SizeTaskRouter('test.tasks.receive', max_small_files=10, max_small_bytes=1000, metrics=metrics)  # type: pacifica.dispatcher_example.queues.SizeTaskRouter
+
+        celery_app = celery.Celery('test.queues.app', broker='memory://', backend='cache+memory://')  # type: celery.Celery
+        install_task_router(celery_app, task_router)
+
+        self.assertEqual(['celery', DEFAULT_SMALL_QUEUE, DEFAULT_LARGE_QUEUE], [queue.name for queue in celery_app.conf.task_queues])
+
+        for (event_data, expected_queue, expected_priority) in [
+                (_create_event_data(10, 100), DEFAULT_SMALL_QUEUE, MAX_PRIORITY),
+                (_create_event_data(11, 1), DEFAULT_LARGE_QUEUE, 0),
+                (_create_event_data(2, 501), DEFAULT_LARGE_QUEUE, 0),
+        ]:
+            options = celery_app.amqp.router.route({}, 'test.tasks.receive', (event_data, ))
+            self.assertEqual(expected_queue, options['queue'].name)
+            self.assertEqual(expected_priority, options['priority'])
+
+        # Options that are given by the publisher override the task router.
+        #
+        self.assertEqual('explicit', celery_app.amqp.router.route({'queue': 'explicit'}, 'test.tasks.receive', (_create_event_data(1, 1), ))['queue'].name)
+        self.assertEqual('celery', celery_app.amqp.router.route({}, 'test.tasks.other', (_create_event_data(1, 1), ))['queue'].name)
+
+        events_routed_total = metrics.counter('dispatcher_example_events_routed_total', '', labelnames=('queue', ))  # type: pacifica.dispatcher_example.metrics.Counter
+        self.assertEqual(2, events_routed_total.value(queue=DEFAULT_SMALL_QUEUE))
+        self.assertEqual(2, events_routed_total.value(queue=DEFAULT_LARGE_QUEUE))
+
+        for kwargs in [{'small_queue': 'same', 'large_queue': 'same'}, {'small_priority': MAX_PRIORITY + 1}, {'large_priority': -1}]:
+            with self.assertRaises(ValueError):
+                SizeTaskRouter('test.tasks.receive', **kwargs)
+
+    def test_simulate_mixed_workload(self) -> None:
+        """Test that, for a mixed workload of small and bulk transactions, the
+        p99 latency of small transactions is lower when they are routed to
+        their own queue than when every transaction shares one queue with the
+        same total number of workers.
+
+        """
+
+        task_router = SizeTaskRouter('test.tasks.receive', max_small_files=16, max_small_bytes=16 * 1024 * 1024)  # type: pacifica.dispatcher_example.queues.SizeTaskRouter
+
+        rng = random.Random(0)  # type: random.Random
+
+        # 20% of the transactions are bulk transactions, whose files take about
+        # one second to handle, and the rest are small transactions, whose files
+        # take about five milliseconds to handle.
+        #
+        jobs = []  # type: typing.List[typing.Tuple[float, float, str, bool]]
+        arrival = 0.0  # type: float
+
+        for _index in range(5000):
+            arrival += rng.expovariate(20.0)
+
+            if rng.random() < 0.2:
+                event_data = _create_event_data(100, 10 * 1024 * 1024)
+            else:
+                event_data = _create_event_data(rng.randint(1, 4), 4096)
+
+            (file_count, total_size) = measure_event(event_data)
+            small = task_router.is_small(event_data)
+
+            jobs.append((arrival, 0.005 + (total_size / (1024.0 * 1024.0 * 1024.0)), task_router.route_event(event_data)['queue'], small))
+
+            self.assertEqual(small, file_count <= 16)
+
+        shared_p99 = _p99(_simulate([(arrival, service, 'shared', small) for (arrival, service, _queue, small) in jobs], {'shared': 6}))  # type: float
+        routed_p99 = _p99(_simulate(jobs, {DEFAULT_SMALL_QUEUE: 1, DEFAULT_LARGE_QUEUE: 5}))  # type: float
+
+        self.assertLess(routed_p99, 0.1)
+        self.assertLess(routed_p99 * 10, shared_p99)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
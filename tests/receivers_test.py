@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/receivers_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the receivers for Pacifica Dispatcher Example.
+
+This module defines the test cases for the receivers for Pacifica Dispatcher
+Example.
+
+"""
+
+import datetime
+import json
+import os
+import tempfile
+import typing
+import unittest
+import unittest.mock
+
+import playhouse.db_url
+from jsonpath2.path import Path
+
+from pacifica.dispatcher.event_handlers import NoopEventHandler
+from pacifica.dispatcher.receiver import create_peewee_model
+from pacifica.dispatcher.router import Router
+
+from pacifica.dispatcher_example.metrics import Registry
+from pacifica.dispatcher_example import metadata, receivers
+from pacifica.dispatcher_example.receivers import DUPLICATE_STATUS, create_celery_app, decode_json, parse_events, receive_batch
+from pacifica.dispatcher_example.routers import IndexedRouter
+
+
+class ReceiversTestCase(unittest.TestCase):
+    """Test cases for the receivers for Pacifica Dispatcher Example.
+
+    Attributes:
+        event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for the
+            CloudEvents notification.
+        tempdir (tempfile.TemporaryDirectory): The temporary directory for the
+            SQLite database.
+        model (type): The class for the Peewee model.
+        router (pacifica.dispatcher.router.Router): The router.
+        metrics (pacifica.dispatcher_example.metrics.Registry): The registry
+            for the metrics.
+        celery_app (celery.Celery): The Celery application, which runs tasks
+            eagerly.
+
+    """
+
+    def setUp(self) -> None:
+        """Initialize the environment for the test cases.
+
+        """
+
+        with open(os.path.join('test_files', 'C234-1234-1234', 'event.json'), mode='r') as event_file:
+            self.event_data = json.load(event_file)  # type: typing.Dict[str, typing.Any]
+
+        self.tempdir = tempfile.TemporaryDirectory()  # type: tempfile.TemporaryDirectory
+
+        db = playhouse.db_url.connect('sqlite:///{0}'.format(os.path.join(self.tempdir.name, 'db.sqlite3')))  # type: peewee.Database
+
+        self.model = create_peewee_model(db)  # type: type
+        self.model.create_table(safe=True)
+        db.close()
+
+        self.router = Router()  # type: pacifica.dispatcher.router.Router
+        self.router.add_route(Path.parse_file(os.path.join(os.path.dirname(__file__), '..', 'pacifica', 'dispatcher_example', 'jsonpath2', 'example.txt')), NoopEventHandler())
+
+        self.metrics = Registry()  # type: pacifica.dispatcher_example.metrics.Registry
+
+        self.celery_app = create_celery_app(self.model, self.router, 'test.app', 'test.tasks.receive', broker='memory://', backend='cache+memory://', metrics=self.metrics)  # type: celery.Celery
+        self.celery_app.conf.task_always_eager = True
+
+    def tearDown(self) -> None:
+        """Clean up the environment for the test cases.
+
+        """
+
+        self.tempdir.cleanup()
+
+    def test_parse_events(self) -> None:
+        """Test that JSON arrays and JSON Lines streams are parsed.
+
+        """
+
+        self.assertEqual([{'a': 1}, {'b': 2}], parse_events(b'[{"a": 1}, {"b": 2}]', 'application/json'))
+        self.assertEqual([{'a': 1}, {'b': 2}], parse_events(b'{"a": 1}\n\n{"b": 2}\n', 'application/x-ndjson; charset=utf-8'))
+
+        for (body, content_type) in [(b'{"a": 1}', None), (b'[1]', None), (b'[', None), (b'{"a": 1}\n[', 'application/x-ndjson')]:
+            with self.assertRaises(ValueError):
+                parse_events(body, content_type)
+
+    def test_decode_json(self) -> None:
+        """Test that the same JSON documents are accepted with and without the
+        fast JSON parser.
+
+        """
+
+        for orjson in {receivers.orjson, None}:
+            with unittest.mock.patch.object(receivers, 'orjson', orjson):
+                self.assertEqual({'a': [1, 2 ** 70, 1.5], 'b': '\u00e9'}, decode_json('{"a": [1, 1180591620717411303424, 1.5], "b": "\u00e9"}'.encode('utf-8')))
+
+                for body in [b'', b'{', b'\xff']:
+                    with self.assertRaises(ValueError):
+                        decode_json(body)
+
+    def test_receive_batch(self) -> None:
+        """Test that the rows for a batch are inserted and that each task
+        updates its row.
+
+        """
+
+        events = [self.event_data, dict(self.event_data, eventType='org.pacifica.metadata.other')]  # type: typing.List[typing.Dict[str, typing.Any]]
+
+        task_ids = receive_batch(self.model, self.celery_app.tasks['test.tasks.receive'], events)  # type: typing.List[str]
+
+        self.assertEqual(2, len(task_ids))
+
+        with self.model._meta.database.connection_context():
+            self.assertEqual(2, self.model.select().count())
+            self.assertEqual(['200 OK', '422 Unprocessable Entity'], [self.model.get(self.model.task_id == task_id).task_status for task_id in task_ids])
+
+        self.assertEqual([], receive_batch(self.model, self.celery_app.tasks['test.tasks.receive'], []))
+
+        # The queue wait time is observed for each row that was inserted before
+        # its task started.
+        #
+        self.assertEqual(2, self.metrics.histogram('dispatcher_example_queue_wait_seconds', '').count())
+        self.assertEqual(1, self.metrics.histogram('dispatcher_example_task_seconds', '', labelnames=('status', )).count(status='422'))
+
+    def test_receive_batch_publish_error(self) -> None:
+        """Test that the rows for a batch are marked as failed, rather than left
+        pending, if the tasks cannot be published.
+
+        """
+
+        with unittest.mock.patch('celery.group.apply_async', side_effect=ConnectionError('broker is down')):
+            with self.assertRaises(ConnectionError):
+                receive_batch(self.model, self.celery_app.tasks['test.tasks.receive'], [self.event_data, dict(self.event_data, eventID='C234-1234-5678')], dedupe_window=60.0)
+
+        with self.model._meta.database.connection_context():
+            self.assertEqual([('500 Internal Server Error', 'ConnectionError', 'broker is down')] * 2, [(inst.task_status, inst.exc_type, inst.exc_value) for inst in self.model.select()])
+
+        # The retry of the batch is not coalesced with the failed rows.
+        #
+        (task_id, ) = receive_batch(self.model, self.celery_app.tasks['test.tasks.receive'], [self.event_data], dedupe_window=60.0)
+
+        with self.model._meta.database.connection_context():
+            self.assertEqual('200 OK', self.model.get(self.model.task_id == task_id).task_status)
+
+    def test_receive_task(self) -> None:
+        """Test that the task inserts its row if it has not been inserted.
+
+        """
+
+        result = self.celery_app.tasks['test.tasks.receive'].delay(self.event_data)
+
+        with self.model._meta.database.connection_context():
+            self.assertEqual('200 OK', self.model.get(self.model.task_id == result.id).task_status)
+
+    def test_dedupe(self) -> None:
+        """Test that duplicate CloudEvents notifications are coalesced when
+        they are received, and that duplicate and redelivered tasks are
+        short-circuited.
+
+        """
+
+        celery_app = create_celery_app(self.model, self.router, 'test.dedupe.app', 'test.dedupe.tasks.receive', broker='memory://', backend='cache+memory://', dedupe_window=60.0, metrics=self.metrics)  # type: celery.Celery
+        celery_app.conf.task_always_eager = True
+
+        receive_task = celery_app.tasks['test.dedupe.tasks.receive']  # type: celery.Task
+        events_suppressed_total = self.metrics.counter('dispatcher_example_events_suppressed_total', '', labelnames=('stage', 'reason', ))  # type: pacifica.dispatcher_example.metrics.Counter
+
+        # The duplicate in the batch is coalesced with the first CloudEvents
+        # notification, whereas a CloudEvents notification from another source
+        # is not a duplicate.
+        #
+        other_event_data = dict(self.event_data, source='/pacifica/other')  # type: typing.Dict[str, typing.Any]
+
+        (task_id, duplicate_task_id, other_task_id) = receive_batch(self.model, receive_task, [self.event_data, self.event_data, other_event_data], dedupe_window=60.0, metrics=self.metrics)
+
+        self.assertEqual(task_id, duplicate_task_id)
+        self.assertNotEqual(task_id, other_task_id)
+        self.assertEqual(1, events_suppressed_total.value(stage='receive', reason='pending'))
+
+        # A CloudEvents notification that was received after the first one
+        # succeeded is coalesced with it.
+        #
+        self.assertEqual([task_id], receive_batch(self.model, receive_task, [self.event_data], dedupe_window=60.0, metrics=self.metrics))
+        self.assertEqual(1, events_suppressed_total.value(stage='receive', reason='succeeded'))
+
+        # A duplicate that reaches the Celery task is short-circuited, as is a
+        # redelivered Celery task.
+        #
+        result = receive_task.delay(self.event_data)
+        receive_task.apply((self.event_data, ), task_id=task_id)
+
+        self.assertEqual(1, events_suppressed_total.value(stage='task', reason='succeeded'))
+        self.assertEqual(1, events_suppressed_total.value(stage='task', reason='redelivered'))
+
+        with self.model._meta.database.connection_context():
+            self.assertEqual('200 OK', self.model.get(self.model.task_id == task_id).task_status)
+            self.assertEqual(DUPLICATE_STATUS, self.model.get(self.model.task_id == result.id).task_status)
+            self.assertEqual(3, self.model.select().count())
+
+            # A pending row is a duplicate within the window, and is assumed to
+            # have been abandoned after it.
+            #
+            self.model.update(task_status='102 Processing').where(self.model.task_id == task_id).execute()
+
+        self.assertEqual([task_id], receive_batch(self.model, receive_task, [self.event_data], dedupe_window=60.0, metrics=self.metrics))
+        self.assertEqual(2, events_suppressed_total.value(stage='receive', reason='pending'))
+
+        with self.model._meta.database.connection_context():
+            self.model.update(created=datetime.datetime.now() - datetime.timedelta(seconds=120)).where(self.model.task_id == task_id).execute()
+
+        self.assertNotEqual([task_id], receive_batch(self.model, receive_task, [self.event_data], dedupe_window=60.0, metrics=self.metrics))
+
+    def test_dedupe_requeue(self) -> None:
+        """Test that the short-circuited duplicate of a CloudEvents notification
+        that failed is handled again.
+
+        """
+
+        celery_app = create_celery_app(self.model, self.router, 'test.requeue.app', 'test.requeue.tasks.receive', broker='memory://', backend='cache+memory://', dedupe_window=60.0, metrics=self.metrics)  # type: celery.Celery
+        celery_app.conf.task_always_eager = True
+
+        receive_task = celery_app.tasks['test.requeue.tasks.receive']  # type: celery.Task
+
+        # The row for the first CloudEvents notification is pending, because
+        # its Celery task has not run yet, when the duplicate is received by
+        # the Celery task, which is short-circuited.
+        #
+        with unittest.mock.patch('celery.group.apply_async'):
+            (task_id, ) = receive_batch(self.model, receive_task, [self.event_data], dedupe_window=60.0)
+
+        duplicate_task_id = receive_task.delay(self.event_data).id  # type: str
+
+        with self.model._meta.database.connection_context():
+            self.assertEqual(DUPLICATE_STATUS, self.model.get(self.model.task_id == duplicate_task_id).task_status)
+
+        # The first CloudEvents notification fails, and then the duplicate is
+        # handled again, and succeeds.
+        #
+        with unittest.mock.patch.object(NoopEventHandler, 'handle', side_effect=[RuntimeError('handler failed'), None]):
+            receive_task.apply((self.event_data, ), task_id=task_id)
+
+        with self.model._meta.database.connection_context():
+            self.assertEqual('500 Internal Server Error', self.model.get(self.model.task_id == task_id).task_status)
+            self.assertEqual('200 OK', self.model.get(self.model.task_id == duplicate_task_id).task_status)
+
+        # A duplicate of a CloudEvents notification that succeeded is not
+        # handled again.
+        #
+        self.assertEqual([], receivers.requeue_duplicates(self.model, receive_task, [task_id], 60.0))
+
+    def test_receive_task_clears_metadata(self) -> None:
+        """Test that the metadata descriptions that were extracted by the
+        indexed router are not kept after the Celery task, whether or not a
+        route matched.
+
+        """
+
+        router = IndexedRouter()  # type: pacifica.dispatcher_example.routers.IndexedRouter
+        router.add_route(Path.parse_file(os.path.join(os.path.dirname(__file__), '..', 'pacifica', 'dispatcher_example', 'jsonpath2', 'example.txt')), NoopEventHandler())
+
+        celery_app = create_celery_app(self.model, router, 'test.metadata.app', 'test.metadata.tasks.receive', broker='memory://', backend='cache+memory://')  # type: celery.Celery
+        celery_app.conf.task_always_eager = True
+
+        other_event_data = dict(self.event_data, data=[dict(entry, value='other-value') if entry.get('destinationTable', None) == 'TransactionKeyValue' else entry for entry in self.event_data['data']])  # type: typing.Dict[str, typing.Any]
+
+        for (event_data, expected_status) in [(self.event_data, '200 OK'), (other_event_data, '422 Unprocessable Entity')]:
+            task_id = celery_app.tasks['test.metadata.tasks.receive'].delay(event_data).id  # type: str
+
+            with self.model._meta.database.connection_context():
+                self.assertEqual(expected_status, self.model.get(self.model.task_id == task_id).task_status)
+
+            self.assertIsNone(getattr(metadata._local, 'cached', None))  # pylint: disable=protected-access
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
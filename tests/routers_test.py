@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/routers_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the routers for Pacifica Dispatcher Example.
+
+This module defines the test cases for the routers for Pacifica Dispatcher
+Example.
+
+"""
+
+import json
+import os
+import unittest
+import unittest.mock
+
+from jsonpath2.path import Path
+
+from pacifica.dispatcher.event_handlers import NoopEventHandler
+from pacifica.dispatcher.router import Router
+
+from pacifica.dispatcher_example import metadata
+from pacifica.dispatcher_example.metadata import extract_metadata
+from pacifica.dispatcher_example.routers import IndexedRouter, compile_predicate, extract_discriminators
+
+
+class RoutersTestCase(unittest.TestCase):
+    """Test cases for the routers for Pacifica Dispatcher Example.
+
+    Attributes:
+        event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for the
+            CloudEvents notification.
+        path (jsonpath2.path.Path): The JSONPath for the example event handler.
+
+    """
+
+    def setUp(self) -> None:
+        """Initialize the environment for the test cases.
+
+        """
+
+        with open(os.path.join('test_files', 'C234-1234-1234', 'event.json'), mode='r') as event_file:
+            self.event_data = json.load(event_file)  # type: typing.Dict[str, typing.Any]
+
+        self.path = Path.parse_file(os.path.join(os.path.dirname(__file__), '..', 'pacifica', 'dispatcher_example', 'jsonpath2', 'example.txt'))  # type: jsonpath2.path.Path
+
+    def test_extract_discriminators(self) -> None:
+        """Test that the equality tests on top-level fields are extracted.
+
+        """
+
+        self.assertEqual({
+            'eventType': 'org.pacifica.metadata.ingest',
+            'source': '/pacifica/metadata/ingest',
+        }, extract_discriminators(self.path))
+
+        self.assertEqual({'eventType': 'x'}, extract_discriminators(Path.parse_str('$[?("x" = $["eventType"])]')))
+        self.assertEqual({}, extract_discriminators(Path.parse_str('$[?($["eventType"] = "x" or $["source"] = "y")]')))
+        self.assertEqual({}, extract_discriminators(Path.parse_str('$["data"][*][?(@["key"] = "x")]')))
+        self.assertEqual({}, extract_discriminators(Path.parse_str('$[?($["data"][0] = "x")]')))
+
+    def test_compile_predicate(self) -> None:
+        """Test that a compiled predicate returns the same result as its
+        JSONPath, and that other JSONPaths are not compiled.
+
+        """
+
+        predicate = compile_predicate(self.path)
+
+        self.assertIsNotNone(predicate)
+
+        files = [entry for entry in self.event_data['data'] if entry.get('destinationTable', None) == 'Files']
+        others = [entry for entry in self.event_data['data'] if entry.get('destinationTable', None) != 'Files']
+
+        for event_data in [
+                self.event_data,
+                dict(self.event_data, data=others),
+                dict(self.event_data, data=others + [dict(entry, mimetype='text/html') for entry in files]),
+                dict(self.event_data, data=others + [dict(entry, subdir='a') for entry in files] + files[-1:]),
+                dict(self.event_data, data=[entry for entry in self.event_data['data'] if entry.get('destinationTable', None) != 'TransactionKeyValue']),
+                dict(self.event_data, data=dict(enumerate(self.event_data['data']))),
+                dict(self.event_data, data=['junk', 1, None] + self.event_data['data']),
+                dict(self.event_data, data='junk'),
+                dict((key, value) for (key, value) in self.event_data.items() if key != 'eventID'),
+                dict((key, value) for (key, value) in self.event_data.items() if key != 'data'),
+                dict(self.event_data, source='/pacifica/metadata/other'),
+        ]:
+            expected = bool(list(self.path.match(event_data)))  # type: bool
+
+            self.assertEqual(expected, predicate(event_data, lambda event_data=event_data: extract_metadata(event_data.get('data', None))))
+
+        for path in [
+                '$[?($["eventType"] = "x" or $["source"] = "y")]',
+                '$[?($["data"][0] = "x")]',
+                '$[?($["data"][*][?(@["key"] = "x")])]',
+                '$[?($["data"][*][?(@["destinationTable"] = "Files" and @["size"] > 1)])]',
+                '$["data"][*][?(@["destinationTable"] = "Files")]',
+        ]:
+            self.assertIsNone(compile_predicate(Path.parse_str(path)))
+
+    def test_indexed_router(self) -> None:
+        """Test that the indexed router yields the same routes, in the same
+        order, as the upstream router.
+
+        """
+
+        paths = [
+            self.path,
+            Path.parse_str('$[?($["eventType"] = "org.pacifica.metadata.other")]'),
+            Path.parse_str('$[?($["eventID"])]'),
+            Path.parse_str('$[?($["eventType"] = "org.pacifica.metadata.ingest")]'),
+            Path.parse_str('$[?($["source"] = "/pacifica/metadata/ingest")]'),
+        ]  # type: typing.List[jsonpath2.path.Path]
+
+        router = Router()  # type: pacifica.dispatcher.router.Router
+        indexed_router = IndexedRouter()  # type: pacifica.dispatcher_example.routers.IndexedRouter
+
+        for path in paths:
+            event_handler = NoopEventHandler()
+            router.add_route(path, event_handler)
+            indexed_router.add_route(path, event_handler)
+
+        for event_data in [self.event_data, dict(self.event_data, eventType='org.pacifica.metadata.other'), dict(self.event_data, source=['unhashable']), {}]:
+            expected = [route.path for route in router.match(event_data)]
+
+            self.assertEqual(expected, [route.path for route in indexed_router.match(event_data)])
+
+        self.assertEqual(4, len(list(indexed_router.match(self.event_data))))
+
+        # The metadata descriptions that were extracted by the indexed router
+        # are reused by the next extraction for the same payload, and are only
+        # extracted if a candidate route tests the entries of the payload.
+        #
+        extract_metadata(self.event_data['data'])
+
+        with unittest.mock.patch('pacifica.dispatcher_example.metadata._extract', wraps=metadata._extract) as extract:
+            self.assertEqual(3, len(list(indexed_router.match(dict(self.event_data, eventType='org.pacifica.metadata.other')))))
+            self.assertEqual(0, extract.call_count)
+
+            list(indexed_router.match(self.event_data))
+            self.assertEqual(1, extract.call_count)
+
+            self.assertEqual(1, len(extract_metadata(self.event_data['data']).files))
+            self.assertEqual(1, extract.call_count)
+
+            extract_metadata(self.event_data['data'])
+            self.assertEqual(2, extract.call_count)
+
+        self.assertEqual(3, len(indexed_router.candidates(dict(self.event_data, eventType='org.pacifica.metadata.other'))))
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
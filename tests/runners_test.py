@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/runners_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the runners for Pacifica Dispatcher Example.
+
+This module defines the test cases for the runners for Pacifica Dispatcher
+Example, and for the lazy construction of the entrypoint module.
+
+"""
+
+import http.server
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tarfile
+import threading
+import typing
+import unittest
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+from pacifica.dispatcher.models import File, Transaction, TransactionKeyValue
+from pacifica.downloader import Downloader
+
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.runners import LazyDownloaderRunner, ShardedRemoteDownloaderRunner, SpoolingRemoteUploaderRunner, create_session
+
+
+class CartServer(http.server.ThreadingHTTPServer):
+    """A stand-in for the cart server, whose carts are staging for a number of
+    checks of their status, and whose connections are kept alive.
+
+    The content of each file in a cart is its path, or, if its path starts
+    with "error", then the cart fails.
+
+    Attributes:
+        staging_polls (int): The number of checks of the status of each cart
+            before it is ready.
+        carts (typing.Dict[str, typing.List[str]]): The paths of the files in
+            each cart.
+        polls (typing.Dict[str, int]): The number of checks of the status of
+            each cart.
+        connections (int): The number of accepted connections.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, staging_polls: int = 1) -> None:
+        """Initialize this server on an ephemeral port."""
+        super(CartServer, self).__init__(('127.0.0.1', 0), CartRequestHandler)
+
+        self.staging_polls = staging_polls  # type: int
+        self.carts = {}  # type: typing.Dict[str, typing.List[str]]
+        self.polls = {}  # type: typing.Dict[str, int]
+        self.connections = 0  # type: int
+        self.lock = threading.Lock()  # type: threading.Lock
+
+    @property
+    def url(self) -> str:
+        """Return the URL for the cart API."""
+        return 'http://{0}:{1}'.format(*self.server_address[:2])
+
+
+class CartRequestHandler(http.server.BaseHTTPRequestHandler):
+    """The request handler for the stand-in for the cart server.
+
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self) -> None:
+        """Count the accepted connection."""
+        super(CartRequestHandler, self).setup()
+
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args: typing.Any) -> None:
+        """Do not log the requests."""
+
+    def _send(self, status: int, headers: typing.Dict[str, str] = None, body: bytes = b'') -> None:
+        """Send a response whose body has a known length."""
+        self.send_response(status)
+
+        for (key, value) in (headers or {}).items():
+            self.send_header(key, value)
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Create a cart."""
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+
+        with self.server.lock:
+            self.server.carts[self.path] = [file_id['path'] for file_id in body['fileids']]
+            self.server.polls[self.path] = 0
+
+        self._send(201)
+
+    def do_HEAD(self) -> None:  # pylint: disable=invalid-name
+        """Return the status of a cart."""
+        with self.server.lock:
+            paths = self.server.carts[self.path]
+            self.server.polls[self.path] += 1
+            polls = self.server.polls[self.path]
+
+        if any(path.startswith('error') for path in paths):
+            self._send(500, {'X-Pacifica-Status': 'error', 'X-Pacifica-Message': 'File not found'})
+        elif polls <= self.server.staging_polls:
+            self._send(204, {'X-Pacifica-Status': 'staging', 'X-Pacifica-Message': ''})
+        else:
+            self._send(204, {'X-Pacifica-Status': 'ready', 'X-Pacifica-Message': ''})
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Download a cart, as a tar archive of its files."""
+        with self.server.lock:
+            paths = self.server.carts[self.path.split('?', 1)[0]]
+
+        content = io.BytesIO()  # type: io.BytesIO
+
+        with tarfile.open(fileobj=content, mode='w') as cart_tar:
+            for path in paths:
+                tarinfo = tarfile.TarInfo(name=os.path.join('data', path))  # type: tarfile.TarInfo
+                tarinfo.size = len(path.encode('utf-8'))
+                cart_tar.addfile(tarinfo, io.BytesIO(path.encode('utf-8')))
+
+        self._send(200, {'Content-Type': 'application/octet-stream'}, content.getvalue())
+
+
+class RecordingUploader:
+    """A Pacifica uploader that records the bundle and its content length.
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize this uploader."""
+        self.uploads = []  # type: typing.List[typing.Tuple[bytes, int]]
+
+    def upload(self, read_fd: typing.BinaryIO, content_length: int = None) -> int:
+        """Record the bundle and its content length."""
+        self.uploads.append((read_fd.read(), content_length))
+        return len(self.uploads)
+
+    def getstate(self, _job_id: int) -> typing.Dict[str, typing.Any]:
+        """Return the state of a job that has been ingested."""
+        return {'state': 'OK', 'task': 'ingest metadata', 'task_percent': '100.00'}
+
+
+class RunnersTestCase(unittest.TestCase):
+    """Test cases for the runners for Pacifica Dispatcher Example.
+
+    """
+
+    def test_lazy_downloader_runner(self) -> None:
+        """Test that the downloader runner is constructed once, on first use.
+
+        """
+
+        calls = []  # type: typing.List[int]
+
+        with tempfile.TemporaryDirectory() as basedir_name:
+            with open(os.path.join(basedir_name, 'example.txt'), mode='w') as file:
+                file.write('example')
+
+            def factory() -> LocalDownloaderRunner:
+                """Construct the downloader runner."""
+                calls.append(1)
+                return LocalDownloaderRunner(basedir_name)
+
+            downloader_runner = LazyDownloaderRunner(factory)  # type: pacifica.dispatcher_example.runners.LazyDownloaderRunner
+
+            self.assertEqual([], calls)
+
+            threads = [threading.Thread(target=lambda: downloader_runner.runner) for _ in range(8)]  # type: typing.List[threading.Thread]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+            with tempfile.TemporaryDirectory() as downloader_tempdir_name:
+                (opener, ) = downloader_runner.download(downloader_tempdir_name, [File(name='example.txt')])
+
+                with opener() as file:
+                    self.assertEqual('example', file.read())
+
+        self.assertEqual([1], calls)
+
+    def test_sharded_remote_downloader_runner(self) -> None:
+        """Test that the files are split into shards, one cart per shard, that
+        the connections are reused across calls, and that a failed cart is
+        reported.
+
+        """
+
+        server = CartServer()  # type: CartServer
+        thread = threading.Thread(target=server.serve_forever)  # type: threading.Thread
+        thread.start()
+
+        try:
+            downloader_runner = ShardedRemoteDownloaderRunner(Downloader(cart_api_url=server.url, session=create_session(pool_maxsize=2)), shard_files=2, max_concurrency=2, poll_interval=0.0)  # type: ShardedRemoteDownloaderRunner
+
+            for _ in range(3):
+                with tempfile.TemporaryDirectory() as basedir_name:
+                    files = [File(_id=index, name='example-{0}.txt'.format(index), path='example-{0}.txt'.format(index), hashsum='', hashtype='sha1') for index in range(5)]  # type: typing.List[File]
+
+                    openers = downloader_runner.download(basedir_name, files)
+
+                    for (file, opener) in zip(files, openers):
+                        with opener() as file_obj:
+                            self.assertEqual(file.path, file_obj.read())
+
+            self.assertEqual(9, len(server.carts))
+            self.assertEqual([1] * 3 + [2] * 6, sorted(len(paths) for paths in server.carts.values()))
+            self.assertLessEqual(server.connections, 2)
+
+            with tempfile.TemporaryDirectory() as basedir_name:
+                with self.assertRaises(RuntimeError):
+                    downloader_runner.download(basedir_name, [File(_id=1, name='example.txt', path='example.txt'), File(_id=2, name='error.txt', path='error.txt')], timeout=5)
+
+                with self.assertRaises(ValueError):
+                    downloader_runner.download(basedir_name, [])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        for kwargs in [{'shard_files': 0}, {'max_concurrency': 0}, {'poll_interval': -1.0}]:
+            with self.assertRaises(ValueError):
+                ShardedRemoteDownloaderRunner(Downloader(cart_api_url=server.url), **kwargs)
+
+        with self.assertRaises(ValueError):
+            create_session(pool_maxsize=0)
+
+    def test_spooling_remote_uploader_runner(self) -> None:
+        """Test that the bundle is uploaded with its content length, both when
+        it is spooled in memory and when it is written to the staging
+        directory.
+
+        """
+
+        with tempfile.TemporaryDirectory() as basedir_name:
+            with open(os.path.join(basedir_name, 'example.txt'), mode='w', encoding='utf-8') as file:
+                file.write('EXAMPLE STRASSE ÆRØSKØBING\n' * 1024)
+
+            for max_spool_bytes in [1024 * 1024, 0]:
+                with tempfile.TemporaryDirectory() as staging_dir:
+                    uploader = RecordingUploader()  # type: RecordingUploader
+
+                    (_bundler, job_id, state) = SpoolingRemoteUploaderRunner(uploader, staging_dir=staging_dir, max_spool_bytes=max_spool_bytes).upload(basedir_name, transaction=Transaction(submitter=1, instrument=2, project='3'), transaction_key_values=[TransactionKeyValue(key='example-key', value='example-value')])
+
+                    self.assertEqual(1, job_id)
+                    self.assertEqual('OK', state['state'])
+                    self.assertEqual([], os.listdir(staging_dir))
+
+                    ((content, content_length), ) = uploader.uploads
+
+                    self.assertEqual(len(content), content_length)
+
+                    with tarfile.open(fileobj=io.BytesIO(content), mode='r') as bundle:
+                        self.assertEqual(['data/example.txt', 'metadata.txt'], bundle.getnames())
+                        self.assertEqual('EXAMPLE STRASSE ÆRØSKØBING\n' * 1024, bundle.extractfile('data/example.txt').read().decode('utf-8'))
+
+        with self.assertRaises(ValueError):
+            SpoolingRemoteUploaderRunner(RecordingUploader(), max_spool_bytes=-1)
+
+    def test_example_event_handler_staging_dir(self) -> None:
+        """Test that the event handler stages the files in the staging
+        directory, and then removes them.
+
+        """
+
+        basedir_name = os.path.abspath(os.path.join('test_files', 'C234-1234-1234'))  # type: str
+
+        with open(os.path.join(basedir_name, 'event.json'), mode='r') as event_file:
+            event = Event(json.load(event_file))  # type: cloudevents.model.Event
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            staging_dir = os.path.join(tempdir_name, 'staging')  # type: str
+            staged_names = []  # type: typing.List[str]
+
+            class RecordingUploaderRunner(SpoolingRemoteUploaderRunner):
+                """An uploader runner that records the directories that it
+                uploads.
+
+                """
+
+                def upload(self, basedir_name, transaction=None, transaction_key_values=None, timeout=180):
+                    """Record the directory and then upload it."""
+                    staged_names.append(basedir_name)
+                    return super(RecordingUploaderRunner, self).upload(basedir_name, transaction=transaction, transaction_key_values=transaction_key_values, timeout=timeout)
+
+            uploader = RecordingUploader()  # type: RecordingUploader
+
+            ExampleEventHandler(LocalDownloaderRunner(os.path.join(basedir_name, 'data')), RecordingUploaderRunner(uploader, staging_dir=staging_dir), staging_dir=staging_dir).handle(event)
+
+            self.assertEqual(1, len(uploader.uploads))
+            self.assertEqual(staging_dir, os.path.dirname(staged_names[0]))
+            self.assertEqual([], os.listdir(staging_dir))
+
+    def test_lazy_main(self) -> None:
+        """Test that importing the entrypoint module constructs nothing.
+
+        """
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            env = dict(os.environ)
+            env['DATABASE_URL'] = 'sqlite:///{0}'.format(os.path.join(tempdir_name, 'db.sqlite3'))
+            env['BROKER_URL'] = 'memory://'
+            env['BACKEND_URL'] = 'cache+memory://'
+
+            subprocess.run([sys.executable, '-c', '; '.join([
+                'import sys',
+                'import pacifica.dispatcher_example.__main__ as module',
+                'assert not {"db", "ReceiveTaskModel", "celery_app", "application"} & set(vars(module))',
+                'assert not {"celery", "cherrypy", "peewee", "pacifica.cli.methods"} & set(sys.modules)',
+                'assert module.application.root.batch is not None',
+                'assert module.celery_app is module.celery_app',
+                'assert "pacifica.cli.methods" not in sys.modules',
+            ])], env=env, check=True)
+
+            self.assertTrue(os.path.exists(os.path.join(tempdir_name, 'db.sqlite3')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/servers_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the servers for Pacifica Dispatcher Example.
+
+This module defines the test cases for the servers for Pacifica Dispatcher
+Example.
+
+"""
+
+import asyncio
+import json
+import os
+import re
+import tempfile
+import typing
+import unittest
+
+import playhouse.db_url
+from jsonpath2.path import Path
+
+from pacifica.dispatcher.event_handlers import NoopEventHandler
+from pacifica.dispatcher.receiver import create_peewee_model
+from pacifica.dispatcher.router import Router
+
+from pacifica.dispatcher_example.metrics import Registry
+from pacifica.dispatcher_example.receivers import create_celery_app
+from pacifica.dispatcher_example.servers import AsyncioServer
+
+
+async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str, body: bytes = b'', headers: typing.Optional[typing.Dict[str, str]] = None) -> typing.Tuple[int, typing.Dict[str, str], bytes]:
+    """Send a request on a connection, and then return the status code, the
+    headers and the body of the response.
+
+    """
+
+    lines = ['{0} {1} HTTP/1.1'.format(method, path), 'Host: 127.0.0.1', 'Content-Length: {0}'.format(len(body))]
+    lines.extend('{0}: {1}'.format(name, value) for (name, value) in (headers or {}).items())
+
+    writer.write(''.join('{0}\r\n'.format(line) for line in lines).encode('latin-1') + b'\r\n' + body)
+    await writer.drain()
+
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    response_headers = dict((name.lower(), value.strip()) for (name, _sep, value) in (line.partition(':') for line in head[1:] if line))
+
+    return (int(head[0].split(' ')[1]), response_headers, await reader.readexactly(int(response_headers['content-length'])))
+
+
+class AsyncioServerTestCase(unittest.TestCase):
+    """Test cases for the asyncio server for Pacifica Dispatcher Example.
+
+    Attributes:
+        event_data (typing.Dict[str, typing.Any]): The JSON-encoded data for the
+            CloudEvents notification.
+        tempdir (tempfile.TemporaryDirectory): The temporary directory for the
+            SQLite database.
+        model (type): The class for the Peewee model.
+        metrics (pacifica.dispatcher_example.metrics.Registry): The registry
+            for the metrics.
+        server (pacifica.dispatcher_example.servers.AsyncioServer): The asyncio
+            server, whose Celery tasks run eagerly.
+
+    """
+
+    def setUp(self) -> None:
+        """Initialize the environment for the test cases.
+
+        """
+
+        with open(os.path.join('test_files', 'C234-1234-1234', 'event.json'), mode='r') as event_file:
+            self.event_data = json.load(event_file)  # type: typing.Dict[str, typing.Any]
+
+        self.tempdir = tempfile.TemporaryDirectory()  # type: tempfile.TemporaryDirectory
+
+        db = playhouse.db_url.connect('sqlite:///{0}'.format(os.path.join(self.tempdir.name, 'db.sqlite3')))  # type: peewee.Database
+
+        self.model = create_peewee_model(db)  # type: type
+        self.model.create_table(safe=True)
+        db.close()
+
+        router = Router()  # type: pacifica.dispatcher.router.Router
+        router.add_route(Path.parse_file(os.path.join(os.path.dirname(__file__), '..', 'pacifica', 'dispatcher_example', 'jsonpath2', 'example.txt')), NoopEventHandler())
+
+        self.metrics = Registry()  # type: pacifica.dispatcher_example.metrics.Registry
+
+        celery_app = create_celery_app(self.model, router, 'test.servers.app', 'test.servers.tasks.receive', broker='memory://', backend='cache+memory://', metrics=self.metrics)  # type: celery.Celery
+        celery_app.conf.task_always_eager = True
+
+        self.server = AsyncioServer(self.model, celery_app.tasks['test.servers.tasks.receive'], metrics=self.metrics, max_workers=4)  # type: pacifica.dispatcher_example.servers.AsyncioServer
+
+    def tearDown(self) -> None:
+        """Clean up the environment for the test cases.
+
+        """
+
+        self.server.shutdown()
+        self.tempdir.cleanup()
+
+    def _run(self, func: typing.Callable[[asyncio.StreamReader, asyncio.StreamWriter], typing.Awaitable[None]]) -> None:
+        """Start the asyncio server, and then call a coroutine function with a
+        connection to it.
+
+        """
+
+        async def run() -> None:
+            server = await self.server.start('127.0.0.1', 0)
+
+            async with server:
+                (reader, writer) = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+
+                try:
+                    await func(reader, writer)
+                finally:
+                    writer.close()
+
+        asyncio.run(run())
+
+    def test_receive(self) -> None:
+        """Test that CloudEvents notifications are received on one connection,
+        and that the status of each is returned.
+
+        """
+
+        async def func(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            (status, _headers, body) = await _request(reader, writer, 'POST', '/receive', json.dumps(self.event_data).encode('utf-8'), {'Content-Type': 'application/json'})
+            self.assertEqual(200, status)
+            task_id = json.loads(body.decode('utf-8'))
+
+            (status, _headers, body) = await _request(reader, writer, 'POST', '/batch', json.dumps([self.event_data, self.event_data]).encode('utf-8'), {'Content-Type': 'application/json'})
+            self.assertEqual(200, status)
+            self.assertEqual(2, len(json.loads(body.decode('utf-8'))))
+
+            (status, _headers, body) = await _request(reader, writer, 'GET', '/get/{0}'.format(task_id))
+            self.assertEqual(200, status)
+            self.assertEqual('200 OK', json.loads(body.decode('utf-8'))['taskStatus'])
+
+            (status, _headers, body) = await _request(reader, writer, 'GET', '/status/{0}'.format(task_id))
+            self.assertEqual((200, '200 OK'), (status, json.loads(body.decode('utf-8'))))
+
+            (status, _headers, body) = await _request(reader, writer, 'GET', '/')
+            self.assertEqual(200, status)
+            self.assertEqual(3, len(json.loads(body.decode('utf-8'))))
+            self.assertEqual(task_id, json.loads(body.decode('utf-8'))[-1]['taskID'])
+
+            (status, _headers, body) = await _request(reader, writer, 'GET', '/metrics')
+            self.assertEqual(200, status)
+            self.assertIn(b'dispatcher_example_http_connections 1', body)
+
+        self._run(func)
+
+        with self.model._meta.database.connection_context():
+            self.assertEqual(3, self.model.select().count())
+
+        request_seconds = self.metrics.histogram('dispatcher_example_http_request_seconds', '', labelnames=('method', 'path', 'status'))  # type: pacifica.dispatcher_example.metrics.Histogram
+
+        self.assertEqual(1, request_seconds.count(method='POST', path='/receive', status='200'))
+        self.assertEqual(1, request_seconds.count(method='POST', path='/batch', status='200'))
+
+    def test_errors(self) -> None:
+        """Test that invalid requests are rejected, without closing the
+        connection.
+
+        """
+
+        async def func(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            for (method, path, body, headers, expected_status) in [
+                    ('POST', '/receive', b'{}', {'Content-Type': 'text/plain'}, 415),
+                    ('POST', '/receive', b'[', {'Content-Type': 'application/json'}, 400),
+                    ('POST', '/receive', b'[]', {'Content-Type': 'application/json'}, 400),
+                    ('POST', '/batch', b'{}', {}, 400),
+                    ('GET', '/receive', b'', {}, 405),
+                    ('GET', '/get/not-a-uuid', b'', {}, 422),
+                    ('GET', '/get/00000000-0000-0000-0000-000000000000', b'', {}, 404),
+                    ('GET', '/status/not-a-uuid', b'', {}, 422),
+                    ('GET', '/status/00000000-0000-0000-0000-000000000000', b'', {}, 404),
+                    ('POST', '/', b'', {}, 405),
+                    ('GET', '/missing', b'', {}, 404),
+            ]:
+                (status, _headers, _body) = await _request(reader, writer, method, path, body, headers)
+                self.assertEqual(expected_status, status)
+
+            (status, headers, _body) = await _request(reader, writer, 'GET', '/missing', headers={'Connection': 'close'})
+            self.assertEqual(404, status)
+            self.assertEqual('close', headers['connection'])
+            self.assertEqual(b'', await reader.read())
+
+        self._run(func)
+
+        with self.assertRaises(ValueError):
+            AsyncioServer(self.model, None, max_workers=0)
+
+    def test_framing(self) -> None:
+        """Test that requests whose body is framed ambiguously are rejected,
+        and that the connection is closed.
+
+        """
+
+        head = b'POST /batch HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n'  # type: bytes
+
+        for request in [
+                head + b'Content-Length: +2\r\n\r\n[]',
+                head + b'Content-Length: 0_2\r\n\r\n[]',
+                head + b'Content-Length: 2, 2\r\n\r\n[]',
+                head + b'Content-Length: 2\r\nContent-Length: 2\r\n\r\n[]',
+                head + b'Content-Length : 2\r\n\r\n[]',
+                head + b'Transfer-Encoding: chunked\r\nContent-Length: 7\r\n\r\n2\r\n[]\r\n0\r\n\r\n',
+                head + b'Transfer-Encoding: chunked\r\nTransfer-Encoding: chunked\r\n\r\n2\r\n[]\r\n0\r\n\r\n',
+                head + b'Transfer-Encoding: chunked\r\n\r\n0x2\r\n[]\r\n0\r\n\r\n',
+                head + b'Transfer-Encoding: chunked\r\n\r\n 2\r\n[]\r\n0\r\n\r\n',
+                head + b'Transfer-Encoding: chunked\r\n\r\n2\r\n[]XX0\r\n\r\n',
+        ]:
+            async def func(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+                writer.write(request)
+                await writer.drain()
+
+                response = await reader.read()  # type: bytes
+                self.assertTrue(response.startswith(b'HTTP/1.1 400 '), request)
+
+            self._run(func)
+
+        # A chunked body with extensions is accepted, as is a body that is sent
+        # after the idle timeout.
+        #
+        self.server.keepalive_timeout = 0.2
+
+        async def func(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            writer.write(head + b'Transfer-Encoding: chunked\r\n\r\n1;name=value\r\n[\r\n1\r\n]\r\n0\r\n\r\n')
+            await writer.drain()
+
+            response_head = await reader.readuntil(b'\r\n\r\n')  # type: bytes
+            self.assertTrue(response_head.startswith(b'HTTP/1.1 200 '))
+            await reader.readexactly(int(re.search(rb'Content-Length: ([0-9]+)', response_head).group(1)))
+
+            writer.write(b'POST /batch HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\nContent-Length: 2\r\n\r\n[')
+            await writer.drain()
+            await asyncio.sleep(0.5)
+            writer.write(b']')
+            await writer.drain()
+
+            self.assertTrue((await reader.read()).startswith(b'HTTP/1.1 200 '))
+
+        self._run(func)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
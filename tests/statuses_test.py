@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/statuses_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the statuses for Pacifica Dispatcher Example.
+
+This module defines the test cases for the statuses for Pacifica Dispatcher
+Example.
+
+"""
+
+import asyncio
+import datetime
+import io
+import json
+import os
+import tempfile
+import typing
+import unittest
+import uuid
+
+import celery
+import cherrypy
+import playhouse.db_url
+
+from pacifica.dispatcher.receiver import create_peewee_model
+
+from pacifica.dispatcher_example.metrics import Registry
+from pacifica.dispatcher_example.servers import AsyncioServer
+from pacifica.dispatcher_example.statuses import MAX_PAGE_SIZE, apply_retention, create_statuses_endpoint, ensure_indexes, install_retention_task, list_statuses
+
+from servers_test import _request
+
+
+def _cherrypy_request(application: cherrypy.Application, path: str, query_string: str = '') -> typing.Tuple[int, typing.Any]:
+    """Send a "GET" request to a CherryPy application, in-process, and then
+    return the status and the JSON-decoded body of the response.
+
+    """
+
+    host = cherrypy.lib.httputil.Host('127.0.0.1', 8080, '')  # type: cherrypy.lib.httputil.Host
+
+    (request, _response) = application.get_serving(host, host, 'http', 'HTTP/1.1')
+
+    try:
+        response = request.run('GET', path, query_string, 'HTTP/1.1', [('Host', '127.0.0.1')], io.BytesIO())  # type: cherrypy._cprequest.Response
+
+        return (int(response.output_status.split()[0]), json.loads(b''.join(response.body).decode('utf-8')))
+    finally:
+        application.release_serving()
+
+
+class StatusesTestCase(unittest.TestCase):
+    """Test cases for the statuses for Pacifica Dispatcher Example.
+
+    Attributes:
+        tempdir (tempfile.TemporaryDirectory): The temporary directory for the
+            SQLite database.
+        db (peewee.Database): The database.
+        model (type): The class for the Peewee model, whose database table was
+            created without the secondary indexes, as if by an earlier version.
+
+    """
+
+    def setUp(self) -> None:
+        """Initialize the environment for the test cases.
+
+        """
+
+        self.tempdir = tempfile.TemporaryDirectory()  # type: tempfile.TemporaryDirectory
+
+        self.db = playhouse.db_url.connect('sqlite:///{0}'.format(os.path.join(self.tempdir.name, 'db.sqlite3')))  # type: peewee.Database
+
+        self.model = create_peewee_model(self.db)  # type: type
+        self.model.create_table(safe=True)
+        self.db.close()
+
+        ensure_indexes(self.model)
+
+    def tearDown(self) -> None:
+        """Clean up the environment for the test cases.
+
+        """
+
+        self.db.close()
+        self.tempdir.cleanup()
+
+    def _create_rows(self, statuses: typing.List[str], age: float = 0.0) -> typing.List[str]:
+        """Insert a row per status, one second apart, the last of which is a
+        number of seconds old, and then return the IDs for their Celery tasks.
+
+        """
+
+        now = datetime.datetime.now()  # type: datetime.datetime
+        task_ids = []  # type: typing.List[str]
+
+        with self.db.connection_context():
+            for (index, status) in enumerate(statuses):
+                task_id = str(uuid.uuid4())  # type: str
+
+                self.model.create(event_data='{}', data='[]', event_id='C234-1234-{0:04d}'.format(index), task_id=task_id, task_application_name='test.app', task_name='test.tasks.receive', task_status=status, exc_traceback='', created=now - datetime.timedelta(seconds=age + len(statuses) - index))
+
+                task_ids.append(task_id)
+
+        return task_ids
+
+    def test_ensure_indexes(self) -> None:
+        """Test that the secondary indexes are created once, and that the
+        listing of the statuses is read from them.
+
+        """
+
+        ensure_indexes(self.model)
+
+        with self.db.connection_context():
+            index_names = {index.name for index in self.db.get_indexes(self.model._meta.table_name)}  # type: typing.Set[str]
+
+            query = self.model.select(self.model.task_id).where(self.model.task_status == '200 OK').order_by(self.model.created.desc(), self.model.task_id.desc()).limit(1)  # type: peewee.ModelSelect
+            plan = ' '.join(str(row) for row in self.db.execute_sql('EXPLAIN QUERY PLAN {0}'.format(query.sql()[0]), query.sql()[1]).fetchall())  # type: str
+
+        self.assertLessEqual({'receivetaskmodel_event_id_source', 'receivetaskmodel_task_status_created_task_id', 'receivetaskmodel_created_task_id'}, index_names)
+        self.assertEqual(3, len(self.model._meta.indexes))
+        self.assertIn('receivetaskmodel_task_status_created_task_id', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_list_statuses(self) -> None:
+        """Test that the pages of the statuses cover every row once, newest
+        first, and that invalid parameters are rejected.
+
+        """
+
+        task_ids = self._create_rows(['200 OK', '500 Internal Server Error'] * 6)  # type: typing.List[str]
+
+        pages = []  # type: typing.List[typing.List[str]]
+        after = None  # type: typing.Optional[str]
+
+        while True:
+            page = list_statuses(self.model, status='200 OK', limit=2, after=after)  # type: typing.Dict[str, typing.Any]
+            pages.append([status['taskID'] for status in page['statuses']])
+            after = page['next']
+
+            if after is None:
+                break
+
+        self.assertEqual([list(reversed(task_ids[0::2]))[index:index + 2] for index in range(0, 6, 2)], pages)
+        self.assertEqual(list(reversed(task_ids)), [status['taskID'] for status in list_statuses(self.model, limit=MAX_PAGE_SIZE)['statuses']])
+        self.assertEqual({'statuses': [], 'next': None}, list_statuses(self.model, status='404 Not Found'))
+
+        for kwargs in [{'limit': 0}, {'limit': MAX_PAGE_SIZE + 1}, {'after': 'not-a-cursor'}]:
+            with self.assertRaises(ValueError):
+                list_statuses(self.model, **kwargs)
+
+    def test_apply_retention(self) -> None:
+        """Test that the rows that finished before the retention period are
+        compacted or deleted in batches, and that the other rows are kept.
+
+        """
+
+        old_task_ids = self._create_rows(['200 OK', '202 Accepted', '102 Ingesting', '500 Internal Server Error', '208 Already Reported'], age=120.0)  # type: typing.List[str]
+        new_task_ids = self._create_rows(['200 OK'])  # type: typing.List[str]
+
+        self.assertEqual(3, apply_retention(self.model, 60.0, compact=True, batch_size=2))
+        self.assertEqual(0, apply_retention(self.model, 60.0, compact=True, batch_size=2))
+
+        with self.db.connection_context():
+            compacted = {str(inst.task_id) for inst in self.model.select().where((self.model.event_data == '') & self.model.deleted.is_null(False))}  # type: typing.Set[str]
+
+        self.assertEqual({old_task_ids[0], old_task_ids[3], old_task_ids[4]}, compacted)
+
+        self.assertEqual(3, apply_retention(self.model, 60.0, batch_size=2))
+
+        with self.db.connection_context():
+            remaining = {str(inst.task_id) for inst in self.model.select()}  # type: typing.Set[str]
+
+        self.assertEqual({old_task_ids[1], old_task_ids[2], new_task_ids[0]}, remaining)
+
+        with self.assertRaises(ValueError):
+            apply_retention(self.model, 0)
+
+        with self.assertRaises(ValueError):
+            apply_retention(self.model, 60.0, batch_size=0)
+
+    def test_retention_task(self) -> None:
+        """Test that the Celery task applies the retention, and that it is
+        scheduled with Celery beat.
+
+        """
+
+        self._create_rows(['200 OK'] * 3, age=120.0)
+
+        metrics = Registry()  # type: pacifica.dispatcher_example.metrics.Registry
+
+        celery_app = celery.Celery('test.statuses.app', broker='memory://', backend='cache+memory://')  # type: celery.Celery
+        celery_app.conf.task_always_eager = True
+
+        retention_task = install_retention_task(celery_app, self.model, 'test.statuses.tasks.retention', 60.0, interval=30.0, metrics=metrics)  # type: celery.Task
+
+        self.assertEqual({'task': 'test.statuses.tasks.retention', 'schedule': 30.0, 'options': {'expires': 30.0}}, celery_app.conf.beat_schedule['test.statuses.tasks.retention'])
+        self.assertEqual(3, retention_task.delay().get())
+        self.assertIn('dispatcher_example_retention_rows_total{action="delete"} 3', metrics.render())
+
+        with self.assertRaises(ValueError):
+            install_retention_task(celery_app, self.model, 'test.statuses.tasks.other', 60.0, interval=0)
+
+    def test_cherrypy_application(self) -> None:
+        """Test that the listing of the statuses is mounted alongside the
+        upstream endpoint for the status of one CloudEvents notification.
+
+        """
+
+        task_ids = self._create_rows(['200 OK', '500 Internal Server Error'])  # type: typing.List[str]
+
+        application = self.model.create_cherrypy_app(None)  # type: cherrypy.Application
+        application.root.statuses = create_statuses_endpoint(self.model)
+
+        self.assertEqual((200, '500 Internal Server Error'), _cherrypy_request(application, '/status/{0}'.format(task_ids[1])))
+        self.assertEqual(404, _cherrypy_request(application, '/status/{0}'.format(uuid.uuid4()))[0])
+
+        (status, page) = _cherrypy_request(application, '/statuses', 'status=200+OK')
+        self.assertEqual((200, [task_ids[0]]), (status, [status['taskID'] for status in page['statuses']]))
+
+        self.assertEqual(400, _cherrypy_request(application, '/statuses', 'limit=zero')[0])
+
+    def test_asyncio_server(self) -> None:
+        """Test that the asyncio server lists the statuses with the same query
+        parameters.
+
+        """
+
+        task_ids = self._create_rows(['200 OK'] * 3)  # type: typing.List[str]
+
+        server = AsyncioServer(self.model, None, max_workers=1)
+
+        async def run() -> None:
+            """List the statuses, two at a time."""
+            started = await server.start('127.0.0.1', 0)
+
+            async with started:
+                (reader, writer) = await asyncio.open_connection(*started.sockets[0].getsockname()[:2])
+
+                try:
+                    (status, _headers, body) = await _request(reader, writer, 'GET', '/statuses?status=200+OK&limit=2')
+                    self.assertEqual(200, status)
+
+                    page = json.loads(body.decode('utf-8'))
+                    self.assertEqual([task_ids[2], task_ids[1]], [status['taskID'] for status in page['statuses']])
+
+                    (status, _headers, body) = await _request(reader, writer, 'GET', '/statuses?after={0}'.format(page['next']))
+                    self.assertEqual(200, status)
+                    page = json.loads(body.decode('utf-8'))
+                    self.assertEqual(([task_ids[0]], None), ([status['taskID'] for status in page['statuses']], page['next']))
+
+                    (status, _headers, _body) = await _request(reader, writer, 'GET', '/statuses?limit=zero')
+                    self.assertEqual(400, status)
+                finally:
+                    writer.close()
+
+        try:
+            asyncio.run(run())
+        finally:
+            server.shutdown()
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()
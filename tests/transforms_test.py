@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-dispatcher-example: tests/transforms_test.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+"""Test cases for the transforms for Pacifica Dispatcher Example.
+
+This module defines the test cases for the transforms for Pacifica Dispatcher
+Example.
+
+"""
+
+import io
+import os
+import tempfile
+import unittest
+
+from cloudevents.model import Event
+
+from pacifica.dispatcher.downloader_runners import LocalDownloaderRunner
+
+from pacifica.dispatcher_example.event_handlers import ExampleEventHandler
+from pacifica.dispatcher_example.executors import PROCESS, SERIAL
+from pacifica.dispatcher_example.transforms import ASCII_UPPER, UPPER, AsciiUpperTransform, UpperTransform, create_transform
+
+from pipeline_test import CountingUploaderRunner
+
+
+class TransformsTestCase(unittest.TestCase):
+    """Test cases for the transforms for Pacifica Dispatcher Example.
+
+    Attributes:
+        content (str): The content of the original file, including multi-byte
+            characters.
+
+    """
+
+    def setUp(self) -> None:
+        """Initialize the environment for the test cases.
+
+        """
+
+        self.content = 'Ærøskøbing straße ĳssel ǆ, lorem ipsum\n' * 16  # type: str
+
+    def test_upper_transform_file(self) -> None:
+        """Test that the transform of a file at a path matches the whole-file
+        transform for chunk sizes that split multi-byte characters.
+
+        """
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            path = os.path.join(tempdir_name, 'original.txt')  # type: str
+            new_path = os.path.join(tempdir_name, 'new.txt')  # type: str
+
+            with open(path, mode='w', encoding='utf-8') as file:
+                file.write(self.content)
+
+            for chunk_size in [1, 2, 3, 7, 4096]:
+                count = UpperTransform().transform_file(path, new_path, encoding='utf-8', chunk_size=chunk_size)  # type: int
+
+                self.assertEqual(len(self.content.encode('utf-8')), count)
+
+                with open(new_path, mode='r', encoding='utf-8') as new_file:
+                    self.assertEqual(self.content.upper(), new_file.read())
+
+    def test_invalid_chunk_size(self) -> None:
+        """Test that the transforms reject non-positive chunk sizes.
+
+        """
+
+        for transform in [UpperTransform(), AsciiUpperTransform()]:
+            with self.assertRaises(ValueError):
+                transform.transform_stream(io.BytesIO(self.content.encode('utf-8')), io.BytesIO(), chunk_size=0)
+
+    def test_upper_transform(self) -> None:
+        """Test that the bytes-level transform matches ``str.upper`` for
+        chunk sizes that split multi-byte characters, for ASCII-compatible and
+        other character encodings, and that the new file is UTF-8.
+
+        """
+
+        content = 'lorem ipsum\r\n' * 8 + self.content + 'dolor sit amet\n' * 8  # type: str
+
+        for encoding in [None, 'utf-8', 'latin-1', 'utf-16']:
+            original = content.encode(encoding or 'utf-8', errors='ignore')  # type: bytes
+            expected = original.decode(encoding or 'utf-8').upper().encode('utf-8')  # type: bytes
+
+            for chunk_size in [1, 2, 3, 7, 64, 4096]:
+                new_file = io.BytesIO()  # type: io.BytesIO
+
+                count = UpperTransform().transform_stream(io.BytesIO(original), new_file, encoding=encoding, chunk_size=chunk_size)  # type: int
+
+                self.assertEqual(len(original), count)
+                self.assertEqual(expected, new_file.getvalue())
+
+        with self.assertRaises(UnicodeDecodeError):
+            UpperTransform().transform_stream(io.BytesIO('ø'.encode('utf-8')[:1]), io.BytesIO())
+
+    def test_ascii_upper_transform(self) -> None:
+        """Test that the ASCII transform converts only the ASCII letters, and
+        that it rejects the character encodings that are not ASCII-compatible.
+
+        """
+
+        original = self.content.encode('utf-8')  # type: bytes
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            path = os.path.join(tempdir_name, 'original.txt')  # type: str
+            new_path = os.path.join(tempdir_name, 'new.txt')  # type: str
+
+            with open(path, mode='wb') as file:
+                file.write(original)
+
+            self.assertEqual(len(original), AsciiUpperTransform().transform_file(path, new_path, encoding='utf-8', chunk_size=3))
+
+            with open(new_path, mode='rb') as new_file:
+                self.assertEqual(''.join(char.upper() if char.isascii() else char for char in self.content).encode('utf-8'), new_file.read())
+
+        with self.assertRaises(ValueError):
+            AsciiUpperTransform().transform_stream(io.BytesIO(), io.BytesIO(), encoding='utf-16')
+
+        with self.assertRaises(ValueError):
+            AsciiUpperTransform().transform_stream(io.BytesIO(), io.BytesIO(), chunk_size=0)
+
+    def test_create_transform(self) -> None:
+        """Test that each transform is constructed by name, and that its version
+        is distinct.
+
+        """
+
+        self.assertIsInstance(create_transform(UPPER), UpperTransform)
+        self.assertIsInstance(create_transform(ASCII_UPPER), AsciiUpperTransform)
+        self.assertNotEqual(create_transform(UPPER).version, create_transform(ASCII_UPPER).version)
+
+        with self.assertRaises(ValueError):
+            create_transform('lower')
+
+    def test_event_handler_transform(self) -> None:
+        """Test that the event handler applies its transform, both in the
+        current process and in a pool of processes.
+
+        """
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            with open(os.path.join(tempdir_name, 'original.txt'), mode='wb') as file:
+                file.write(self.content.encode('utf-8'))
+
+            event = Event({
+                'cloudEventsVersion': '0.1',
+                'contentType': 'application/json',
+                'data': [
+                    {'destinationTable': 'Transactions._id', 'value': -1},
+                    {'destinationTable': 'Files', 'encoding': 'utf-8', 'name': 'original.txt', 'subdir': ''},
+                ],
+                'eventID': 'C234-1234-1234',
+                'eventType': 'org.pacifica.metadata.ingest',
+                'source': '/pacifica/metadata/ingest',
+            })  # type: cloudevents.model.Event
+
+            for executor in [SERIAL, PROCESS]:
+                uploader_runner = CountingUploaderRunner()
+
+                ExampleEventHandler(LocalDownloaderRunner(tempdir_name), uploader_runner, executor=executor, max_workers=1, transform=create_transform(ASCII_UPPER)).handle(event)
+
+                self.assertEqual([{'original.txt': ''.join(char.upper() if char.isascii() else char for char in self.content)}], uploader_runner.uploads)
+
+
+# Entrypoint.
+#
+if __name__ == '__main__':
+    unittest.main()